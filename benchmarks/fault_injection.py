@@ -0,0 +1,174 @@
+"""Fault-injection harness for the resilient Modal client.
+
+Runs scripted failure scenarios against a local stub server and checks that
+`ResilientModalClient` retries, hedges and trips its circuit breaker as
+expected. Exits non-zero if any scenario misbehaves.
+
+    python -m benchmarks.fault_injection
+"""
+import asyncio
+import sys
+import time
+
+from benchmarks.stub_modal_server import StubModalServer
+from src.resilience import CircuitBreaker, CircuitOpenError, ModalAPIError, ResilientModalClient, RetryPolicy
+
+PAYLOAD = {"prompt": "fault injection", "num_inference_steps": 4, "width": 256, "height": 256}
+
+
+def make_client(url: str, **kwargs) -> ResilientModalClient:
+    kwargs.setdefault("retry_policy", RetryPolicy(max_attempts=3, base_delay=0.01, max_delay=0.05))
+    kwargs.setdefault("breaker", CircuitBreaker(failure_threshold=3, reset_timeout=0.2))
+    kwargs.setdefault("timeout", 2.0)
+    return ResilientModalClient(url, **kwargs)
+
+
+async def scenario_transient_errors(server: StubModalServer):
+    """Two 503s in a row are absorbed by retries"""
+    client = make_client(server.url)
+    server.fail_next(2, 503)
+    try:
+        result = await client.post_json("/generate", PAYLOAD)
+        assert "image_base64" in result
+        assert client.stats["attempts"] == 3, client.stats
+        assert client.breaker.state == CircuitBreaker.CLOSED
+    finally:
+        await client.close()
+
+
+async def scenario_client_error_not_retried(server: StubModalServer):
+    """A 400 is a caller bug and must not be retried"""
+    client = make_client(server.url)
+    server.fail_next(1, 400)
+    try:
+        await client.post_json("/generate", PAYLOAD)
+        raise AssertionError("expected ModalAPIError")
+    except ModalAPIError as e:
+        assert e.status == 400 and not e.retryable
+        assert client.stats["attempts"] == 1, client.stats
+    finally:
+        await client.close()
+
+
+async def scenario_timeout_retried(server: StubModalServer):
+    """A hung idempotent request times out and the retry, with the same Idempotency-Key, succeeds"""
+    client = make_client(server.url, timeout=0.2)
+    server.delay_next(1, 1.0)
+    server.idempotency_keys.clear()
+    try:
+        result = await client.post_json("/generate", PAYLOAD, idempotent=True)
+        assert "image_base64" in result
+        assert client.stats["retries"] == 1, client.stats
+        assert len(server.idempotency_keys) == 2 and len(set(server.idempotency_keys)) == 1, server.idempotency_keys
+        assert server.idempotency_keys[0] is not None
+    finally:
+        await client.close()
+
+
+async def scenario_timeout_not_retried_without_idempotency(server: StubModalServer):
+    """A timed-out call that is not idempotent may still be running, so it is not retried"""
+    client = make_client(server.url, timeout=0.2)
+    server.delay_next(1, 1.0)
+    try:
+        await client.post_json("/generate", PAYLOAD)
+        raise AssertionError("expected ModalAPIError")
+    except ModalAPIError as e:
+        assert e.ambiguous
+        assert client.stats["attempts"] == 1, client.stats
+    finally:
+        await client.close()
+
+
+async def scenario_circuit_opens_and_recovers(server: StubModalServer):
+    """While the endpoint is down the breaker fails fast, and closes again once /health passes"""
+    client = make_client(server.url)
+    server.set_down(True)
+    try:
+        try:
+            await client.post_json("/generate", PAYLOAD)
+        except ModalAPIError:
+            pass
+        assert client.breaker.state == CircuitBreaker.OPEN, client.breaker.get_stats()
+
+        calls_before = server.generate_calls
+        start_time = time.monotonic()
+        try:
+            await client.post_json("/generate", PAYLOAD)
+            raise AssertionError("expected CircuitOpenError")
+        except CircuitOpenError:
+            pass
+        assert server.generate_calls == calls_before, "open circuit must not reach the endpoint"
+        assert time.monotonic() - start_time < 0.1
+
+        server.set_down(False)
+        await asyncio.sleep(0.25)
+        result = await client.post_json("/generate", PAYLOAD)
+        assert "image_base64" in result
+        assert client.breaker.state == CircuitBreaker.CLOSED
+        assert client.breaker.stats["probes"] >= 1
+    finally:
+        server.set_down(False)
+        await client.close()
+
+
+async def scenario_hedged_request(server: StubModalServer):
+    """An idempotent request stuck past its path and tier's p95 is hedged and the backup answers first"""
+    client = make_client(server.url, hedge=True, hedge_min_samples=10)
+    server.latency = 0.02
+    try:
+        for _ in range(10):
+            await client.post_json("/generate", PAYLOAD, idempotent=True)
+
+        # Another tier has no samples of its own yet, and other calls are never hedged
+        server.delay_next(2, 0.3)
+        await client.post_json("/generate", {**PAYLOAD, "tier": "preview"}, idempotent=True)
+        await client.post_json("/generate", PAYLOAD)
+        assert client.stats["hedges"] == 0, client.stats
+
+        server.delay_next(1, 1.5)
+        server.idempotency_keys.clear()
+        start_time = time.monotonic()
+        result = await client.post_json("/generate", PAYLOAD, idempotent=True)
+        elapsed = time.monotonic() - start_time
+        assert "image_base64" in result
+        assert client.stats["hedges"] == 1 and client.stats["hedge_wins"] == 1, client.stats
+        assert elapsed < 1.0, f"hedge should beat the slow primary, took {elapsed:.2f}s"
+        assert len(set(server.idempotency_keys)) == 1, "the hedge must reuse the primary's Idempotency-Key"
+    finally:
+        server.latency = 0.0
+        await client.close()
+
+
+SCENARIOS = [
+    scenario_transient_errors,
+    scenario_client_error_not_retried,
+    scenario_timeout_retried,
+    scenario_timeout_not_retried_without_idempotency,
+    scenario_circuit_opens_and_recovers,
+    scenario_hedged_request,
+]
+
+
+async def run_all() -> int:
+    server = StubModalServer()
+    await server.start()
+    failures = 0
+    try:
+        for scenario in SCENARIOS:
+            server.scripted_failures.clear()
+            server.scripted_delays.clear()
+            try:
+                await scenario(server)
+                print(f"✅ {scenario.__name__}: {scenario.__doc__}")
+            except Exception as e:
+                failures += 1
+                print(f"❌ {scenario.__name__}: {type(e).__name__}: {e}")
+    finally:
+        await server.stop()
+
+    print(f"\n{len(SCENARIOS) - failures}/{len(SCENARIOS)} fault scenarios passed")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if asyncio.run(run_all()) else 0)
@@ -0,0 +1,251 @@
+"""Load generator and capacity report for one app.py instance.
+
+Ramps the number of concurrent marketers through the Single Image, A/B and
+Social tabs (by calling the same handler functions Gradio calls) against the
+fake Flux server and stub Mistral API, and reports the error rate, timeouts,
+throughput and latency at every concurrency level. The capacity is the last
+level that stays under the error and latency budgets.
+
+Time is compressed: `--step-latency` makes the fake GPU N times faster than a
+real one, so `RESULT_TIMEOUT_SCALE` shrinks the app's wait_for_result timeouts
+by the same factor and timeouts start at the same relative load.
+
+Gradio runs each event listener with `concurrency_limit=1` unless told
+otherwise; `--event-concurrency` models that queue (0 = unlimited).
+
+    python -m benchmarks.load_test --levels 1,2,4,8 --stage-seconds 20
+    python -m benchmarks.load_test --fail-below 4        # CI gate: exit 1 below 4 sessions
+"""
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+from src.fake_flux import FakeFluxPipeline
+from benchmarks.run_benchmarks import RESULTS_DIR, AppRunner, git_commit
+from benchmarks.stubs import FakeFluxAPIServer, StubHost, StubMistralServer
+from benchmarks.workloads import APP_DRIVERS, Sample
+from src.tracing import percentile
+
+# Share of clicks per tab
+TAB_MIX = {"single": 0.5, "ab_batch": 0.25, "social_pack": 0.25}
+
+# Seconds per denoising step on the real GPU, used to derive the time compression
+REAL_STEP_SECONDS = 0.6
+
+
+class EventQueue:
+    """Per-tab concurrency limit, like Gradio's queue for one event listener"""
+
+    def __init__(self, limit: int):
+        self.slots = {name: threading.Semaphore(limit) for name in TAB_MIX} if limit > 0 else None
+
+    def run(self, name: str, fn):
+        if self.slots is None:
+            return fn()
+        with self.slots[name]:
+            return fn()
+
+
+def marketer(app, events: EventQueue, user: int, stop_at: float, steps: int, think_time: float,
+             rng: random.Random, samples: list, lock: threading.Lock):
+    """One virtual marketer clicking through the tabs until the stage ends"""
+    tabs, weights = zip(*TAB_MIX.items())
+    index = 0
+    while time.time() < stop_at:
+        tab = rng.choices(tabs, weights)[0]
+        start_time = time.time()
+        sample = events.run(tab, lambda: APP_DRIVERS[tab](app, user * 100000 + index, steps))
+        # Include time spent waiting for the Gradio event slot
+        sample = Sample(sample.workload, time.time() - start_time, sample.images, sample.ok, sample.error,
+                        sample.disk_bytes)
+        with lock:
+            samples.append(sample)
+        index += 1
+        time.sleep(rng.uniform(0, 2 * think_time))
+
+
+def run_stage(app, level: int, args) -> dict:
+    samples = []
+    lock = threading.Lock()
+    events = EventQueue(args.event_concurrency)
+    start_time = time.time()
+    stop_at = start_time + args.stage_seconds
+    threads = [
+        threading.Thread(target=marketer, daemon=True,
+                         args=(app, events, user, stop_at, args.steps, args.think_time,
+                               random.Random(args.seed * 1000 + level * 100 + user), samples, lock))
+        for user in range(level)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        # Requests started before the deadline are allowed to finish
+        thread.join()
+    wall_seconds = time.time() - start_time
+    return stage_report(level, samples, wall_seconds)
+
+
+def stage_report(level: int, samples: list, wall_seconds: float) -> dict:
+    latencies = sorted(s.latency for s in samples)
+    errors = [s for s in samples if not s.ok]
+    timeouts = [s for s in errors if "Timeout" in s.error]
+    report = {
+        "sessions": level,
+        "requests": len(samples),
+        "errors": len(errors),
+        "timeouts": len(timeouts),
+        "error_rate": round(len(errors) / len(samples), 4) if samples else 0.0,
+        "wall_seconds": round(wall_seconds, 2),
+        "requests_per_second": round(len(samples) / wall_seconds, 3),
+        "images_per_second": round(sum(s.images for s in samples) / wall_seconds, 3),
+        "latency_s": {},
+        "by_tab": {},
+    }
+    if latencies:
+        report["latency_s"] = {
+            "p50": round(percentile(latencies, 50), 3),
+            "p95": round(percentile(latencies, 95), 3),
+            "p99": round(percentile(latencies, 99), 3),
+        }
+    for tab in TAB_MIX:
+        tab_samples = sorted(s.latency for s in samples if s.workload == tab)
+        if tab_samples:
+            report["by_tab"][tab] = {
+                "requests": len(tab_samples),
+                "p95_s": round(percentile(tab_samples, 95), 3),
+            }
+    return report
+
+
+def find_capacity(stages: list, max_error_rate: float, p95_budget: float) -> dict:
+    """Last level within budget, and why the next one was rejected"""
+    capacity = 0
+    reason = "all levels within budget"
+    for stage in stages:
+        p95 = stage["latency_s"].get("p95", 0.0)
+        if stage["error_rate"] > max_error_rate:
+            reason = f"error rate {stage['error_rate']:.1%} at {stage['sessions']} sessions"
+            break
+        if p95_budget and p95 > p95_budget:
+            reason = f"p95 {p95:.2f}s over {p95_budget:.2f}s budget at {stage['sessions']} sessions"
+            break
+        capacity = stage["sessions"]
+    return {"capacity_sessions": capacity, "saturation": reason}
+
+
+def bar(value: float, scale: float, width: int = 30) -> str:
+    return "█" * int(round(width * value / scale)) if scale else ""
+
+
+def render_report(result: dict) -> str:
+    stages = result["stages"]
+    max_p95 = max((s["latency_s"].get("p95", 0) for s in stages), default=0)
+    max_rps = max((s["requests_per_second"] for s in stages), default=0)
+    lines = [
+        "# Capacity report",
+        "",
+        f"Commit `{result['git_commit']}`, {result['timestamp']}, time compression x{result['time_compression']:.0f}",
+        "",
+        f"**Capacity: {result['capacity_sessions']} concurrent sessions** (saturation: {result['saturation']})",
+        "",
+        "| sessions | requests | errors | timeouts | error rate | req/s | img/s | p50 s | p95 s | p99 s |",
+        "|---:|---:|---:|---:|---:|---:|---:|---:|---:|---:|",
+    ]
+    for s in stages:
+        latency = s["latency_s"]
+        lines.append(f"| {s['sessions']} | {s['requests']} | {s['errors']} | {s['timeouts']} | {s['error_rate']:.1%} | "
+                     f"{s['requests_per_second']:.2f} | {s['images_per_second']:.2f} | {latency.get('p50', 0):.2f} | "
+                     f"{latency.get('p95', 0):.2f} | {latency.get('p99', 0):.2f} |")
+    lines += ["", "```", "p95 latency"]
+    lines += [f"{s['sessions']:>4} {bar(s['latency_s'].get('p95', 0), max_p95)} {s['latency_s'].get('p95', 0):.2f}s"
+              for s in stages]
+    lines += ["", "throughput"]
+    lines += [f"{s['sessions']:>4} {bar(s['requests_per_second'], max_rps)} {s['requests_per_second']:.2f} req/s"
+              for s in stages]
+    lines += ["", "error rate"]
+    lines += [f"{s['sessions']:>4} {bar(s['error_rate'], 1.0)} {s['error_rate']:.1%}" for s in stages]
+    lines += ["```", ""]
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Ramp concurrent sessions through app.py and report capacity")
+    parser.add_argument("--levels", default="1,2,4,8,16", help="Concurrent sessions per stage")
+    parser.add_argument("--stage-seconds", type=float, default=20.0)
+    parser.add_argument("--think-time", type=float, default=0.5, help="Mean pause between a session's clicks")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--step-latency", type=float, default=0.05, help="Fake seconds per denoising step")
+    parser.add_argument("--gpus", type=int, default=1, help="Concurrent renders on the fake server")
+    parser.add_argument("--detail", type=float, default=0.1)
+    parser.add_argument("--event-concurrency", type=int, default=1,
+                        help="Gradio concurrency_limit per tab (0 = unlimited)")
+    parser.add_argument("--max-error-rate", type=float, default=0.01)
+    parser.add_argument("--p95-budget", type=float, default=0.0, help="Seconds; 0 disables the latency budget")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--fail-below", type=int, default=0, help="Exit 1 if capacity is below this many sessions")
+    parser.add_argument("--output", default=None, help="Report path prefix (writes .json and .md)")
+    args = parser.parse_args()
+
+    levels = [int(level) for level in args.levels.split(",") if level.strip()]
+    time_compression = REAL_STEP_SECONDS / args.step_latency
+
+    pipeline = FakeFluxPipeline(step_latency=args.step_latency, decode_latency=args.step_latency * 2,
+                                detail=args.detail, seed=args.seed)
+    flux_server = FakeFluxAPIServer(pipeline, gpus=args.gpus)
+    mistral_server = StubMistralServer(latency=2.0 / time_compression)
+    host = StubHost().start(flux_server, mistral_server)
+
+    os.environ["MODAL_API_URL"] = flux_server.url
+    os.environ["MISTRAL_API_URL"] = mistral_server.url
+    os.environ.setdefault("MISTRAL_API_KEY", "load-test")
+    os.environ.setdefault("TRACE_EXPORT", "none")
+    os.environ["RESULT_TIMEOUT_SCALE"] = str(1 / time_compression)
+    # The MCP server's own HTTP timeout shrinks with everything else
+    os.environ.setdefault("MODAL_TIMEOUT_SECONDS", str(max(1.0, 120 / time_compression)))
+
+    runner = AppRunner(argparse.Namespace(iterations=0, steps=args.steps, users=0, seed=args.seed))
+    stages = []
+    try:
+        for level in levels:
+            print(f"🚦 Stage: {level} concurrent sessions for {args.stage_seconds:.0f}s")
+            stage = run_stage(runner.app, level, args)
+            stages.append(stage)
+            print(f"   {stage['requests']} requests, error rate {stage['error_rate']:.1%} "
+                  f"({stage['timeouts']} timeouts), p95 {stage['latency_s'].get('p95', 0):.2f}s, "
+                  f"{stage['requests_per_second']:.2f} req/s")
+            if stage["error_rate"] > max(0.5, args.max_error_rate):
+                print("   Stopping ramp: more than half of the requests failed")
+                break
+    finally:
+        runner.close()
+        host.stop()
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "time_compression": time_compression,
+        "config": vars(args),
+        "stages": stages,
+        **find_capacity(stages, args.max_error_rate, args.p95_budget),
+    }
+    prefix = args.output or os.path.join(RESULTS_DIR, f"capacity_{time.strftime('%Y%m%d_%H%M%S')}")
+    os.makedirs(os.path.dirname(prefix) or ".", exist_ok=True)
+    with open(prefix + ".json", "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    report = render_report(result)
+    with open(prefix + ".md", "w", encoding="utf-8") as f:
+        f.write(report)
+    print(report)
+    print(f"💾 Capacity report written to {prefix}.json / {prefix}.md")
+
+    if result["capacity_sessions"] < args.fail_below:
+        print(f"❌ Capacity {result['capacity_sessions']} is below the required {args.fail_below} sessions")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
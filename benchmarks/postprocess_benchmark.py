@@ -0,0 +1,90 @@
+"""Throughput of the brand post-processing pipeline (`src/postprocess.py`).
+
+Renders a batch of fake images at the social-pack sizes, then times:
+
+    per_image   the pipeline run on one image at a time (stacks of one)
+    batched     the same images stacked by size (up to POSTPROCESS_STACK_BYTES),
+                each operation once per stack
+    files       read, process and PNG-encode from disk, inline
+    pool        the same split across `--workers` processes
+
+The pool only helps with more than one CPU core; encoding the PNGs is
+usually the largest share of `files`.
+
+    python -m benchmarks.postprocess_benchmark --images 24 --workers 4
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.fake_flux import FakeFluxPipeline
+from benchmarks.run_benchmarks import RESULTS_DIR, git_commit
+from src.postprocess import PLATFORM_SIZES, Pipeline, PostProcessor
+
+
+def timed(label: str, images: int, megapixels: float, run) -> dict:
+    start_time = time.time()
+    run()
+    seconds = time.time() - start_time
+    print(f"🎨 {label:<10} {seconds:6.2f}s  {images / seconds:6.1f} img/s  {megapixels / seconds:6.1f} MP/s")
+    return {"seconds": round(seconds, 3), "images_per_second": round(images / seconds, 2),
+            "megapixels_per_second": round(megapixels / seconds, 2)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Post-processing throughput: per image, batched and pooled")
+    parser.add_argument("--images", type=int, default=24)
+    parser.add_argument("--pipeline", default="brand")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--detail", type=float, default=0.25)
+    args = parser.parse_args()
+
+    fake = FakeFluxPipeline(step_latency=0, decode_latency=0, detail=args.detail)
+    platforms = [list(PLATFORM_SIZES)[index % len(PLATFORM_SIZES)] for index in range(args.images)]
+    images = []
+    for index, platform in enumerate(platforms):
+        width, height = PLATFORM_SIZES[platform]
+        image = fake(f"post-processing benchmark {index % 3}", num_inference_steps=1,
+                     width=width // 16 * 16, height=height // 16 * 16).images[0]
+        images.append(np.asarray(image.convert("RGB")))
+    megapixels = sum(image.shape[0] * image.shape[1] for image in images) / 1e6
+    pipeline = Pipeline.from_config(args.pipeline)
+    # Overlays are rendered once per size; warm them so every run measures the same work
+    pipeline.run(images, platforms)
+
+    results = {
+        "per_image": timed("per_image", len(images), megapixels,
+                           lambda: [pipeline.run([image], [platform]) for image, platform in zip(images, platforms)]),
+        "batched": timed("batched", len(images), megapixels, lambda: pipeline.run(images, platforms)),
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        paths = []
+        for index, image in enumerate(images):
+            path = os.path.join(directory, f"{index}.png")
+            Image.fromarray(image).save(path)
+            paths.append(path)
+        results["files"] = timed("files", len(images), megapixels,
+                                 lambda: PostProcessor(0).process_files(paths, pipeline, platforms))
+        processor = PostProcessor(args.workers)
+        # Start the workers outside the measurement
+        processor.process_files(paths[:processor.workers * 2], pipeline, platforms[:processor.workers * 2])
+        results["pool"] = timed(f"pool x{args.workers}", len(images), megapixels,
+                                lambda: processor.process_files(paths, pipeline, platforms))
+        processor.close()
+
+    output = os.path.join(RESULTS_DIR, f"postprocess_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": git_commit(),
+                   "config": vars(args), "megapixels": round(megapixels, 2), "cpu_count": os.cpu_count(),
+                   "results": results}, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
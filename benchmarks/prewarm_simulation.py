@@ -0,0 +1,119 @@
+"""Drive the warm pool controller with a simulated clock and a fake backend.
+
+Replays a synthetic day of traffic (quiet night, office-hours bursts and one
+scheduled campaign) through `PrewarmController` and reports how many requests
+would have hit a cold container and how many GPU container-minutes were kept
+warm. No Modal account or GPU needed.
+
+    python -m benchmarks.prewarm_simulation --min-warm 0 --max-warm 4
+"""
+import argparse
+import asyncio
+import json
+import random
+
+from src.prewarm import PrewarmController
+
+COLD_START_SECONDS = 90.0
+WARM_SERVICE_SECONDS = 20.0
+SCALEDOWN_SECONDS = 20 * 60
+
+
+class SimulatedClock:
+    def __init__(self, start: float = 0.0):
+        self.now = start
+
+    def __call__(self) -> float:
+        return self.now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+class FakeWarmPool:
+    """Backend that only records what the controller asked for"""
+
+    def __init__(self, clock: SimulatedClock):
+        self.clock = clock
+        self.min_containers = 0
+        self.warmups = 0
+        self.last_used = float("-inf")
+
+    async def set_warm(self, count: int):
+        self.min_containers = count
+
+    async def warmup(self, count: int):
+        self.warmups += count
+        self.last_used = self.clock()
+
+    def serve(self) -> bool:
+        """Serve one request, returning True when it lands on a cold container"""
+        now = self.clock()
+        cold = self.min_containers == 0 and now - self.last_used > SCALEDOWN_SECONDS
+        self.last_used = now
+        return cold
+
+
+def arrival_rate(second_of_day: float) -> float:
+    """Requests per second for the synthetic traffic profile"""
+    hour = second_of_day / 3600
+    if 9 <= hour < 12 or 14 <= hour < 17:
+        return 1 / 120
+    if 12 <= hour < 14:
+        return 1 / 600
+    return 1 / 3600
+
+
+async def simulate(min_warm: int, max_warm: int, tick_seconds: float, seed: int) -> dict:
+    random.seed(seed)
+    clock = SimulatedClock()
+    backend = FakeWarmPool(clock)
+    controller = PrewarmController(backend, clock=clock, min_warm=min_warm, max_warm=max_warm,
+                                   service_seconds=WARM_SERVICE_SECONDS)
+    controller.schedule_campaign("evening_launch", start=19 * 3600, duration_seconds=3600, containers=2)
+
+    warm_container_seconds = 0.0
+    requests = 0
+    next_tick = 0.0
+    day = 24 * 3600
+
+    while clock.now < day:
+        if clock.now >= next_tick:
+            await controller.tick()
+            next_tick += tick_seconds
+
+        rate = arrival_rate(clock.now)
+        if 19 * 3600 <= clock.now < 20 * 3600:
+            rate = 1 / 30
+        if random.random() < rate:
+            requests += 1
+            controller.record_request()
+            cold = backend.serve()
+            latency = WARM_SERVICE_SECONDS + (COLD_START_SECONDS if cold else 0.0)
+            controller.record_latency(latency, cold)
+
+        warm_container_seconds += backend.min_containers
+        clock.advance(1.0)
+
+    report = controller.latency.report()
+    return {
+        "min_warm": min_warm,
+        "max_warm": max_warm,
+        "requests": requests,
+        "cold_starts": report["cold"]["count"],
+        "cold_fraction": report["cold_fraction"],
+        "warm_container_minutes": round(warm_container_seconds / 60, 1),
+        "campaign_warmups": backend.warmups,
+        "scale_decisions": len(controller.decisions),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate the warm pool controller over a day of traffic")
+    parser.add_argument("--min-warm", type=int, default=0)
+    parser.add_argument("--max-warm", type=int, default=4)
+    parser.add_argument("--tick-seconds", type=float, default=30.0)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(simulate(args.min_warm, args.max_warm, args.tick_seconds, args.seed)), indent=2))
@@ -0,0 +1,123 @@
+"""Build time, query latency and recall of the prompt similarity index (`src/prompt_index.py`).
+
+Builds a `PromptIndex` over `--entries` synthetic campaign prompts, then runs
+`--queries` paraphrased queries (words dropped, some made plural, words
+reordered), each made from a known source prompt, and reports:
+
+    build          hashing, IDF fit, encoding and IVF training for all entries
+    flat / ivf     query latency p50 / p99, scoring every vector or `--nprobe` lists
+    recall_at_k    share of IVF results scoring at least the exact (flat) k-th
+                   result; ties count, as the corpus repeats combinations
+    hit_at_k       share of queries whose source prompt scores at least the
+                   k-th result, i.e. is in the top k up to ties
+    save / load    writing and reading `prompt_index.npz`
+
+    python -m benchmarks.prompt_index_benchmark --entries 100000 --queries 500
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+
+from benchmarks.run_benchmarks import RESULTS_DIR, git_commit
+from src.prompt_index import PromptIndex, hash_features
+from src.tracing import percentile
+
+PRODUCTS = ["wireless headphones", "running sneaker", "smart watch", "skincare serum", "coffee blend",
+            "electric bike", "leather handbag", "gaming laptop", "yoga mat", "sparkling water",
+            "desk lamp", "perfume bottle", "camping tent", "protein bar", "sunglasses", "mechanical keyboard"]
+ADJECTIVES = ["premium", "eco-friendly", "minimalist", "vibrant", "luxury", "retro", "futuristic", "handmade",
+              "limited edition", "bold", "pastel", "matte black"]
+SETTINGS = ["on a marble pedestal", "on a sunny beach", "in a neon-lit city street", "in a cozy kitchen",
+            "on a mountain trail", "in a bright studio", "on a wooden table", "floating in mid-air",
+            "in a lush forest", "at a rooftop party", "on concrete steps", "beside a swimming pool"]
+STYLES = ["product photography", "cinematic lighting", "flat lay", "watercolor illustration", "3d render",
+          "film grain", "golden hour", "high contrast", "soft shadows", "studio lighting"]
+CAMPAIGNS = ["summer sale", "black friday", "holiday launch", "back to school", "spring collection",
+             "new arrival", "flash deal", "brand awareness"]
+LABELS = ["generated", "instagram_post_1080x1080", "instagram_story_1080x1920", "variation_1", "variation_2",
+          "youtube_thumbnail_1280x720", "preview"]
+
+
+def make_prompt(rng: random.Random) -> str:
+    return (f"{rng.choice(ADJECTIVES)} {rng.choice(PRODUCTS)} {rng.choice(SETTINGS)}, {rng.choice(CAMPAIGNS)} "
+            f"campaign, {', '.join(rng.sample(STYLES, 2))} {rng.choice(LABELS).replace('_', ' ')}")
+
+
+def paraphrase(prompt: str, rng: random.Random) -> str:
+    """What someone remembers of a prompt: some words, in a different form and order"""
+    words = prompt.replace(",", "").split()
+    kept = [word for word in words if rng.random() > 0.4] or words[:3]
+    kept = [word + "s" if rng.random() < 0.15 else word for word in kept]
+    start = rng.randrange(len(kept))
+    return " ".join(kept[start:] + kept[:start])
+
+
+def latencies(search, queries) -> tuple:
+    seconds, results = [], []
+    for query in queries:
+        start_time = time.perf_counter()
+        results.append(search(query))
+        seconds.append(time.perf_counter() - start_time)
+    seconds.sort()
+    return {"p50_ms": round(percentile(seconds, 50) * 1000, 3), "p99_ms": round(percentile(seconds, 99) * 1000, 3)}, results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt index build time, latency and recall")
+    parser.add_argument("--entries", type=int, default=100000)
+    parser.add_argument("--queries", type=int, default=500)
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--nprobe", type=int, default=16)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    texts = [make_prompt(rng) for _ in range(args.entries)]
+    ids = [f"{index:016x}" for index in range(args.entries)]
+    start_time = time.time()
+    index = PromptIndex(nprobe=args.nprobe)
+    index.add(ids, texts)
+    build = time.time() - start_time
+    print(f"🏗️  built {len(index)} entries in {build:.2f}s ({index.mode}, {len(index.lists)} lists)")
+
+    sources = [rng.randrange(args.entries) for _ in range(args.queries)]
+    queries = [paraphrase(texts[source], rng) for source in sources]
+    flat, flat_results = latencies(lambda query: index.search(query, args.k, exact=True), queries)
+    ivf, ivf_results = latencies(lambda query: index.search(query, args.k), queries)
+    recall = sum(sum(score >= exact[-1][0] - 1e-6 for score, _ in found) / len(exact)
+                 for exact, found in zip(flat_results, ivf_results) if exact) / len(queries)
+    source_scores = [float(index.vectors[source] @ index._encode([hash_features(query)])[0])
+                     for source, query in zip(sources, queries)]
+    hit = {name: sum(bool(found) and score >= found[-1][0] - 1e-6 for score, found in zip(source_scores, results))
+           / len(queries) for name, results in (("flat", flat_results), ("ivf", ivf_results))}
+    print(f"🔎 flat p50 {flat['p50_ms']:.2f}ms p99 {flat['p99_ms']:.2f}ms, hit@{args.k} {hit['flat']:.1%}")
+    print(f"🔎 ivf  p50 {ivf['p50_ms']:.2f}ms p99 {ivf['p99_ms']:.2f}ms, hit@{args.k} {hit['ivf']:.1%}, "
+          f"recall@{args.k} vs flat {recall:.1%}")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "prompt_index.npz")
+        start_time = time.time()
+        index.save(path)
+        save = time.time() - start_time
+        size = os.path.getsize(path)
+        start_time = time.time()
+        PromptIndex.load(path, dict(zip(ids, texts)))
+        load = time.time() - start_time
+    print(f"💾 save {save:.2f}s, load {load:.2f}s, {size / 1e6:.1f} MB")
+
+    output = os.path.join(RESULTS_DIR, f"prompt_index_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": git_commit(),
+                   "config": vars(args), "build_seconds": round(build, 2), "index": index.get_stats(),
+                   "flat": flat, "ivf": ivf, f"recall_at_{args.k}": round(recall, 4),
+                   f"hit_at_{args.k}": {name: round(value, 4) for name, value in hit.items()},
+                   "save_seconds": round(save, 3), "load_seconds": round(load, 3), "file_bytes": size}, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+"""Offline throughput benchmark for the generation path.
+
+Starts a fake Flux /generate server and a stub Mistral API, points the real
+mcp_server.py (and optionally app.py) at them and runs the scripted workloads
+from `benchmarks.workloads`. Reports throughput, latency percentiles and bytes
+moved per image and writes everything to a JSON file so runs can be compared.
+
+    python -m benchmarks.run_benchmarks                     # MCP tools in-process
+    python -m benchmarks.run_benchmarks --mode app          # Gradio handlers + stdio MCP
+    python -m benchmarks.run_benchmarks --workloads single,mixed --users 8 --gpus 2
+
+Compare two runs:
+    python -m benchmarks.run_benchmarks --compare benchmarks/results/a.json benchmarks/results/b.json
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+from src.fake_flux import FakeFluxPipeline
+from benchmarks.stubs import FakeFluxAPIServer, StubHost, StubMistralServer
+from benchmarks.workloads import WORKLOADS, run_app_workload, run_mcp_workload
+from src.tracing import percentile
+
+RESULTS_DIR = os.path.join("benchmarks", "results")
+
+
+class ByteCounter:
+    """Counts bytes of MCP tool results crossing the app <-> MCP hop"""
+
+    def __init__(self):
+        self.bytes = 0
+
+    def wrap(self, marketing_tool):
+        call_mcp_tool = marketing_tool.call_mcp_tool
+
+        async def counted(tool_name, arguments):
+            result = await call_mcp_tool(tool_name, arguments)
+            self.bytes += len(result or "")
+            return result
+
+        marketing_tool.call_mcp_tool = counted
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True).stdout.strip()
+    except Exception:
+        return ""
+
+
+def summarize(name: str, samples: list, wall_seconds: float, http_bytes: int, mcp_bytes: int, http_images: int) -> dict:
+    latencies = sorted(s.latency for s in samples)
+    images = sum(s.images for s in samples)
+    disk_bytes = sum(s.disk_bytes for s in samples)
+    errors = [s.error for s in samples if not s.ok]
+    report = {
+        "workload": name,
+        "requests": len(samples),
+        "errors": len(errors),
+        "error_samples": errors[:3],
+        "images": images,
+        "wall_seconds": round(wall_seconds, 3),
+        "requests_per_second": round(len(samples) / wall_seconds, 3) if wall_seconds else None,
+        "images_per_second": round(images / wall_seconds, 3) if wall_seconds else None,
+        "latency_ms": {},
+        "bytes_per_image": {
+            # base64 body of /generate responses
+            "http": round(http_bytes / http_images) if http_images else None,
+            # JSON tool results returned over MCP (app mode only)
+            "mcp": round(mcp_bytes / images) if images and mcp_bytes else None,
+            # PNG written by the Gradio handlers (app mode only)
+            "disk": round(disk_bytes / images) if images and disk_bytes else None,
+        },
+    }
+    if latencies:
+        report["latency_ms"] = {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+            "mean": round(sum(latencies) / len(latencies) * 1000, 1),
+            "max": round(latencies[-1] * 1000, 1),
+        }
+    return report
+
+
+def run_workloads(args, flux_server: FakeFluxAPIServer, runner) -> list:
+    reports = []
+    for name in args.workloads:
+        images_before, bytes_before = flux_server.images_rendered, flux_server.bytes_sent
+        mcp_before = runner.byte_counter.bytes if runner.byte_counter else 0
+        start_time = time.time()
+        samples = runner.run(name)
+        wall_seconds = time.time() - start_time
+        mcp_bytes = (runner.byte_counter.bytes - mcp_before) if runner.byte_counter else 0
+        report = summarize(name, samples, wall_seconds,
+                           flux_server.bytes_sent - bytes_before, mcp_bytes,
+                           flux_server.images_rendered - images_before)
+        reports.append(report)
+        latency = report["latency_ms"]
+        print(f"📊 {name:<12} {report['requests']:>4} req  {report['images']:>4} img  "
+              f"{report['images_per_second']:>7.2f} img/s  p50 {latency.get('p50', 0):>8.1f} ms  "
+              f"p95 {latency.get('p95', 0):>8.1f} ms  errors {report['errors']}")
+    return reports
+
+
+class MCPRunner:
+    """Awaits the mcp_server tool functions directly"""
+
+    def __init__(self, args):
+        import mcp_server
+        self.mcp_server = mcp_server
+        self.args = args
+        self.byte_counter = None
+        self.loop = asyncio.new_event_loop()
+
+    def run(self, name: str) -> list:
+        return self.loop.run_until_complete(run_mcp_workload(
+            self.mcp_server, name, self.args.iterations, self.args.steps, self.args.users, self.args.seed))
+
+    def close(self):
+        self.loop.run_until_complete(self.mcp_server.modal_client.close())
+        self.loop.close()
+
+
+class AppRunner:
+    """Calls the Gradio handlers, which talk to a real stdio MCP subprocess"""
+
+    def __init__(self, args):
+        import app
+        self.app = app
+        self.args = args
+        self.byte_counter = ByteCounter()
+        self.byte_counter.wrap(app.marketing_tool)
+        os.makedirs("AI-Marketing-Content-Creator/created_image", exist_ok=True)
+        app.start_mcp_server()
+        if not app.marketing_tool.wait_until_ready(60):
+            raise RuntimeError(f"MCP server did not connect within 60s {app.marketing_tool.connect_error}".rstrip())
+
+    def run(self, name: str) -> list:
+        return run_app_workload(self.app, name, self.args.iterations, self.args.steps, self.args.users, self.args.seed)
+
+    def close(self):
+        self.app.marketing_tool.request_queue.put("STOP")
+
+
+def compare(paths: list):
+    runs = [json.load(open(path, encoding="utf-8")) for path in paths]
+    print(f"{'workload':<14}" + "".join(f"{os.path.basename(p)[:22]:>24}" for p in paths))
+    names = [r["workload"] for r in runs[0]["workloads"]]
+    for name in names:
+        for metric, key in (("img/s", "images_per_second"), ("p95 ms", None)):
+            row = f"{name + ' ' + metric:<14}"
+            for run in runs:
+                report = next((r for r in run["workloads"] if r["workload"] == name), None)
+                value = None
+                if report is not None:
+                    value = report[key] if key else report["latency_ms"].get("p95")
+                row += f"{value if value is not None else '-':>24}"
+            print(row)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline benchmark with a fake Flux pipeline and stub APIs")
+    parser.add_argument("--mode", choices=["mcp", "app"], default="mcp")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS),
+                        help="Comma separated subset of: " + ", ".join(WORKLOADS) + " (plus ai_prompt, ab_shared)")
+    parser.add_argument("--iterations", type=int, default=3, help="Requests per workload (per user for mixed)")
+    parser.add_argument("--users", type=int, default=4, help="Concurrent users in the mixed workload")
+    parser.add_argument("--steps", type=int, default=20)
+    parser.add_argument("--step-latency", type=float, default=0.02, help="Fake seconds per denoising step")
+    parser.add_argument("--decode-latency", type=float, default=0.05)
+    parser.add_argument("--detail", type=float, default=0.25, help="0..1, higher makes bigger PNGs")
+    parser.add_argument("--gpus", type=int, default=1, help="Concurrent renders on the fake server")
+    parser.add_argument("--mistral-latency", type=float, default=0.2)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", default=None, help="Result JSON path (default: benchmarks/results/<mode>_<time>.json)")
+    parser.add_argument("--compare", nargs="+", metavar="RESULT", help="Print a side by side of saved runs and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(args.compare)
+        return
+
+    args.workloads = [w.strip() for w in args.workloads.split(",") if w.strip()]
+
+    pipeline = FakeFluxPipeline(step_latency=args.step_latency, decode_latency=args.decode_latency,
+                                detail=args.detail, seed=args.seed)
+    flux_server = FakeFluxAPIServer(pipeline, gpus=args.gpus)
+    mistral_server = StubMistralServer(latency=args.mistral_latency)
+    host = StubHost().start(flux_server, mistral_server)
+
+    # Must be set before mcp_server / app are imported
+    os.environ["MODAL_API_URL"] = flux_server.url
+    os.environ["MISTRAL_API_URL"] = mistral_server.url
+    os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+    os.environ.setdefault("TRACE_EXPORT", "none")
+
+    print(f"🚀 Benchmark mode={args.mode} flux={flux_server.url} mistral={mistral_server.url}")
+    runner = MCPRunner(args) if args.mode == "mcp" else AppRunner(args)
+    try:
+        reports = run_workloads(args, flux_server, runner)
+    finally:
+        runner.close()
+        host.stop()
+
+    result = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "git_commit": git_commit(),
+        "python": sys.version.split()[0],
+        "machine": platform.machine(),
+        "config": {k: v for k, v in vars(args).items() if k not in ("output", "compare")},
+        "workloads": reports,
+    }
+    output = args.output or os.path.join(RESULTS_DIR, f"{args.mode}_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
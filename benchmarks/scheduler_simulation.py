@@ -0,0 +1,105 @@
+"""Compare scheduling policies for the GPU queue with simulated job costs.
+
+A few bulk A/B batches (five 50-step 1024x1024 images each) land at once,
+then interactive single images arrive while they run. Every job sleeps for
+its estimated cost, in denoising-step increments, so preemption can happen
+between steps. Time is compressed: one 1024x1024 step (~0.6s on the GPU)
+takes `--ms-per-step` milliseconds.
+
+    python -m benchmarks.scheduler_simulation --gpus 1
+"""
+import argparse
+import asyncio
+import json
+import random
+import time
+
+from src.scheduler import PriorityScheduler, Preempted, estimate_cost
+
+GPU_SECONDS_PER_STEP = 0.6
+
+
+async def simulated_inference(job, steps: int, width: int, height: int, seconds_per_unit: float):
+    """Sleep through the remaining steps, stopping early if asked to yield"""
+    done = job.resume_state or 0
+    step_cost = estimate_cost(1, width, height)
+    for step in range(done, steps):
+        if job.preempt_requested and step > done:
+            return Preempted(step, (steps - step) * step_cost)
+        await asyncio.sleep(step_cost * seconds_per_unit)
+    return {"steps": steps}
+
+
+async def run_policy(policy: str, args) -> dict:
+    scale = args.ms_per_step / 1000 / GPU_SECONDS_PER_STEP
+    seconds_per_unit = args.ms_per_step / 1000
+    scheduler = PriorityScheduler(
+        slots=args.gpus,
+        aging_seconds=args.aging_seconds * scale if policy != "fifo" else 0,
+        preemption=policy == "priority+preemption",
+        clock=time.monotonic,
+    )
+    rng = random.Random(args.seed)
+    latencies = {"interactive": [], "bulk": []}
+
+    async def request(kind: str, steps: int, width: int, height: int, delay: float):
+        await asyncio.sleep(delay)
+        start_time = time.monotonic()
+        priority = "standard" if policy == "fifo" else kind
+        # FIFO ignores cost too: equal costs sort by arrival
+        cost = 0.0 if policy == "fifo" else estimate_cost(steps, width, height)
+        await scheduler.submit(
+            lambda job: simulated_inference(job, steps, width, height, seconds_per_unit),
+            priority, cost, preemptible=kind == "bulk"
+        )
+        latencies[kind].append((time.monotonic() - start_time) / scale)
+
+    tasks = []
+    for _ in range(args.bulk_batches):
+        tasks += [request("bulk", 50, 1024, 1024, 0.0) for _ in range(5)]
+    arrival = 0.0
+    for _ in range(args.interactive):
+        arrival += rng.expovariate(1 / args.interactive_gap)
+        steps = rng.choice([20, 30, 50])
+        tasks.append(request("interactive", steps, 1024, 1024, arrival * scale))
+
+    start_time = time.monotonic()
+    await asyncio.gather(*tasks)
+    makespan = (time.monotonic() - start_time) / scale
+
+    def summary(values):
+        ordered = sorted(values)
+        if not ordered:
+            return {}
+        return {
+            "count": len(ordered),
+            "p50_s": round(ordered[len(ordered) // 2], 1),
+            "p95_s": round(ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1) + 0.5))], 1),
+            "max_s": round(ordered[-1], 1),
+        }
+
+    return {
+        "policy": policy,
+        "interactive_latency": summary(latencies["interactive"]),
+        "bulk_latency": summary(latencies["bulk"]),
+        "makespan_s": round(makespan, 1),
+        "preemptions": scheduler.stats["preemptions"],
+    }
+
+
+async def main(args):
+    return [await run_policy(policy, args) for policy in ("fifo", "priority", "priority+preemption")]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Simulate FIFO vs priority scheduling of GPU jobs")
+    parser.add_argument("--gpus", type=int, default=1)
+    parser.add_argument("--bulk-batches", type=int, default=3, help="A/B batches of five 50-step images at t=0")
+    parser.add_argument("--interactive", type=int, default=12, help="Interactive single-image requests")
+    parser.add_argument("--interactive-gap", type=float, default=30.0, help="Mean GPU-seconds between them")
+    parser.add_argument("--aging-seconds", type=float, default=300.0, help="GPU-seconds per class promotion")
+    parser.add_argument("--ms-per-step", type=float, default=2.0, help="Wall milliseconds per simulated step")
+    parser.add_argument("--seed", type=int, default=3)
+    args = parser.parse_args()
+
+    print(json.dumps(asyncio.run(main(args)), indent=2))
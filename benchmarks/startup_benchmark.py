@@ -0,0 +1,151 @@
+"""Measure how long `python app.py` takes to become usable.
+
+Each repetition runs the app's startup in a fresh interpreter against the fake
+Flux server and records:
+
+    import_app    `import app` (gradio is no longer imported here)
+    build_ui      `app.build_demo()`, which imports gradio and builds the Blocks
+    ui_serving    from process start until the Gradio server answers HTTP
+    mcp_ready     from process start until the MCP server connection is ready
+    usable        the later of ui_serving and mcp_ready
+
+`legacy_modelled` is the old sequential path for comparison: import with the
+UI built at import time, then the fixed `time.sleep(5)`, then launch.
+
+An import-time breakdown (`python -X importtime`) of `import app` plus
+`build_demo()` lists the top-level packages by cumulative import time.
+
+    python -m benchmarks.startup_benchmark --repeat 3
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import urllib.request
+from collections import defaultdict
+
+from benchmarks.run_benchmarks import RESULTS_DIR, git_commit
+from src.tracing import percentile
+
+LEGACY_SLEEP_SECONDS = 5.0
+PHASES = ("import_app", "build_ui", "launch", "ui_serving", "mcp_ready", "usable", "legacy_modelled")
+
+
+def child():
+    """One cold start; prints the phase timings as JSON on the last line"""
+    process_start = time.time()
+    from benchmarks.transport_benchmark import free_port
+
+    start_time = time.time()
+    import app
+    import_app = time.time() - start_time
+
+    app.start_mcp_server()
+    start_time = time.time()
+    demo = app.build_demo()
+    build_ui = time.time() - start_time
+
+    port = free_port()
+    start_time = time.time()
+    demo.launch(server_port=port, prevent_thread_lock=True, share=False, quiet=True)
+    while True:
+        try:
+            with urllib.request.urlopen(f"http://127.0.0.1:{port}/", timeout=1) as response:
+                if response.status == 200:
+                    break
+        except OSError:
+            time.sleep(0.02)
+    launch = time.time() - start_time
+    ui_serving = time.time() - process_start
+
+    connected = app.marketing_tool.wait_until_ready(60)
+    mcp_ready = app.marketing_tool.connect_started_at + app.marketing_tool.connect_seconds - process_start
+    result = {
+        "connected": connected,
+        "import_app": import_app,
+        "build_ui": build_ui,
+        "launch": launch,
+        "ui_serving": ui_serving,
+        "mcp_ready": mcp_ready,
+        "usable": max(ui_serving, mcp_ready),
+        "legacy_modelled": (ui_serving - launch) + LEGACY_SLEEP_SECONDS + launch,
+    }
+    demo.close()
+    app.marketing_tool.request_queue.put("STOP")
+    print(json.dumps(result))
+    sys.stdout.flush()
+    os._exit(0)
+
+
+def import_breakdown(top: int) -> list:
+    """Cumulative import time of the packages imported directly by startup"""
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app; app.build_demo()"],
+        env=os.environ, capture_output=True, text=True, timeout=300)
+    totals = defaultdict(int)
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        # One leading space at the top level, two more per nesting level
+        if len(name) - len(name.lstrip()) == 1:
+            totals[name.strip().split(".")[0]] += int(cumulative)
+    ranked = sorted(totals.items(), key=lambda item: -item[1])[:top]
+    return [{"package": package, "seconds": round(us / 1e6, 3)} for package, us in ranked]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Cold-start timing and import breakdown for app.py")
+    parser.add_argument("--repeat", type=int, default=3, help="Cold starts to measure")
+    parser.add_argument("--top", type=int, default=12, help="Packages in the import breakdown")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.child:
+        child()
+
+    from src.fake_flux import FakeFluxPipeline
+    from benchmarks.stubs import FakeFluxAPIServer, StubHost
+
+    flux_server = FakeFluxAPIServer(FakeFluxPipeline(step_latency=0.005, decode_latency=0.01))
+    host = StubHost().start(flux_server)
+    os.environ["MODAL_API_URL"] = flux_server.url
+    os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+    os.environ.setdefault("TRACE_EXPORT", "none")
+    os.environ.setdefault("GRADIO_ANALYTICS_ENABLED", "False")
+
+    runs = []
+    try:
+        for index in range(args.repeat):
+            completed = subprocess.run([sys.executable, "-m", "benchmarks.startup_benchmark", "--child"],
+                                       env=os.environ, capture_output=True, text=True, timeout=300)
+            lines = completed.stdout.strip().splitlines()
+            if completed.returncode != 0 or not lines:
+                raise RuntimeError(f"Startup run failed:\n{completed.stderr[-2000:]}")
+            run = json.loads(lines[-1])
+            runs.append(run)
+            print(f"🚀 run {index + 1}: import {run['import_app']:.2f}s, UI built {run['build_ui']:.2f}s, "
+                  f"serving at {run['ui_serving']:.2f}s, MCP ready at {run['mcp_ready']:.2f}s, "
+                  f"usable at {run['usable']:.2f}s (legacy path ~{run['legacy_modelled']:.2f}s)")
+        breakdown = import_breakdown(args.top)
+    finally:
+        host.stop()
+
+    summary = {phase: round(percentile(sorted(run[phase] for run in runs), 50), 3) for phase in PHASES}
+    print(f"⏱️  median usable {summary['usable']:.2f}s vs legacy {summary['legacy_modelled']:.2f}s")
+    print("📦 Import time by package:")
+    for entry in breakdown:
+        print(f"   {entry['package']:<24} {entry['seconds']:.3f}s")
+
+    output = os.path.join(RESULTS_DIR, f"startup_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": git_commit(),
+                   "config": vars(args), "median_seconds": summary, "runs": runs,
+                   "import_breakdown": breakdown}, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+"""Build the auto-steps calibration table from measured quality versus steps.
+
+For every prompt, seed and resolution bucket, renders the reference at
+`--reference-steps` and the same prompt and seed at each candidate step
+count, then scores each candidate against the reference:
+
+    lpips        LPIPS (AlexNet) distance to the reference render
+    clip_ratio   CLIP image-text similarity relative to the reference's
+
+Scores are averaged per bucket and step count and written as the table
+`src/steps.py` reads. Needs a CUDA GPU with torch, diffusers, transformers and
+lpips installed (not required by the app itself).
+
+    python -m benchmarks.step_calibration --sizes 768x768,1024x1024,1080x1920 --seeds 2
+    python -m src.steps --table benchmarks/results/step_calibration.json
+"""
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+
+from benchmarks.run_benchmarks import RESULTS_DIR, git_commit
+
+PROMPTS = [
+    "Professional product photo of a stainless steel water bottle on wet stone, soft window light",
+    "Vibrant Instagram post for a summer sale with bold typography and tropical colors",
+    "Minimalist hero image of a smartphone on white marble with long shadows",
+    "Cozy coffee shop interior at golden hour, people working on laptops, warm tones",
+    "Luxury watch close-up on black velvet, dramatic rim lighting, reflections",
+    "Flat illustration of a team collaborating around a giant dashboard, pastel palette",
+    "Athlete sprinting on a track at dawn, motion blur, energetic sports advertisement",
+    "Event poster for a tech conference with neon grid background and glowing title text",
+]
+
+
+class QualityScorer:
+    def __init__(self, device: str):
+        import lpips
+        import torch
+        from transformers import CLIPModel, CLIPProcessor
+
+        self.torch = torch
+        self.device = device
+        self.lpips = lpips.LPIPS(net="alex").to(device)
+        self.clip = CLIPModel.from_pretrained("openai/clip-vit-large-patch14").to(device)
+        self.processor = CLIPProcessor.from_pretrained("openai/clip-vit-large-patch14")
+
+    def _tensor(self, image):
+        array = np.asarray(image.convert("RGB"), dtype=np.float32) / 127.5 - 1.0
+        return self.torch.from_numpy(array).permute(2, 0, 1)[None].to(self.device)
+
+    def lpips_distance(self, image, reference) -> float:
+        with self.torch.no_grad():
+            return float(self.lpips(self._tensor(image), self._tensor(reference)).item())
+
+    def clip_score(self, image, prompt: str) -> float:
+        inputs = self.processor(text=[prompt], images=[image], return_tensors="pt", padding=True,
+                                truncation=True).to(self.device)
+        with self.torch.no_grad():
+            output = self.clip(**inputs)
+        image_embeds = output.image_embeds / output.image_embeds.norm(dim=-1, keepdim=True)
+        text_embeds = output.text_embeds / output.text_embeds.norm(dim=-1, keepdim=True)
+        return float((image_embeds * text_embeds).sum().item())
+
+
+def load_pipeline(model: str, device: str):
+    import torch
+    from diffusers import FluxPipeline
+
+    return FluxPipeline.from_pretrained(model, torch_dtype=torch.bfloat16).to(device)
+
+
+def render(pipe, prompt: str, steps: int, width: int, height: int, seed: int, device: str):
+    import torch
+
+    generator = torch.Generator(device=device).manual_seed(seed)
+    return pipe(prompt=prompt, num_inference_steps=steps, width=width, height=height,
+                generator=generator, output_type="pil").images[0]
+
+
+def calibrate(args) -> dict:
+    pipe = load_pipeline(args.model, args.device)
+    scorer = QualityScorer(args.device)
+    steps_grid = sorted(int(s) for s in args.steps.split(","))
+    buckets = []
+
+    for size in args.sizes.split(","):
+        width, _, height = size.partition("x")
+        width, height = int(width), int(height)
+        scores = {steps: {"lpips": [], "clip_ratio": [], "seconds": []} for steps in steps_grid}
+        for prompt in PROMPTS[:args.prompts]:
+            for seed in range(args.seeds):
+                reference = render(pipe, prompt, args.reference_steps, width, height, seed, args.device)
+                reference_clip = scorer.clip_score(reference, prompt)
+                for steps in steps_grid:
+                    start_time = time.time()
+                    image = render(pipe, prompt, steps, width, height, seed, args.device)
+                    scores[steps]["seconds"].append(time.time() - start_time)
+                    scores[steps]["lpips"].append(scorer.lpips_distance(image, reference))
+                    scores[steps]["clip_ratio"].append(scorer.clip_score(image, prompt) / reference_clip)
+                print(f"📏 {size} seed {seed}: {prompt[:50]}")
+
+        bucket = {
+            "megapixels": round(width * height / 1e6, 3),
+            "size": size,
+            "steps": steps_grid,
+            "lpips": [round(float(np.mean(scores[s]["lpips"])), 4) for s in steps_grid],
+            "clip_ratio": [round(float(np.mean(scores[s]["clip_ratio"])), 4) for s in steps_grid],
+            "seconds": [round(float(np.mean(scores[s]["seconds"])), 3) for s in steps_grid],
+        }
+        buckets.append(bucket)
+        for steps, lpips_value, clip_ratio in zip(steps_grid, bucket["lpips"], bucket["clip_ratio"]):
+            print(f"   {size} {steps:>3} steps: lpips {lpips_value:.3f}, clip ratio {clip_ratio:.3f}")
+
+    return {
+        "source": f"benchmarks/step_calibration.py, {args.model}, {args.prompts} prompts x {args.seeds} seeds, "
+                  f"commit {git_commit()}, {time.strftime('%Y-%m-%d')}",
+        "measured": True,
+        "reference_steps": args.reference_steps,
+        "buckets": buckets,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure quality versus steps and write the auto-steps table")
+    parser.add_argument("--model", default="black-forest-labs/FLUX.1-dev")
+    parser.add_argument("--sizes", default="768x768,1024x1024,1080x1920")
+    parser.add_argument("--steps", default="8,12,16,20,24,28,36,44")
+    parser.add_argument("--reference-steps", type=int, default=50)
+    parser.add_argument("--prompts", type=int, default=len(PROMPTS), help="How many built-in prompts to use")
+    parser.add_argument("--seeds", type=int, default=2)
+    parser.add_argument("--device", default="cuda")
+    parser.add_argument("--output", default=os.path.join(RESULTS_DIR, "step_calibration.json"),
+                        help="Copy to src/step_calibration.json to ship it")
+    args = parser.parse_args()
+
+    table = calibrate(args)
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(table, f, indent=2)
+    print(f"💾 Calibration table written to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
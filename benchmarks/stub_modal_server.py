@@ -0,0 +1,132 @@
+"""Local stand-in for the Modal Flux API with fault injection.
+
+Serves `/generate`, `/img2img`, `/inpaint`, `/variations` and `/health` like `src/model_server.py` does, but answers
+instantly (or after a configured latency) and can be told to fail, hang or go
+down so client-side resilience can be exercised without a GPU.
+
+Run standalone:
+    python -m benchmarks.stub_modal_server --port 8000 --fail-rate 0.2
+"""
+import argparse
+import asyncio
+import random
+import time
+
+from aiohttp import web
+
+# 1x1 transparent PNG
+TINY_PNG_BASE64 = (
+    "iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mNkYPhfDwAChwGA60e6kgAAAABJRU5ErkJggg=="
+)
+
+
+class StubModalServer:
+    """aiohttp server mimicking the Modal FastAPI app, with scripted faults"""
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, latency: float = 0.0, fail_rate: float = 0.0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.down = False
+        self.scripted_failures = []   # status codes returned by the next /generate calls
+        self.scripted_delays = []     # extra delays applied to the next /generate calls
+        self.generate_calls = 0
+        self.idempotency_keys = []    # Idempotency-Key header of every /generate call
+        self.health_calls = 0
+        self._runner = None
+
+    # Fault controls
+
+    def fail_next(self, count: int, status: int = 503):
+        self.scripted_failures.extend([status] * count)
+
+    def delay_next(self, count: int, seconds: float):
+        self.scripted_delays.extend([seconds] * count)
+
+    def set_down(self, down: bool = True):
+        self.down = down
+
+    # Handlers
+
+    async def render(self, payload: dict, start_time: float) -> dict:
+        """Produce the /generate response body; subclasses plug in a fake pipeline"""
+        return {"image_base64": TINY_PNG_BASE64, "generation_time": time.time() - start_time}
+
+    async def handle_generate(self, request: web.Request) -> web.Response:
+        self.generate_calls += 1
+        self.idempotency_keys.append(request.headers.get("Idempotency-Key"))
+        payload = await request.json()
+        if request.path != "/generate":
+            payload["mode"] = request.path.strip("/")
+        start_time = time.time()
+
+        if self.down:
+            return web.json_response({"detail": "stub endpoint down"}, status=503)
+        if self.scripted_failures:
+            status = self.scripted_failures.pop(0)
+            return web.json_response({"detail": f"injected {status}"}, status=status)
+        if self.fail_rate and random.random() < self.fail_rate:
+            return web.json_response({"detail": "injected random failure"}, status=503)
+
+        delay = self.latency + (self.scripted_delays.pop(0) if self.scripted_delays else 0.0)
+        if delay:
+            await asyncio.sleep(delay)
+
+        return web.json_response(await self.render(payload, start_time))
+
+    async def handle_health(self, request: web.Request) -> web.Response:
+        self.health_calls += 1
+        if self.down:
+            return web.json_response({"status": "unhealthy"}, status=503)
+        return web.json_response({"status": "healthy", "message": "Stub Flux API server is running"})
+
+    def build_app(self) -> web.Application:
+        app = web.Application(client_max_size=64 * 1024 * 1024)
+        app.router.add_post("/generate", self.handle_generate)
+        app.router.add_post("/img2img", self.handle_generate)
+        app.router.add_post("/inpaint", self.handle_generate)
+        app.router.add_post("/variations", self.handle_generate)
+        app.router.add_get("/health", self.handle_health)
+        return app
+
+    # Lifecycle
+
+    async def start(self) -> str:
+        """Start serving and return the base URL"""
+        self._runner = web.AppRunner(self.build_app(), access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}"
+
+
+async def serve_forever(server: StubModalServer):
+    url = await server.start()
+    print(f"🧪 Stub Modal API listening on {url}")
+    try:
+        while True:
+            await asyncio.sleep(3600)
+    finally:
+        await server.stop()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stub Modal Flux API with fault injection")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--latency", type=float, default=0.0, help="Seconds added to every /generate call")
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="Fraction of /generate calls answered with 503")
+    args = parser.parse_args()
+
+    asyncio.run(serve_forever(StubModalServer(args.host, args.port, args.latency, args.fail_rate)))
@@ -0,0 +1,142 @@
+"""Local stand-ins for the Modal /generate app and the Mistral API.
+
+`FakeFluxAPIServer` answers /generate, /img2img, /inpaint and /variations with
+the same `FluxEngine` calls `src/model_server.py` makes, on `FakeFluxPipeline`
+on the CPU, and keeps the stub's fault injection. `gpus` bounds how many
+renders run at once, like the number of warm GPU containers, and requests wait
+for a slot in the same `PriorityScheduler` order as the real API. To run the
+real FastAPI app on the fake pipeline instead, use `python -m src.serve`.
+"""
+import asyncio
+import threading
+import time
+from io import BytesIO
+
+from aiohttp import web
+from PIL import Image
+
+from src.fake_flux import FakeFluxPipeline
+from benchmarks.stub_modal_server import StubModalServer
+from src.editing import EDIT_MODES, decode_image, edit_steps
+from src.engine import FluxEngine
+from src.scheduler import PriorityScheduler, estimate_cost
+
+
+class FakeFluxAPIServer(StubModalServer):
+    def __init__(self, pipeline: FakeFluxPipeline = None, gpus: int = 1, host: str = "127.0.0.1", port: int = 0):
+        super().__init__(host, port)
+        self.pipeline = pipeline or FakeFluxPipeline()
+        self.engine = FluxEngine(self.pipeline, backend="fake")
+        # Nothing to load, so no call is a cold start
+        self.engine.warmup()
+        self.gpus = gpus
+        self.scheduler = PriorityScheduler(slots=gpus)
+        self.images_rendered = 0
+        self.bytes_sent = 0
+
+    def engine_call(self, payload: dict, start_time: float):
+        """The FluxEngine call the Modal API makes for this payload, and its scheduler cost"""
+        mode = payload.get("mode", "generate")
+        steps = payload.get("num_inference_steps", 50)
+        width, height = payload.get("width", 1024), payload.get("height", 1024)
+        clip_prompt = payload.get("clip_prompt") or ""
+        if mode == "variations":
+            shared_steps = payload["shared_steps"]
+            steps_run = shared_steps + len(payload["variation_prompts"]) * (steps - shared_steps)
+            cost = estimate_cost(steps_run, width, height)
+            return cost, lambda: self.engine.variations(
+                payload["prompt"], payload["variation_prompts"], shared_steps, steps, width, height, "", start_time,
+                clip_prompt, payload.get("variation_clip_prompts"))
+        if mode in EDIT_MODES:
+            image_bytes = decode_image(payload["image_base64"])
+            mask_bytes = decode_image(payload["mask_base64"]) if payload.get("mask_base64") else b""
+            strength = payload.get("strength", 0.35)
+            cost = estimate_cost(edit_steps(steps, strength), *Image.open(BytesIO(image_bytes)).size)
+            return cost, lambda: self.engine.edit(mode, payload["prompt"], image_bytes, strength, steps, mask_bytes,
+                                                  "", start_time, clip_prompt)
+        if payload.get("tier") == "preview":
+            return estimate_cost(steps, width, height), lambda: self.engine.preview(
+                payload["prompt"], steps, width, height, "", start_time, clip_prompt)
+        return estimate_cost(steps, width, height), lambda: self.engine.inference(
+            payload["prompt"], steps, width, height, "", start_time, clip_prompt)
+
+    async def render(self, payload: dict, start_time: float) -> dict:
+        cost, call = self.engine_call(payload, start_time)
+        result = await self.scheduler.submit(
+            lambda job: asyncio.get_running_loop().run_in_executor(None, call),
+            payload.get("priority", "standard"),
+            cost
+        )
+        for image in result.get("images", [result]):
+            self.images_rendered += 1
+            self.bytes_sent += len(image["image_base64"])
+        result["spans"].append({"name": f"fastapi.{payload.get('mode', 'generate')}", "start": start_time,
+                                "end": time.time()})
+        return result
+
+
+class StubMistralServer:
+    """Answers /v1/chat/completions with a canned cinematic prompt"""
+
+    def __init__(self, latency: float = 0.5, host: str = "127.0.0.1", port: int = 0):
+        self.latency = latency
+        self.host = host
+        self.port = port
+        self.calls = 0
+        self._runner = None
+
+    async def handle_completion(self, request: web.Request) -> web.Response:
+        self.calls += 1
+        payload = await request.json()
+        await asyncio.sleep(self.latency)
+        user_message = payload["messages"][-1]["content"]
+        content = (
+            "A cinematic, high-energy marketing poster with dramatic studio lighting, golden rim light and "
+            "floating particles. The product sits center frame on polished marble while bold metallic "
+            f"typography glows above it. Context: {user_message[:120]}"
+        )
+        return web.json_response({
+            "choices": [{"message": {"role": "assistant", "content": content}}],
+            "usage": {"prompt_tokens": len(user_message.split()), "completion_tokens": len(content.split())},
+        })
+
+    async def start(self) -> str:
+        app = web.Application()
+        app.router.add_post("/v1/chat/completions", self.handle_completion)
+        self._runner = web.AppRunner(app, access_log=None)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        self.port = self._runner.addresses[0][1]
+        return self.url
+
+    async def stop(self):
+        if self._runner is not None:
+            await self._runner.cleanup()
+            self._runner = None
+
+    @property
+    def url(self) -> str:
+        return f"http://{self.host}:{self.port}/v1/chat/completions"
+
+
+class StubHost:
+    """Runs stub servers on a background event loop so sync and async drivers can share them"""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.servers = []
+
+    def start(self, *servers):
+        self.thread.start()
+        for server in servers:
+            asyncio.run_coroutine_threadsafe(server.start(), self.loop).result()
+            self.servers.append(server)
+        return self
+
+    def stop(self):
+        for server in self.servers:
+            asyncio.run_coroutine_threadsafe(server.stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join(timeout=5)
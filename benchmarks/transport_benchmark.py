@@ -0,0 +1,177 @@
+"""Compare MCP transports between the app and the tool server.
+
+Runs the same calls through every transport in `src/transport.py` against the
+fake Flux server: image generations (multi-megabyte base64 results) and a
+small tool call (`add_style_modifier`) that isolates per-call overhead. The
+http transport talks to a `mcp_server.py --transport streamable-http` child
+process.
+
+Reports startup time, latency percentiles per call type, calls per second and
+the payload bytes each transport serialized.
+
+    python -m benchmarks.transport_benchmark --calls 20 --concurrency 4
+    python -m benchmarks.transport_benchmark --transports inprocess,http --pool-size 8
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from src.fake_flux import FakeFluxPipeline
+from benchmarks.run_benchmarks import RESULTS_DIR, git_commit
+from benchmarks.stubs import FakeFluxAPIServer, StubHost
+from src.tracing import percentile
+from src.transport import InProcessTransport, StdioTransport, StreamableHTTPTransport, server_env
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_http_server(port: int) -> subprocess.Popen:
+    process = subprocess.Popen(
+        [sys.executable, "mcp_server.py", "--transport", "streamable-http", "--port", str(port)],
+        env={**os.environ, **{k: v for k, v in server_env().items() if v is not None}},
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError("MCP HTTP server did not start")
+
+
+async def timed_calls(transport, tool: str, make_arguments, calls: int, concurrency: int) -> dict:
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = 0
+
+    async def one(index: int):
+        nonlocal errors
+        async with semaphore:
+            start_time = time.time()
+            try:
+                await transport.call_tool(tool, make_arguments(index))
+                latencies.append(time.time() - start_time)
+            except Exception:
+                errors += 1
+
+    start_time = time.time()
+    await asyncio.gather(*(one(i) for i in range(calls)))
+    wall_seconds = time.time() - start_time
+    latencies.sort()
+    return {
+        "calls": calls,
+        "errors": errors,
+        "calls_per_second": round(calls / wall_seconds, 3),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2) if latencies else None,
+            "p95": round(percentile(latencies, 95) * 1000, 2) if latencies else None,
+        },
+    }
+
+
+async def bench_transport(transport, args) -> dict:
+    start_time = time.time()
+    await transport.start()
+    startup_seconds = time.time() - start_time
+    try:
+        # Warm connections and caches before measuring
+        await transport.call_tool("add_style_modifier", {"prompt": "warmup", "style": "professional"})
+        transport.stats.update({"calls": 0, "bytes_sent": 0, "bytes_received": 0})
+
+        small = await timed_calls(
+            transport, "add_style_modifier",
+            lambda i: {"prompt": f"product photo {i}", "style": "professional"},
+            args.calls, args.concurrency)
+        small_bytes = transport.stats["bytes_sent"] + transport.stats["bytes_received"]
+        image = await timed_calls(
+            transport, "generate_and_save_image",
+            lambda i: {"prompt": f"transport benchmark image {i}", "num_inference_steps": args.steps,
+                       "width": args.size, "height": args.size},
+            args.calls, args.concurrency)
+        return {
+            "transport": transport.name,
+            "startup_seconds": round(startup_seconds, 3),
+            "small_call": small,
+            "image_call": image,
+            "bytes_sent": transport.stats["bytes_sent"],
+            "bytes_received": transport.stats["bytes_received"],
+            "bytes_per_small_call": round(small_bytes / args.calls),
+            "bytes_per_image_call": round(
+                (transport.stats["bytes_sent"] + transport.stats["bytes_received"] - small_bytes) / args.calls),
+        }
+    finally:
+        await transport.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency and bytes copied per MCP transport")
+    parser.add_argument("--transports", default="stdio,inprocess,http")
+    parser.add_argument("--calls", type=int, default=20, help="Calls per call type")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--pool-size", type=int, default=4, help="Sessions in the http pool")
+    parser.add_argument("--steps", type=int, default=4)
+    parser.add_argument("--size", type=int, default=1024)
+    parser.add_argument("--step-latency", type=float, default=0.005)
+    parser.add_argument("--detail", type=float, default=0.25)
+    args = parser.parse_args()
+
+    pipeline = FakeFluxPipeline(step_latency=args.step_latency, decode_latency=args.step_latency * 2,
+                                detail=args.detail)
+    flux_server = FakeFluxAPIServer(pipeline, gpus=args.concurrency)
+    host = StubHost().start(flux_server)
+    os.environ["MODAL_API_URL"] = flux_server.url
+    os.environ.setdefault("MISTRAL_API_KEY", "benchmark")
+    os.environ.setdefault("TRACE_EXPORT", "none")
+
+    results = []
+    try:
+        for name in args.transports.split(","):
+            process = None
+            if name == "stdio":
+                transport = StdioTransport(env=server_env())
+            elif name == "inprocess":
+                transport = InProcessTransport()
+            elif name == "http":
+                port = free_port()
+                process = start_http_server(port)
+                transport = StreamableHTTPTransport(f"http://127.0.0.1:{port}/mcp", args.pool_size)
+            else:
+                raise SystemExit(f"Unknown transport '{name}'")
+            try:
+                result = asyncio.run(bench_transport(transport, args))
+            finally:
+                if process is not None:
+                    process.terminate()
+                    process.wait(timeout=10)
+            results.append(result)
+            print(f"🔌 {name:<10} startup {result['startup_seconds']:.2f}s  "
+                  f"small p50 {result['small_call']['latency_ms']['p50']} ms  "
+                  f"image p50 {result['image_call']['latency_ms']['p50']} ms "
+                  f"p95 {result['image_call']['latency_ms']['p95']} ms  "
+                  f"{result['image_call']['calls_per_second']} img/s  "
+                  f"serialized {result['bytes_sent'] + result['bytes_received']:,} bytes")
+    finally:
+        host.stop()
+
+    output = os.path.join(RESULTS_DIR, f"transport_{time.strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump({"timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"), "git_commit": git_commit(),
+                   "config": vars(args), "results": results}, f, indent=2)
+    print(f"💾 Results written to {output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Scripted workloads for the offline benchmarks.
+
+Each workload has an MCP driver (awaits the mcp_server tool functions
+in-process) and an app driver (calls the Gradio handlers in app.py, which go
+through the stdio MCP session). Both return a list of `Sample`s, one per user
+request. Prompts carry a request number so coalescing does not hide work.
+"""
+import asyncio
+import json
+import os
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BASE_PROMPTS = [
+    "Premium wireless headphones on a marble pedestal",
+    "Summer sale banner for an organic skincare brand",
+    "Launch poster for a smart fitness watch",
+    "Cozy coffee shop promotion with latte art",
+    "Eco-friendly sneaker campaign hero shot",
+]
+
+SOCIAL_PLATFORMS = [
+    "instagram_post", "instagram_story", "twitter_post",
+    "linkedin_post", "facebook_cover", "youtube_thumbnail",
+]
+
+AB_VARIATIONS = 5
+# Share of the steps the ab_shared workload runs once before branching
+AB_SHARED_FRACTION = 0.4
+
+
+class Sample:
+    def __init__(self, workload: str, latency: float, images: int, ok: bool, error: str = "", disk_bytes: int = 0):
+        self.workload = workload
+        self.latency = latency
+        self.images = images
+        self.ok = ok
+        self.error = error
+        self.disk_bytes = disk_bytes
+
+
+def make_prompt(index: int) -> str:
+    return f"{BASE_PROMPTS[index % len(BASE_PROMPTS)]}, request {index}"
+
+
+# MCP drivers
+
+async def mcp_single(mcp_server, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    try:
+        await mcp_server.generate_and_save_image(make_prompt(index), steps, 1024, 1024)
+        return Sample("single", time.time() - start_time, 1, True)
+    except Exception as e:
+        return Sample("single", time.time() - start_time, 0, False, str(e))
+
+
+async def mcp_ab_batch(mcp_server, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    result = json.loads(await mcp_server.batch_generate_smart_variations(
+        make_prompt(index), AB_VARIATIONS, "mixed", steps))
+    images = len(result["images"])
+    error = "; ".join(f["error"] for f in result.get("failed", []))
+    return Sample("ab_batch", time.time() - start_time, images, images == AB_VARIATIONS, error)
+
+
+async def mcp_ab_shared(mcp_server, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    result = json.loads(await mcp_server.batch_generate_smart_variations(
+        make_prompt(index), AB_VARIATIONS, "mixed", steps, shared_steps=max(1, int(steps * AB_SHARED_FRACTION))))
+    images = len(result["images"])
+    error = "; ".join(f["error"] for f in result.get("failed", []))
+    return Sample("ab_shared", time.time() - start_time, images, images == AB_VARIATIONS, error)
+
+
+async def mcp_social_pack(mcp_server, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    result = json.loads(await mcp_server.generate_social_media_set(make_prompt(index), SOCIAL_PLATFORMS, steps))
+    images = len(result["results"])
+    error = "; ".join(f["error"] for f in result.get("failed", []))
+    return Sample("social_pack", time.time() - start_time, images, images == len(SOCIAL_PLATFORMS), error)
+
+
+async def mcp_ai_prompt(mcp_server, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    result = json.loads(await mcp_server.generate_prompt_with_ai(make_prompt(index), "marketing", "professional", "instagram"))
+    return Sample("ai_prompt", time.time() - start_time, 0, bool(result.get("success")), result.get("error", ""))
+
+
+MCP_DRIVERS = {
+    "single": mcp_single,
+    "ab_batch": mcp_ab_batch,
+    "ab_shared": mcp_ab_shared,
+    "social_pack": mcp_social_pack,
+    "ai_prompt": mcp_ai_prompt,
+}
+
+# What the mixed workload's users pick from
+MIXED_KINDS = ["single", "ab_batch", "social_pack", "ai_prompt"]
+
+
+async def run_mcp_workload(mcp_server, name: str, iterations: int, steps: int, users: int, seed: int = 0) -> list:
+    if name != "mixed":
+        driver = MCP_DRIVERS[name]
+        return [await driver(mcp_server, i, steps) for i in range(iterations)]
+
+    rng = random.Random(seed)
+    plans = [[rng.choice(MIXED_KINDS) for _ in range(iterations)] for _ in range(users)]
+
+    async def user_session(user: int, plan: list) -> list:
+        return [await MCP_DRIVERS[kind](mcp_server, user * 1000 + i, steps) for i, kind in enumerate(plan)]
+
+    sessions = await asyncio.gather(*(user_session(user, plan) for user, plan in enumerate(plans)))
+    return [sample for session in sessions for sample in session]
+
+
+# App drivers (blocking, like Gradio worker threads)
+
+def _collect_files(paths) -> int:
+    """Size of the files a handler wrote, removing them afterwards"""
+    total = 0
+    for path in set(paths or []):
+        if path and os.path.exists(path):
+            total += os.path.getsize(path)
+            os.remove(path)
+    return total
+
+
+def app_single(app, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    path, status = app.single_image_generation(make_prompt(index), steps, "professional")
+    latency = time.time() - start_time
+    return Sample("single", latency, 1 if path else 0, path is not None, "" if path else status,
+                  _collect_files([path]))
+
+
+def app_ab_batch(app, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    paths, status = app.enhanced_batch_generation(make_prompt(index), "mixed", AB_VARIATIONS, steps)
+    latency = time.time() - start_time
+    images = len(paths or [])
+    return Sample("ab_batch", latency, images, images == AB_VARIATIONS, "" if images == AB_VARIATIONS else status,
+                  _collect_files(paths))
+
+
+def app_social_pack(app, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    paths, status = app.social_media_generation(make_prompt(index), SOCIAL_PLATFORMS, steps)
+    latency = time.time() - start_time
+    images = len(paths or [])
+    ok = images == len(SOCIAL_PLATFORMS)
+    return Sample("social_pack", latency, images, ok, "" if ok else status, _collect_files(paths))
+
+
+def app_ai_prompt(app, index: int, steps: int) -> Sample:
+    start_time = time.time()
+    prompt, status = app.generate_ai_prompt(make_prompt(index), "marketing", "professional", "instagram")
+    ok = status.startswith("✅")
+    return Sample("ai_prompt", time.time() - start_time, 0, ok, "" if ok else status)
+
+
+APP_DRIVERS = {
+    "single": app_single,
+    "ab_batch": app_ab_batch,
+    "social_pack": app_social_pack,
+    "ai_prompt": app_ai_prompt,
+}
+
+
+def run_app_workload(app, name: str, iterations: int, steps: int, users: int, seed: int = 0) -> list:
+    if name != "mixed":
+        driver = APP_DRIVERS[name]
+        return [driver(app, i, steps) for i in range(iterations)]
+
+    rng = random.Random(seed)
+    plans = [[rng.choice(MIXED_KINDS) for _ in range(iterations)] for _ in range(users)]
+
+    def user_session(user: int, plan: list) -> list:
+        return [APP_DRIVERS[kind](app, user * 1000 + i, steps) for i, kind in enumerate(plan)]
+
+    with ThreadPoolExecutor(max_workers=users) as pool:
+        sessions = list(pool.map(user_session, range(users), plans))
+    return [sample for session in sessions for sample in session]
+
+
+WORKLOADS = ["single", "ab_batch", "social_pack", "mixed"]
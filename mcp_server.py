@@ -4,19 +4,45 @@ import requests
 import asyncio
 import aiohttp
 import json
+import time
 from datetime import datetime
-from typing import List, Dict
-import zipfile
+from typing import List, Dict, Optional, Tuple
 from io import BytesIO
 from PIL import Image
 from mcp.server.fastmcp import FastMCP
+from src.singleflight import SingleFlight, normalize_generation_key
+from src.resilience import ResilientModalClient, RetryPolicy, CircuitBreaker
+from src.tracing import get_tracer
+from src.metrics import MetricsRegistry
+from src.bulk import BULK_DIR, default_output_dir, run_manifest
+from src.packaging import default_package_path, entries_from_directory, within_roots, write_package
+from src.prompts import STYLE_MODIFIERS, prompt_compiler
+from src.routing import PREVIEW_STEPS, ToolRouter
+from src.steps import AUTO_STEPS, step_planner
+from src.image_store import OUTPUT_DIR as IMAGE_STORE_DIR, default_store
+from src.postprocess import Pipeline, post_processor
+from src.prompt_index import default_history_index
+from src.accounting import GROUPS, default_ledger, parse_since
+from src.editing import DEFAULT_STRENGTH, box_mask, decode_image, edit_steps
 
 mcp = FastMCP("modal_flux_testing", timeout=500)
 
 
 MODAL_API_URL = os.environ.get("MODAL_API_URL")
 MISTRAL_API_KEY = os.environ.get("MISTRAL_API_KEY")
-MISTRAL_API_URL = "https://api.mistral.ai/v1/chat/completions"
+MISTRAL_API_URL = os.environ.get("MISTRAL_API_URL", "https://api.mistral.ai/v1/chat/completions")
+
+# Retries, hedging and circuit breaking for calls to the Modal endpoint
+modal_client = ResilientModalClient(
+    MODAL_API_URL,
+    retry_policy=RetryPolicy(max_attempts=int(os.environ.get("MODAL_RETRY_ATTEMPTS", "3"))),
+    breaker=CircuitBreaker(
+        failure_threshold=int(os.environ.get("MODAL_BREAKER_THRESHOLD", "5")),
+        reset_timeout=float(os.environ.get("MODAL_BREAKER_RESET_SECONDS", "30")),
+    ),
+    timeout=float(os.environ.get("MODAL_TIMEOUT_SECONDS", "120")),
+    hedge=os.environ.get("MODAL_HEDGE_REQUESTS", "0") == "1",
+)
 
 
 SIZE_PRESETS = {
@@ -29,113 +55,80 @@ SIZE_PRESETS = {
 }
 
 
-PROMPT_TEMPLATES = {
-    "product_hero": """A professional, cinematic product photography composition featuring {product} as the center subject against a {background} backdrop. The scene is illuminated with dramatic studio lighting creating golden highlights and deep shadows. The {product} appears to float with ethereal light emanating from beneath, surrounded by subtle glowing particles and atmospheric mist. The composition uses cinematic depth of field with the product razor-sharp in focus while the background fades into artistic bokeh. Luxurious materials and textures are emphasized with photorealistic detail, showcasing premium quality and craftsmanship.""",
-    
-    "social_announcement": """A high-energy, cinematic social media poster announcing {announcement}. The composition features bold, dramatic lighting with vibrant neon glows and electric energy crackling through the frame. Dynamic typography with the announcement text appears in luxurious, impactful metallic font that seems to emerge from the composition. The backdrop features a futuristic cityscape at night with towering skyscrapers surrounded by colorful LED light strips. Atmospheric elements include flowing energy streams, glowing particles, and lens flares that create a sense of excitement and urgency. The entire poster pulses with kinetic energy and modern sophistication.""",
-    
-    "blog_header": """An elegant, cinematic header image for a blog post about {topic}. The composition features ethereal lighting with soft golden hour illumination casting dramatic shadows across the scene. In the foreground, symbolic elements related to {topic} are artistically arranged with professional depth of field. The background dissolves into atmospheric mist with subtle bokeh and floating light particles. The color palette consists of warm golds, deep purples, and rich earth tones. The entire composition exudes intellectual sophistication and visual storytelling, with magazine-quality photography aesthetics.""",
-    
-    "team_photo": """A cinematic corporate team photograph showing {description} in a modern, luxurious office environment. The scene is lit with dramatic architectural lighting, featuring large floor-to-ceiling windows with natural light streaming in, creating beautiful rim lighting around the subjects. The team is positioned dynamically across multiple levels of the space, with some standing and others seated in premium furniture. The background showcases sleek modern architecture with glass, steel, and wood elements. Professional color grading gives the image a premium, magazine-worthy aesthetic with rich contrasts and warm undertones.""",
-    
-    "event_banner": """A spectacular, cinematic event banner for {event} with movie poster-level production value. The composition features epic scale with dramatic perspective and atmospheric depth. Bold, metallic event typography dominates the upper portion with luxurious, impactful font treatment that appears to be forged from light itself. The scene is filled with dynamic elements: swirling energy, floating particles, dramatic spotlights cutting through atmospheric haze, and architectural elements that frame the composition. The color palette uses deep blues, electric purples, and gold accents to create excitement and grandeur.""",
-    
-    "testimonial_bg": """An abstract, cinematic background for testimonial content featuring {mood} aesthetic. The composition uses flowing, organic shapes with ethereal lighting effects creating depth and movement. Subtle geometric patterns emerge from atmospheric mist while soft, diffused lighting creates beautiful gradients across the frame. The scene includes floating elements like delicate particles, soft bokeh, and gentle light rays that add visual interest without overwhelming the testimonial text. The color palette is sophisticated and calming, using gradient transitions between complementary colors to create emotional resonance.""",
-    
-    "poster_style": """A cinematic movie poster composition featuring {subject} with dramatic, high-impact visual storytelling. The scene is dominated by theatrical lighting with bold contrasts between light and shadow. The main subject is positioned using classical composition rules with supporting elements arranged to guide the eye. Atmospheric elements include swirling mist, dramatic sky, glowing magical effects, and rich environmental details. The composition features layered depth with foreground, midground, and background elements all contributing to the narrative. Typography space is reserved for impactful text placement with the overall mood being {mood}.""",
-    
-    "luxury_product": """An ultra-premium product showcase featuring {product} in a luxurious, museum-quality presentation. The item sits on pristine surfaces with perfect reflections, surrounded by architectural elements like marble, gold accents, and crystal. Dramatic lighting creates spectacular highlights and deep shadows, emphasizing every detail and texture. The background features elegant negative space with subtle gradient lighting and floating particles that suggest exclusivity. The entire composition exudes opulence and sophistication, with photorealistic detail that showcases premium craftsmanship and materials."""
-}
+generation_history = []
 
+# Identical generations that overlap in time share one Modal call
+generation_flight = SingleFlight("mcp_generate")
 
-STYLE_MODIFIERS = {
-    "professional": """professional studio lighting, cinematic composition, dramatic shadows and highlights, premium materials and textures, photorealistic detail, magazine-quality photography, sophisticated color grading, architectural precision, corporate elegance, high-end commercial aesthetics""",
-    
-    "playful": """vibrant neon colors, electric energy crackling through the frame, dynamic movement and flow, glowing particles and magical elements, whimsical floating objects, rainbow light effects, kinetic energy, joyful atmosphere, colorful light strips and LED effects, fun and energetic composition""",
-    
-    "minimalist": """clean geometric composition, pristine white negative space, single dramatic light source, subtle shadows and highlights, elegant simplicity, floating elements with perfect spacing, monochromatic or limited color palette, architectural precision, zen-like tranquility, museum-quality presentation""",
-    
-    "luxury": """opulent materials like gold, marble, and crystal, dramatic chiaroscuro lighting, rich textures and reflections, premium craftsmanship details, sophisticated color palette of deep jewel tones, elegant architectural elements, museum-quality presentation, exclusive atmosphere, metallic accents and flowing fabrics""",
-    
-    "tech": """futuristic neon lighting with electric blue and cyan glows, holographic interfaces and digital elements, sleek metallic surfaces with perfect reflections, floating geometric shapes, matrix-style digital rain effects, cyberpunk aesthetic, glowing circuit patterns, high-tech laboratory environment, innovative and cutting-edge atmosphere""",
-    
-    "cinematic": """movie poster lighting with dramatic spotlights, atmospheric haze and volumetric fog, epic scale and perspective, rich color grading with deep contrasts, cinematic depth of field, theatrical composition, dramatic sky and environmental elements, professional film-quality aesthetics, storytelling through visual elements""",
-    
-    "mystical": """ethereal lighting with soft, magical glows, floating particles and sparkles, misty atmospheric effects, enchanted forest or temple environment, glowing runes and magical symbols, otherworldly color palette of purples and golds, mysterious shadows and light rays, fantasy movie aesthetic, ancient and magical atmosphere""",
-    
-    "editorial": """magazine-quality photography lighting, sophisticated composition following rule of thirds, professional color grading, high fashion aesthetic, dramatic contrasts, premium materials and styling, architectural or natural backgrounds, artistic depth of field, editorial sophistication, contemporary visual storytelling"""
-}
+# Which model tier (full FLUX.1-dev or schnell preview) each tool renders on
+tool_router = ToolRouter.from_env()
 
-VARIATION_STRATEGIES = {
-    "color_schemes": [
-        "with warm colors (reds, oranges, yellows)",
-        "with cool colors (blues, greens, purples)", 
-        "with bold, high-contrast colors",
-        "with muted, pastel colors",
-        "monochromatic color scheme"
-    ],
-    "composition_styles": [
-        "centered composition with symmetrical balance",
-        "rule of thirds composition with dynamic flow",
-        "minimalist composition with lots of white space",
-        "busy, detailed composition with multiple elements",
-        "close-up, focused composition"
-    ],
-    "emotional_tones": [
-        "energetic and exciting mood",
-        "calm and peaceful atmosphere",
-        "professional and trustworthy feel",
-        "fun and playful vibe",
-        "luxurious and premium aesthetic"
-    ],
-    "visual_styles": [
-        "photorealistic style",
-        "illustrated/graphic design style",
-        "vintage/retro aesthetic",
-        "modern/contemporary look",
-        "artistic/creative approach"
-    ],
-    "lighting_moods": [
-        "bright, well-lit scene",
-        "dramatic lighting with shadows",
-        "soft, diffused lighting",
-        "golden hour warm lighting",
-        "studio lighting setup"
-    ]
-}
+tracer = get_tracer("mcp_server")
 
+# Metrics surface exposed through the get_metrics tool
+metrics = MetricsRegistry()
+upstream_latency = metrics.histogram("mcp_upstream_latency_seconds", "Latency of calls to upstream APIs", ["upstream", "outcome"])
+upstream_calls = metrics.counter("mcp_upstream_calls_total", "Calls to upstream APIs", ["upstream", "outcome"])
+tool_latency = metrics.histogram("mcp_tool_latency_seconds", "Latency of image generation tool calls", ["resolution", "steps"])
+prompt_tokens = metrics.histogram("mcp_prompt_tokens", "Compiled prompt length per text encoder", ["encoder"],
+                                  buckets=(32, 64, 77, 128, 256, 384, 512, 768))
+prompt_clauses_dropped = metrics.counter("mcp_prompt_clauses_dropped_total", "Clauses left out to fit encoder limits", ["encoder"])
+image_bytes = metrics.histogram("mcp_image_base64_bytes", "Size of base64 images returned by Modal",
+                                buckets=(64e3, 256e3, 512e3, 1e6, 2e6, 4e6, 8e6, 16e6))
+coalesce_ratio = metrics.gauge("mcp_coalesce_hit_ratio", "Fraction of generations joined to an in-flight request")
+modal_retries = metrics.gauge("mcp_modal_retries", "Retries issued by the Modal client since start")
+modal_hedges = metrics.gauge("mcp_modal_hedges", "Hedged requests issued by the Modal client since start")
+circuit_state = metrics.gauge("mcp_modal_circuit_open", "1 while the Modal circuit breaker is open")
 
-CONTENT_CREATOR_VARIATIONS = {
-    "social_media": [
-        "Instagram-optimized with bold text overlay space",
-        "TikTok-style with vertical focus and trending elements",
-        "LinkedIn professional with corporate aesthetic",
-        "YouTube thumbnail with clickable visual hierarchy",
-        "Twitter-friendly with clear, readable elements"
-    ],
-    "engagement_hooks": [
-        "with eye-catching focal point in center",
-        "with contrasting element to grab attention",
-        "with human faces or eyes for connection",
-        "with bright colors that pop in feeds",
-        "with intriguing visual question or mystery"
-    ],
-    "brand_positioning": [
-        "premium/luxury brand positioning",
-        "affordable/accessible brand feel",
-        "innovative/cutting-edge brand image",
-        "trustworthy/established brand look",
-        "fun/approachable brand personality"
-    ]
-}
+def refresh_gauges():
+    coalesce_ratio.set(generation_flight.get_stats()["coalesce_rate"])
+    modal_retries.set(modal_client.stats["retries"])
+    modal_hedges.set(modal_client.stats["hedges"])
+    circuit_state.set(1 if modal_client.breaker.state == CircuitBreaker.OPEN else 0)
 
+metrics.add_collector(refresh_gauges)
 
+def record_upstream(upstream: str, start_time: float, ok: bool):
+    outcome = "ok" if ok else "error"
+    upstream_latency.observe(time.time() - start_time, upstream=upstream, outcome=outcome)
+    upstream_calls.inc(upstream=upstream, outcome=outcome)
 
-generation_history = []
+async def post_to_mistral(payload: dict, tool: str = "mistral", user: str = "", campaign: str = "") -> dict:
+    """POST a chat completion request to Mistral and return the JSON response"""
+    headers = {
+        "Authorization": f"Bearer {MISTRAL_API_KEY}",
+        "Content-Type": "application/json"
+    }
+    ledger = default_ledger()
+    # Roughly 4 characters per token for the messages, plus the most the reply may use
+    expected_tokens = sum(len(m["content"]) for m in payload["messages"]) // 4 + payload.get("max_tokens", 0)
+    with ledger.admission(user, campaign, mistral_tokens=expected_tokens):
+        start_time = time.time()
+        try:
+            async with aiohttp.ClientSession() as session:
+                async with session.post(
+                    MISTRAL_API_URL,
+                    headers=headers,
+                    json=payload,
+                    timeout=aiohttp.ClientTimeout(total=30)
+                ) as response:
+                    if response.status != 200:
+                        error_text = await response.text()
+                        raise Exception(f"Mistral API error ({response.status}): {error_text}")
+                    result = await response.json()
+        except Exception:
+            record_upstream("mistral", start_time, ok=False)
+            ledger.record(tool, user, campaign, kind="mistral", ok=False)
+            raise
+    record_upstream("mistral", start_time, ok=True)
+    usage = result.get("usage", {})
+    ledger.record(tool, user, campaign, kind="mistral", prompt_tokens=usage.get("prompt_tokens", 0),
+                  completion_tokens=usage.get("completion_tokens", 0))
+    return result
 
 
 @mcp.tool()
-async def generate_prompt_with_ai(user_input: str, context: str = "marketing", style: str = "professional", platform: str = "general") -> str:
+async def generate_prompt_with_ai(user_input: str, context: str = "marketing", style: str = "professional", platform: str = "general", user: str = "", campaign: str = "") -> str:
     """
     Use Mistral AI to generate optimized prompts for Flux image generation.
     
@@ -144,6 +137,7 @@ async def generate_prompt_with_ai(user_input: str, context: str = "marketing", s
         context: The context (marketing, product, social, etc.)
         style: The desired style
         platform: Target platform (instagram, twitter, etc.)
+        user, campaign: Tags for usage accounting and quotas
     
     Returns:
         An optimized prompt for Flux
@@ -181,11 +175,6 @@ Platform: {platform}
 
 Make it sound like a professional movie poster description with rich visual details, specific lighting, composition, and atmospheric elements. Keep it under 200 words but extremely detailed and vivid."""
         
-        headers = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": "mistral-large-latest",
             "messages": [
@@ -196,39 +185,28 @@ Make it sound like a professional movie poster description with rich visual deta
             "max_tokens": 250 
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                MISTRAL_API_URL,
-                headers=headers,
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Mistral API error ({response.status}): {error_text}")
-                
-                result = await response.json()
-                generated_prompt = result['choices'][0]['message']['content']
-                
-               
-                word_count = len(generated_prompt.split())
-                if word_count > 200:
-                    
-                    words = generated_prompt.split()
-                    truncated = ' '.join(words[:190])
-                    # Find the last complete sentence
-                    last_period = truncated.rfind('.')
-                    if last_period > 100:  
-                        generated_prompt = truncated[:last_period + 1]
-                
-                return json.dumps({
-                    "success": True,
-                    "prompt": generated_prompt,
-                    "user_input": user_input,
-                    "context": context,
-                    "style": style,
-                    "word_count": len(generated_prompt.split())
-                })
+        result = await post_to_mistral(payload, "generate_prompt_with_ai", user, campaign)
+        generated_prompt = result['choices'][0]['message']['content']
+        
+       
+        word_count = len(generated_prompt.split())
+        if word_count > 200:
+            
+            words = generated_prompt.split()
+            truncated = ' '.join(words[:190])
+            # Find the last complete sentence
+            last_period = truncated.rfind('.')
+            if last_period > 100:  
+                generated_prompt = truncated[:last_period + 1]
+        
+        return json.dumps({
+            "success": True,
+            "prompt": generated_prompt,
+            "user_input": user_input,
+            "context": context,
+            "style": style,
+            "word_count": len(generated_prompt.split())
+        })
                 
     except Exception as e:
         return json.dumps({
@@ -238,13 +216,14 @@ Make it sound like a professional movie poster description with rich visual deta
         })
 
 @mcp.tool()
-async def enhance_prompt_with_details(base_prompt: str, enhancement_type: str = "cinematic") -> str:
+async def enhance_prompt_with_details(base_prompt: str, enhancement_type: str = "cinematic", user: str = "", campaign: str = "") -> str:
     """
     Enhance a basic prompt with detailed visual elements like your examples.
     
     Args:
         base_prompt: The basic prompt to enhance
         enhancement_type: Type of enhancement (cinematic, poster, product, etc.)
+        user, campaign: Tags for usage accounting and quotas
     
     Returns:
         Enhanced detailed prompt
@@ -270,11 +249,6 @@ Enhancement Type: {enhancement_type}
 
 Transform it into a detailed, cinematic description with specific lighting, composition, atmosphere, and visual storytelling elements."""
         
-        headers = {
-            "Authorization": f"Bearer {MISTRAL_API_KEY}",
-            "Content-Type": "application/json"
-        }
-        
         payload = {
             "model": "mistral-large-latest",
             "messages": [
@@ -285,35 +259,24 @@ Transform it into a detailed, cinematic description with specific lighting, comp
             "max_tokens": 250
         }
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                MISTRAL_API_URL,
-                headers=headers,
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=30)
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Mistral API error ({response.status}): {error_text}")
-                
-                result = await response.json()
-                enhanced_prompt = result['choices'][0]['message']['content']
-                
-                # Ensure under 200 words
-                word_count = len(enhanced_prompt.split())
-                if word_count > 200:
-                    words = enhanced_prompt.split()
-                    truncated = ' '.join(words[:190])
-                    last_period = truncated.rfind('.')
-                    if last_period > 100:
-                        enhanced_prompt = truncated[:last_period + 1]
-                
-                return json.dumps({
-                    "success": True,
-                    "original_prompt": base_prompt,
-                    "enhanced_prompt": enhanced_prompt,
-                    "word_count": len(enhanced_prompt.split())
-                })
+        result = await post_to_mistral(payload, "enhance_prompt_with_details", user, campaign)
+        enhanced_prompt = result['choices'][0]['message']['content']
+        
+        # Ensure under 200 words
+        word_count = len(enhanced_prompt.split())
+        if word_count > 200:
+            words = enhanced_prompt.split()
+            truncated = ' '.join(words[:190])
+            last_period = truncated.rfind('.')
+            if last_period > 100:
+                enhanced_prompt = truncated[:last_period + 1]
+        
+        return json.dumps({
+            "success": True,
+            "original_prompt": base_prompt,
+            "enhanced_prompt": enhanced_prompt,
+            "word_count": len(enhanced_prompt.split())
+        })
                 
     except Exception as e:
         return json.dumps({
@@ -323,51 +286,131 @@ Transform it into a detailed, cinematic description with specific lighting, comp
         })
 
 @mcp.tool()
-async def generate_and_save_image(prompt: str, num_inference_steps: int = 50, width: int = 1024, height: int = 1024) -> str:
-    """Generate a single image with specified dimensions"""
+async def generate_and_save_image(prompt: str, num_inference_steps: int = 50, width: int = 1024, height: int = 1024, trace_id: str = "", priority: str = "standard", platform: str = "", quality: str = "", user: str = "", campaign: str = "") -> str:
+    """Generate a single image with specified dimensions.
+
+    trace_id is an optional W3C traceparent used to correlate latency spans.
+    priority is the GPU queue class: interactive, standard or bulk.
+    num_inference_steps=0 picks steps automatically from the size, the platform
+    (e.g. youtube_thumbnail, website) and the quality target (draft, standard, hero).
+    user and campaign tag the GPU time for usage reports and quotas.
+    """
+    return await generate_routed("generate_and_save_image", prompt, num_inference_steps, width, height,
+                                 trace_id, priority, platform, quality, user, campaign)
+
+@mcp.tool()
+async def generate_preview_image(prompt: str, width: int = 1024, height: int = 1024, trace_id: str = "", user: str = "", campaign: str = "") -> str:
+    """Generate a fast draft of a prompt: FLUX.1-schnell, 1-4 steps, reduced resolution.
+
+    Use it to iterate on a prompt, then render the accepted prompt with generate_and_save_image.
+    """
+    return await generate_routed("generate_preview_image", prompt, PREVIEW_STEPS, width, height,
+                                 trace_id, "interactive", user=user, campaign=campaign)
+
+async def generate_routed(tool: str, prompt: str, num_inference_steps: int, width: int, height: int,
+                          trace_id: str = "", priority: str = "standard", platform: str = "", quality: str = "",
+                          user: str = "", campaign: str = "") -> str:
+    """Generate on the tier, steps and size the routing config assigns to `tool`"""
+    route = tool_router.route(tool)
+    num_inference_steps, width, height = route.apply(num_inference_steps, width, height)
+    if num_inference_steps <= AUTO_STEPS:
+        num_inference_steps = step_planner.choose(width, height, platform, quality)
+    # Full renders are queued by priority class, so only calls of the same class share one
+    key = normalize_generation_key(prompt, num_inference_steps, width, height, route.tier,
+                                   priority if route.tier == "full" else "")
+    # A duplicate of a call in flight shares its GPU job: nothing to admit or charge
+    coalesced = generation_flight.is_in_flight(key)
+    ledger = default_ledger()
+    call = {"tier": route.tier, "width": width, "height": height, "steps": num_inference_steps}
+    expected = 0.0 if coalesced else ledger.estimate(route.tier, num_inference_steps, width, height)
+    with ledger.admission(user, campaign, gpu_seconds=expected, images=0 if coalesced else 1):
+        with tracer.span("mcp.generate_image", parent=trace_id, width=width, height=height,
+                         steps=num_inference_steps, tier=route.tier) as span:
+            with tool_latency.time(resolution=f"{width}x{height}", steps=str(num_inference_steps)):
+                try:
+                    image_b64, usage = await generation_flight.do(
+                        key, lambda: _request_image(prompt, num_inference_steps, width, height, span.traceparent(),
+                                                    priority, route.tier)
+                    )
+                except Exception:
+                    ledger.record(tool, user, campaign, cache="coalesced" if coalesced else "", ok=False, **call)
+                    raise
+    if coalesced:
+        ledger.record(tool, user, campaign, cache="coalesced", **call)
+    else:
+        ledger.record(tool, user, campaign, gpu_seconds=usage["gpu_seconds"], cache=usage["cache"],
+                      cold_start=usage["cold_start"], **call)
+    return image_b64
+
+async def _request_image(prompt: str, num_inference_steps: int, width: int, height: int, traceparent: str = "",
+                         priority: str = "standard", tier: str = "full") -> Tuple[str, dict]:
+    """Call the Modal /generate endpoint; returns the base64 image and the GPU usage reported for it"""
     try:
         print(f"Sending request to Modal API: {prompt} at {width}x{height}")
+        # Fit both encoders: user text first, style filler dropped first
+        compiled = prompt_compiler.compile(prompt)
+        prompt_tokens.observe(compiled.tokens, encoder="t5")
+        prompt_tokens.observe(compiled.clip_tokens, encoder="clip")
+        if compiled.dropped:
+            prompt_clauses_dropped.inc(len(compiled.dropped), encoder="t5")
+        if compiled.clip_dropped:
+            prompt_clauses_dropped.inc(compiled.clip_dropped, encoder="clip")
         payload = {
-            "prompt": prompt,
+            "prompt": compiled.text,
             "num_inference_steps": num_inference_steps,
             "width": width,
-            "height": height
+            "height": height,
+            "priority": priority,
+            "tier": tier
         }
+        if compiled.clip_text != compiled.text:
+            payload["clip_prompt"] = compiled.clip_text
         
-        async with aiohttp.ClientSession() as session:
-            async with session.post(
-                f"{MODAL_API_URL}/generate",
-                json=payload,
-                timeout=aiohttp.ClientTimeout(total=120)
-            ) as response:
-                if response.status != 200:
-                    error_text = await response.text()
-                    raise Exception(f"Modal API error ({response.status}): {error_text}")
-                
-                result = await response.text()
-                result_json = json.loads(result)
-                
-                if 'image_base64' in result_json:
-                    image_b64 = result_json['image_base64']
-                    
-                    # Store in history
-                    generation_history.append({
-                        "prompt": prompt,
-                        "timestamp": datetime.now().isoformat(),
-                        "dimensions": f"{width}x{height}",
-                        "image_base64": image_b64[:100] + "..." 
-                    })
-                    
-                    return image_b64
-                else:
-                    raise Exception("No 'image_base64' key found in response")
+        with tracer.span("mcp.modal_http", parent=traceparent) as http_span:
+            start_time = time.time()
+            try:
+                # The API answers retries and hedges from one job (Idempotency-Key + coalescing)
+                result_json = await modal_client.post_json(
+                    "/generate", payload, headers={"traceparent": http_span.traceparent()}, idempotent=True
+                )
+            except Exception:
+                record_upstream("modal", start_time, ok=False)
+                raise
+            record_upstream("modal", start_time, ok=True)
+        
+        # Stage timings measured on the Modal side (GPU queue, denoise, encode)
+        for stage in result_json.get("spans", []):
+            tracer.record_span(stage["name"], http_span.traceparent(), stage["start"], stage["end"])
+        
+        if 'image_base64' in result_json:
+            image_b64 = result_json['image_base64']
+            image_bytes.observe(len(image_b64))
+            
+            # Store in history
+            generation_history.append({
+                "prompt": prompt,
+                "timestamp": datetime.now().isoformat(),
+                "dimensions": f"{width}x{height}",
+                "tier": tier,
+                "image_base64": image_b64[:100] + "..." 
+            })
+            
+            # A response shared with an identical request at the API did not cost a GPU job of its own
+            shared = result_json.get("coalesced", False)
+            return image_b64, {
+                "gpu_seconds": 0.0 if shared else result_json.get("generation_time", 0.0),
+                "cache": "server_coalesced" if shared else "",
+                "cold_start": result_json.get("cold_start", False) and not shared,
+            }
+        else:
+            raise Exception("No 'image_base64' key found in response")
                     
     except Exception as e:
         print(f"Error in generate_and_save_image: {str(e)}")
         raise Exception(f"Error generating image: {str(e)}")
     
 @mcp.tool()
-async def batch_generate_smart_variations(prompt: str, count: int = 3, variation_type: str = "mixed", num_inference_steps: int = 50, width: int = 1024, height: int = 1024) -> str:
+async def batch_generate_smart_variations(prompt: str, count: int = 3, variation_type: str = "mixed", num_inference_steps: int = 50, width: int = 1024, height: int = 1024, trace_id: str = "", user: str = "", campaign: str = "", shared_steps: int = 0) -> str:
     """
     Generate multiple meaningful variations for A/B testing content.
     
@@ -379,65 +422,145 @@ async def batch_generate_smart_variations(prompt: str, count: int = 3, variation
     - "social_media": Platform-optimized variations
     - "engagement_hooks": Test attention-grabbing elements
     - "brand_positioning": Test different brand feels
+
+    shared_steps > 0 renders a controlled A/B set: the first shared_steps denoising
+    steps run once on the base prompt, then each variation finishes from those same
+    latents. Composition is common to the set, so the tested variable is the only
+    difference, and the batch costs shared + count x (steps - shared) steps.
     """
+    return await _generate_variations("batch_generate_smart_variations", prompt, count, variation_type,
+                                      num_inference_steps, width, height, trace_id, user, campaign, shared_steps)
+
+async def _generate_variations(tool: str, prompt: str, count: int, variation_type: str, num_inference_steps: int,
+                               width: int, height: int, trace_id: str, user: str = "", campaign: str = "",
+                               shared_steps: int = 0) -> str:
     if count > 5:
         count = 5
         
-    variations = []
-    
-    if variation_type == "mixed":
-
-        all_variations = []
-        for strategy in VARIATION_STRATEGIES.values():
-            all_variations.extend(strategy[:2]) 
-        
-       
-        all_variations.extend(CONTENT_CREATOR_VARIATIONS["engagement_hooks"][:2])
-        
-        
-        import random
-        selected_variations = random.sample(all_variations, min(count, len(all_variations)))
-        
-    elif variation_type in VARIATION_STRATEGIES:
-        selected_variations = VARIATION_STRATEGIES[variation_type][:count]
-    elif variation_type in CONTENT_CREATOR_VARIATIONS:
-        selected_variations = CONTENT_CREATOR_VARIATIONS[variation_type][:count]
-    else:
-       
-        selected_variations = [
-            "with vibrant, attention-grabbing colors",
-            "with professional, clean aesthetic", 
-            "with bold, dramatic composition"
-        ][:count]
+    selected_variations = prompt_compiler.select_variations(variation_type, count)
+    compiled_variations = [prompt_compiler.compile(prompt, variation=variation) for variation in selected_variations]
     
     results = []
-    
-    for i, variation in enumerate(selected_variations):
-        enhanced_prompt = f"{prompt}, {variation}"
-        
+    failed = []
+
+    def add_result(i: int, image_b64: str):
+        results.append({
+            "index": i,
+            "variation_description": selected_variations[i],
+            "full_prompt": compiled_variations[i].text,
+            "token_count": compiled_variations[i].tokens,
+            "dimensions": f"{width}x{height}",
+            "image_base64": image_b64,
+            "testing_purpose": get_testing_purpose(selected_variations[i])
+        })
+
+    # The preview tier has too few steps to share
+    if shared_steps > 0 and tool_router.route(tool).tier == "full":
         try:
-            print(f"Generating variation {i+1}/{count}: {variation}")
-            image_b64 = await generate_and_save_image(enhanced_prompt, num_inference_steps, width, height)
-            
-            results.append({
-                "index": i,
-                "variation_description": variation,
-                "full_prompt": enhanced_prompt,
-                "dimensions": f"{width}x{height}",
-                "image_base64": image_b64,
-                "testing_purpose": get_testing_purpose(variation)
-            })
-            
+            print(f"Generating {count} variations from {shared_steps} shared steps")
+            images, shared_steps = await generate_shared_trajectory(
+                tool, prompt, [compiled.text for compiled in compiled_variations], num_inference_steps, width,
+                height, shared_steps, trace_id, user, campaign
+            )
+            for i, image_b64 in enumerate(images):
+                add_result(i, image_b64)
         except Exception as e:
-            print(f"Error generating variation {i+1}: {str(e)}")
+            print(f"Error generating shared-trajectory variations: {str(e)}")
+            failed = [{"index": i, "variation_description": variation, "error": str(e)}
+                      for i, variation in enumerate(selected_variations)]
+    else:
+        shared_steps = 0
+        for i, variation in enumerate(selected_variations):
+            try:
+                print(f"Generating variation {i+1}/{count}: {variation}")
+                image_b64 = await generate_routed(tool, compiled_variations[i].text, num_inference_steps, width,
+                                                  height, trace_id, user=user, campaign=campaign)
+                add_result(i, image_b64)
+            except Exception as e:
+                print(f"Error generating variation {i+1}: {str(e)}")
+                failed.append({
+                    "index": i,
+                    "variation_description": variation,
+                    "error": str(e)
+                })
             
     return json.dumps({
         "images": results, 
         "count": len(results),
+        "failed": failed,
         "variation_type": variation_type,
+        "shared_steps": shared_steps,
         "testing_strategy": get_testing_strategy(variation_type)
     })
 
+async def generate_shared_trajectory(tool: str, prompt: str, variation_prompts: List[str], num_inference_steps: int,
+                                     width: int, height: int, shared_steps: int, trace_id: str = "", user: str = "",
+                                     campaign: str = "") -> Tuple[List[str], int]:
+    """Render variations branched from one trajectory on the Modal /variations endpoint.
+
+    Returns the base64 images in order and the shared steps actually used.
+    """
+    num_inference_steps, width, height = tool_router.route(tool).apply(num_inference_steps, width, height)
+    if num_inference_steps <= AUTO_STEPS:
+        num_inference_steps = step_planner.choose(width, height)
+    shared_steps = max(1, min(shared_steps, num_inference_steps - 1))
+    count = len(variation_prompts)
+    steps_run = shared_steps + count * (num_inference_steps - shared_steps)
+
+    base = prompt_compiler.compile(prompt)
+    compiled = [prompt_compiler.compile(text) for text in variation_prompts]
+    payload = {
+        "prompt": base.text,
+        "variation_prompts": [c.text for c in compiled],
+        "shared_steps": shared_steps,
+        "num_inference_steps": num_inference_steps,
+        "width": width,
+        "height": height,
+    }
+    if base.clip_text != base.text:
+        payload["clip_prompt"] = base.clip_text
+    if any(c.clip_text != c.text for c in compiled):
+        payload["variation_clip_prompts"] = [c.clip_text if c.clip_text != c.text else "" for c in compiled]
+
+    ledger = default_ledger()
+    # Charged per image at its share of the steps the batch ran
+    call = {"tier": "full", "width": width, "height": height, "steps": round(steps_run / count)}
+    with ledger.admission(user, campaign, gpu_seconds=ledger.estimate("full", steps_run, width, height), images=count):
+        with tracer.span("mcp.generate_variations", parent=trace_id, width=width, height=height,
+                         steps=num_inference_steps, shared_steps=shared_steps, count=count) as span:
+            with tool_latency.time(resolution=f"{width}x{height}", steps=str(num_inference_steps)):
+                start_time = time.time()
+                try:
+                    result_json = await modal_client.post_json("/variations", payload,
+                                                               headers={"traceparent": span.traceparent()},
+                                                               idempotent=True)
+                except Exception:
+                    record_upstream("modal", start_time, ok=False)
+                    for _ in range(count):
+                        ledger.record(tool, user, campaign, ok=False, **call)
+                    raise
+                record_upstream("modal", start_time, ok=True)
+            for stage in result_json.get("spans", []):
+                tracer.record_span(stage["name"], span.traceparent(), stage["start"], stage["end"])
+
+    shared = result_json.get("coalesced", False)
+    for index in range(count):
+        ledger.record(tool, user, campaign,
+                      gpu_seconds=0.0 if shared else result_json.get("generation_time", 0.0) / count,
+                      cache="server_coalesced" if shared else "",
+                      cold_start=index == 0 and result_json.get("cold_start", False) and not shared, **call)
+    images = [image["image_base64"] for image in result_json["images"]]
+    for text, image_b64 in zip(variation_prompts, images):
+        image_bytes.observe(len(image_b64))
+        generation_history.append({
+            "prompt": text,
+            "timestamp": datetime.now().isoformat(),
+            "dimensions": f"{width}x{height}",
+            "tier": "full",
+            "image_base64": image_b64[:100] + "..."
+        })
+    return images, shared_steps
+
 def get_testing_purpose(variation: str) -> str:
     """Get the testing purpose for a variation"""
     if "warm colors" in variation or "cool colors" in variation:
@@ -512,41 +635,51 @@ async def generate_ab_test_report_template(variations_data: str) -> str:
 
 
 @mcp.tool()
-async def batch_generate_images(prompt: str, count: int = 3, num_inference_steps: int = 50, width: int = 1024, height: int = 1024) -> str:
+async def batch_generate_images(prompt: str, count: int = 3, num_inference_steps: int = 50, width: int = 1024, height: int = 1024, trace_id: str = "", user: str = "", campaign: str = "") -> str:
     """
     Generate multiple images with smart variations for A/B testing.
     Now uses meaningful variations instead of identical images.
     """
-    return await batch_generate_smart_variations(
+    return await _generate_variations(
+        "batch_generate_images",
         prompt=prompt,
         count=count,
         variation_type="mixed",
         num_inference_steps=num_inference_steps,
         width=width,
-        height=height
+        height=height,
+        trace_id=trace_id,
+        user=user,
+        campaign=campaign
     )
 
 
 @mcp.tool()
-async def generate_social_media_set(prompt: str, platforms: List[str], num_inference_steps: int = 50) -> str:
+async def generate_social_media_set(prompt: str, platforms: List[str], num_inference_steps: int = 50, trace_id: str = "", user: str = "", campaign: str = "") -> str:
     """
     Generate images optimized for different social media platforms with correct resolutions.
     Platforms: instagram_post, instagram_story, twitter_post, linkedin_post, etc.
     """
     results = []
+    failed = []
     
     for platform in platforms:
         if platform in SIZE_PRESETS:
             width, height = SIZE_PRESETS[platform]
-            platform_prompt = f"{prompt}, optimized for {platform.replace('_', ' ')}"
+            platform_prompt = prompt_compiler.compile(prompt, extra=[f"optimized for {platform.replace('_', ' ')}"]).text
             
             try:
                
-                image_b64 = await generate_and_save_image(
+                image_b64 = await generate_routed(
+                    "generate_social_media_set",
                     platform_prompt, 
                     num_inference_steps, 
                     width, 
-                    height
+                    height,
+                    trace_id,
+                    platform=platform,
+                    user=user,
+                    campaign=campaign
                 )
                 results.append({
                     "platform": platform,
@@ -557,14 +690,15 @@ async def generate_social_media_set(prompt: str, platforms: List[str], num_infer
                 print(f"✅ Generated {platform} image at {width}x{height}")
             except Exception as e:
                 print(f"Error generating for {platform}: {str(e)}")
+                failed.append({"platform": platform, "error": str(e)})
                 
-    return json.dumps({"results": results})
+    return json.dumps({"results": results, "failed": failed})
 
 @mcp.tool() 
 async def add_style_modifier(prompt: str, style: str) -> str:
     """
     Add style modifiers to ensure brand consistency.
-    Styles: professional, playful, minimalist, luxury, tech
+    Styles: professional, playful, minimalist, luxury, tech, cinematic, mystical, editorial
     """
     if style not in STYLE_MODIFIERS:
         return json.dumps({
@@ -572,11 +706,12 @@ async def add_style_modifier(prompt: str, style: str) -> str:
             "available_styles": list(STYLE_MODIFIERS.keys())
         })
         
-    enhanced_prompt = f"{prompt}, {STYLE_MODIFIERS[style]}"
+    compiled = prompt_compiler.compile(prompt, style)
     return json.dumps({
         "original_prompt": prompt,
-        "enhanced_prompt": enhanced_prompt,
-        "style_applied": style
+        "enhanced_prompt": compiled.text,
+        "style_applied": style,
+        "token_stats": {k: v for k, v in compiled.to_dict().items() if k != "prompt"}
     })
 
 @mcp.tool()
@@ -589,47 +724,352 @@ async def get_generation_history(limit: int = 10) -> str:
     })
 
 @mcp.tool()
-async def create_image_package(image_data_list: List[Dict], package_name: str = "marketing_assets") -> str:
+async def search_history(query: str, k: int = 5) -> str:
+    """
+    Search past generations by what their prompts described, e.g. "headphones on
+    marble for black friday", to reuse an existing image instead of regenerating it.
+    Offline and CPU only: stored images are ranked by hashed n-gram TF-IDF similarity
+    of their prompts and labels.
+    Returns up to k cached image paths with their prompts, sizes and similarity scores.
+    """
+    if not query.strip():
+        return json.dumps({"success": False, "error": "Give a query to search for"})
+    try:
+        # Picking up new store records and the first index load read the disk
+        found = await asyncio.get_running_loop().run_in_executor(None, default_history_index().search, query, max(1, k))
+        return json.dumps({"success": True, "query": query, **found})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+async def find_similar_images(image_id: str = "", image_base64: str = "", prompt: str = "", width: int = 0, height: int = 0, max_distance: int = -1, limit: int = 5) -> str:
+    """
+    Find past images in the output store before spending a GPU call on a new one.
+    image_id (content hash, hash prefix or file name) or image_base64 (e.g. a preview
+    draft): stored images that look the same by perceptual hash (pHash + dHash).
+    prompt (and optionally width/height): stored images made from the same prompt.
+    max_distance: pHash bits that may differ (-1 uses the near-duplicate thresholds).
+    Returns file paths, Hamming distances and the prompts they were made from.
+    """
+    if not (image_id or image_base64 or prompt):
+        return json.dumps({"success": False, "error": "Give image_id, image_base64 or prompt"})
+
+    def search() -> dict:
+        store = default_store()
+        found = {}
+        if image_id or image_base64:
+            if image_id:
+                record = store.find(image_id)
+                if record is None:
+                    raise ValueError(f"No stored image matches '{image_id}'")
+                image = Image.open(store.path(record))
+            else:
+                image = Image.open(BytesIO(base64.b64decode(image_base64 + "=" * (-len(image_base64) % 4))))
+            found["similar"] = store.similar(image, None if max_distance < 0 else max_distance, limit)
+        if prompt:
+            found["same_prompt"] = store.by_prompt(prompt, width, height, limit)
+        return {key: [{k: v for k, v in record.items() if k not in ("phash", "dhash", "metadata")} for record in records]
+                for key, records in found.items()}
+
+    try:
+        # Hashing and index reads touch the disk; keep the event loop free
+        matches = await asyncio.get_running_loop().run_in_executor(None, search)
+        return json.dumps({"success": True, **matches,
+                           "reusable": any(matches.values()), "store": default_store().get_stats()})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+async def postprocess_images(image_ids: List[str], pipeline: str = "brand", steps: Optional[List[Dict]] = None, platforms: Optional[List[str]] = None) -> str:
+    """
+    Apply a brand post-processing pipeline (color grade, safe zones, watermark, resize)
+    to stored images on CPU, without another GPU call.
+    image_ids: content hashes or file names from the output store.
+    pipeline: a named pipeline (e.g. "brand", "safe_zone_guides"), or
+    steps: an explicit chain, e.g. [{"op": "resize", "preset": "instagram_post"}, {"op": "watermark", "text": "ACME"}].
+    platforms: one per image, for platform safe zones and preset sizes.
+    Returns the processed images' paths in the output store.
+    """
+    steps, platforms = steps or [], platforms or []
+    if platforms and len(platforms) != len(image_ids):
+        return json.dumps({"success": False, "error": "Give one platform per image or none"})
+
+    def run() -> List[dict]:
+        store = default_store()
+        records = []
+        for image_id in image_ids:
+            record = store.find(image_id)
+            if record is None:
+                raise ValueError(f"No stored image matches '{image_id}'")
+            records.append(record)
+        chain = Pipeline.from_config(steps, "custom") if steps else Pipeline.from_config(pipeline)
+        outputs = post_processor.process_files([store.path(r) for r in records], chain, platforms)
+        name = chain.name or "processed"
+        return [store.save(data, label=f"{record['label'] or record['id'][:16]}_{name}", prompt=record.get("prompt", ""))
+                for record, data in zip(records, outputs)]
+
+    try:
+        start_time = time.time()
+        saved = await asyncio.get_running_loop().run_in_executor(None, run)
+        return json.dumps({
+            "success": True,
+            "images": [{"id": r["id"], "path": r["path"], "width": r["width"], "height": r["height"]} for r in saved],
+            "seconds": round(time.time() - start_time, 3)
+        })
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+async def img2img_image(image_id: str, prompt: str = "", strength: float = DEFAULT_STRENGTH["img2img"], num_inference_steps: int = 50, priority: str = "interactive", trace_id: str = "", user: str = "", campaign: str = "") -> str:
+    """
+    Edit a stored image instead of regenerating it, e.g. swap the color scheme of an A/B winner.
+    image_id: content hash, hash prefix or file name from the output store (see search_history).
+    prompt: the edited description; defaults to the prompt the image was made from.
+    strength: 0-1, how much is repainted. Only strength x num_inference_steps steps run,
+    so 0.35 keeps the composition and costs about a third of a fresh render.
+    Returns the edited image's id and path in the output store.
+    """
+    return await edit_stored_image("img2img_image", "img2img", image_id, prompt, strength, num_inference_steps,
+                                   priority=priority, trace_id=trace_id, user=user, campaign=campaign)
+
+@mcp.tool()
+async def inpaint_image(image_id: str, prompt: str = "", box: Optional[List[int]] = None, mask_base64: str = "", strength: float = DEFAULT_STRENGTH["inpaint"], num_inference_steps: int = 50, priority: str = "interactive", trace_id: str = "", user: str = "", campaign: str = "") -> str:
+    """
+    Repaint one region of a stored image and keep the rest, e.g. fix a hand or replace the headline area.
+    image_id: content hash, hash prefix or file name from the output store.
+    box: [x, y, width, height] in pixels of the region to repaint, or
+    mask_base64: a PNG mask of the image's size, white where to repaint.
+    prompt: what the region should show; defaults to the image's original prompt.
+    Only strength x num_inference_steps steps run.
+    """
+    if not (box or mask_base64):
+        return json.dumps({"success": False, "error": "Give box or mask_base64"})
+    return await edit_stored_image("inpaint_image", "inpaint", image_id, prompt, strength, num_inference_steps,
+                                   box, mask_base64, priority, trace_id, user, campaign)
+
+async def edit_stored_image(tool: str, mode: str, image_id: str, prompt: str, strength: float,
+                            num_inference_steps: int, box: Optional[List[int]] = None, mask_base64: str = "",
+                            priority: str = "interactive", trace_id: str = "", user: str = "", campaign: str = "") -> str:
+    """Send a stored image to the Modal /img2img or /inpaint endpoint and store the result"""
+    if not 0 < strength <= 1:
+        return json.dumps({"success": False, "error": "strength must be in (0, 1]"})
+    loop = asyncio.get_running_loop()
+
+    def load() -> Tuple[dict, bytes, bytes]:
+        store = default_store()
+        record = store.find(image_id)
+        if record is None:
+            raise ValueError(f"No stored image matches '{image_id}'")
+        with open(store.path(record), "rb") as f:
+            source = f.read()
+        mask = box_mask(record["width"], record["height"], box) if box else decode_image(mask_base64) if mask_base64 else b""
+        return record, source, mask
+
+    try:
+        record, source, mask = await loop.run_in_executor(None, load)
+        prompt = prompt or record.get("prompt", "")
+        if not prompt:
+            raise ValueError("The stored image has no prompt; give one")
+        width, height = record["width"], record["height"]
+        steps_run = edit_steps(num_inference_steps, strength)
+        compiled = prompt_compiler.compile(prompt)
+        payload = {"image_base64": base64.b64encode(source).decode("utf-8"), "prompt": compiled.text,
+                   "strength": strength, "num_inference_steps": num_inference_steps, "priority": priority}
+        if mask:
+            payload["mask_base64"] = base64.b64encode(mask).decode("utf-8")
+        if compiled.clip_text != compiled.text:
+            payload["clip_prompt"] = compiled.clip_text
+
+        ledger = default_ledger()
+        call = {"tier": "full", "width": width, "height": height, "steps": steps_run}
+        start_time = time.time()
+        with ledger.admission(user, campaign, gpu_seconds=ledger.estimate("full", steps_run, width, height), images=1):
+            with tracer.span(f"mcp.{mode}", parent=trace_id, width=width, height=height, steps=steps_run) as span:
+                try:
+                    result_json = await modal_client.post_json(f"/{mode}", payload,
+                                                               headers={"traceparent": span.traceparent()},
+                                                               idempotent=True)
+                except Exception:
+                    record_upstream("modal", start_time, ok=False)
+                    ledger.record(tool, user, campaign, ok=False, **call)
+                    raise
+                record_upstream("modal", start_time, ok=True)
+                for stage in result_json.get("spans", []):
+                    tracer.record_span(stage["name"], span.traceparent(), stage["start"], stage["end"])
+        shared = result_json.get("coalesced", False)
+        ledger.record(tool, user, campaign, gpu_seconds=0.0 if shared else result_json.get("generation_time", 0.0),
+                      cache="server_coalesced" if shared else "",
+                      cold_start=result_json.get("cold_start", False) and not shared, **call)
+
+        label = f"{record['label'] or record['id'][:16]}_{mode}"
+        saved = await loop.run_in_executor(None, lambda: default_store().save(
+            decode_image(result_json["image_base64"]), label=label, prompt=prompt,
+            metadata={"source": record["id"], "mode": mode, "strength": strength}))
+        generation_history.append({
+            "prompt": prompt,
+            "timestamp": datetime.now().isoformat(),
+            "dimensions": f"{width}x{height}",
+            "tier": mode,
+            "image_base64": result_json["image_base64"][:100] + "..."
+        })
+        return json.dumps({
+            "success": True,
+            "image": {"id": saved["id"], "path": saved["path"], "width": saved["width"], "height": saved["height"],
+                      "status": saved["status"]},
+            "source": record["id"],
+            "steps_run": result_json.get("steps_run") or steps_run,
+            "full_render_steps": num_inference_steps,
+            "seconds": round(time.time() - start_time, 3)
+        })
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+async def create_image_package(image_data_list: Optional[List[Dict]] = None, package_name: str = "marketing_assets", source_dir: str = "") -> str:
     """
-    Create a downloadable package of generated images with metadata.
+    Create a downloadable ZIP package of generated images with a metadata manifest.
     Useful for bulk content creation and organization.
+    Each item may reference an image on disk ("path") or carry "image_base64",
+    plus "prompt" and "metadata". source_dir adds every image under a directory
+    (e.g. a bulk campaign output). Paths and source_dir must be inside the image
+    store or the bulk output directory. Returns the package file path, not the bytes.
     """
+    roots = (IMAGE_STORE_DIR, BULK_DIR)
+    entries = list(image_data_list or [])
+    if source_dir:
+        if not within_roots(source_dir, roots):
+            return json.dumps({"success": False, "error": f"source_dir must be inside {' or '.join(roots)}"})
+        if not os.path.isdir(source_dir):
+            return json.dumps({"success": False, "error": f"Directory not found: {source_dir}"})
+        entries += entries_from_directory(source_dir)
 
-    
-    package_info = {
-        "package_name": package_name,
-        "created_at": datetime.now().isoformat(),
-        "total_images": len(image_data_list),
-        "images": []
-    }
-    
-    for idx, data in enumerate(image_data_list):
-        package_info["images"].append({
-            "filename": f"{package_name}_{idx+1}.png",
-            "prompt": data.get("prompt", ""),
-            "metadata": data.get("metadata", {})
+    try:
+        # Images are streamed from disk; keep the event loop free while zipping
+        package_info = await asyncio.get_running_loop().run_in_executor(
+            None, write_package, entries, default_package_path(package_name), package_name, roots
+        )
+        return json.dumps({"success": True, **package_info})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+async def generate_bulk_image(prompt: str, num_inference_steps: int, width: int, height: int, user: str = "",
+                              campaign: str = "") -> str:
+    """Bulk jobs queue behind interactive and standard work on the GPU"""
+    return await generate_routed("bulk_generate_campaign", prompt, num_inference_steps, width, height,
+                                 priority="bulk", user=user, campaign=campaign)
+
+@mcp.tool()
+async def bulk_generate_campaign(manifest_path: str, output_dir: str = "", num_inference_steps: int = 30, concurrency: int = 4, user: str = "", campaign: str = "") -> str:
+    """
+    Generate every asset in a CSV/JSONL campaign manifest (prompt, styles, platforms, steps).
+    Jobs are deduplicated, grouped by resolution and run with bounded concurrency.
+    Images and a results.jsonl manifest are written to output_dir; re-running resumes.
+    GPU time is accounted to campaign (default: the manifest's file name) and user.
+    """
+    if not os.path.exists(manifest_path):
+        return json.dumps({"success": False, "error": f"Manifest not found: {manifest_path}"})
+
+    campaign = campaign or os.path.splitext(os.path.basename(manifest_path))[0]
+    try:
+        summary = await run_manifest(
+            manifest_path,
+            output_dir or default_output_dir(manifest_path),
+            lambda prompt, steps, width, height: generate_bulk_image(prompt, steps, width, height, user, campaign),
+            SIZE_PRESETS,
+            num_inference_steps,
+            concurrency
+        )
+        return json.dumps({"success": True, **summary})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+async def get_server_stats() -> str:
+    """Get request coalescing counters for this MCP server"""
+    return json.dumps({
+        "coalescing": generation_flight.get_stats(),
+        "modal_client": modal_client.get_stats(),
+        "routes": tool_router.to_dict(),
+        "accounting": default_ledger().get_stats(),
+        "total_generations": len(generation_history)
+    })
+
+@mcp.tool()
+async def get_usage_report(group_by: str = "campaign", since: str = "", user: str = "", campaign: str = "") -> str:
+    """
+    Report GPU-seconds, images, cache hits, Mistral tokens and estimated cost.
+    group_by: user, campaign, tool, tier, resolution or day.
+    since: an ISO date (2026-10-01), a unix timestamp, "day" or "month" (the current UTC period).
+    user / campaign: only count calls with that tag; also selects which quotas are listed.
+    Includes each matching quota with what is used, in flight and left in its period.
+    """
+    if group_by not in GROUPS:
+        return json.dumps({"success": False, "error": f"group_by must be one of {list(GROUPS)}"})
+
+    def build() -> dict:
+        ledger = default_ledger()
+        quotas = [quota for quota in ledger.quota_status()
+                  if (not user and not campaign) or (quota["kind"], quota["tenant"]) in (("user", user), ("campaign", campaign))]
+        return {**ledger.report(group_by, parse_since(since), user=user, campaign=campaign), "quotas": quotas}
+
+    try:
+        # Grouping scans the ledger; keep the event loop free
+        report = await asyncio.get_running_loop().run_in_executor(None, build)
+        return json.dumps({"success": True, **report})
+    except Exception as e:
+        return json.dumps({"success": False, "error": str(e)})
+
+@mcp.tool()
+async def get_metrics(format: str = "prometheus") -> str:
+    """
+    Get MCP server metrics: upstream (Modal, Mistral) call latency, tool latency,
+    image sizes, coalescing and client resilience counters.
+    format: "prometheus" for the text exposition format, "json" for a summary
+    """
+    if format == "json":
+        refresh_gauges()
+        return json.dumps({
+            "upstream_latency": upstream_latency.summary(),
+            "tool_latency": tool_latency.summary(),
+            "image_base64_bytes": image_bytes.summary(),
+            "prompt_tokens": prompt_tokens.summary(),
+            "coalescing": generation_flight.get_stats(),
+            "modal_client": modal_client.get_stats()
         })
-        
-    return json.dumps(package_info)
+    return metrics.render()
 
 @mcp.tool()
 async def health_check() -> str:
     """Check if the Modal API server is healthy"""
     try:
-        async with aiohttp.ClientSession() as session:
-            async with session.get(
-                f"{MODAL_API_URL}/health",
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
-                if response.status == 200:
-                    result = await response.text()
-                    return f"Modal API is healthy: {result}"
-                else:
-                    return f"Modal API returned status {response.status}"
+        session = await modal_client.session()
+        async with session.get(
+            f"{MODAL_API_URL}/health",
+            timeout=aiohttp.ClientTimeout(total=10)
+        ) as response:
+            if response.status == 200:
+                result = await response.text()
+                modal_client.breaker.record_success()
+                return f"Modal API is healthy: {result}"
+            else:
+                # Counts toward the breaker's threshold like any other failure
+                modal_client.breaker.record_failure()
+                return f"Modal API returned status {response.status}"
     except Exception as e:
+        modal_client.breaker.record_failure()
         return f"Modal API health check failed: {str(e)}"
 
 if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="MCP tool server")
+    parser.add_argument("--transport", default="stdio", choices=["stdio", "streamable-http", "sse"])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+
     print("Starting Enhanced MCP server for Content Creators & Marketers...")
     print(f"Modal API URL: {MODAL_API_URL}")
-    mcp.run(transport="stdio")
\ No newline at end of file
+    mcp.settings.host = args.host
+    mcp.settings.port = args.port
+    mcp.run(transport=args.transport)
\ No newline at end of file
@@ -0,0 +1,406 @@
+"""GPU-seconds and token accounting per request, user and campaign.
+
+Every generation and Mistral call the MCP server makes is recorded in an
+embedded SQLite database (`ACCOUNTING_DB`): the tool, the user and campaign
+tags passed to it, tier, resolution and steps, the GPU-seconds the Modal
+container reported (`generation_time`), whether it was served without a GPU
+job of its own (a coalesced duplicate), and the prompt and completion tokens of
+Mistral calls. The database runs in WAL mode, so every MCP worker process can
+write to it. Each record also adds to a per-tenant daily rollup, so a quota
+check sums at most a month of rows however long the history grows.
+
+Reports group the records by user, campaign, tool, tier, resolution or day,
+with a cost estimate from `GPU_COST_PER_HOUR` and the Mistral token prices.
+
+Quotas cap a tenant (a user or a campaign) per day, per month or in total, on
+GPU-seconds, images or Mistral tokens. `admit` runs before the upstream call.
+It estimates the call's GPU-seconds from its steps and megapixels and the
+seconds per unit measured so far, and raises `QuotaExceeded` when usage plus
+the calls in flight plus the estimate would pass a limit. Calls in flight are
+reserved per process, so with several MCP workers a quota can be overshot by
+at most the calls the other workers have in flight.
+
+    python -m src.accounting report --by campaign --since 2026-10-01
+    python -m src.accounting quota set campaign summer_launch --gpu-seconds 3600 --period month
+    python -m src.accounting quota list
+"""
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from src.scheduler import estimate_cost
+
+# A per-user data directory, not the working tree: the ledger holds live usage
+DATA_DIR = os.path.join(os.environ.get("XDG_DATA_HOME") or os.path.join(os.path.expanduser("~"), ".local", "share"),
+                        "ai-marketing-content-creator")
+ACCOUNTING_DB = os.environ.get("ACCOUNTING_DB", os.path.join(DATA_DIR, "accounting.sqlite3"))
+# On-demand H200 price on Modal, USD
+GPU_COST_PER_HOUR = float(os.environ.get("GPU_COST_PER_HOUR", "4.54"))
+MISTRAL_INPUT_COST = float(os.environ.get("MISTRAL_INPUT_COST_PER_MTOKEN", "2.0"))
+MISTRAL_OUTPUT_COST = float(os.environ.get("MISTRAL_OUTPUT_COST_PER_MTOKEN", "6.0"))
+
+# GPU-seconds per cost unit (one step at 1024x1024) until calls have been measured
+DEFAULT_SECONDS_PER_UNIT = {"full": 0.2, "preview": 0.5}
+# Measured calls averaged for the estimate, and how long the average is reused
+ESTIMATE_WINDOW = 200
+ESTIMATE_TTL_SECONDS = 60
+
+TENANT_KINDS = ("user", "campaign")
+PERIODS = ("day", "month", "total")
+LIMITS = ("gpu_seconds", "images", "mistral_tokens")
+GROUPS = {
+    "user": "user",
+    "campaign": "campaign",
+    "tool": "tool",
+    "tier": "tier",
+    "resolution": "width || 'x' || height",
+    "day": "date(ts, 'unixepoch')",
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS usage (
+    id INTEGER PRIMARY KEY,
+    ts REAL NOT NULL,
+    tool TEXT NOT NULL,
+    user TEXT NOT NULL DEFAULT '',
+    campaign TEXT NOT NULL DEFAULT '',
+    kind TEXT NOT NULL,                      -- generation or mistral
+    tier TEXT NOT NULL DEFAULT '',
+    width INTEGER NOT NULL DEFAULT 0,
+    height INTEGER NOT NULL DEFAULT 0,
+    steps INTEGER NOT NULL DEFAULT 0,
+    cost_units REAL NOT NULL DEFAULT 0,      -- steps x megapixels
+    gpu_seconds REAL NOT NULL DEFAULT 0,
+    cache TEXT NOT NULL DEFAULT '',          -- '' ran on the GPU; coalesced, server_coalesced
+    cold_start INTEGER NOT NULL DEFAULT 0,
+    prompt_tokens INTEGER NOT NULL DEFAULT 0,
+    completion_tokens INTEGER NOT NULL DEFAULT 0,
+    ok INTEGER NOT NULL DEFAULT 1
+);
+CREATE INDEX IF NOT EXISTS usage_user_ts ON usage (user, ts);
+CREATE INDEX IF NOT EXISTS usage_campaign_ts ON usage (campaign, ts);
+CREATE INDEX IF NOT EXISTS usage_ts ON usage (ts);
+CREATE TABLE IF NOT EXISTS daily (                -- per-tenant rollup read by quota checks
+    kind TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    day TEXT NOT NULL,
+    gpu_seconds REAL NOT NULL DEFAULT 0,
+    images INTEGER NOT NULL DEFAULT 0,
+    mistral_tokens INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (kind, tenant, day)
+);
+CREATE TABLE IF NOT EXISTS quotas (
+    kind TEXT NOT NULL,
+    tenant TEXT NOT NULL,
+    period TEXT NOT NULL,
+    gpu_seconds REAL,                        -- NULL: no limit
+    images INTEGER,
+    mistral_tokens INTEGER,
+    PRIMARY KEY (kind, tenant, period)
+);
+"""
+
+
+class QuotaExceeded(Exception):
+    def __init__(self, kind: str, tenant: str, limit: str, allowed: float, used: float, requested: float,
+                 period: str):
+        super().__init__(f"{kind} '{tenant}' is over its {period} {limit} quota: "
+                         f"{used:g} used or in flight + {requested:g} requested > {allowed:g}")
+        self.kind = kind
+        self.tenant = tenant
+        self.limit = limit
+        self.period = period
+
+
+def utc_day(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, tz=timezone.utc).strftime("%Y-%m-%d")
+
+
+def period_start(period: str, now: Optional[float] = None) -> float:
+    """Start of the current UTC day or month, or 0 for total"""
+    moment = datetime.fromtimestamp(time.time() if now is None else now, tz=timezone.utc)
+    if period == "day":
+        return moment.replace(hour=0, minute=0, second=0, microsecond=0).timestamp()
+    if period == "month":
+        return moment.replace(day=1, hour=0, minute=0, second=0, microsecond=0).timestamp()
+    if period == "total":
+        return 0.0
+    raise ValueError(f"Unknown quota period '{period}', expected one of {list(PERIODS)}")
+
+
+def parse_since(since: str) -> float:
+    """A unix timestamp, an ISO date, or a period name (day, month)"""
+    if not since:
+        return 0.0
+    if since in PERIODS:
+        return period_start(since)
+    try:
+        return float(since)
+    except ValueError:
+        return datetime.fromisoformat(since).replace(tzinfo=timezone.utc).timestamp()
+
+
+def cost_usd(gpu_seconds: float, prompt_tokens: int, completion_tokens: int) -> float:
+    return (gpu_seconds / 3600 * GPU_COST_PER_HOUR + prompt_tokens / 1e6 * MISTRAL_INPUT_COST
+            + completion_tokens / 1e6 * MISTRAL_OUTPUT_COST)
+
+
+class Ledger:
+    def __init__(self, path: str = ACCOUNTING_DB):
+        self.path = path
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("PRAGMA busy_timeout=5000")
+        self._db.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._reserved: Dict[Tuple[str, str], Dict[str, float]] = {}
+        self._rates: Dict[str, Tuple[float, float]] = {}
+        self.stats = {"records": 0, "admitted": 0, "rejected": 0}
+
+    def record(self, tool: str, user: str = "", campaign: str = "", kind: str = "generation", tier: str = "",
+               width: int = 0, height: int = 0, steps: int = 0, gpu_seconds: float = 0.0, cache: str = "",
+               cold_start: bool = False, prompt_tokens: int = 0, completion_tokens: int = 0, ok: bool = True):
+        units = estimate_cost(steps, width, height) if steps else 0.0
+        now = time.time()
+        image = int(kind == "generation" and ok and not cache)
+        with self._lock:
+            self._db.execute("BEGIN")
+            try:
+                self._db.execute(
+                    "INSERT INTO usage (ts, tool, user, campaign, kind, tier, width, height, steps, cost_units, "
+                    "gpu_seconds, cache, cold_start, prompt_tokens, completion_tokens, ok) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (now, tool, user, campaign, kind, tier, width, height, steps, units, gpu_seconds, cache,
+                     int(cold_start), prompt_tokens, completion_tokens, int(ok)))
+                for tenant_kind, tenant in (("user", user), ("campaign", campaign)):
+                    if tenant:
+                        self._db.execute(
+                            "INSERT INTO daily VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (kind, tenant, day) DO UPDATE "
+                            "SET gpu_seconds = gpu_seconds + excluded.gpu_seconds, images = images + excluded.images, "
+                            "mistral_tokens = mistral_tokens + excluded.mistral_tokens",
+                            (tenant_kind, tenant, utc_day(now), gpu_seconds, image, prompt_tokens + completion_tokens))
+            except Exception:
+                self._db.execute("ROLLBACK")
+                raise
+            self._db.execute("COMMIT")
+            self.stats["records"] += 1
+
+    def seconds_per_unit(self, tier: str) -> float:
+        """Mean GPU-seconds per cost unit over the tier's latest measured calls"""
+        cached = self._rates.get(tier)
+        if cached and time.time() - cached[1] < ESTIMATE_TTL_SECONDS:
+            return cached[0]
+        with self._lock:
+            seconds, units = self._db.execute(
+                "SELECT SUM(gpu_seconds), SUM(cost_units) FROM (SELECT gpu_seconds, cost_units FROM usage "
+                "WHERE kind = 'generation' AND tier = ? AND cache = '' AND ok = 1 AND gpu_seconds > 0 "
+                "ORDER BY id DESC LIMIT ?)", (tier, ESTIMATE_WINDOW)).fetchone()
+        rate = seconds / units if units else DEFAULT_SECONDS_PER_UNIT.get(tier, DEFAULT_SECONDS_PER_UNIT["full"])
+        self._rates[tier] = (rate, time.time())
+        return rate
+
+    def estimate(self, tier: str, steps: int, width: int, height: int) -> float:
+        """Expected GPU-seconds of a generation"""
+        return estimate_cost(steps, width, height) * self.seconds_per_unit(tier)
+
+    def usage(self, kind: str, tenant: str, period: str = "total", now: Optional[float] = None) -> Dict[str, float]:
+        """GPU-seconds, GPU images and Mistral tokens a tenant used in the current period"""
+        since = "" if period == "total" else utc_day(period_start(period, now))
+        with self._lock:
+            row = self._db.execute(
+                "SELECT COALESCE(SUM(gpu_seconds), 0), COALESCE(SUM(images), 0), COALESCE(SUM(mistral_tokens), 0) "
+                "FROM daily WHERE kind = ? AND tenant = ? AND day >= ?", (kind, tenant, since)).fetchone()
+        return {"gpu_seconds": row[0], "images": row[1], "mistral_tokens": row[2]}
+
+    def quotas(self, kind: str = "", tenant: str = "") -> List[dict]:
+        query, params = "SELECT * FROM quotas", []
+        if kind:
+            query, params = query + " WHERE kind = ? AND tenant = ?", [kind, tenant]
+        with self._lock:
+            return [dict(row) for row in self._db.execute(query + " ORDER BY kind, tenant, period", params)]
+
+    def set_quota(self, kind: str, tenant: str, period: str = "month", gpu_seconds: Optional[float] = None,
+                  images: Optional[int] = None, mistral_tokens: Optional[int] = None):
+        if kind not in TENANT_KINDS:
+            raise ValueError(f"Unknown tenant kind '{kind}', expected one of {list(TENANT_KINDS)}")
+        period_start(period)
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO quotas VALUES (?, ?, ?, ?, ?, ?)",
+                             (kind, tenant, period, gpu_seconds, images, mistral_tokens))
+
+    def remove_quota(self, kind: str, tenant: str, period: str = "") -> int:
+        query, params = "DELETE FROM quotas WHERE kind = ? AND tenant = ?", [kind, tenant]
+        if period:
+            query, params = query + " AND period = ?", params + [period]
+        with self._lock:
+            return self._db.execute(query, params).rowcount
+
+    def quota_status(self, kind: str = "", tenant: str = "") -> List[dict]:
+        """Each quota with what is used, in flight and left in its current period"""
+        status = []
+        for quota in self.quotas(kind, tenant):
+            used = self.usage(quota["kind"], quota["tenant"], quota["period"])
+            reserved = self._reserved.get((quota["kind"], quota["tenant"]), {})
+            limits = {limit: {"limit": quota[limit], "used": round(used[limit], 3),
+                              "in_flight": round(reserved.get(limit, 0), 3),
+                              "remaining": round(max(0.0, quota[limit] - used[limit] - reserved.get(limit, 0)), 3)}
+                      for limit in LIMITS if quota[limit] is not None}
+            status.append({"kind": quota["kind"], "tenant": quota["tenant"], "period": quota["period"], **limits})
+        return status
+
+    def admit(self, user: str = "", campaign: str = "", gpu_seconds: float = 0.0, images: int = 0,
+              mistral_tokens: int = 0) -> List[Tuple[Tuple[str, str], Dict[str, float]]]:
+        """Reserve a call's expected usage against its tenants' quotas; raises QuotaExceeded"""
+        wanted = {"gpu_seconds": gpu_seconds, "images": images, "mistral_tokens": mistral_tokens}
+        tenants = [(kind, tenant) for kind, tenant in (("user", user), ("campaign", campaign)) if tenant]
+        now = time.time()
+        for kind, tenant in tenants:
+            for quota in self.quotas(kind, tenant):
+                used = self.usage(kind, tenant, quota["period"], now)
+                reserved = self._reserved.get((kind, tenant), {})
+                for limit in LIMITS:
+                    if quota[limit] is None or not wanted[limit]:
+                        continue
+                    committed = used[limit] + reserved.get(limit, 0)
+                    if committed + wanted[limit] > quota[limit]:
+                        self.stats["rejected"] += 1
+                        raise QuotaExceeded(kind, tenant, limit, quota[limit], committed, wanted[limit],
+                                            quota["period"])
+        reservation = [(key, wanted) for key in tenants]
+        with self._lock:
+            for key, amounts in reservation:
+                reserved = self._reserved.setdefault(key, {})
+                for limit, amount in amounts.items():
+                    reserved[limit] = reserved.get(limit, 0) + amount
+        self.stats["admitted"] += 1
+        return reservation
+
+    def release(self, reservation: List[Tuple[Tuple[str, str], Dict[str, float]]]):
+        with self._lock:
+            for key, amounts in reservation:
+                reserved = self._reserved.get(key, {})
+                for limit, amount in amounts.items():
+                    reserved[limit] = reserved.get(limit, 0) - amount
+                if all(abs(amount) < 1e-9 for amount in reserved.values()):
+                    self._reserved.pop(key, None)
+
+    @contextmanager
+    def admission(self, user: str = "", campaign: str = "", gpu_seconds: float = 0.0, images: int = 0,
+                  mistral_tokens: int = 0):
+        """Hold a reservation while the call runs; the recorded usage replaces it"""
+        reservation = self.admit(user, campaign, gpu_seconds, images, mistral_tokens)
+        try:
+            yield
+        finally:
+            self.release(reservation)
+
+    def report(self, by: str = "campaign", since: float = 0.0, until: Optional[float] = None, user: str = "",
+               campaign: str = "") -> dict:
+        """Usage and estimated cost grouped by user, campaign, tool, tier, resolution or day"""
+        if by not in GROUPS:
+            raise ValueError(f"Unknown grouping '{by}', expected one of {list(GROUPS)}")
+        conditions, params = ["ts >= ?"], [since]
+        if until is not None:
+            conditions.append("ts < ?")
+            params.append(until)
+        for column, value in (("user", user), ("campaign", campaign)):
+            if value:
+                conditions.append(f"{column} = ?")
+                params.append(value)
+        with self._lock:
+            rows = self._db.execute(
+                f"SELECT {GROUPS[by]} AS key, COUNT(*) AS requests, "
+                f"SUM(kind = 'generation' AND ok = 1) AS images, "
+                f"SUM(kind = 'generation' AND ok = 1 AND cache = '') AS gpu_images, "
+                f"SUM(kind = 'generation' AND ok = 1 AND cache != '') AS cache_hits, "
+                f"SUM(gpu_seconds) AS gpu_seconds, SUM(cost_units) AS cost_units, SUM(cold_start) AS cold_starts, "
+                f"SUM(prompt_tokens) AS prompt_tokens, SUM(completion_tokens) AS completion_tokens, "
+                f"SUM(ok = 0) AS errors FROM usage WHERE {' AND '.join(conditions)} "
+                f"GROUP BY key ORDER BY SUM(gpu_seconds) DESC", params).fetchall()
+        groups = []
+        for row in rows:
+            entry = dict(row)
+            entry["gpu_seconds"] = round(entry["gpu_seconds"], 3)
+            entry["cost_units"] = round(entry["cost_units"], 2)
+            entry["cache_hit_rate"] = round(entry["cache_hits"] / entry["images"], 4) if entry["images"] else 0.0
+            entry["cost_usd"] = round(cost_usd(entry["gpu_seconds"], entry["prompt_tokens"],
+                                               entry["completion_tokens"]), 4)
+            groups.append({by: entry.pop("key"), **entry})
+        totals = {key: sum(group[key] for group in groups)
+                  for key in ("requests", "images", "gpu_images", "cache_hits", "gpu_seconds", "prompt_tokens",
+                              "completion_tokens", "errors", "cost_usd")}
+        totals["gpu_seconds"] = round(totals["gpu_seconds"], 3)
+        totals["cost_usd"] = round(totals["cost_usd"], 4)
+        return {"by": by, "since": since, "groups": groups, "totals": totals,
+                "prices": {"gpu_per_hour": GPU_COST_PER_HOUR, "mistral_input_per_mtoken": MISTRAL_INPUT_COST,
+                           "mistral_output_per_mtoken": MISTRAL_OUTPUT_COST}}
+
+    def get_stats(self) -> dict:
+        return {"db": self.path, **self.stats,
+                "in_flight": {f"{kind}:{tenant}": amounts for (kind, tenant), amounts in self._reserved.items()}}
+
+
+_default_ledger: Optional[Ledger] = None
+
+
+def default_ledger() -> Ledger:
+    """Ledger at ACCOUNTING_DB, opened on first use"""
+    global _default_ledger
+    if _default_ledger is None:
+        _default_ledger = Ledger()
+    return _default_ledger
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GPU-seconds and token accounting")
+    parser.add_argument("--db", default=ACCOUNTING_DB)
+    commands = parser.add_subparsers(dest="command", required=True)
+    report_parser = commands.add_parser("report", help="Usage and cost per group")
+    report_parser.add_argument("--by", default="campaign", choices=list(GROUPS))
+    report_parser.add_argument("--since", default="", help="ISO date, unix time, 'day' or 'month'")
+    report_parser.add_argument("--user", default="")
+    report_parser.add_argument("--campaign", default="")
+    report_parser.add_argument("--json", action="store_true")
+    quota_parser = commands.add_parser("quota", help="Manage per-tenant quotas")
+    quota_parser.add_argument("action", choices=["set", "remove", "list"])
+    quota_parser.add_argument("kind", nargs="?", choices=list(TENANT_KINDS))
+    quota_parser.add_argument("tenant", nargs="?")
+    quota_parser.add_argument("--period", default="month", choices=list(PERIODS))
+    quota_parser.add_argument("--gpu-seconds", type=float, default=None)
+    quota_parser.add_argument("--images", type=int, default=None)
+    quota_parser.add_argument("--mistral-tokens", type=int, default=None)
+    args = parser.parse_args()
+
+    ledger = Ledger(args.db)
+    if args.command == "report":
+        summary = ledger.report(args.by, parse_since(args.since), user=args.user, campaign=args.campaign)
+        if args.json:
+            print(json.dumps(summary, indent=2))
+        else:
+            rows = summary["groups"] + [{args.by: "total", **summary["totals"]}]
+            width = max(len(str(group[args.by] or "-")) for group in rows + [{args.by: args.by}])
+            print(f"{args.by:<{width}} {'images':>7} {'cached':>7} {'GPU s':>10} {'tokens':>9} {'USD':>9}")
+            for group in rows:
+                print(f"{str(group[args.by] or '-'):<{width}} {group['images']:>7} {group['cache_hits']:>7} "
+                      f"{group['gpu_seconds']:>10.1f} {group['prompt_tokens'] + group['completion_tokens']:>9} "
+                      f"{group['cost_usd']:>9.2f}")
+    elif args.action == "list":
+        print(json.dumps(ledger.quota_status(), indent=2))
+    else:
+        if not (args.kind and args.tenant):
+            quota_parser.error(f"'{args.action}' needs a kind (user or campaign) and a tenant")
+        if args.action == "set":
+            ledger.set_quota(args.kind, args.tenant, args.period, args.gpu_seconds, args.images, args.mistral_tokens)
+            print(json.dumps(ledger.quota_status(args.kind, args.tenant), indent=2))
+        else:
+            print(f"🗑️  Removed {ledger.remove_quota(args.kind, args.tenant, args.period)} quota(s)")
@@ -0,0 +1,513 @@
+"""FastAPI front end of the Flux server, independent of where the model runs.
+
+Coalescing, priority scheduling with preemption, prewarming, metrics and the
+/generate, /img2img, /inpaint and /variations endpoints. The model calls go to
+an engine client bound with `serve()`, which has coroutines taking
+`FluxEngine`'s arguments:
+
+    inference, preview, edit, variations    run on the model
+    set_warm(count), warmup(count)          warm pool backend (see src/prewarm.py)
+    queue_stats() -> (backlog, runners)     for /metrics
+    publish_traffic(batch), prewarm_status()
+                                            optional: the warm pool controller runs elsewhere
+
+plus `request_preemption(key)`, which asks the running job with that key to stop,
+and `clear_preemption(key)`, which drops that request once the job is done.
+`src/model_server.py` binds a client for the Modal GPU classes and
+`src/serve.py` one that runs a `FluxEngine` in-process.
+"""
+import asyncio
+import os
+import time
+import uuid
+from io import BytesIO
+from typing import Optional
+
+from fastapi import FastAPI, HTTPException, Header
+from fastapi.responses import Response
+from PIL import Image
+from pydantic import BaseModel
+
+from src.singleflight import IdempotentResponses, SingleFlight, normalize_generation_key
+from src.prewarm import PREWARM_INTERVAL_SECONDS, TrafficRecorder, controller_from_env
+from src.metrics import MetricsRegistry, RateWindow, FAST_BUCKETS, CONTENT_TYPE
+from src.scheduler import PriorityScheduler, Preempted, PRIORITY_CLASSES, estimate_cost
+from src.memory import GB, MemoryBusy
+from src.routing import TIERS
+from src.editing import edit_steps, decode_image
+
+MINUTES = 60  # seconds
+
+# Most variations one /variations call branches from a shared trajectory
+MAX_VARIATIONS = 8
+
+# A job the engine turns away for lack of free GPU memory is retried for this
+# long (without holding the GPU worker), then fails with 503
+MEMORY_QUEUE_SECONDS = float(os.environ.get("MEMORY_QUEUE_SECONDS", "30"))
+MEMORY_RETRY_SECONDS = float(os.environ.get("MEMORY_RETRY_SECONDS", "1"))
+
+class ImageRequest(BaseModel):
+    prompt: str  # full prompt, encoded by T5
+    num_inference_steps: int = 50
+    width: int = 1024  # Add width parameter
+    height: int = 1024  # Add height parameter
+    clip_prompt: Optional[str] = None  # compacted to CLIP's 77 tokens; defaults to prompt
+    priority: str = "standard"  # interactive, standard or bulk
+    tier: str = "full"  # full (FLUX.1-dev) or preview (FLUX.1-schnell)
+
+class ImageResponse(BaseModel):
+    image_base64: str
+    generation_time: float
+    cold_start: bool = False
+    spans: list = []  # stage timings for latency tracing
+    gpu_memory: dict = {}
+    prompt_tokens: dict = {}
+    memory_plan: dict = {}
+    coalesced: bool = False  # shared another request's GPU job; accounted there
+    steps_run: int = 0  # denoising steps an edit actually ran (about strength x steps)
+
+class EditRequest(BaseModel):
+    image_base64: str  # prior output to start from
+    prompt: str
+    strength: float = 0.35  # share of the schedule re-run: 0 keeps the source, 1 is a fresh render
+    num_inference_steps: int = 50  # full schedule; only strength x steps of it run
+    mask_base64: Optional[str] = None  # inpaint: white is repainted
+    clip_prompt: Optional[str] = None
+    priority: str = "interactive"
+
+class VariationsRequest(BaseModel):
+    prompt: str  # base prompt the shared steps are conditioned on
+    variation_prompts: list  # one full prompt per variation (base prompt + tested variable)
+    shared_steps: int = 20  # steps run once on the base prompt before branching
+    num_inference_steps: int = 50
+    width: int = 1024
+    height: int = 1024
+    clip_prompt: Optional[str] = None
+    variation_clip_prompts: list = []  # per variation; defaults to the variation prompts
+    priority: str = "standard"
+
+class VariationsResponse(BaseModel):
+    images: list  # {"image_base64", "prompt"} per variation, in request order
+    generation_time: float
+    cold_start: bool = False
+    spans: list = []
+    gpu_memory: dict = {}
+    memory_plan: dict = {}
+    shared_steps: int = 0
+    steps_run: int = 0  # shared steps + the branch steps of every variation
+    coalesced: bool = False
+
+class CampaignRequest(BaseModel):
+    name: str
+    start_time: float  # unix timestamp
+    duration_minutes: float = 60
+    containers: int = 1
+
+
+fastapi_app = FastAPI(title="Flux Image Generation API")
+
+# Engine client the endpoints run on, bound by serve()
+engine = None
+
+# Concurrent identical requests share one GPU job
+generate_flight = SingleFlight("fastapi_generate")
+
+# Retries and hedges of one client call (same Idempotency-Key) get one response,
+# even when the first attempt finished after the client gave up on it
+idempotent_responses = IdempotentResponses(
+    ttl_seconds=float(os.environ.get("IDEMPOTENCY_TTL_SECONDS", "300"))
+)
+
+# Prometheus metrics served on /metrics
+metrics = MetricsRegistry()
+requests_total = metrics.counter("flux_requests_total", "Generation requests by endpoint and outcome", ["endpoint", "status"])
+request_latency = metrics.histogram("flux_request_latency_seconds", "End-to-end /generate latency", ["resolution", "steps"])
+denoise_seconds = metrics.histogram("flux_denoise_seconds", "Time spent in the denoising loop", ["resolution", "steps"])
+gpu_queue_seconds = metrics.histogram("flux_gpu_queue_seconds", "Time between the API receiving a request and inference starting")
+encode_seconds = metrics.histogram("flux_encode_seconds", "PNG + base64 encode time", buckets=FAST_BUCKETS)
+inflight_requests = metrics.gauge("flux_inflight_requests", "Requests currently being served by the API")
+queue_depth = metrics.gauge("flux_gpu_queue_depth", "Inference inputs waiting for a GPU container")
+gpu_containers = metrics.gauge("flux_gpu_containers", "Running GPU containers")
+gpu_memory_bytes = metrics.gauge("flux_gpu_memory_bytes", "GPU memory reported by the latest inference", ["kind"])
+images_total = metrics.counter("flux_images_generated_total", "Images generated")
+images_per_second = metrics.gauge("flux_images_per_second", "Images generated per second over the last minute")
+cold_starts_total = metrics.counter("flux_cold_starts_total", "Requests served by a freshly started container")
+cache_requests = metrics.counter("flux_cache_requests_total", "Cache lookups by cache and result", ["cache", "result"])
+cache_hit_ratio = metrics.gauge("flux_cache_hit_ratio", "Fraction of lookups served from cache", ["cache"])
+prompt_tokens_hist = metrics.histogram("flux_prompt_tokens", "Prompt length per text encoder", ["encoder"],
+                                       buckets=(32, 64, 77, 128, 256, 384, 512, 768))
+scheduler_waiting = metrics.gauge("flux_scheduler_waiting", "Requests waiting for a GPU slot", ["priority"])
+scheduler_preemptions = metrics.gauge("flux_scheduler_preemptions", "Running jobs preempted so far")
+peak_memory_bytes = metrics.histogram("flux_gpu_peak_memory_bytes", "Peak GPU memory per request", ["resolution"],
+                                      buckets=tuple(gb * GB for gb in (24, 32, 40, 48, 64, 80, 96, 120, 141)))
+memory_plans_total = metrics.counter("flux_memory_plans_total", "Pre-flight memory decisions", ["action"])
+image_rate = RateWindow(60)
+
+def refresh_gauges():
+    images_per_second.set(image_rate.rate())
+    for cache in {key[0] for key in list(cache_requests.values)}:
+        hits = cache_requests.get(cache=cache, result="hit")
+        total = hits + cache_requests.get(cache=cache, result="miss")
+        cache_hit_ratio.set(hits / total if total else 0.0, cache=cache)
+    for priority in PRIORITY_CLASSES:
+        scheduler_waiting.set(sum(1 for job in scheduler.waiting if job.priority == priority), priority=priority)
+    scheduler_preemptions.set(scheduler.stats["preemptions"])
+
+metrics.add_collector(refresh_gauges)
+
+def record_inference_metrics(result: dict, resolution: str, steps: str):
+    """Update metrics from the stage timings and GPU stats returned by Model.inference"""
+    images_total.inc()
+    image_rate.add()
+    if result.get("cold_start"):
+        cold_starts_total.inc()
+    tokens = result.get("prompt_tokens", {})
+    if tokens:
+        prompt_tokens_hist.observe(tokens["t5_tokens"], encoder="t5")
+        prompt_tokens_hist.observe(tokens["clip_tokens"], encoder="clip")
+    for kind, value in result.get("gpu_memory", {}).items():
+        gpu_memory_bytes.set(value, kind=kind.replace("_bytes", ""))
+    if "peak_bytes" in result.get("gpu_memory", {}):
+        peak_memory_bytes.observe(result["gpu_memory"]["peak_bytes"], resolution=resolution)
+    if result.get("memory_plan"):
+        memory_plans_total.inc(action=result["memory_plan"]["action"])
+    for span in result.get("spans", []):
+        duration = span["end"] - span["start"]
+        if span["name"] == "modal.denoise":
+            denoise_seconds.observe(duration, resolution=resolution, steps=steps)
+        elif span["name"] == "modal.encode":
+            encode_seconds.observe(duration)
+        elif span["name"] == "modal.gpu_queue":
+            gpu_queue_seconds.observe(duration)
+
+
+# Exactly one controller owns the warm pool. In-process engines run it here,
+# with the engine client as its backend; a client that can publish traffic
+# (Modal, where this app scales to several replicas) gets a recorder instead
+# and the controller runs once, next to the engine. Bound by serve().
+prewarm = controller_from_env(None)
+
+# Orders work in front of the GPU: interactive before standard before bulk,
+# cheapest first within a class. SCHEDULER_SLOTS should match the GPU
+# containers the Model class may scale to.
+SCHEDULER_ID = uuid.uuid4().hex[:12]
+
+def preempt_key(job) -> str:
+    return f"{SCHEDULER_ID}:{job.job_id}"
+
+def request_preemption(job):
+    engine.request_preemption(preempt_key(job))
+
+scheduler = PriorityScheduler(
+    slots=int(os.environ.get("SCHEDULER_SLOTS", "4")),
+    aging_seconds=float(os.environ.get("SCHEDULER_AGING_SECONDS", "300")),
+    preemption=os.environ.get("SCHEDULER_PREEMPTION", "0") == "1",
+    on_preempt=request_preemption,
+)
+
+async def when_memory_frees(call):
+    """Run a GPU call, retrying while the engine reports its free memory short (MemoryBusy)"""
+    deadline = time.time() + MEMORY_QUEUE_SECONDS
+    while True:
+        try:
+            return await call()
+        except MemoryBusy as e:
+            if time.time() >= deadline:
+                raise
+            print(f"{str(e)}, retrying in {MEMORY_RETRY_SECONDS:g}s")
+            await asyncio.sleep(MEMORY_RETRY_SECONDS)
+
+async def run_on_gpu(job, request: ImageRequest, traceparent: str, start_time: float):
+    """Scheduler runner: one inference call, possibly resuming a preempted job"""
+    state = job.resume_state or {}
+    result = await when_memory_frees(lambda: engine.inference(
+        request.prompt,
+        request.num_inference_steps,
+        request.width,
+        request.height,
+        traceparent,
+        start_time,
+        request.clip_prompt or "",
+        preempt_key(job) if job.preemptible and scheduler.preemption else "",
+        state.get("latents", b""),
+        state.get("step", 0),
+        state.get("render_size")
+    ))
+    if job.preempt_requested and not result.get("preempted"):
+        # Asked to stop after its last check: the engine has already cleared
+        # the flag, but the request may have landed since
+        await engine.clear_preemption(preempt_key(job))
+    if result.get("preempted"):
+        remaining = request.num_inference_steps - result["step"]
+        return Preempted(result, estimate_cost(remaining, request.width, request.height))
+    return result
+
+async def publish_traffic():
+    batch = prewarm.drain()
+    if batch:
+        await engine.publish_traffic(batch)
+
+async def prewarm_loop():
+    while True:
+        try:
+            if isinstance(prewarm, TrafficRecorder):
+                await publish_traffic()
+            else:
+                await prewarm.tick()
+        except Exception as e:
+            print(f"Prewarm tick failed: {str(e)}")
+        await asyncio.sleep(PREWARM_INTERVAL_SECONDS)
+
+@fastapi_app.on_event("startup")
+async def start_prewarm():
+    fastapi_app.state.prewarm_task = asyncio.create_task(prewarm_loop())
+
+async def idempotent(idempotency_key: Optional[str], handler):
+    """Run `handler()` once per Idempotency-Key (every call when there is none)"""
+    if not idempotency_key:
+        return await handler()
+    cache_requests.inc(cache="idempotency", result="hit" if idempotent_responses.seen(idempotency_key) else "miss")
+    return await idempotent_responses.do(idempotency_key, handler)
+
+@fastapi_app.post("/generate", response_model=ImageResponse)
+async def generate_image(request: ImageRequest, traceparent: Optional[str] = Header(default=None),
+                         idempotency_key: Optional[str] = Header(default=None)):
+    return await idempotent(idempotency_key, lambda: render_image(request, traceparent))
+
+async def render_image(request: ImageRequest, traceparent: Optional[str]) -> ImageResponse:
+    inflight_requests.inc()
+    try:
+        print(f"Received request: {request.prompt} at {request.width}x{request.height} ({request.priority})")
+        if request.priority not in PRIORITY_CLASSES:
+            raise HTTPException(status_code=422, detail=f"priority must be one of {list(PRIORITY_CLASSES)}")
+        if request.tier not in TIERS:
+            raise HTTPException(status_code=422, detail=f"tier must be one of {list(TIERS)}")
+        prewarm.record_request()
+        start_time = time.time()
+        # Full renders only share a job within a priority class: an interactive
+        # request must not inherit a bulk job's queue position and preemptibility
+        key = normalize_generation_key(
+            request.prompt, request.num_inference_steps, request.width, request.height, request.clip_prompt or "",
+            request.tier, request.priority if request.tier == "full" else ""
+        )
+        resolution = f"{request.width}x{request.height}"
+        steps = str(request.num_inference_steps)
+        coalesced = generate_flight.is_in_flight(key)
+        cache_requests.inc(cache="coalesce", result="hit" if coalesced else "miss")
+        # Use the async variant so the event loop keeps serving (and
+        # coalescing) other requests while this one is on the GPU
+        if request.tier == "preview":
+            # Previews run on their own GPU pool and never queue behind full renders
+            run = lambda: engine.preview(
+                request.prompt,
+                request.num_inference_steps,
+                request.width,
+                request.height,
+                traceparent or "",
+                start_time,
+                request.clip_prompt or ""
+            )
+        else:
+            run = lambda: scheduler.submit(
+                lambda job: run_on_gpu(job, request, traceparent or "", start_time),
+                request.priority,
+                estimate_cost(request.num_inference_steps, request.width, request.height),
+                preemptible=request.priority != "interactive"
+            )
+        result = await generate_flight.do(key, run)
+        if request.tier == "full":
+            prewarm.record_latency(time.time() - start_time, result.get("cold_start", False))
+        spans = result.get("spans", []) + [
+            {"name": "fastapi.generate", "start": start_time, "end": time.time()}
+        ]
+        requests_total.inc(endpoint="generate", status="ok")
+        request_latency.observe(time.time() - start_time, resolution=resolution, steps=steps)
+        if not coalesced:
+            record_inference_metrics(result, resolution, steps)
+        return ImageResponse(**{**result, "spans": spans, "coalesced": coalesced})
+    except HTTPException:
+        requests_total.inc(endpoint="generate", status="error")
+        raise
+    except Exception as e:
+        print(f"Error generating image: {str(e)}")
+        requests_total.inc(endpoint="generate", status="error")
+        raise HTTPException(status_code=503 if isinstance(e, MemoryBusy) else 500, detail=str(e))
+    finally:
+        inflight_requests.dec()
+
+async def edit_image(mode: str, request: EditRequest, traceparent: Optional[str]) -> ImageResponse:
+    """Shared body of /img2img and /inpaint: a short, non-preemptible job on the full model"""
+    inflight_requests.inc()
+    try:
+        if request.priority not in PRIORITY_CLASSES:
+            raise HTTPException(status_code=422, detail=f"priority must be one of {list(PRIORITY_CLASSES)}")
+        if not 0 < request.strength <= 1:
+            raise HTTPException(status_code=422, detail="strength must be in (0, 1]")
+        if mode == "inpaint" and not request.mask_base64:
+            raise HTTPException(status_code=422, detail="inpaint needs mask_base64")
+        try:
+            image_bytes = decode_image(request.image_base64)
+            mask_bytes = decode_image(request.mask_base64) if request.mask_base64 else b""
+            width, height = Image.open(BytesIO(image_bytes)).size
+        except Exception as e:
+            raise HTTPException(status_code=422, detail=f"Could not read image: {str(e)}")
+        steps_run = edit_steps(request.num_inference_steps, request.strength)
+        print(f"Received {mode} request: {request.prompt} at {width}x{height}, {steps_run} steps ({request.priority})")
+        prewarm.record_request()
+        start_time = time.time()
+        key = normalize_generation_key(
+            request.prompt, request.num_inference_steps, width, height, request.clip_prompt or "", mode,
+            round(request.strength, 4), hash(image_bytes), hash(mask_bytes), request.priority
+        )
+        resolution = f"{width}x{height}"
+        coalesced = generate_flight.is_in_flight(key)
+        cache_requests.inc(cache="coalesce", result="hit" if coalesced else "miss")
+        run = lambda: scheduler.submit(
+            lambda job: when_memory_frees(lambda: engine.edit(
+                mode, request.prompt, image_bytes, request.strength, request.num_inference_steps, mask_bytes,
+                traceparent or "", start_time, request.clip_prompt or ""
+            )),
+            request.priority,
+            estimate_cost(steps_run, width, height)
+        )
+        result = await generate_flight.do(key, run)
+        spans = result.get("spans", []) + [{"name": f"fastapi.{mode}", "start": start_time, "end": time.time()}]
+        requests_total.inc(endpoint=mode, status="ok")
+        request_latency.observe(time.time() - start_time, resolution=resolution, steps=str(steps_run))
+        if not coalesced:
+            record_inference_metrics(result, resolution, str(steps_run))
+        return ImageResponse(**{**result, "spans": spans, "coalesced": coalesced})
+    except HTTPException:
+        requests_total.inc(endpoint=mode, status="error")
+        raise
+    except Exception as e:
+        print(f"Error in {mode}: {str(e)}")
+        requests_total.inc(endpoint=mode, status="error")
+        raise HTTPException(status_code=503 if isinstance(e, MemoryBusy) else 500, detail=str(e))
+    finally:
+        inflight_requests.dec()
+
+@fastapi_app.post("/img2img", response_model=ImageResponse)
+async def img2img(request: EditRequest, traceparent: Optional[str] = Header(default=None),
+                  idempotency_key: Optional[str] = Header(default=None)):
+    """Repaint a prior output from partly noised latents"""
+    return await idempotent(idempotency_key, lambda: edit_image("img2img", request, traceparent))
+
+@fastapi_app.post("/inpaint", response_model=ImageResponse)
+async def inpaint(request: EditRequest, traceparent: Optional[str] = Header(default=None),
+                  idempotency_key: Optional[str] = Header(default=None)):
+    """Repaint the white area of mask_base64 in a prior output"""
+    return await idempotent(idempotency_key, lambda: edit_image("inpaint", request, traceparent))
+
+@fastapi_app.post("/variations", response_model=VariationsResponse)
+async def generate_variations(request: VariationsRequest, traceparent: Optional[str] = Header(default=None),
+                              idempotency_key: Optional[str] = Header(default=None)):
+    """A/B variations branched from one shared trajectory (see FluxEngine.variations)"""
+    return await idempotent(idempotency_key, lambda: render_variations(request, traceparent))
+
+async def render_variations(request: VariationsRequest, traceparent: Optional[str]) -> VariationsResponse:
+    inflight_requests.inc()
+    try:
+        if request.priority not in PRIORITY_CLASSES:
+            raise HTTPException(status_code=422, detail=f"priority must be one of {list(PRIORITY_CLASSES)}")
+        if not 1 <= len(request.variation_prompts) <= MAX_VARIATIONS:
+            raise HTTPException(status_code=422, detail=f"Give 1 to {MAX_VARIATIONS} variation prompts")
+        if not 0 < request.shared_steps < request.num_inference_steps:
+            raise HTTPException(status_code=422, detail="shared_steps must be between 1 and num_inference_steps - 1")
+        count = len(request.variation_prompts)
+        steps_run = request.shared_steps + count * (request.num_inference_steps - request.shared_steps)
+        print(f"Received variations request: {count} x {request.prompt} at {request.width}x{request.height}, "
+              f"{request.shared_steps} shared steps ({request.priority})")
+        prewarm.record_request()
+        start_time = time.time()
+        key = normalize_generation_key(
+            request.prompt, request.num_inference_steps, request.width, request.height, request.clip_prompt or "",
+            "variations", request.shared_steps, tuple(request.variation_prompts), tuple(request.variation_clip_prompts),
+            request.priority
+        )
+        resolution = f"{request.width}x{request.height}"
+        coalesced = generate_flight.is_in_flight(key)
+        cache_requests.inc(cache="coalesce", result="hit" if coalesced else "miss")
+        run = lambda: scheduler.submit(
+            lambda job: when_memory_frees(lambda: engine.variations(
+                request.prompt, request.variation_prompts, request.shared_steps, request.num_inference_steps,
+                request.width, request.height, traceparent or "", start_time, request.clip_prompt or "",
+                request.variation_clip_prompts
+            )),
+            request.priority,
+            estimate_cost(steps_run, request.width, request.height)
+        )
+        result = await generate_flight.do(key, run)
+        spans = result.get("spans", []) + [{"name": "fastapi.variations", "start": start_time, "end": time.time()}]
+        requests_total.inc(endpoint="variations", status="ok")
+        request_latency.observe(time.time() - start_time, resolution=resolution, steps=str(request.num_inference_steps))
+        if not coalesced:
+            # record_inference_metrics counts one image
+            images_total.inc(count - 1)
+            image_rate.add(count - 1)
+            record_inference_metrics(result, resolution, str(request.num_inference_steps))
+        return VariationsResponse(**{**result, "spans": spans, "coalesced": coalesced})
+    except HTTPException:
+        requests_total.inc(endpoint="variations", status="error")
+        raise
+    except Exception as e:
+        print(f"Error generating variations: {str(e)}")
+        requests_total.inc(endpoint="variations", status="error")
+        raise HTTPException(status_code=503 if isinstance(e, MemoryBusy) else 500, detail=str(e))
+    finally:
+        inflight_requests.dec()
+
+@fastapi_app.get("/health")
+async def health_check():
+    return {
+        "status": "healthy",
+        "message": "Flux API server is running",
+        "coalescing": generate_flight.get_stats(),
+        "idempotency": idempotent_responses.get_stats(),
+        "scheduler": scheduler.get_stats(),
+        "in_flight": int(inflight_requests.get()),
+        "images_per_second": round(image_rate.rate(), 4)
+    }
+
+@fastapi_app.get("/metrics")
+async def metrics_endpoint():
+    """Prometheus text exposition of request, latency, GPU and cache metrics"""
+    try:
+        # Backlog and runner counts come from the engine (Modal's scheduler on Modal)
+        backlog, runners = await engine.queue_stats()
+        queue_depth.set(backlog)
+        gpu_containers.set(runners)
+    except Exception as e:
+        print(f"Could not read engine queue stats: {str(e)}")
+    return Response(content=metrics.render(), media_type=CONTENT_TYPE)
+
+@fastapi_app.get("/prewarm")
+async def prewarm_status():
+    """Warm pool size, request rate, scheduled campaigns and cold/warm latency split"""
+    if isinstance(prewarm, TrafficRecorder):
+        return await engine.prewarm_status()
+    return prewarm.get_status()
+
+@fastapi_app.post("/prewarm/campaigns")
+async def schedule_campaign(request: CampaignRequest):
+    campaign = prewarm.schedule_campaign(
+        request.name,
+        request.start_time,
+        request.duration_minutes * MINUTES,
+        request.containers
+    )
+    if isinstance(prewarm, TrafficRecorder):
+        await publish_traffic()
+    else:
+        await prewarm.tick()
+    return campaign.to_dict()
+
+
+def serve(client, slots: Optional[int] = None) -> FastAPI:
+    """Bind the endpoints to an engine client; `slots` overrides SCHEDULER_SLOTS"""
+    global engine, prewarm
+    engine = client
+    prewarm = TrafficRecorder() if hasattr(client, "publish_traffic") else controller_from_env(client)
+    if slots is not None:
+        scheduler.slots = slots
+    return fastapi_app
@@ -0,0 +1,301 @@
+"""Headless bulk generation from a campaign manifest.
+
+A manifest is a CSV or JSONL file with one row per brief. Columns:
+
+    prompt      required
+    styles      optional, "|"-separated style names ("none" = no modifier)
+    platforms   optional, "|"-separated platform presets or WxH sizes
+    steps       optional, overrides the run default; "auto" picks them per size and platform
+    id          optional, carried through to the results
+
+Every row expands to prompts x styles x platforms. Jobs are deduplicated on
+the final prompt, steps and size, grouped into resolution buckets and run
+with bounded concurrency. Each finished job is appended to `results.jsonl` in
+the output directory; that file doubles as the checkpoint, so re-running the
+same command skips jobs that already have an image on disk.
+
+    python -m src.bulk campaign.csv --out AI-Marketing-Content-Creator/bulk/launch --concurrency 4
+"""
+import argparse
+import asyncio
+import base64
+import csv
+import hashlib
+import json
+import os
+import time
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+from src.prompts import PromptCompiler, prompt_compiler
+from src.singleflight import normalize_generation_key
+from src.steps import AUTO_STEPS, step_planner
+
+DEFAULT_SIZE = (1024, 1024)
+RESULTS_FILE = "results.jsonl"
+BULK_DIR = os.environ.get("BULK_OUTPUT_DIR", os.path.join("AI-Marketing-Content-Creator", "bulk"))
+SUMMARY_FILE = "manifest.json"
+
+
+class ManifestError(ValueError):
+    pass
+
+
+class BulkJob:
+    def __init__(self, prompt: str, base_prompt: str, style: str, platform: str, width: int, height: int,
+                 steps: int, row: int, source_id: str = ""):
+        self.prompt = prompt
+        self.base_prompt = base_prompt
+        self.style = style
+        self.platform = platform
+        self.width = width
+        self.height = height
+        self.steps = steps
+        self.row = row
+        self.source_id = source_id
+        key = normalize_generation_key(prompt, steps, width, height)
+        self.job_id = hashlib.sha1(json.dumps(key).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def bucket(self) -> str:
+        return f"{self.width}x{self.height}"
+
+    def to_record(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "row": self.row,
+            "id": self.source_id,
+            "base_prompt": self.base_prompt,
+            "style": self.style,
+            "platform": self.platform,
+            "width": self.width,
+            "height": self.height,
+            "steps": self.steps,
+            "prompt": self.prompt,
+        }
+
+
+def _split(value) -> List[str]:
+    if value is None:
+        return []
+    if isinstance(value, list):
+        return [str(v).strip() for v in value if str(v).strip()]
+    return [part.strip() for part in str(value).split("|") if part.strip()]
+
+
+def read_manifest(path: str) -> List[dict]:
+    """Rows of a .csv or .jsonl manifest as dicts"""
+    with open(path, encoding="utf-8", newline="") as f:
+        if path.lower().endswith((".jsonl", ".ndjson")):
+            return [json.loads(line) for line in f if line.strip()]
+        return list(csv.DictReader(f))
+
+
+def resolve_size(platform: str, size_presets: Dict[str, Tuple[int, int]]) -> Tuple[int, int]:
+    if platform in size_presets:
+        return size_presets[platform]
+    if "x" in platform:
+        width, _, height = platform.partition("x")
+        if width.isdigit() and height.isdigit():
+            return int(width), int(height)
+    raise ManifestError(f"Unknown platform '{platform}', expected one of {sorted(size_presets)} or WxH")
+
+
+def expand_jobs(rows: List[dict], size_presets: Dict[str, Tuple[int, int]], default_steps: int,
+                compiler: PromptCompiler = prompt_compiler) -> Tuple[List[BulkJob], int]:
+    """Expand manifest rows into unique jobs; returns (jobs, duplicates_removed)"""
+    jobs: Dict[str, BulkJob] = {}
+    expanded = 0
+    for row_number, row in enumerate(rows, start=1):
+        base_prompt = (row.get("prompt") or "").strip()
+        if not base_prompt:
+            raise ManifestError(f"Row {row_number} has no prompt")
+        steps = row.get("steps") or default_steps
+        steps = AUTO_STEPS if str(steps).strip().lower() == "auto" else int(steps)
+        styles = _split(row.get("styles", row.get("style"))) or ["none"]
+        platforms = _split(row.get("platforms", row.get("platform"))) or [""]
+        for style in styles:
+            if style != "none" and style not in compiler.styles:
+                raise ManifestError(f"Row {row_number}: unknown style '{style}', expected one of {sorted(compiler.styles)}")
+            for platform in platforms:
+                width, height = resolve_size(platform, size_presets) if platform else DEFAULT_SIZE
+                extra = [f"optimized for {platform.replace('_', ' ')}"] if platform in size_presets else []
+                platform_prompt = compiler.compile(base_prompt, style, extra=extra).text
+                job_steps = steps if steps > AUTO_STEPS else step_planner.choose(width, height, platform)
+                job = BulkJob(platform_prompt, base_prompt, style, platform or "default", width, height,
+                              job_steps, row_number, str(row.get("id") or ""))
+                expanded += 1
+                jobs.setdefault(job.job_id, job)
+    return list(jobs.values()), expanded - len(jobs)
+
+
+def bucket_jobs(jobs: List[BulkJob]) -> List[BulkJob]:
+    """Order jobs so each resolution bucket runs back to back, biggest bucket first"""
+    buckets: Dict[str, List[BulkJob]] = {}
+    for job in jobs:
+        buckets.setdefault(job.bucket, []).append(job)
+    ordered = sorted(buckets.values(), key=lambda bucket: -len(bucket))
+    return [job for bucket in ordered for job in bucket]
+
+
+def load_checkpoint(output_dir: str) -> Dict[str, dict]:
+    """Last result per job from a previous run, keeping only images still on disk"""
+    path = os.path.join(output_dir, RESULTS_FILE)
+    done = {}
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                # A crash can leave a torn last line
+                continue
+            done[record["job_id"]] = record
+    return {
+        job_id: record for job_id, record in done.items()
+        if record.get("status") == "ok" and os.path.exists(os.path.join(output_dir, record["file"]))
+    }
+
+
+class BulkRunner:
+    """Runs jobs through `generate(prompt, steps, width, height) -> base64 PNG`"""
+
+    def __init__(self, generate: Callable[[str, int, int, int], Awaitable[str]], output_dir: str,
+                 concurrency: int = 4, progress: Optional[Callable[[dict], None]] = None):
+        self.generate = generate
+        self.output_dir = output_dir
+        self.concurrency = max(1, concurrency)
+        self.progress = progress
+        self.stats = {"completed": 0, "failed": 0, "skipped": 0, "bytes_written": 0}
+
+    @staticmethod
+    def _append(results, record: dict):
+        results.write(json.dumps(record) + "\n")
+        results.flush()
+        os.fsync(results.fileno())
+
+    def _write_image(self, job: BulkJob, image_b64: str) -> Tuple[str, int]:
+        relative = os.path.join("images", job.bucket, f"{job.job_id}.png")
+        path = os.path.join(self.output_dir, relative)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        data = base64.b64decode(image_b64 + "=" * (-len(image_b64) % 4))
+        # Write then rename so a crash never leaves a half-written image behind
+        with open(path + ".part", "wb") as f:
+            f.write(data)
+        os.replace(path + ".part", path)
+        return relative, len(data)
+
+    async def _run_job(self, job: BulkJob, results):
+        start_time = time.time()
+        record = job.to_record()
+        try:
+            image_b64 = await self.generate(job.prompt, job.steps, job.width, job.height)
+            record["file"], record["bytes"] = await asyncio.get_running_loop().run_in_executor(
+                None, self._write_image, job, image_b64)
+            record["status"] = "ok"
+            self.stats["completed"] += 1
+            self.stats["bytes_written"] += record["bytes"]
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = str(e)
+            self.stats["failed"] += 1
+        record["seconds"] = round(time.time() - start_time, 3)
+        self._append(results, record)
+        if self.progress:
+            self.progress(record)
+
+    async def run(self, jobs: List[BulkJob]) -> dict:
+        os.makedirs(self.output_dir, exist_ok=True)
+        done = load_checkpoint(self.output_dir)
+        pending = [job for job in bucket_jobs(jobs) if job.job_id not in done]
+        self.stats["skipped"] = len(jobs) - len(pending)
+
+        queue: asyncio.Queue = asyncio.Queue()
+        for job in pending:
+            queue.put_nowait(job)
+
+        start_time = time.time()
+        # Closed however the run ends, a cancelled or failed one included
+        with open(os.path.join(self.output_dir, RESULTS_FILE), "a", encoding="utf-8") as results:
+            async def worker():
+                while not queue.empty():
+                    await self._run_job(queue.get_nowait(), results)
+
+            await asyncio.gather(*(worker() for _ in range(min(self.concurrency, len(pending)) or 1)))
+        elapsed = time.time() - start_time
+
+        buckets: Dict[str, int] = {}
+        for job in jobs:
+            buckets[job.bucket] = buckets.get(job.bucket, 0) + 1
+        return {
+            **self.stats,
+            "jobs": len(jobs),
+            "buckets": buckets,
+            "elapsed_seconds": round(elapsed, 2),
+            "images_per_second": round(self.stats["completed"] / elapsed, 3) if elapsed else None,
+            "output_dir": self.output_dir,
+            "results": os.path.join(self.output_dir, RESULTS_FILE),
+        }
+
+
+async def run_manifest(manifest_path: str, output_dir: str, generate, size_presets: dict,
+                       default_steps: int = 30, concurrency: int = 4, progress=None) -> dict:
+    """Expand, dedupe, bucket and run a manifest, writing the summary next to the results"""
+    jobs, duplicates = expand_jobs(read_manifest(manifest_path), size_presets, default_steps)
+    runner = BulkRunner(generate, output_dir, concurrency, progress)
+    summary = await runner.run(jobs)
+    summary = {"manifest": os.path.abspath(manifest_path), "duplicates_removed": duplicates,
+               "finished_at": time.strftime("%Y-%m-%dT%H:%M:%S"), **summary}
+    with open(os.path.join(output_dir, SUMMARY_FILE), "w", encoding="utf-8") as f:
+        json.dump(summary, f, indent=2)
+    return summary
+
+
+def default_output_dir(manifest_path: str) -> str:
+    name = os.path.splitext(os.path.basename(manifest_path))[0]
+    return os.path.join(BULK_DIR, name)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate every asset in a campaign manifest")
+    parser.add_argument("manifest", help="CSV or JSONL manifest")
+    parser.add_argument("--out", default=None, help="Output directory (default: AI-Marketing-Content-Creator/bulk/<name>)")
+    parser.add_argument("--steps", type=int, default=30, help="Default inference steps (0 = auto)")
+    parser.add_argument("--concurrency", type=int, default=4, help="Generations in flight at once")
+    parser.add_argument("--dry-run", action="store_true", help="Print the job plan without generating")
+    args = parser.parse_args()
+
+    # The MCP server module carries the presets and the Modal client
+    import mcp_server
+
+    output_dir = args.out or default_output_dir(args.manifest)
+    if args.dry_run:
+        jobs, duplicates = expand_jobs(read_manifest(args.manifest), mcp_server.SIZE_PRESETS, args.steps)
+        done = load_checkpoint(output_dir)
+        ordered = bucket_jobs(jobs)
+        print(f"📋 {len(jobs)} jobs ({duplicates} duplicates removed, {sum(j.job_id in done for j in jobs)} already done)")
+        for job in ordered:
+            print(f"  {job.bucket:>10}  {job.steps:>3} steps  {job.job_id}  {job.prompt[:70]}")
+        return
+
+    total = {"n": 0}
+
+    def progress(record: dict):
+        total["n"] += 1
+        mark = "✅" if record["status"] == "ok" else "❌"
+        print(f"{mark} [{total['n']}] {record['width']}x{record['height']} {record['job_id']} "
+              f"{record['seconds']:.1f}s {record.get('error', '')}")
+
+    async def run():
+        try:
+            return await run_manifest(args.manifest, output_dir, mcp_server.generate_bulk_image,
+                                      mcp_server.SIZE_PRESETS, args.steps, args.concurrency, progress)
+        finally:
+            await mcp_server.modal_client.close()
+
+    summary = asyncio.run(run())
+    print(json.dumps(summary, indent=2))
+
+
+if __name__ == "__main__":
+    main()
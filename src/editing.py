@@ -0,0 +1,63 @@
+"""Img2img and inpainting on stored images.
+
+An edit starts from a prior output instead of pure noise: the source image is
+encoded, noised to `strength` and denoised from there, so only the last
+`strength` share of the schedule runs. At the default 50 steps, a colour tweak
+at strength 0.35 runs 18 steps and an inpainted region at 0.85 runs 43 (on that
+region only, the rest is kept from the source).
+
+    img2img   the whole image is repainted; low strength keeps the composition
+    inpaint   only the white area of a mask is repainted
+"""
+import base64
+from io import BytesIO
+from typing import List, Tuple
+
+from PIL import Image, ImageDraw, ImageFilter
+
+EDIT_MODES = ("img2img", "inpaint")
+DEFAULT_STRENGTH = {"img2img": 0.35, "inpaint": 0.85}
+# Soft mask edge in pixels so the repainted region blends into the source
+MASK_FEATHER = 8
+
+
+def edit_steps(num_inference_steps: int, strength: float) -> int:
+    """Denoising steps an edit actually runs (same rounding as diffusers' get_timesteps)"""
+    strength = min(max(strength, 0.0), 1.0)
+    start = int(max(num_inference_steps - num_inference_steps * strength, 0))
+    return max(1, num_inference_steps - start)
+
+
+def render_size(width: int, height: int) -> Tuple[int, int]:
+    """Flux works on multiples of 16 pixels"""
+    return max(16, width // 16 * 16), max(16, height // 16 * 16)
+
+
+def decode_image(data: str) -> bytes:
+    """Base64 (padding optional) to bytes"""
+    data = data.strip()
+    return base64.b64decode(data + "=" * (-len(data) % 4))
+
+
+def box_mask(width: int, height: int, box: List[int], feather: int = MASK_FEATHER) -> bytes:
+    """PNG mask that is white inside box=[x, y, w, h] (pixels of the source image)"""
+    if len(box) != 4:
+        raise ValueError("box must be [x, y, width, height]")
+    x, y, w, h = (int(v) for v in box)
+    if w <= 0 or h <= 0 or x >= width or y >= height or x + w <= 0 or y + h <= 0:
+        raise ValueError(f"box {box} does not cover any of the {width}x{height} image")
+    mask = Image.new("L", (width, height), 0)
+    ImageDraw.Draw(mask).rectangle([x, y, x + w - 1, y + h - 1], fill=255)
+    if feather:
+        mask = mask.filter(ImageFilter.GaussianBlur(feather / 2))
+    buffer = BytesIO()
+    mask.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def load_mask(mask_bytes: bytes, size: Tuple[int, int]) -> Image.Image:
+    """Mask as a grayscale image of the source size; white is repainted"""
+    mask = Image.open(BytesIO(mask_bytes)).convert("L")
+    if mask.size != size:
+        mask = mask.resize(size, Image.BILINEAR)
+    return mask
@@ -0,0 +1,738 @@
+"""Backend-agnostic Flux inference engine.
+
+The model side of the Flux server: memory planning, adaptive T5 sequence
+length, preemption and resume, edits, shared-trajectory variations, PNG
+encoding and stage spans. Nothing here depends on Modal, and CUDA and the
+Hugging Face login are only touched by the backends that need them. The
+pipeline is pluggable:
+
+    flux      FLUX.1-dev with the doodle-poster LoRA on CUDA (the Modal Model class)
+    schnell   FLUX.1-schnell, the preview tier (the Modal PreviewModel class)
+    tiny      a tiny random-weight Flux pipeline (ENGINE_TINY_MODEL) on CPU or
+              CUDA: the real diffusers code path, in seconds
+    fake      `src.fake_flux.FakeFluxPipeline`, which sleeps per step and
+              needs neither torch nor diffusers
+
+`src/model_server.py` wraps engines in Modal classes; `src/serve.py` runs one
+in-process behind the same FastAPI app with plain uvicorn.
+"""
+import base64
+import os
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from typing import Optional
+
+import numpy as np
+import requests
+from PIL import Image
+
+from src.editing import edit_steps, render_size, load_mask
+from src.memory import plan_memory, plan_resume, MemoryBusy, MEMORY_HEADROOM_BYTES, GB
+from src.routing import PREVIEW_MAX_STEPS, PREVIEW_MAX_SIDE, preview_size
+from src.tokens import t5_counter, clip_counter, token_stats
+
+try:
+    import torch
+except ImportError:
+    # The fake backend runs without torch
+    torch = None
+
+BACKENDS = ("flux", "schnell", "tiny", "fake")
+
+FLUX_MODEL = "black-forest-labs/FLUX.1-dev"
+PREVIEW_MODEL = "black-forest-labs/FLUX.1-schnell"
+TINY_MODEL = os.environ.get("ENGINE_TINY_MODEL", "hf-internal-testing/tiny-flux-pipe")
+FAKE_STEP_SECONDS = float(os.environ.get("ENGINE_FAKE_STEP_SECONDS", "0.02"))
+FAKE_DECODE_SECONDS = float(os.environ.get("ENGINE_FAKE_DECODE_SECONDS", "0.05"))
+
+LORA_PATH = "/cache/flux.1_lora_flyway_doodle-poster.safetensors"
+LORA_URL = "https://huggingface.co/RajputVansh/SG161222-DISTILLED-IITI-VANSH-RUHELA/resolve/main/flux.1_lora_flyway_doodle-poster.safetensors?download=true"
+
+NUM_INFERENCE_STEPS = 50
+
+# FLUX.1-schnell is guidance-distilled and was trained with at most 256 T5
+# tokens; a preview on any other backend keeps FLUX.1-dev's default guidance
+DEV_GUIDANCE_SCALE = 3.5
+SCHNELL_MAX_SEQUENCE_LENGTH = 256
+
+# Pad T5 to the smallest of 128/256/512 tokens that fits the prompt instead of
+# always 512: the text sequence is part of every denoising step's attention
+ADAPTIVE_SEQUENCE_LENGTH = os.environ.get("ADAPTIVE_SEQUENCE_LENGTH", "1") == "1"
+
+# Preempted jobs are flagged by the API; the pipeline checks every few steps
+PREEMPT_CHECK_STEPS = int(os.environ.get("PREEMPT_CHECK_STEPS", "5"))
+
+NUMPY_MAGIC = b"\x93NUMPY"
+
+
+class StepPreempted(Exception):
+    """Raised from the step callback to leave the denoising loop early"""
+
+    def __init__(self, latents, step: int):
+        super().__init__(f"preempted after step {step}")
+        self.latents = latents
+        self.step = step
+
+
+def clear_preempt_flag(flags, key: str):
+    """Drop a job's preemption flag, if set (modal.Dict.pop takes no default)"""
+    try:
+        flags.pop(key)
+    except KeyError:
+        pass
+
+
+def remaining_sigmas(num_inference_steps: int, start_step: int) -> list:
+    """Flow-matching sigmas left after `start_step` of a `num_inference_steps` schedule"""
+    return list(np.linspace(1.0, 1 / num_inference_steps, num_inference_steps)[start_step:])
+
+
+def dump_latents(latents) -> bytes:
+    """Serialize latents to send them through the API (torch tensors or, for the fake, arrays)"""
+    buffer = BytesIO()
+    if torch is not None and isinstance(latents, torch.Tensor):
+        torch.save(latents.cpu(), buffer)
+    else:
+        np.save(buffer, np.asarray(latents), allow_pickle=False)
+    return buffer.getvalue()
+
+
+def load_latents(data: bytes, device: str = "cpu"):
+    if data.startswith(NUMPY_MAGIC):
+        return np.load(BytesIO(data), allow_pickle=False)
+    return torch.load(BytesIO(data), map_location=device)
+
+
+def copy_latents(latents):
+    return latents.clone() if hasattr(latents, "clone") else latents.copy()
+
+
+def encode_png(image: Image.Image) -> str:
+    byte_stream = BytesIO()
+    image.save(byte_stream, format="PNG")
+    return base64.b64encode(byte_stream.getvalue()).decode('utf-8')
+
+
+def download_lora_from_url(url, save_path):
+    """Download LoRA with proper error handling"""
+    try:
+        print(f"📥 Downloading LoRA from {url}")
+        response = requests.get(url, timeout=300)  # 5 minute timeout
+        response.raise_for_status()  # Raise exception for bad status codes
+
+        with open(save_path, "wb") as f:
+            f.write(response.content)
+
+        print(f"✅ LoRA downloaded successfully to {save_path}")
+        print(f"📊 File size: {len(response.content)} bytes")
+        return True
+    except Exception as e:
+        print(f"❌ LoRA download failed: {str(e)}")
+        return False
+
+
+def verify_lora_file(lora_path):
+    """Verify that the LoRA file is valid"""
+    try:
+        if not os.path.exists(lora_path):
+            return False, "File does not exist"
+
+        file_size = os.path.getsize(lora_path)
+        if file_size == 0:
+            return False, "File is empty"
+
+        # Try to load the file to verify it's valid
+        try:
+            from safetensors.torch import load_file
+            load_file(lora_path)
+            return True, f"Valid LoRA file ({file_size} bytes)"
+        except Exception as e:
+            return False, f"Invalid LoRA file: {str(e)}"
+
+    except Exception as e:
+        return False, f"Error verifying file: {str(e)}"
+
+
+def load_flux(compile: bool = False):
+    """FLUX.1-dev on CUDA with the LoRA if it can be fetched; returns (pipe, lora_loaded)"""
+    from huggingface_hub import login
+    from diffusers import FluxPipeline
+
+    # Login to HuggingFace
+    login(os.environ["huggingface_token"])
+
+    # Download and verify LoRA
+    if not os.path.exists(LORA_PATH):
+        print("📥 LoRA not found, downloading...")
+        if not download_lora_from_url(LORA_URL, LORA_PATH):
+            print("❌ Failed to download LoRA, continuing without it")
+    else:
+        print("📁 LoRA file found in cache")
+
+    # Verify LoRA file
+    is_valid, message = verify_lora_file(LORA_PATH)
+    print(f"🔍 LoRA verification: {message}")
+
+    print("🚀 Loading Flux model...")
+    pipe = FluxPipeline.from_pretrained(FLUX_MODEL, torch_dtype=torch.bfloat16).to("cuda")
+
+    lora_loaded = False
+    if is_valid:
+        try:
+            print(f"🔄 Loading LoRA from {LORA_PATH}")
+            pipe.load_lora_weights(LORA_PATH)
+            print("✅ LoRA successfully loaded!")
+            lora_loaded = True
+        except Exception as e:
+            print(f"❌ LoRA loading failed: {str(e)}")
+    else:
+        print("⚠️ LoRA not loaded due to verification failure")
+
+    return optimize(pipe, compile=compile), lora_loaded
+
+
+def load_pipeline(backend: str, compile: bool = False):
+    """Build the pipeline for a backend; returns (pipe, device, lora_loaded)"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown engine backend '{backend}', expected one of {list(BACKENDS)}")
+    if backend == "fake":
+        from src.fake_flux import FakeFluxPipeline
+        return FakeFluxPipeline(step_latency=FAKE_STEP_SECONDS, decode_latency=FAKE_DECODE_SECONDS), "cpu", False
+    if backend == "flux":
+        pipe, lora_loaded = load_flux(compile)
+        return pipe, "cuda", lora_loaded
+
+    from diffusers import FluxPipeline
+    if backend == "schnell":
+        from huggingface_hub import login
+        login(os.environ["huggingface_token"])
+        print(f"🚀 Loading preview model {PREVIEW_MODEL}...")
+        pipe = FluxPipeline.from_pretrained(PREVIEW_MODEL, torch_dtype=torch.bfloat16).to("cuda")
+        return optimize(pipe, compile=False), "cuda", False
+
+    device = "cuda" if torch.cuda.is_available() else "cpu"
+    print(f"🚀 Loading tiny pipeline {TINY_MODEL} on {device}...")
+    pipe = FluxPipeline.from_pretrained(TINY_MODEL, torch_dtype=torch.float32).to(device)
+    return pipe, device, False
+
+
+def edit_pipelines(pipe) -> dict:
+    """Img2img and inpaint pipelines sharing `pipe`'s modules: no extra weights are loaded"""
+    if not hasattr(pipe, "components"):
+        # The fake pipeline takes image/mask_image itself
+        return {"img2img": pipe, "inpaint": pipe}
+    from diffusers import FluxImg2ImgPipeline, FluxInpaintPipeline
+    return {
+        "img2img": FluxImg2ImgPipeline(**pipe.components),
+        "inpaint": FluxInpaintPipeline(**pipe.components),
+    }
+
+
+class FluxEngine:
+    def __init__(self, pipe, device: str = "cpu", backend: str = "fake", lora_loaded: bool = False,
+                 preempt_flags=None):
+        """
+        pipe: a FluxPipeline or anything with its call signature
+        preempt_flags: mapping the API sets job keys in to ask a running job to stop
+        (a modal.Dict on Modal, a dict in-process)
+        """
+        self.pipe = pipe
+        self.device = device
+        self.backend = backend
+        self.lora_loaded = lora_loaded
+        self.preempt_flags = preempt_flags if preempt_flags is not None else {}
+        self.calls_served = 0
+        self.edit_pipes = edit_pipelines(pipe)
+        # Diffusers has no getter for attention slicing: track what is set
+        self.attention_slicing = False
+
+        # Count tokens with the pipeline's own tokenizers
+        if hasattr(pipe, "tokenizer_2"):
+            t5_counter.use(pipe.tokenizer_2)
+            clip_counter.use(pipe.tokenizer)
+
+        # Memory left for activations once the weights are resident
+        self.activation_capacity = None
+        if self.cuda:
+            total_memory = torch.cuda.get_device_properties(0).total_memory
+            self.activation_capacity = total_memory - torch.cuda.memory_allocated() - MEMORY_HEADROOM_BYTES
+            print(f"🧮 {self.activation_capacity / GB:.1f} GB available for activations")
+        self.ready_at = time.time()
+        print(f"🎯 Model ready ({backend})! LoRA status: {'✅ Loaded' if self.lora_loaded else '❌ Not loaded'}")
+
+    @classmethod
+    def from_backend(cls, backend: str, compile: bool = False, preempt_flags=None) -> "FluxEngine":
+        pipe, device, lora_loaded = load_pipeline(backend, compile)
+        return cls(pipe, device, backend, lora_loaded, preempt_flags)
+
+    @property
+    def cuda(self) -> bool:
+        return self.device == "cuda"
+
+    def get_model_status(self) -> dict:
+        """Get detailed model and LoRA status"""
+        lora_file_info = {"exists": False}
+        if os.path.exists(LORA_PATH):
+            file_size = os.path.getsize(LORA_PATH)
+            lora_file_info = {
+                "exists": True,
+                "size_bytes": file_size,
+                "size_mb": round(file_size / (1024 * 1024), 2)
+            }
+        return {
+            "status": "ready",
+            "backend": self.backend,
+            "device": self.device,
+            "lora_loaded": self.lora_loaded,
+            "lora_path": LORA_PATH,
+            "model_info": {
+                "base_model": FLUX_MODEL,
+                "lora_file": lora_file_info,
+                "lora_url": LORA_URL
+            }
+        }
+
+    def warmup(self) -> dict:
+        """Cheap ping; on Modal it makes a container start and load the model"""
+        cold_start = self.calls_served == 0
+        self.calls_served += 1
+        return {
+            "warm": True,
+            "cold_start": cold_start,
+            "ready_for_seconds": round(time.time() - self.ready_at, 2)
+        }
+
+    def preflight(self, width: int, height: int, max_sequence_length: int, resume_size=None):
+        """Memory plan for a request; raises MemoryBusy rather than waiting if memory is held elsewhere.
+
+        The API retries a busy job later, so the worker is free in the meantime.
+        `resume_size` is the render size of a preempted job's latents, which
+        the resumed run has to keep. Without CUDA the plan is the one the H200
+        default capacity would give.
+        """
+        def plan(free_bytes=None):
+            if resume_size:
+                return plan_resume(width, height, *resume_size, max_sequence_length, self.activation_capacity,
+                                   free_bytes)
+            return plan_memory(width, height, max_sequence_length, self.activation_capacity, free_bytes)
+
+        if not self.cuda:
+            return plan()
+        memory_plan = plan(torch.cuda.mem_get_info()[0] - MEMORY_HEADROOM_BYTES)
+        if memory_plan.action == "queue":
+            # Cached blocks of earlier calls may be all that is in the way
+            torch.cuda.empty_cache()
+            memory_plan = plan(torch.cuda.mem_get_info()[0] - MEMORY_HEADROOM_BYTES)
+        if memory_plan.action == "queue":
+            raise MemoryBusy(memory_plan.reason)
+        return memory_plan
+
+    def set_memory_options(self, vae_tiling: bool, attention_slicing: bool):
+        if vae_tiling:
+            self.pipe.vae.enable_tiling()
+        else:
+            self.pipe.vae.disable_tiling()
+        try:
+            if attention_slicing:
+                self.pipe.enable_attention_slicing()
+            else:
+                self.pipe.disable_attention_slicing()
+            self.attention_slicing = attention_slicing
+        except Exception as e:
+            # Not every attention processor supports slicing
+            print(f"⚠️ Attention slicing unavailable: {str(e)}")
+
+    @contextmanager
+    def memory_plan_applied(self, plan):
+        """VAE tiling and attention slicing of a plan for one call; the shared pipeline is restored after"""
+        if not hasattr(self.pipe, "vae"):
+            yield
+            return
+        previous = (getattr(self.pipe.vae, "use_tiling", False), self.attention_slicing)
+        self.set_memory_options(plan.vae_tiling, plan.attention_slicing)
+        try:
+            yield
+        finally:
+            self.set_memory_options(*previous)
+
+    def reset_memory_stats(self):
+        if self.cuda:
+            torch.cuda.reset_peak_memory_stats()
+
+    def gpu_memory(self) -> dict:
+        if not self.cuda:
+            return {}
+        return {
+            "allocated_bytes": torch.cuda.memory_allocated(),
+            "reserved_bytes": torch.cuda.memory_reserved(),
+            "peak_bytes": torch.cuda.max_memory_allocated(),
+        }
+
+    def sequence_length(self, prompt: str, clip_prompt: str = "") -> int:
+        return token_stats(prompt, clip_prompt or None)["max_sequence_length"] if ADAPTIVE_SEQUENCE_LENGTH else 512
+
+    def inference(self, prompt: str, num_inference_steps: int = 50, width: int = 1024, height: int = 1024,
+                  traceparent: str = "", enqueued_at: Optional[float] = None, clip_prompt: str = "",
+                  preempt_key: str = "", resume_latents: bytes = b"", resume_step: int = 0,
+                  resume_size: Optional[list] = None) -> dict:
+        inference_start = time.time()
+
+        # First call on a fresh container paid for the model load
+        cold_start = self.calls_served == 0
+        self.calls_served += 1
+
+        prompt_tokens = token_stats(prompt, clip_prompt or None)
+        max_sequence_length = prompt_tokens["max_sequence_length"] if ADAPTIVE_SEQUENCE_LENGTH else 512
+
+        print(f"🎨 Generating image:")
+        print(f"   Prompt: {prompt}")
+        print(f"   Tokens: T5 {prompt_tokens['t5_tokens']} (max_sequence_length {max_sequence_length}), CLIP {prompt_tokens['clip_tokens']}")
+        print(f"   Dimensions: {width}x{height}")
+        print(f"   LoRA status: {'✅ Active' if self.lora_loaded else '❌ Inactive'}")
+        if traceparent:
+            print(f"   Trace: {traceparent}")
+
+        # A resumed job keeps the render size its latents were made at
+        memory_plan = self.preflight(width, height, max_sequence_length, resume_size if resume_latents else None)
+        print(f"   Memory plan: {memory_plan.action} at {memory_plan.render_width}x{memory_plan.render_height}, "
+              f"VAE tiling {memory_plan.vae_tiling}, attention slicing {memory_plan.attention_slicing} ({memory_plan.reason})")
+
+        start_time = time.time()
+        self.reset_memory_stats()
+
+        # Resuming a preempted job: continue from its latents on the remaining sigmas
+        resume_kwargs = {}
+        if resume_latents:
+            resume_kwargs = {"latents": load_latents(resume_latents, self.device),
+                             "sigmas": remaining_sigmas(num_inference_steps, resume_step)}
+            print(f"   Resuming at step {resume_step}/{num_inference_steps}")
+
+        # Timestamp every denoising step so VAE decode can be told apart
+        step_times = []
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            step_times.append(time.time())
+            done = resume_step + step + 1
+            if (preempt_key and done < num_inference_steps and done % PREEMPT_CHECK_STEPS == 0
+                    and self.preempt_flags.get(preempt_key, False)):
+                raise StepPreempted(callback_kwargs["latents"], done)
+            return callback_kwargs
+
+        try:
+            with self.memory_plan_applied(memory_plan):
+                out = self.pipe(
+                    prompt=clip_prompt or prompt,
+                    prompt_2=prompt,
+                    output_type="pil",
+                    num_inference_steps=num_inference_steps - resume_step,
+                    width=memory_plan.render_width,
+                    height=memory_plan.render_height,
+                    max_sequence_length=max_sequence_length,
+                    callback_on_step_end=on_step_end,
+                    **resume_kwargs
+                ).images[0]
+        except StepPreempted as preempted:
+            print(f"⏸️ Preempted after step {preempted.step}/{num_inference_steps}")
+            return {
+                "preempted": True,
+                "step": preempted.step,
+                "latents": dump_latents(preempted.latents),
+                "render_size": [memory_plan.render_width, memory_plan.render_height],
+                "cold_start": cold_start,
+            }
+        finally:
+            # A flag set for a job that finished before its next check must not
+            # outlive the job
+            if preempt_key:
+                clear_preempt_flag(self.preempt_flags, preempt_key)
+        if out.size != (width, height):
+            # Split plan: rendered smaller than requested to fit in memory
+            out = out.resize((width, height), Image.LANCZOS)
+        decoded_at = time.time()
+
+        image_base64 = encode_png(out)
+        encoded_at = time.time()
+
+        generation_time = encoded_at - start_time
+        print(f"✅ Generated image in {generation_time:.2f} seconds")
+
+        gpu_memory = self.gpu_memory()
+        if gpu_memory:
+            print(f"🧮 Peak GPU memory {gpu_memory['peak_bytes'] / GB:.1f} GB "
+                  f"(estimated activations {memory_plan.activation_bytes / GB:.1f} GB)")
+
+        denoised_at = step_times[-1] if step_times else decoded_at
+        spans = [
+            {"name": "modal.denoise", "start": start_time, "end": denoised_at},
+            {"name": "modal.vae_decode", "start": denoised_at, "end": decoded_at},
+            {"name": "modal.encode", "start": decoded_at, "end": encoded_at},
+        ]
+        if enqueued_at:
+            spans.insert(0, {"name": "modal.gpu_queue", "start": enqueued_at, "end": inference_start})
+
+        return {
+            "image_base64": image_base64,
+            "generation_time": generation_time,
+            "final_prompt": prompt,
+            "lora_used": self.lora_loaded,
+            "cold_start": cold_start,
+            "spans": spans,
+            "gpu_memory": gpu_memory,
+            "prompt_tokens": {**prompt_tokens, "max_sequence_length": max_sequence_length},
+            "memory_plan": memory_plan.to_dict()
+        }
+
+    def preview(self, prompt: str, num_inference_steps: int = 4, width: int = PREVIEW_MAX_SIDE,
+                height: int = PREVIEW_MAX_SIDE, traceparent: str = "", enqueued_at: Optional[float] = None,
+                clip_prompt: str = "") -> dict:
+        """Cheap draft tier: 1-4 steps at reduced resolution; unguided on schnell (the Modal preview model)"""
+        inference_start = time.time()
+        cold_start = self.calls_served == 0
+        self.calls_served += 1
+
+        steps = max(1, min(PREVIEW_MAX_STEPS, num_inference_steps))
+        width, height = preview_size(width, height)
+        prompt_tokens = token_stats(prompt, clip_prompt or None)
+        max_sequence_length = prompt_tokens["max_sequence_length"] if ADAPTIVE_SEQUENCE_LENGTH else 512
+        if self.backend == "schnell":
+            guidance_scale = 0.0
+            max_sequence_length = min(SCHNELL_MAX_SEQUENCE_LENGTH, max_sequence_length)
+        else:
+            guidance_scale = DEV_GUIDANCE_SCALE
+        print(f"⚡ Preview: {steps} steps at {width}x{height}, guidance {guidance_scale}")
+
+        step_times = []
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            step_times.append(time.time())
+            return callback_kwargs
+
+        start_time = time.time()
+        out = self.pipe(
+            prompt=clip_prompt or prompt,
+            prompt_2=prompt,
+            output_type="pil",
+            num_inference_steps=steps,
+            guidance_scale=guidance_scale,
+            width=width,
+            height=height,
+            max_sequence_length=max_sequence_length,
+            callback_on_step_end=on_step_end
+        ).images[0]
+        decoded_at = time.time()
+
+        image_base64 = encode_png(out)
+        encoded_at = time.time()
+
+        denoised_at = step_times[-1] if step_times else decoded_at
+        spans = [
+            {"name": "modal.denoise", "start": start_time, "end": denoised_at},
+            {"name": "modal.vae_decode", "start": denoised_at, "end": decoded_at},
+            {"name": "modal.encode", "start": decoded_at, "end": encoded_at},
+        ]
+        if enqueued_at:
+            spans.insert(0, {"name": "modal.gpu_queue", "start": enqueued_at, "end": inference_start})
+        return {
+            "image_base64": image_base64,
+            "generation_time": encoded_at - start_time,
+            "cold_start": cold_start,
+            "spans": spans,
+            "prompt_tokens": {**prompt_tokens, "max_sequence_length": max_sequence_length},
+            "guidance_scale": guidance_scale,
+        }
+
+    def edit(self, mode: str, prompt: str, image_bytes: bytes, strength: float = 0.35,
+             num_inference_steps: int = 50, mask_bytes: bytes = b"", traceparent: str = "",
+             enqueued_at: Optional[float] = None, clip_prompt: str = "") -> dict:
+        """Img2img or inpaint a prior output; only the last `strength` share of the steps run"""
+        inference_start = time.time()
+        cold_start = self.calls_served == 0
+        self.calls_served += 1
+
+        source = Image.open(BytesIO(image_bytes)).convert("RGB")
+        width, height = source.size
+        prompt_tokens = token_stats(prompt, clip_prompt or None)
+        max_sequence_length = prompt_tokens["max_sequence_length"] if ADAPTIVE_SEQUENCE_LENGTH else 512
+        steps_run = edit_steps(num_inference_steps, strength)
+        print(f"🖌️ {mode}: {steps_run}/{num_inference_steps} steps (strength {strength}) at {width}x{height}")
+        if traceparent:
+            print(f"   Trace: {traceparent}")
+
+        memory_plan = self.preflight(*render_size(width, height), max_sequence_length)
+        render = (memory_plan.render_width, memory_plan.render_height)
+        edit_kwargs = {"image": source.resize(render, Image.LANCZOS) if source.size != render else source}
+        if mode == "inpaint":
+            edit_kwargs["mask_image"] = load_mask(mask_bytes, render)
+
+        step_times = []
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            step_times.append(time.time())
+            return callback_kwargs
+
+        start_time = time.time()
+        self.reset_memory_stats()
+        with self.memory_plan_applied(memory_plan):
+            out = self.edit_pipes[mode](
+                prompt=clip_prompt or prompt,
+                prompt_2=prompt,
+                output_type="pil",
+                strength=strength,
+                num_inference_steps=num_inference_steps,
+                width=render[0],
+                height=render[1],
+                max_sequence_length=max_sequence_length,
+                callback_on_step_end=on_step_end,
+                **edit_kwargs
+            ).images[0]
+        if out.size != (width, height):
+            out = out.resize((width, height), Image.LANCZOS)
+        decoded_at = time.time()
+
+        image_base64 = encode_png(out)
+        encoded_at = time.time()
+        print(f"✅ Edited image in {encoded_at - start_time:.2f} seconds")
+
+        denoised_at = step_times[-1] if step_times else decoded_at
+        spans = [
+            {"name": "modal.denoise", "start": start_time, "end": denoised_at},
+            {"name": "modal.vae_decode", "start": denoised_at, "end": decoded_at},
+            {"name": "modal.encode", "start": decoded_at, "end": encoded_at},
+        ]
+        if enqueued_at:
+            spans.insert(0, {"name": "modal.gpu_queue", "start": enqueued_at, "end": inference_start})
+        return {
+            "image_base64": image_base64,
+            "generation_time": encoded_at - start_time,
+            "cold_start": cold_start,
+            "spans": spans,
+            "gpu_memory": self.gpu_memory(),
+            "prompt_tokens": {**prompt_tokens, "max_sequence_length": max_sequence_length},
+            "memory_plan": memory_plan.to_dict(),
+            "steps_run": len(step_times) or steps_run,
+        }
+
+    def variations(self, prompt: str, variation_prompts: list, shared_steps: int, num_inference_steps: int = 50,
+                   width: int = 1024, height: int = 1024, traceparent: str = "", enqueued_at: Optional[float] = None,
+                   clip_prompt: str = "", variation_clip_prompts: Optional[list] = None) -> dict:
+        """A/B set on one trajectory: `shared_steps` on the base prompt, then each variation finishes alone.
+
+        Every variation starts its own steps from the same latents, so the
+        composition settled in the shared steps is common to the set and the
+        prompts' difference is what varies. Costs shared + n x (total - shared)
+        steps instead of n x total.
+        """
+        inference_start = time.time()
+        cold_start = self.calls_served == 0
+        self.calls_served += 1
+        variation_clip_prompts = variation_clip_prompts or [""] * len(variation_prompts)
+
+        print(f"🌿 Variations: {shared_steps}/{num_inference_steps} steps shared by {len(variation_prompts)} at {width}x{height}")
+        if traceparent:
+            print(f"   Trace: {traceparent}")
+        memory_plan = self.preflight(width, height, max(self.sequence_length(text, clip) for text, clip in
+                                                          zip([prompt, *variation_prompts], [clip_prompt, *variation_clip_prompts])))
+        render = {"width": memory_plan.render_width, "height": memory_plan.render_height}
+
+        step_times = []
+        def stop_after_shared(pipe, step, timestep, callback_kwargs):
+            step_times.append(time.time())
+            if step + 1 == shared_steps:
+                raise StepPreempted(callback_kwargs["latents"], shared_steps)
+            return callback_kwargs
+
+        def on_step_end(pipe, step, timestep, callback_kwargs):
+            step_times.append(time.time())
+            return callback_kwargs
+
+        start_time = time.time()
+        self.reset_memory_stats()
+        with self.memory_plan_applied(memory_plan):
+            try:
+                self.pipe(
+                    prompt=clip_prompt or prompt,
+                    prompt_2=prompt,
+                    output_type="latent",
+                    num_inference_steps=num_inference_steps,
+                    max_sequence_length=self.sequence_length(prompt, clip_prompt),
+                    callback_on_step_end=stop_after_shared,
+                    **render
+                )
+                raise RuntimeError(f"Shared trajectory ended before step {shared_steps}")
+            except StepPreempted as branch_point:
+                shared_latents = branch_point.latents
+            spans = [{"name": "modal.shared_denoise", "start": start_time, "end": step_times[-1]}]
+
+            images = []
+            for text, clip_text in zip(variation_prompts, variation_clip_prompts):
+                branch_start = time.time()
+                out = self.pipe(
+                    prompt=clip_text or text,
+                    prompt_2=text,
+                    output_type="pil",
+                    latents=copy_latents(shared_latents),
+                    sigmas=remaining_sigmas(num_inference_steps, shared_steps),
+                    num_inference_steps=num_inference_steps - shared_steps,
+                    max_sequence_length=self.sequence_length(text, clip_text),
+                    callback_on_step_end=on_step_end,
+                    **render
+                ).images[0]
+                if out.size != (width, height):
+                    out = out.resize((width, height), Image.LANCZOS)
+                decoded_at = time.time()
+                images.append({"image_base64": encode_png(out), "prompt": text})
+                spans.append({"name": "modal.branch", "start": branch_start, "end": decoded_at})
+                spans.append({"name": "modal.encode", "start": decoded_at, "end": time.time()})
+        if enqueued_at:
+            spans.insert(0, {"name": "modal.gpu_queue", "start": enqueued_at, "end": inference_start})
+        generation_time = time.time() - start_time
+        print(f"✅ {len(images)} variations in {generation_time:.2f} seconds, {len(step_times)} steps")
+
+        return {
+            "images": images,
+            "generation_time": generation_time,
+            "cold_start": cold_start,
+            "spans": spans,
+            "gpu_memory": self.gpu_memory(),
+            "memory_plan": memory_plan.to_dict(),
+            "shared_steps": shared_steps,
+            "steps_run": len(step_times),
+        }
+
+
+def optimize(pipe, compile=True):
+    # fuse QKV projections in Transformer and VAE
+    pipe.transformer.fuse_qkv_projections()
+    pipe.vae.fuse_qkv_projections()
+
+    # switch memory layout to Torch's preferred, channels_last
+    pipe.transformer.to(memory_format=torch.channels_last)
+    pipe.vae.to(memory_format=torch.channels_last)
+
+    if not compile:
+        return pipe
+
+    # set torch compile flags
+    config = torch._inductor.config
+    config.disable_progress = False
+    config.conv_1x1_as_mm = True
+    config.coordinate_descent_tuning = True
+    config.coordinate_descent_check_all_directions = True
+    config.epilogue_fusion = False
+
+    # compile the compute-intensive modules
+    pipe.transformer = torch.compile(
+        pipe.transformer, mode="max-autotune", fullgraph=True
+    )
+    pipe.vae.decode = torch.compile(
+        pipe.vae.decode, mode="max-autotune", fullgraph=True
+    )
+
+    # trigger torch compilation
+    print("🔦 Running torch compilation (may take up to 20 minutes)...")
+    pipe(
+        "dummy prompt to trigger torch compilation",
+        output_type="pil",
+        num_inference_steps=NUM_INFERENCE_STEPS,
+    ).images[0]
+    print("🔦 Finished torch compilation")
+
+    return pipe
@@ -0,0 +1,74 @@
+"""CPU stand-in for diffusers' FluxPipeline.
+
+Accepts the same call signature `FluxEngine` uses, sleeps for a
+configurable time per denoising step (so throughput behaves like a GPU that is
+busy for `steps * step_latency`) and returns real PIL images of the requested
+size, whose PNG size is controlled by `detail`. Given `image` (and `mask_image`)
+it behaves like the img2img/inpaint pipelines: only the last `strength` share of
+the steps runs and the render is blended into the source. The "latents" in the
+step callback are a tiny array holding the seed, so preemption, resume and
+shared-trajectory branching work as they do on the real pipeline.
+"""
+import time
+import zlib
+
+import numpy as np
+from PIL import Image
+
+from src.editing import edit_steps
+
+
+class FakePipelineOutput:
+    def __init__(self, images):
+        self.images = images
+
+
+class FakeFluxPipeline:
+    def __init__(self, step_latency: float = 0.02, decode_latency: float = 0.05, detail: float = 0.25, seed: int = 0):
+        """
+        step_latency: seconds per denoising step
+        decode_latency: seconds for the VAE decode after the last step
+        detail: 0..1 noise amplitude; higher values make larger, less compressible PNGs
+        """
+        self.step_latency = step_latency
+        self.decode_latency = decode_latency
+        self.detail = detail
+        self.seed = seed
+        self.calls = 0
+
+    def make_image(self, width: int, height: int, seed: int = 0) -> Image.Image:
+        # Smooth gradient plus noise: roughly the entropy profile of a render
+        x = np.linspace(0, 255, width, dtype=np.float32)
+        y = np.linspace(0, 255, height, dtype=np.float32)[:, None]
+        base = np.stack([np.broadcast_to(x, (height, width)), np.broadcast_to(y, (height, width)),
+                         np.full((height, width), 128, dtype=np.float32)], axis=-1)
+        amplitude = 127 * self.detail
+        # Per-call generator: calls run concurrently on executor threads
+        rng = np.random.default_rng(seed)
+        noise = rng.uniform(-amplitude, amplitude, size=(height, width, 3)).astype(np.float32)
+        return Image.fromarray(np.clip(base + noise, 0, 255).astype(np.uint8), "RGB")
+
+    def __call__(self, prompt, output_type: str = "pil", num_inference_steps: int = 50, width: int = 1024,
+                 height: int = 1024, max_sequence_length: int = 512, callback_on_step_end=None, image=None,
+                 mask_image=None, strength: float = 1.0, latents=None, **kwargs):
+        self.calls += 1
+        seed = self.seed + self.calls
+        if latents is not None:
+            # Resumed or branched: the same start, finished for this prompt
+            seed = int(np.asarray(latents).flat[0]) + zlib.crc32(prompt.encode("utf-8"))
+        steps = num_inference_steps if image is None else edit_steps(num_inference_steps, strength)
+        callback_kwargs = {"latents": np.array([[seed]], dtype=np.int64)}
+        for step in range(steps):
+            time.sleep(self.step_latency)
+            if callback_on_step_end is not None:
+                callback_kwargs = callback_on_step_end(self, step, None, callback_kwargs) or callback_kwargs
+        if output_type == "latent":
+            return FakePipelineOutput([None])
+        time.sleep(self.decode_latency)
+        rendered = self.make_image(width, height, seed)
+        if image is not None:
+            source = image.convert("RGB").resize((width, height))
+            rendered = Image.blend(source, rendered, strength)
+            if mask_image is not None:
+                rendered = Image.composite(rendered, source, mask_image.convert("L").resize((width, height)))
+        return FakePipelineOutput([rendered])
@@ -0,0 +1,412 @@
+"""Content-addressed output store with near-duplicate detection.
+
+Every saved image is named by the SHA-256 of its PNG bytes, so saving the same
+image twice writes one file and names never collide. Each image also gets two
+64-bit perceptual hashes, computed for a whole batch at once with NumPy:
+
+    phash   sign of the low-frequency 8x8 DCT block of a 32x32 grayscale
+            thumbnail against its median (robust to resizing and recompression)
+    dhash   sign of horizontal gradients on a 9x8 grayscale thumbnail
+
+Two images are near-duplicates when both Hamming distances are within the
+thresholds. pHashes are kept in a multi-index hash (`HashIndex`), so a radius
+query checks a small part of the store instead of every image.
+
+The index is an append-only `index.jsonl` next to the images. Another process
+(the MCP server) picks up new lines on `refresh()`.
+
+    python -m src.image_store scan                 # index images saved before the store existed
+    python -m src.image_store dedupe [--apply]     # group near-duplicates, remove all but the first
+    python -m src.image_store similar photo.png
+"""
+import argparse
+import hashlib
+import json
+import os
+import threading
+import time
+from io import BytesIO
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+OUTPUT_DIR = os.environ.get("IMAGE_STORE_DIR", os.path.join("AI-Marketing-Content-Creator", "created_image"))
+INDEX_NAME = "index.jsonl"
+PHASH_THRESHOLD = int(os.environ.get("IMAGE_PHASH_THRESHOLD", "8"))
+DHASH_THRESHOLD = int(os.environ.get("IMAGE_DHASH_THRESHOLD", "10"))
+# exact: identical bytes are stored once; near: a near-duplicate reuses the stored image instead
+DEDUPE_MODE = os.environ.get("IMAGE_DEDUPE", "exact")
+HASH_BATCH = 256
+
+# Set bits per byte value, for vectorized Hamming distances
+POPCOUNT = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def _dct_matrix(size: int) -> np.ndarray:
+    n = np.arange(size)
+    matrix = np.cos(np.pi * (2 * n[None, :] + 1) * n[:, None] / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_32 = _dct_matrix(32)
+
+
+def _pack(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) booleans to N uint64 hashes, first bit most significant"""
+    return np.packbits(bits, axis=1).view(">u8").ravel().astype(np.uint64)
+
+
+def phash_batch(thumbnails: np.ndarray) -> np.ndarray:
+    """pHashes for (N, 32, 32) grayscale thumbnails"""
+    coefficients = DCT_32 @ thumbnails.astype(np.float64) @ DCT_32.T
+    low = coefficients[:, :8, :8].reshape(len(thumbnails), 64)
+    return _pack(low > np.median(low, axis=1, keepdims=True))
+
+
+def dhash_batch(thumbnails: np.ndarray) -> np.ndarray:
+    """dHashes for (N, 8, 9) grayscale thumbnails"""
+    thumbnails = thumbnails.astype(np.int16)
+    return _pack((thumbnails[:, :, 1:] > thumbnails[:, :, :-1]).reshape(len(thumbnails), 64))
+
+
+def hash_images(images: List[Image.Image]) -> Tuple[np.ndarray, np.ndarray]:
+    """(phashes, dhashes) for a batch of images"""
+    if not images:
+        return np.zeros(0, dtype=np.uint64), np.zeros(0, dtype=np.uint64)
+    gray = [image.convert("L") for image in images]
+    p_thumbs = np.stack([np.asarray(g.resize((32, 32), Image.Resampling.LANCZOS)) for g in gray])
+    d_thumbs = np.stack([np.asarray(g.resize((9, 8), Image.Resampling.LANCZOS)) for g in gray])
+    return phash_batch(p_thumbs), dhash_batch(d_thumbs)
+
+
+def hamming(hashes: np.ndarray, other: int) -> np.ndarray:
+    """Hamming distance from every hash in `hashes` to `other`"""
+    xor = np.asarray(hashes, dtype=np.uint64) ^ np.uint64(other)
+    return POPCOUNT[xor.view(np.uint8)].reshape(-1, 8).sum(axis=1)
+
+
+def _distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+class HashIndex:
+    """Exact Hamming radius search over 64-bit hashes (multi-index hashing).
+
+    The 64 bits are split into `radius + 1` bands. Two hashes within `radius`
+    bits of each other must agree exactly on at least one band (pigeonhole),
+    so a query only checks the hashes sharing a band value with it, verified
+    with a vectorized distance. Larger radii fall back to a full scan.
+    """
+
+    def __init__(self, radius: int = PHASH_THRESHOLD):
+        self.bands = max(1, min(radius + 1, 64))
+        widths = [64 // self.bands + (1 if band < 64 % self.bands else 0) for band in range(self.bands)]
+        shifts = np.cumsum([0] + widths[:-1])
+        self._bands = [(int(shift), (1 << width) - 1) for shift, width in zip(shifts, widths)]
+        self.buckets = [{} for _ in range(self.bands)]
+        self.hashes: List[int] = []
+        self.items: List[object] = []
+        self._array = None
+
+    def __len__(self) -> int:
+        return len(self.items)
+
+    def add(self, key: int, item):
+        index = len(self.items)
+        self.hashes.append(key)
+        self.items.append(item)
+        self._array = None
+        for buckets, (shift, mask) in zip(self.buckets, self._bands):
+            buckets.setdefault((key >> shift) & mask, []).append(index)
+
+    def array(self) -> np.ndarray:
+        if self._array is None:
+            self._array = np.array(self.hashes, dtype=np.uint64)
+        return self._array
+
+    def query(self, key: int, radius: int) -> List[Tuple[int, object]]:
+        """(distance, item) within `radius` of `key`, nearest first"""
+        if not self.items:
+            return []
+        if radius < self.bands:
+            candidates = set()
+            for buckets, (shift, mask) in zip(self.buckets, self._bands):
+                candidates.update(buckets.get((key >> shift) & mask, ()))
+            candidates = np.fromiter(candidates, dtype=np.int64, count=len(candidates))
+        else:
+            candidates = np.arange(len(self.items))
+        distances = hamming(self.array()[candidates], key)
+        keep = distances <= radius
+        order = np.argsort(distances[keep], kind="stable")
+        return [(int(distance), self.items[index])
+                for distance, index in zip(distances[keep][order], candidates[keep][order])]
+
+
+def normalize_prompt(prompt: str) -> str:
+    return " ".join(prompt.lower().split())
+
+
+class ImageStore:
+    def __init__(self, root: str = OUTPUT_DIR, phash_threshold: int = PHASH_THRESHOLD,
+                 dhash_threshold: int = DHASH_THRESHOLD, dedupe: str = DEDUPE_MODE):
+        if dedupe not in ("exact", "near"):
+            raise ValueError(f"Unknown IMAGE_DEDUPE '{dedupe}', expected exact or near")
+        self.root = root
+        self.index_path = os.path.join(root, INDEX_NAME)
+        self.phash_threshold = phash_threshold
+        self.dhash_threshold = dhash_threshold
+        self.dedupe_mode = dedupe
+        self.records: Dict[str, dict] = {}
+        self.index = HashIndex(self.phash_threshold)
+        self._offset = 0
+        self._lock = threading.Lock()
+        self.stats = {"stored": 0, "exact_duplicates": 0, "near_duplicates": 0}
+        os.makedirs(root, exist_ok=True)
+        self.refresh()
+
+    def path(self, record: dict) -> str:
+        return os.path.join(self.root, record["file"])
+
+    def _add(self, record: dict):
+        if record["id"] not in self.records:
+            self.index.add(int(record["phash"], 16), record["id"])
+        self.records[record["id"]] = record
+
+    def refresh(self):
+        """Pick up records appended by other processes"""
+        with self._lock:
+            if not os.path.exists(self.index_path):
+                return
+            if os.path.getsize(self.index_path) < self._offset:
+                # Rewritten by dedupe: start over
+                self.records, self.index, self._offset = {}, HashIndex(self.phash_threshold), 0
+            with open(self.index_path, "rb") as f:
+                f.seek(self._offset)
+                for line in f:
+                    if not line.endswith(b"\n"):
+                        break
+                    self._offset += len(line)
+                    if line.strip():
+                        self._add(json.loads(line))
+
+    def _append(self, records: List[dict]):
+        with open(self.index_path, "a", encoding="utf-8") as f:
+            for record in records:
+                f.write(json.dumps(record) + "\n")
+
+    def find(self, image_id: str) -> Optional[dict]:
+        """Record by content hash (or a prefix of it) or file name"""
+        self.refresh()
+        image_id = os.path.basename(image_id)
+        if not image_id:
+            return None
+        if image_id in self.records:
+            return self.records[image_id]
+        for record in self.records.values():
+            if record["file"] == image_id or record["id"].startswith(image_id.split(".")[0]):
+                return record
+        return None
+
+    def near_duplicates(self, phash: int, dhash: int, max_distance: Optional[int] = None,
+                        limit: int = 0) -> List[dict]:
+        radius = self.phash_threshold if max_distance is None else max_distance
+        matches = []
+        for distance, image_id in self.index.query(phash, radius):
+            record = self.records[image_id]
+            if not os.path.exists(self.path(record)):
+                continue
+            dhash_distance = _distance(dhash, int(record["dhash"], 16))
+            if max_distance is None and dhash_distance > self.dhash_threshold:
+                continue
+            matches.append({**record, "path": self.path(record), "phash_distance": distance,
+                            "dhash_distance": dhash_distance})
+            if limit and len(matches) >= limit:
+                break
+        return matches
+
+    def save(self, image_bytes: bytes, label: str = "", prompt: str = "", metadata: Optional[dict] = None) -> dict:
+        """Store an encoded image; returns its record with `path` and `status`"""
+        image = Image.open(BytesIO(image_bytes))
+        if image.format != "PNG":
+            buffer = BytesIO()
+            image.save(buffer, format="PNG")
+            image_bytes = buffer.getvalue()
+        digest = hashlib.sha256(image_bytes).hexdigest()
+        phashes, dhashes = hash_images([image])
+        phash, dhash = int(phashes[0]), int(dhashes[0])
+
+        self.refresh()
+        with self._lock:
+            # A record whose file was deleted outside the store is written again
+            if digest in self.records and os.path.exists(self.path(self.records[digest])):
+                self.stats["exact_duplicates"] += 1
+                return {**self.records[digest], "path": self.path(self.records[digest]), "status": "exact_duplicate"}
+        near = self.near_duplicates(phash, dhash, limit=5)
+        if near and self.dedupe_mode == "near":
+            self.stats["near_duplicates"] += 1
+            return {**near[0], "status": "near_duplicate"}
+
+        record = {
+            "id": digest,
+            "file": f"{digest[:16]}.png",
+            "phash": f"{phash:016x}",
+            "dhash": f"{dhash:016x}",
+            "width": image.width,
+            "height": image.height,
+            "size_bytes": len(image_bytes),
+            "label": label,
+            "prompt": prompt,
+            "created_at": time.time(),
+            **({"metadata": metadata} if metadata else {}),
+        }
+        path = self.path(record)
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as f:
+            f.write(image_bytes)
+        os.replace(temporary, path)
+        with self._lock:
+            self._add(record)
+            self._append([record])
+            self.stats["stored"] += 1
+        return {**record, "path": path, "status": "stored",
+                "near_duplicates": [{"id": m["id"], "path": m["path"], "phash_distance": m["phash_distance"]}
+                                    for m in near]}
+
+    def similar(self, image: Image.Image, max_distance: Optional[int] = None, limit: int = 5) -> List[dict]:
+        self.refresh()
+        phashes, dhashes = hash_images([image])
+        return self.near_duplicates(int(phashes[0]), int(dhashes[0]), max_distance, limit)
+
+    def by_prompt(self, prompt: str, width: int = 0, height: int = 0, limit: int = 5) -> List[dict]:
+        """Stored images made from the same prompt (and size, if given), newest first"""
+        self.refresh()
+        wanted = normalize_prompt(prompt)
+        matches = [record for record in self.records.values()
+                   if record.get("prompt") and os.path.exists(self.path(record)) and normalize_prompt(record["prompt"]) == wanted
+                   and (not width or record["width"] == width) and (not height or record["height"] == height)]
+        matches.sort(key=lambda record: -record["created_at"])
+        return [{**record, "path": self.path(record)} for record in matches[:limit]]
+
+    def scan(self) -> int:
+        """Index images in the directory that are not in the index yet, hashing in batches"""
+        self.refresh()
+        known = {record["file"] for record in self.records.values()}
+        names = sorted(name for name in os.listdir(self.root)
+                       if name.lower().endswith((".png", ".jpg", ".jpeg", ".webp")) and name not in known)
+        added = 0
+        for offset in range(0, len(names), HASH_BATCH):
+            batch = names[offset:offset + HASH_BATCH]
+            images, payloads = [], []
+            for name in batch:
+                with open(os.path.join(self.root, name), "rb") as f:
+                    data = f.read()
+                payloads.append(data)
+                images.append(Image.open(BytesIO(data)))
+            phashes, dhashes = hash_images(images)
+            records = []
+            for name, data, image, phash, dhash in zip(batch, payloads, images, phashes, dhashes):
+                digest = hashlib.sha256(data).hexdigest()
+                if digest in self.records:
+                    continue
+                records.append({
+                    "id": digest, "file": name, "phash": f"{int(phash):016x}", "dhash": f"{int(dhash):016x}",
+                    "width": image.width, "height": image.height, "size_bytes": len(data),
+                    "label": os.path.splitext(name)[0], "prompt": "",
+                    "created_at": os.path.getmtime(os.path.join(self.root, name)),
+                })
+            with self._lock:
+                for record in records:
+                    self._add(record)
+                self._append(records)
+            added += len(records)
+        return added
+
+    def duplicate_groups(self) -> List[List[dict]]:
+        """Near-duplicate groups, oldest image first in each"""
+        self.refresh()
+        seen, groups = set(), []
+        for record in sorted(self.records.values(), key=lambda r: r["created_at"]):
+            if record["id"] in seen:
+                continue
+            matches = [m for m in self.near_duplicates(int(record["phash"], 16), int(record["dhash"], 16))
+                       if m["id"] not in seen]
+            if len(matches) > 1:
+                group = sorted(matches, key=lambda r: r["created_at"])
+                groups.append(group)
+                seen.update(m["id"] for m in group)
+        return groups
+
+    def dedupe(self, apply: bool = False) -> dict:
+        """Keep the oldest image of each near-duplicate group; with apply, delete the rest"""
+        groups = self.duplicate_groups()
+        redundant = [record for group in groups for record in group[1:]]
+        freed = sum(record["size_bytes"] for record in redundant)
+        if apply and redundant:
+            with self._lock:
+                for record in redundant:
+                    if os.path.exists(self.path(record)):
+                        os.remove(self.path(record))
+                    del self.records[record["id"]]
+                self.index = HashIndex(self.phash_threshold)
+                for record in self.records.values():
+                    self.index.add(int(record["phash"], 16), record["id"])
+                temporary = f"{self.index_path}.tmp"
+                with open(temporary, "w", encoding="utf-8") as f:
+                    for record in self.records.values():
+                        f.write(json.dumps(record) + "\n")
+                os.replace(temporary, self.index_path)
+                self._offset = os.path.getsize(self.index_path)
+        return {
+            "groups": [[record["file"] for record in group] for group in groups],
+            "redundant_images": len(redundant),
+            "bytes": freed,
+            "applied": apply,
+        }
+
+    def get_stats(self) -> dict:
+        return {"images": len(self.records), "dedupe": self.dedupe_mode, **self.stats}
+
+
+_default_store: Optional[ImageStore] = None
+
+
+def default_store() -> ImageStore:
+    """Store under IMAGE_STORE_DIR, opened on first use"""
+    global _default_store
+    if _default_store is None:
+        _default_store = ImageStore()
+    return _default_store
+
+
+def _summaries(records: Iterable[dict]) -> List[dict]:
+    keys = ("id", "path", "prompt", "label", "width", "height", "phash_distance", "dhash_distance")
+    return [{key: record[key] for key in keys if key in record} for record in records]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Content-addressed image store maintenance")
+    parser.add_argument("command", choices=["scan", "dedupe", "similar"])
+    parser.add_argument("image", nargs="?", help="Image file for 'similar'")
+    parser.add_argument("--root", default=OUTPUT_DIR)
+    parser.add_argument("--apply", action="store_true", help="Delete redundant near-duplicates")
+    parser.add_argument("--max-distance", type=int, default=None, help="pHash radius for 'similar'")
+    args = parser.parse_args()
+
+    store = ImageStore(args.root)
+    if args.command == "scan":
+        start_time = time.time()
+        added = store.scan()
+        print(f"🗂️  Indexed {added} images in {time.time() - start_time:.2f}s ({len(store.records)} in store)")
+    elif args.command == "dedupe":
+        store.scan()
+        summary = store.dedupe(apply=args.apply)
+        for group in summary["groups"]:
+            print(f"   keep {group[0]}, {'removed' if args.apply else 'duplicates'}: {', '.join(group[1:])}")
+        print(f"🧹 {summary['redundant_images']} near-duplicates in {len(summary['groups'])} groups, "
+              f"{summary['bytes'] / 1e6:.1f} MB {'freed' if args.apply else 'reclaimable (use --apply)'}")
+    else:
+        if not args.image:
+            parser.error("'similar' needs an image path")
+        print(json.dumps(_summaries(store.similar(Image.open(args.image), args.max_distance, limit=10)), indent=2))
@@ -0,0 +1,192 @@
+"""Supervised pool of MCP server worker processes.
+
+Each worker is its own `mcp_server.py` child process (its own event loop and
+CPU) behind a transport. A supervisor task per worker starts it, pings it every
+`health_interval` seconds and, when it crashes or stops answering, fails the
+calls in flight on it, closes it and starts a new one after an exponential
+backoff with jitter. Tool calls go to the ready worker with the fewest calls in
+flight.
+
+The pool is itself an `MCPTransport`, so the app uses it like any other
+transport; `connected` is true only while at least one worker is ready.
+
+Workers share nothing in memory. Each has its own `generation_flight`, so
+identical concurrent tool calls that land on different workers are not
+coalesced in the MCP server (the Flux API, which all workers call, still
+coalesces them and replays idempotent responses), and `get_generation_history`
+returns only the history of the worker that answers it. The output store and
+the accounting ledger are on disk and shared.
+"""
+import asyncio
+import time
+from typing import Callable, List, Optional
+
+from src.resilience import RetryPolicy
+from src.transport import MCPTransport
+
+
+class WorkerUnavailable(ConnectionError):
+    pass
+
+
+class MCPWorker:
+    def __init__(self, index: int, factory: Callable[[], MCPTransport]):
+        self.index = index
+        self.factory = factory
+        self.transport: Optional[MCPTransport] = None
+        self.state = "starting"
+        self.in_flight = 0
+        self.restarts = 0
+        self.consecutive_failures = 0
+        self.last_error = ""
+        self.started_at = None
+        self.tools: List[dict] = []
+        self.pending = set()
+        self.task: Optional[asyncio.Task] = None
+
+    @property
+    def ready(self) -> bool:
+        return self.state == "ready"
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Optional[str]:
+        # Run the call as its own task so a crash can fail it instead of leaving it hanging
+        call = asyncio.ensure_future(self.transport.call_tool(tool_name, arguments))
+        self.pending.add(call)
+        self.in_flight += 1
+        try:
+            return await call
+        except asyncio.CancelledError:
+            if call.cancelled() and self.state != "ready":
+                raise WorkerUnavailable(f"MCP worker {self.index} crashed during {tool_name}: {self.last_error}")
+            raise
+        finally:
+            self.in_flight -= 1
+            self.pending.discard(call)
+
+    def fail_pending(self):
+        for call in list(self.pending):
+            call.cancel()
+
+    def get_stats(self) -> dict:
+        return {
+            "worker": self.index,
+            "state": self.state,
+            "in_flight": self.in_flight,
+            "restarts": self.restarts,
+            "uptime_seconds": round(time.time() - self.started_at, 1) if self.ready and self.started_at else 0.0,
+            "last_error": self.last_error,
+            **({"transport": self.transport.get_stats()} if self.transport else {}),
+        }
+
+
+class MCPWorkerPool(MCPTransport):
+    name = "pool"
+
+    def __init__(self, size: int, factory: Callable[[], MCPTransport], health_interval: float = 5.0,
+                 health_timeout: float = 5.0, backoff: Optional[RetryPolicy] = None, start_timeout: float = 60.0):
+        super().__init__()
+        self.workers = [MCPWorker(index, factory) for index in range(max(1, size))]
+        self.health_interval = health_interval
+        self.health_timeout = health_timeout
+        self.backoff = backoff or RetryPolicy(base_delay=0.5, max_delay=30.0)
+        self.start_timeout = start_timeout
+        self.stopping = False
+        self._ready = None
+
+    @property
+    def connected(self) -> bool:
+        return not self.stopping and any(worker.ready for worker in self.workers)
+
+    async def start(self) -> List[dict]:
+        self._ready = asyncio.Event()
+        for worker in self.workers:
+            worker.task = asyncio.ensure_future(self._supervise(worker))
+        try:
+            await asyncio.wait_for(self._ready.wait(), self.start_timeout)
+        except asyncio.TimeoutError:
+            errors = {worker.index: worker.last_error for worker in self.workers}
+            await self.close()
+            raise WorkerUnavailable(f"No MCP worker started within {self.start_timeout:.0f}s: {errors}")
+        return next(worker.tools for worker in self.workers if worker.ready)
+
+    async def _supervise(self, worker: MCPWorker):
+        while not self.stopping:
+            transport = worker.factory()
+            try:
+                worker.state = "starting"
+                worker.tools = await transport.start()
+                worker.transport = transport
+                worker.state = "ready"
+                worker.started_at = time.time()
+                worker.consecutive_failures = 0
+                self._ready.set()
+                print(f"🟢 MCP worker {worker.index} ready ({transport.name})")
+                await self._watch(worker, transport)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                worker.last_error = f"{type(e).__name__}: {e}"
+            finally:
+                if worker.state == "ready" and not self.stopping:
+                    print(f"🔴 MCP worker {worker.index} failed: {worker.last_error}")
+                worker.state = "stopped" if self.stopping else "restarting"
+                worker.fail_pending()
+                worker.transport = None
+                try:
+                    # In this task: the session's cancel scopes were entered here
+                    await transport.close()
+                except Exception:
+                    pass
+            if self.stopping:
+                return
+            delay = self.backoff.backoff(worker.consecutive_failures)
+            worker.consecutive_failures += 1
+            worker.restarts += 1
+            print(f"🔁 Restarting MCP worker {worker.index} in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _watch(self, worker: MCPWorker, transport: MCPTransport):
+        """Return once the worker stops answering pings"""
+        while not self.stopping:
+            await asyncio.sleep(self.health_interval)
+            try:
+                await asyncio.wait_for(transport.ping(), self.health_timeout)
+            except Exception as e:
+                worker.last_error = f"health check failed: {type(e).__name__}: {e}"
+                return
+
+    def pick(self) -> Optional[MCPWorker]:
+        ready = [worker for worker in self.workers if worker.ready]
+        return min(ready, key=lambda worker: worker.in_flight) if ready else None
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Optional[str]:
+        worker = self.pick()
+        if worker is None:
+            self.stats["errors"] += 1
+            raise WorkerUnavailable("No MCP worker is available, restarting")
+        try:
+            result = await worker.call_tool(tool_name, arguments)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        self.stats["calls"] += 1
+        return result
+
+    async def ping(self):
+        if not self.connected:
+            raise WorkerUnavailable("No MCP worker is available")
+
+    async def close(self):
+        self.stopping = True
+        tasks = [worker.task for worker in self.workers if worker.task is not None]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def get_stats(self) -> dict:
+        return {
+            "transport": self.name,
+            **self.stats,
+            "ready_workers": sum(worker.ready for worker in self.workers),
+            "workers": [worker.get_stats() for worker in self.workers],
+        }
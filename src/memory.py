@@ -0,0 +1,214 @@
+"""Pre-flight GPU memory planning for Flux generations.
+
+Peak memory of a Flux request is the resident weights plus the larger of two
+phases: the transformer's denoising activations (dominated by attention over
+image + text tokens) and the VAE decode at full output resolution. Tall and
+wide presets such as instagram_story (1080x1920) roughly double both.
+
+`plan_memory` estimates both phases and picks:
+    vae_tiling          decode in tiles when the full-resolution decode is large
+    attention_slicing   compute attention a few heads at a time when the
+                        materialized attention scores would be large
+    action              "run"   fits now
+                        "queue" fits on an idle GPU, but not in the memory free right now;
+                                the engine raises `MemoryBusy` instead of waiting and the
+                                API retries the job without holding the GPU worker
+                        "split" does not fit even tiled and sliced: render at the
+                                largest size that fits, then upscale the image
+
+The constants are rough upper bounds for FLUX.1-dev in bfloat16 and err on
+the high side; peak memory measured per request is reported next to the
+estimate so they can be recalibrated.
+
+Configuration:
+    GPU_MEMORY_GB=141              (H200)
+    MEMORY_HEADROOM_GB=8           kept free for the allocator and fragmentation
+    VAE_TILING_ABOVE_GB=6          decode estimate above which tiling is used
+    ATTENTION_SLICING_ABOVE_GB=8   attention score estimate above which slicing is used
+
+    python -m src.memory 1080x1920 2048x2048
+
+A preempted job resumes from latents of its original render size, so
+`plan_resume` keeps that size and only re-plans tiling and slicing.
+"""
+import argparse
+import math
+import os
+from typing import Optional
+
+GB = 1024 ** 3
+
+# FLUX.1-dev bf16: transformer 23.8 GB, T5-XXL 9.5 GB, CLIP and VAE ~0.4 GB
+FLUX_WEIGHTS_BYTES = int(33.7 * GB)
+
+HIDDEN_SIZE = 3072
+ATTENTION_HEADS = 24
+BYTES_PER_VALUE = 2  # bfloat16
+# Live activations per token per block (QKV, MLP x4, residual, norms)
+ACTIVATION_FACTOR = 12
+# Pixels are decoded 8x up from the latent; peak decode memory per output pixel
+VAE_BYTES_PER_PIXEL = 4096
+VAE_TILE_PIXELS = 512 * 512
+# Heads computed at once when attention slicing is on
+ATTENTION_SLICE_HEADS = 2
+
+
+def _gb_env(name: str, default: float) -> int:
+    return int(float(os.environ.get(name, default)) * GB)
+
+
+GPU_MEMORY_BYTES = _gb_env("GPU_MEMORY_GB", 141)
+MEMORY_HEADROOM_BYTES = _gb_env("MEMORY_HEADROOM_GB", 8)
+VAE_TILING_ABOVE_BYTES = _gb_env("VAE_TILING_ABOVE_GB", 6)
+ATTENTION_SLICING_ABOVE_BYTES = _gb_env("ATTENTION_SLICING_ABOVE_GB", 8)
+
+
+def image_tokens(width: int, height: int) -> int:
+    """Transformer sequence length of the image: 8x VAE downsampling, then 2x2 patches"""
+    return (height // 16) * (width // 16)
+
+
+def transformer_bytes(width: int, height: int, max_sequence_length: int, attention_slicing: bool) -> int:
+    tokens = image_tokens(width, height) + max_sequence_length
+    activations = tokens * HIDDEN_SIZE * BYTES_PER_VALUE * ACTIVATION_FACTOR
+    heads = ATTENTION_SLICE_HEADS if attention_slicing else ATTENTION_HEADS
+    return activations + attention_score_bytes(tokens, heads)
+
+
+def attention_score_bytes(tokens: int, heads: int = ATTENTION_HEADS) -> int:
+    """Scores materialized when attention falls back from fused kernels"""
+    return heads * tokens * tokens * BYTES_PER_VALUE
+
+
+def vae_decode_bytes(width: int, height: int, tiling: bool) -> int:
+    pixels = min(width * height, VAE_TILE_PIXELS) if tiling else width * height
+    return pixels * VAE_BYTES_PER_PIXEL
+
+
+class MemoryPlan:
+    def __init__(self, action: str, width: int, height: int, render_width: int, render_height: int,
+                 vae_tiling: bool, attention_slicing: bool, activation_bytes: int, capacity_bytes: int,
+                 free_bytes: Optional[int], reason: str):
+        self.action = action
+        self.width = width
+        self.height = height
+        self.render_width = render_width
+        self.render_height = render_height
+        self.vae_tiling = vae_tiling
+        self.attention_slicing = attention_slicing
+        self.activation_bytes = activation_bytes
+        self.capacity_bytes = capacity_bytes
+        self.free_bytes = free_bytes
+        self.reason = reason
+
+    def to_dict(self) -> dict:
+        return {
+            "action": self.action,
+            "render_size": f"{self.render_width}x{self.render_height}",
+            "vae_tiling": self.vae_tiling,
+            "attention_slicing": self.attention_slicing,
+            "estimated_activation_bytes": self.activation_bytes,
+            "capacity_bytes": self.capacity_bytes,
+            "free_bytes": self.free_bytes,
+            "reason": self.reason,
+        }
+
+
+class MemoryBusy(Exception):
+    """A request fits on an idle GPU but not in the memory free right now"""
+
+    def __init__(self, reason: str):
+        # args stay (reason,) so the exception pickles back from a Modal container
+        super().__init__(reason)
+        self.reason = reason
+
+    def __str__(self):
+        return f"GPU memory busy: {self.reason}"
+
+
+def _activation_plan(width: int, height: int, max_sequence_length: int, capacity_bytes: int):
+    """Cheapest settings for one size: tiling and slicing only where they pay off or are needed"""
+    tokens = image_tokens(width, height) + max_sequence_length
+    vae_tiling = vae_decode_bytes(width, height, False) > VAE_TILING_ABOVE_BYTES
+    attention_slicing = attention_score_bytes(tokens) > ATTENTION_SLICING_ABOVE_BYTES
+
+    def peak(tiling: bool, slicing: bool) -> int:
+        return max(transformer_bytes(width, height, max_sequence_length, slicing),
+                   vae_decode_bytes(width, height, tiling))
+
+    # Turn on whatever is still needed to fit, cheapest first
+    if peak(vae_tiling, attention_slicing) > capacity_bytes:
+        vae_tiling = True
+    if peak(vae_tiling, attention_slicing) > capacity_bytes:
+        attention_slicing = True
+    return vae_tiling, attention_slicing, peak(vae_tiling, attention_slicing)
+
+
+def plan_memory(width: int, height: int, max_sequence_length: int = 512,
+                capacity_bytes: Optional[int] = None, free_bytes: Optional[int] = None) -> MemoryPlan:
+    """Decide how to run a request.
+
+    `capacity_bytes` is the memory available for activations on an idle GPU
+    (total minus weights minus headroom); `free_bytes` is what is free right
+    now, if known.
+    """
+    if capacity_bytes is None:
+        capacity_bytes = GPU_MEMORY_BYTES - FLUX_WEIGHTS_BYTES - MEMORY_HEADROOM_BYTES
+    if capacity_bytes <= 0:
+        raise ValueError("No GPU memory left for activations after the model weights and headroom")
+    vae_tiling, attention_slicing, needed = _activation_plan(width, height, max_sequence_length, capacity_bytes)
+
+    if needed <= capacity_bytes:
+        if free_bytes is not None and needed > free_bytes:
+            action, reason = "queue", f"needs {needed / GB:.1f} GB, {free_bytes / GB:.1f} GB free"
+        else:
+            action, reason = "run", f"needs {needed / GB:.1f} GB of {capacity_bytes / GB:.1f} GB"
+        return MemoryPlan(action, width, height, width, height, vae_tiling, attention_slicing, needed,
+                          capacity_bytes, free_bytes, reason)
+
+    # Shrink both sides by the same factor, in steps of 16 pixels, until it fits
+    scale = math.sqrt(capacity_bytes / needed)
+    while True:
+        render_width = max(256, int(width * scale) // 16 * 16)
+        render_height = max(256, int(height * scale) // 16 * 16)
+        vae_tiling, attention_slicing, render_needed = _activation_plan(
+            render_width, render_height, max_sequence_length, capacity_bytes)
+        if render_needed <= capacity_bytes or (render_width, render_height) == (256, 256):
+            break
+        scale *= 0.9
+    return MemoryPlan("split", width, height, render_width, render_height, vae_tiling, attention_slicing,
+                      render_needed, capacity_bytes, free_bytes,
+                      f"needs {needed / GB:.1f} GB of {capacity_bytes / GB:.1f} GB even tiled and sliced")
+
+
+def plan_resume(width: int, height: int, render_width: int, render_height: int, max_sequence_length: int = 512,
+                capacity_bytes: Optional[int] = None, free_bytes: Optional[int] = None) -> MemoryPlan:
+    """Plan for resuming a preempted job whose latents were rendered at render_width x render_height.
+
+    The latents fix the render size: if it no longer fits (a smaller capacity
+    than the first run's), it still renders at that size, tiled and sliced.
+    """
+    plan = plan_memory(render_width, render_height, max_sequence_length, capacity_bytes, free_bytes)
+    if plan.action == "split":
+        plan.action, plan.vae_tiling, plan.attention_slicing = "run", True, True
+        plan.reason = f"resuming at {render_width}x{render_height}: {plan.reason}"
+    plan.width, plan.height = width, height
+    plan.render_width, plan.render_height = render_width, render_height
+    return plan
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Estimate Flux memory and the execution plan per size")
+    parser.add_argument("sizes", nargs="*", default=["1024x1024", "1080x1920", "2048x2048", "4096x4096"])
+    parser.add_argument("--max-sequence-length", type=int, default=512)
+    parser.add_argument("--gpu-gb", type=float, default=None, help="Override GPU_MEMORY_GB")
+    args = parser.parse_args()
+
+    capacity = None
+    if args.gpu_gb is not None:
+        capacity = int(args.gpu_gb * GB) - FLUX_WEIGHTS_BYTES - MEMORY_HEADROOM_BYTES
+    for size in args.sizes:
+        width, _, height = size.partition("x")
+        plan = plan_memory(int(width), int(height), args.max_sequence_length, capacity)
+        print(f"{size:>10}  {plan.action:<5}  render {plan.render_width}x{plan.render_height}  "
+              f"tiling={plan.vae_tiling}  slicing={plan.attention_slicing}  {plan.reason}")
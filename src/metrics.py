@@ -0,0 +1,201 @@
+"""Minimal Prometheus-style metrics (counters, gauges, histograms).
+
+Renders the Prometheus text exposition format without requiring the
+prometheus_client package, so the same registry works inside the Modal image,
+the MCP server and local benchmarks.
+"""
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Dict, Iterable, Optional, Tuple
+
+LATENCY_BUCKETS = (0.5, 1, 2.5, 5, 10, 15, 20, 30, 45, 60, 90, 120, 180, 300)
+FAST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+
+
+def _label_key(labelnames: Tuple[str, ...], labels: dict) -> Tuple[str, ...]:
+    return tuple(str(labels.get(name, "")) for name in labelnames)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labelnames: Tuple[str, ...], values: Tuple[str, ...], extra: Optional[dict] = None) -> str:
+    pairs = list(zip(labelnames, values)) + list((extra or {}).items())
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+class Metric:
+    type_name = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+
+    def header(self) -> str:
+        return f"# HELP {self.name} {self.documentation}\n# TYPE {self.name} {self.type_name}\n"
+
+
+class Counter(Metric):
+    type_name = "counter"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(self.labelnames, labels), 0.0)
+
+    def render(self) -> str:
+        lines = [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in self.values.items()]
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Gauge(Metric):
+    type_name = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self.values[_label_key(self.labelnames, labels)] = float(value)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            self.values[key] = self.values.get(key, 0.0) + amount
+
+    def dec(self, amount: float = 1.0, **labels):
+        self.inc(-amount, **labels)
+
+    def get(self, **labels) -> float:
+        return self.values.get(_label_key(self.labelnames, labels), 0.0)
+
+    @contextmanager
+    def track_inprogress(self, **labels):
+        self.inc(**labels)
+        try:
+            yield
+        finally:
+            self.dec(**labels)
+
+    def render(self) -> str:
+        lines = [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(v)}" for key, v in self.values.items()]
+        return self.header() + "".join(line + "\n" for line in lines)
+
+
+class Histogram(Metric):
+    type_name = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+        self.series: Dict[Tuple[str, ...], dict] = {}
+
+    def observe(self, value: float, **labels):
+        key = _label_key(self.labelnames, labels)
+        with self._lock:
+            series = self.series.setdefault(key, {"counts": [0] * len(self.buckets), "sum": 0.0, "count": 0})
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series["counts"][i] += 1
+            series["sum"] += value
+            series["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start_time = time.time()
+        try:
+            yield
+        finally:
+            self.observe(time.time() - start_time, **labels)
+
+    def render(self) -> str:
+        lines = []
+        for key, series in self.series.items():
+            for bound, count in zip(self.buckets, series["counts"]):
+                labels = _format_labels(self.labelnames, key, {"le": _format_value(bound)})
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(series['sum'])}")
+            lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {series['count']}")
+        return self.header() + "".join(line + "\n" for line in lines)
+
+    def summary(self) -> dict:
+        """Count and mean per label set, for JSON consumers"""
+        return {
+            ",".join(key) or "all": {
+                "count": series["count"],
+                "mean": round(series["sum"] / series["count"], 4) if series["count"] else None,
+            }
+            for key, series in self.series.items()
+        }
+
+
+class RateWindow:
+    """Events per second over a sliding window"""
+
+    def __init__(self, window_seconds: float = 60.0):
+        self.window_seconds = window_seconds
+        self.events = deque()
+
+    def add(self, count: int = 1, timestamp: Optional[float] = None):
+        self.events.append((time.time() if timestamp is None else timestamp, count))
+
+    def rate(self) -> float:
+        cutoff = time.time() - self.window_seconds
+        while self.events and self.events[0][0] < cutoff:
+            self.events.popleft()
+        return sum(count for _, count in self.events) / self.window_seconds
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics: Dict[str, Metric] = {}
+        self.collectors = []
+
+    def _register(self, metric: Metric) -> Metric:
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (), buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def add_collector(self, collector):
+        """Register a callable run before every render, e.g. to refresh gauges"""
+        self.collectors.append(collector)
+
+    def render(self) -> str:
+        for collector in self.collectors:
+            try:
+                collector()
+            except Exception as e:
+                print(f"Metrics collector failed: {str(e)}")
+        return "".join(metric.render() for metric in self.metrics.values())
+
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
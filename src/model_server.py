@@ -1,14 +1,20 @@
-import time
-from io import BytesIO
+"""Modal deployment of the Flux server: a thin adapter over `src/engine.py` and `src/api.py`.
+
+The GPU classes load a `FluxEngine` in `@modal.enter()` and expose its methods;
+`ModalEngineClient` is the engine client the FastAPI app (`src/api.py`) calls.
+The warm pool controller runs once, as the scheduled `prewarm_tick`, on the
+traffic every API replica publishes. To run the same app without Modal, see
+`src/serve.py`.
+"""
+import asyncio
+from typing import Optional
+
 import modal
-from huggingface_hub import login
-from fastapi import FastAPI, HTTPException
-from pydantic import BaseModel
-import base64
-import sys
-import requests
-import os
-from safetensors.torch import load_file
+
+from src.api import serve
+from src.engine import FluxEngine
+from src.prewarm import PREWARM_INTERVAL_SECONDS, controller_from_env
+from src.routing import PREVIEW_MAX_SIDE
 
 # Modal setup (same as your original)
 cuda_version = "12.4.0"
@@ -55,25 +61,21 @@ flux_image = flux_image.env(
     }
 )
 
-app = modal.App("flux-api-server", image=flux_image, secrets=[modal.Secret.from_name("huggingface-token")])
+# Ship the shared `src` package (coalescing, etc.) into the container.
+# Deploy from the repository root with: modal deploy -m src.model_server
+flux_image = flux_image.add_local_python_source("src")
 
-with flux_image.imports():
-    import torch
-    from diffusers import FluxPipeline
+app = modal.App("flux-api-server", image=flux_image, secrets=[modal.Secret.from_name("huggingface-token")])
 
 MINUTES = 60  # seconds
-VARIANT = "dev"
-NUM_INFERENCE_STEPS = 50
 
-class ImageRequest(BaseModel):
-    prompt: str
-    num_inference_steps: int = 50
-    width: int = 1024  # Add width parameter
-    height: int = 1024  # Add height parameter
+# Preempted jobs are flagged here by the API; the GPU checks every few steps
+preempt_flags = modal.Dict.from_name("flux-preempt-flags", create_if_missing=True)
+
+# API replicas publish the traffic they saw; the controller keeps its state
+prewarm_events = modal.Queue.from_name("flux-prewarm-events", create_if_missing=True)
+prewarm_state = modal.Dict.from_name("flux-prewarm-state", create_if_missing=True)
 
-class ImageResponse(BaseModel):
-    image_base64: str
-    generation_time: float
 
 @app.cls(
     gpu="H200",
@@ -91,194 +93,142 @@ class ImageResponse(BaseModel):
 class Model:
     compile: bool = modal.parameter(default=False)
 
-    lora_loaded = False
-    lora_path = "/cache/flux.1_lora_flyway_doodle-poster.safetensors"
-    lora_url = "https://huggingface.co/RajputVansh/SG161222-DISTILLED-IITI-VANSH-RUHELA/resolve/main/flux.1_lora_flyway_doodle-poster.safetensors?download=true"
-
-    def download_lora_from_url(self, url, save_path):
-        """Download LoRA with proper error handling"""
-        try:
-            print(f"📥 Downloading LoRA from {url}")
-            response = requests.get(url, timeout=300)  # 5 minute timeout
-            response.raise_for_status()  # Raise exception for bad status codes
-            
-            with open(save_path, "wb") as f:
-                f.write(response.content)
-            
-            print(f"✅ LoRA downloaded successfully to {save_path}")
-            print(f"📊 File size: {len(response.content)} bytes")
-            return True
-        except Exception as e:
-            print(f"❌ LoRA download failed: {str(e)}")
-            return False
-
-    def verify_lora_file(self, lora_path):
-        """Verify that the LoRA file is valid"""
-        try:
-            if not os.path.exists(lora_path):
-                return False, "File does not exist"
-            
-            file_size = os.path.getsize(lora_path)
-            if file_size == 0:
-                return False, "File is empty"
-            
-            # Try to load the file to verify it's valid
-            try:
-                load_file(lora_path)
-                return True, f"Valid LoRA file ({file_size} bytes)"
-            except Exception as e:
-                return False, f"Invalid LoRA file: {str(e)}"
-                
-        except Exception as e:
-            return False, f"Error verifying file: {str(e)}"
-
     @modal.enter()
     def enter(self):
-        from huggingface_hub import login
-        import os
-
-        # Login to HuggingFace
-        token = os.environ["huggingface_token"]
-        login(token)
-
-        # Download and verify LoRA
-        if not os.path.exists(self.lora_path):
-            print("📥 LoRA not found, downloading...")
-            download_success = self.download_lora_from_url(self.lora_url, self.lora_path)
-            if not download_success:
-                print("❌ Failed to download LoRA, continuing without it")
-                self.lora_loaded = False
-        else:
-            print("📁 LoRA file found in cache")
-
-        # Verify LoRA file
-        is_valid, message = self.verify_lora_file(self.lora_path)
-        print(f"🔍 LoRA verification: {message}")
-
-        # Load the base model
-        from diffusers import FluxPipeline
-        import torch
-
-        print("🚀 Loading Flux model...")
-        pipe = FluxPipeline.from_pretrained(
-            "black-forest-labs/FLUX.1-dev",
-            torch_dtype=torch.bfloat16
-        ).to("cuda")
-
-        # Load LoRA if available and valid
-        if is_valid:
-            try:
-                print(f"🔄 Loading LoRA from {self.lora_path}")
-                pipe.load_lora_weights(self.lora_path)
-                print("✅ LoRA successfully loaded!")
-                self.lora_loaded = True
-                
-                # Test LoRA by checking if it affects the model
-                print("🧪 Testing LoRA integration...")
-                # You could add a simple test generation here if needed
-                
-            except Exception as e:
-                print(f"❌ LoRA loading failed: {str(e)}")
-                self.lora_loaded = False
-        else:
-            print("⚠️ LoRA not loaded due to verification failure")
-            self.lora_loaded = False
-
-        # Optimize the pipeline
-        self.pipe = optimize(pipe, compile=self.compile)
-        
-        print(f"🎯 Model ready! LoRA status: {'✅ Loaded' if self.lora_loaded else '❌ Not loaded'}")
-
+        self.engine = FluxEngine.from_backend("flux", compile=self.compile, preempt_flags=preempt_flags)
 
     @modal.method()
     def get_model_status(self) -> dict:
         """Get detailed model and LoRA status"""
-        lora_file_info = {}
-        if os.path.exists(self.lora_path):
-            try:
-                file_size = os.path.getsize(self.lora_path)
-                lora_file_info = {
-                    "exists": True,
-                    "size_bytes": file_size,
-                    "size_mb": round(file_size / (1024 * 1024), 2)
-                }
-            except:
-                lora_file_info = {"exists": False}
-        else:
-            lora_file_info = {"exists": False}
-
-        return {
-            "status": "ready",
-            "lora_loaded": self.lora_loaded,
-            "lora_path": self.lora_path,
-            "model_info": {
-                "base_model": "black-forest-labs/FLUX.1-dev",
-                "lora_file": lora_file_info,
-                "lora_url": self.lora_url
-            }
-        }
+        return self.engine.get_model_status()
+
+    @modal.method()
+    def warmup(self) -> dict:
+        """Cheap ping that makes Modal start a container and load the model"""
+        return self.engine.warmup()
+
+    @modal.method()
+    def inference(self, prompt: str, num_inference_steps: int = 50, width: int = 1024, height: int = 1024,
+                  traceparent: str = "", enqueued_at: Optional[float] = None, clip_prompt: str = "",
+                  preempt_key: str = "", resume_latents: bytes = b"", resume_step: int = 0,
+                  resume_size: Optional[list] = None) -> dict:
+        return self.engine.inference(prompt, num_inference_steps, width, height, traceparent, enqueued_at,
+                                     clip_prompt, preempt_key, resume_latents, resume_step, resume_size)
+
+    @modal.method()
+    def edit(self, mode: str, prompt: str, image_bytes: bytes, strength: float = 0.35,
+             num_inference_steps: int = 50, mask_bytes: bytes = b"", traceparent: str = "",
+             enqueued_at: Optional[float] = None, clip_prompt: str = "") -> dict:
+        return self.engine.edit(mode, prompt, image_bytes, strength, num_inference_steps, mask_bytes, traceparent,
+                                enqueued_at, clip_prompt)
+
+    @modal.method()
+    def variations(self, prompt: str, variation_prompts: list, shared_steps: int, num_inference_steps: int = 50,
+                   width: int = 1024, height: int = 1024, traceparent: str = "", enqueued_at: Optional[float] = None,
+                   clip_prompt: str = "", variation_clip_prompts: Optional[list] = None) -> dict:
+        return self.engine.variations(prompt, variation_prompts, shared_steps, num_inference_steps, width, height,
+                                      traceparent, enqueued_at, clip_prompt, variation_clip_prompts)
+
+
+@app.cls(
+    gpu="H100",
+    scaledown_window=10 * MINUTES,
+    timeout=10 * MINUTES,
+    volumes={"/cache": modal.Volume.from_name("hf-hub-cache", create_if_missing=True)},
+)
+class PreviewModel:
+    """Cheap draft tier: timestep-distilled schnell, 1-4 steps, no guidance"""
+
+    @modal.enter()
+    def enter(self):
+        self.engine = FluxEngine.from_backend("schnell")
 
     @modal.method()
-    def inference(self, prompt: str, num_inference_steps: int = 50, width: int = 1024, height: int = 1024) -> dict:
-        # Clean and prepare the prompt
-        final_prompt = prompt
-        
-        print(f"🎨 Generating image:")
-        print(f"   Original prompt: {prompt}")
-        print(f"   Final prompt: {final_prompt}")
-        print(f"   Dimensions: {width}x{height}")
-        print(f"   LoRA status: {'✅ Active' if self.lora_loaded else '❌ Inactive'}")
-        
-        start_time = time.time()
-        
-        out = self.pipe(
-            final_prompt,
-            output_type="pil",
-            num_inference_steps=num_inference_steps,
-            width=width,
-            height=height,
-            max_sequence_length=512
-        ).images[0]
-
-        # Convert to base64
-        byte_stream = BytesIO()
-        out.save(byte_stream, format="PNG")
-        image_bytes = byte_stream.getvalue()
-        image_base64 = base64.b64encode(image_bytes).decode('utf-8')
-        
-        generation_time = time.time() - start_time
-        print(f"✅ Generated image in {generation_time:.2f} seconds")
-        
-        return {
-            "image_base64": image_base64,
-            "generation_time": generation_time,
-            "final_prompt": final_prompt,
-            "lora_used": self.lora_loaded
-        }
-# FastAPI server
-fastapi_app = FastAPI(title="Flux Image Generation API")
+    def inference(self, prompt: str, num_inference_steps: int = 4, width: int = PREVIEW_MAX_SIDE,
+                  height: int = PREVIEW_MAX_SIDE, traceparent: str = "", enqueued_at: Optional[float] = None,
+                  clip_prompt: str = "") -> dict:
+        return self.engine.preview(prompt, num_inference_steps, width, height, traceparent, enqueued_at, clip_prompt)
+
 
 # Initialize model instance
 model_instance = Model(compile=False)
+preview_instance = PreviewModel()
+
+
+class ModalEngineClient:
+    """Engine client for the FastAPI app: the GPU classes above, and Modal's autoscaler as the warm pool"""
+
+    def __init__(self):
+        # Preemption flag writes still in flight, by job key
+        self.flag_puts = {}
+
+    async def inference(self, *args):
+        return await model_instance.inference.remote.aio(*args)
+
+    async def preview(self, *args):
+        # Previews run on their own GPU pool and never queue behind full renders
+        return await preview_instance.inference.remote.aio(*args)
+
+    async def edit(self, *args):
+        return await model_instance.edit.remote.aio(*args)
+
+    async def variations(self, *args):
+        return await model_instance.variations.remote.aio(*args)
+
+    def request_preemption(self, key: str):
+        put = asyncio.ensure_future(preempt_flags.put.aio(key, True))
+        self.flag_puts[key] = put
+        put.add_done_callback(lambda task, key=key: self._flag_put_done(key, task))
+
+    def _flag_put_done(self, key: str, task: asyncio.Future):
+        if self.flag_puts.get(key) is task:
+            del self.flag_puts[key]
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Could not flag {key} for preemption: {str(task.exception())}")
+
+    async def clear_preemption(self, key: str):
+        # Let a pending put land first, or it would set the flag again afterwards
+        put = self.flag_puts.get(key)
+        if put is not None:
+            await asyncio.wait([put])
+        try:
+            await preempt_flags.pop.aio(key)
+        except KeyError:
+            pass
 
-@fastapi_app.post("/generate", response_model=ImageResponse)
-async def generate_image(request: ImageRequest):
-    try:
-        print(f"Received request: {request.prompt} at {request.width}x{request.height}")
-        result = model_instance.inference.remote(
-            request.prompt, 
-            request.num_inference_steps,
-            request.width,
-            request.height
+    async def queue_stats(self):
+        stats = await model_instance.inference.get_current_stats.aio()
+        return stats.backlog, stats.num_total_runners
+
+    async def set_warm(self, count: int):
+        await model_instance.update_autoscaler.aio(min_containers=count)
+
+    async def warmup(self, count: int):
+        await asyncio.gather(
+            *[model_instance.warmup.remote.aio() for _ in range(count)],
+            return_exceptions=True
         )
-        return ImageResponse(**result)
-    except Exception as e:
-        print(f"Error generating image: {str(e)}")
-        raise HTTPException(status_code=500, detail=str(e))
 
-@fastapi_app.get("/health")
-async def health_check():
-    return {"status": "healthy", "message": "Flux API server is running"}
+    async def publish_traffic(self, batch: dict):
+        await prewarm_events.put.aio(batch)
+
+    async def prewarm_status(self) -> dict:
+        status = await prewarm_state.get.aio("status")
+        return status or {"current_warm": None, "message": "The warm pool controller has not run yet"}
+
+
+# One container, one run at a time: the only controller of the warm pool
+@app.function(schedule=modal.Period(seconds=PREWARM_INTERVAL_SECONDS), max_containers=1, timeout=10 * MINUTES)
+async def prewarm_tick():
+    """Merge every API replica's traffic into the persisted history and apply the warm count"""
+    controller = controller_from_env(ModalEngineClient(), await prewarm_state.get.aio("state"))
+    controller.apply_traffic(await prewarm_events.get_many.aio(1000, block=False))
+    await controller.tick()
+    await prewarm_state.put.aio("state", controller.to_state())
+    await prewarm_state.put.aio("status", controller.get_status())
+
+
+fastapi_app = serve(ModalEngineClient())
 
 @app.function(
     image=flux_image.pip_install("fastapi", "uvicorn"),
@@ -289,45 +239,5 @@ async def health_check():
 def fastapi_server():
     return fastapi_app
 
-def optimize(pipe, compile=True):
-    # fuse QKV projections in Transformer and VAE
-    pipe.transformer.fuse_qkv_projections()
-    pipe.vae.fuse_qkv_projections()
-
-    # switch memory layout to Torch's preferred, channels_last
-    pipe.transformer.to(memory_format=torch.channels_last)
-    pipe.vae.to(memory_format=torch.channels_last)
-
-    if not compile:
-        return pipe
-
-    # set torch compile flags
-    config = torch._inductor.config
-    config.disable_progress = False
-    config.conv_1x1_as_mm = True
-    config.coordinate_descent_tuning = True
-    config.coordinate_descent_check_all_directions = True
-    config.epilogue_fusion = False
-
-    # compile the compute-intensive modules
-    pipe.transformer = torch.compile(
-        pipe.transformer, mode="max-autotune", fullgraph=True
-    )
-    pipe.vae.decode = torch.compile(
-        pipe.vae.decode, mode="max-autotune", fullgraph=True
-    )
-
-    # trigger torch compilation
-    print("🔦 Running torch compilation (may take up to 20 minutes)...")
-    pipe(
-        "dummy prompt to trigger torch compilation",
-        output_type="pil",
-        num_inference_steps=NUM_INFERENCE_STEPS,
-    ).images[0]
-    print("🔦 Finished torch compilation")
-
-    return pipe
-
 if __name__ == "__main__":
     print("Starting Modal Flux API server...")
-    # This will be handled by Modal's deployment
\ No newline at end of file
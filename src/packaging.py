@@ -0,0 +1,204 @@
+"""Streaming ZIP packaging of generated assets.
+
+Images are copied into the archive in fixed-size chunks straight from disk
+(or decoded chunk by chunk from base64), so memory use does not grow with
+the number or size of images. Already-compressed formats are stored,
+everything else is deflated. A `manifest.json` with prompts, metadata, sizes
+and SHA-256 digests is written as the last member.
+
+Member names are sanitized and may not climb out of the archive (`..` or
+absolute paths), and files are only read from under the given source roots.
+"""
+import base64
+import hashlib
+import json
+import os
+import re
+import tempfile
+import time
+import uuid
+import zipfile
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+CHUNK_SIZE = 1 << 20
+# Base64 decodes cleanly on 4-character boundaries
+B64_CHUNK_SIZE = (CHUNK_SIZE // 3) * 4
+
+# Formats that are already compressed gain nothing from deflate
+STORED_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".avif", ".zip", ".mp4"}
+IMAGE_EXTENSIONS = {".png", ".jpg", ".jpeg", ".webp", ".gif", ".avif"}
+
+PACKAGES_DIR = os.path.join("AI-Marketing-Content-Creator", "packages")
+
+
+def compression_for(filename: str) -> int:
+    extension = os.path.splitext(filename)[1].lower()
+    return zipfile.ZIP_STORED if extension in STORED_EXTENSIONS else zipfile.ZIP_DEFLATED
+
+
+def safe_name(name: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", name).strip("._") or "package"
+
+
+def member_name(filename: str) -> str:
+    """Archive member name: sanitized relative path segments, never `..` or absolute"""
+    normalized = filename.replace("\\", "/")
+    if normalized.startswith("/") or re.match(r"^[A-Za-z]:", normalized):
+        raise ValueError(f"Absolute member name not allowed: {filename}")
+    segments = [segment for segment in normalized.split("/") if segment not in ("", ".")]
+    if not segments or ".." in segments:
+        raise ValueError(f"Invalid member name: {filename}")
+    return "/".join(safe_name(segment) for segment in segments)
+
+
+def within_roots(path: str, roots: Sequence[str]) -> bool:
+    """Whether `path` resolves (symlinks included) to somewhere under one of `roots`"""
+    real = os.path.realpath(path)
+    for root in roots:
+        root = os.path.realpath(root)
+        try:
+            if os.path.commonpath([real, root]) == root:
+                return True
+        except ValueError:
+            # Different drives on Windows
+            continue
+    return False
+
+
+def _file_chunks(path: str) -> Iterator[bytes]:
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(CHUNK_SIZE)
+            if not chunk:
+                return
+            yield chunk
+
+
+def _base64_chunks(image_b64: str) -> Iterator[bytes]:
+    image_b64 = image_b64.strip()
+    image_b64 += "=" * (-len(image_b64) % 4)
+    for offset in range(0, len(image_b64), B64_CHUNK_SIZE):
+        yield base64.b64decode(image_b64[offset:offset + B64_CHUNK_SIZE])
+
+
+def entries_from_directory(source_dir: str) -> List[dict]:
+    """Image entries for every image under `source_dir`, with prompts from a bulk results.jsonl if present"""
+    prompts: Dict[str, dict] = {}
+    results_path = os.path.join(source_dir, "results.jsonl")
+    if os.path.exists(results_path):
+        with open(results_path, encoding="utf-8") as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if record.get("status") == "ok":
+                    prompts[os.path.normpath(record["file"])] = record
+
+    entries = []
+    for root, _, files in os.walk(source_dir):
+        for name in sorted(files):
+            if os.path.splitext(name)[1].lower() not in IMAGE_EXTENSIONS:
+                continue
+            path = os.path.join(root, name)
+            relative = os.path.relpath(path, source_dir)
+            record = prompts.get(os.path.normpath(relative), {})
+            entries.append({
+                "path": path,
+                "filename": relative.replace(os.sep, "/"),
+                "prompt": record.get("prompt", ""),
+                "metadata": {k: record[k] for k in ("platform", "style", "width", "height", "steps") if k in record},
+            })
+    entries.sort(key=lambda entry: entry["filename"])
+    return entries
+
+
+def write_package(entries: Iterable[dict], output_path: str, package_name: str,
+                  roots: Optional[Sequence[str]] = None) -> dict:
+    """Stream `entries` into a ZIP at `output_path` and return the package manifest.
+
+    Each entry may carry `path` (file on disk) or `image_base64`, plus
+    optional `filename`, `prompt` and `metadata`. Entries without image data
+    are listed in the manifest with `included: false`. With `roots`, a `path`
+    outside of them raises ValueError and no package is written.
+    """
+    manifest = {
+        "package_name": package_name,
+        "created_at": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "images": [],
+    }
+    directory = os.path.dirname(output_path) or "."
+    os.makedirs(directory, exist_ok=True)
+    # A private partial file: concurrent packages never write to the same one
+    fd, partial_path = tempfile.mkstemp(prefix=os.path.basename(output_path) + ".", suffix=".part", dir=directory)
+    try:
+        with os.fdopen(fd, "wb") as partial:
+            _write_members(partial, entries, manifest, package_name, roots)
+        # mkstemp creates the file owner-only
+        os.chmod(partial_path, 0o644)
+        os.replace(partial_path, output_path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        raise
+
+    manifest["package_path"] = os.path.abspath(output_path)
+    manifest["package_bytes"] = os.path.getsize(output_path)
+    return manifest
+
+
+def _write_members(partial, entries: Iterable[dict], manifest: dict, package_name: str,
+                   roots: Optional[Sequence[str]]):
+    used_names = set()
+    with zipfile.ZipFile(partial, "w", allowZip64=True) as archive:
+        for index, entry in enumerate(entries):
+            path = entry.get("path") or entry.get("file")
+            if path and roots is not None and not within_roots(path, roots):
+                raise ValueError(f"{path} is outside the allowed source directories")
+            extension = os.path.splitext(path)[1] if path else ".png"
+            filename = member_name(entry.get("filename") or f"{safe_name(package_name)}_{index + 1}{extension}")
+            if filename == "manifest.json" or filename in used_names:
+                stem, extension = os.path.splitext(filename)
+                filename = f"{stem}_{index + 1}{extension}"
+            used_names.add(filename)
+
+            record = {
+                "filename": filename,
+                "prompt": entry.get("prompt", ""),
+                "metadata": entry.get("metadata", {}),
+            }
+            if path and os.path.exists(path):
+                chunks = _file_chunks(path)
+            elif entry.get("image_base64"):
+                chunks = _base64_chunks(entry["image_base64"])
+            else:
+                record["included"] = False
+                manifest["images"].append(record)
+                continue
+
+            info = zipfile.ZipInfo(filename, date_time=time.localtime()[:6])
+            info.compress_type = compression_for(filename)
+            digest = hashlib.sha256()
+            size = 0
+            with archive.open(info, "w", force_zip64=True) as member:
+                for chunk in chunks:
+                    digest.update(chunk)
+                    size += len(chunk)
+                    member.write(chunk)
+            record.update({
+                "included": True,
+                "bytes": size,
+                "sha256": digest.hexdigest(),
+                "compression": "stored" if info.compress_type == zipfile.ZIP_STORED else "deflate",
+            })
+            manifest["images"].append(record)
+
+        manifest["total_images"] = sum(1 for image in manifest["images"] if image["included"])
+        archive.writestr(zipfile.ZipInfo("manifest.json", date_time=time.localtime()[:6]),
+                         json.dumps(manifest, indent=2), compress_type=zipfile.ZIP_DEFLATED)
+
+
+def default_package_path(package_name: str, directory: Optional[str] = None) -> str:
+    """Timestamped path with a random suffix, so packages built in the same second do not collide"""
+    stamp = time.strftime("%Y%m%d_%H%M%S")
+    return os.path.join(directory or PACKAGES_DIR, f"{safe_name(package_name)}_{stamp}_{uuid.uuid4().hex[:8]}.zip")
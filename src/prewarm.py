@@ -0,0 +1,265 @@
+"""Traffic-aware warm pool controller for the Modal GPU class.
+
+The controller decides how many GPU containers to keep warm from the recent
+request rate and from scheduled campaigns, and tells a backend to apply that.
+Time and the backend are injected, so the policy can be driven by a simulated
+clock and a fake backend (see benchmarks/prewarm_simulation.py and
+tests/test_prewarm.py).
+
+A backend is any object with two coroutines:
+    set_warm(count)  keep `count` containers warm (min containers)
+    warmup(count)    ping `count` containers so the model is loaded
+
+Exactly one controller may own the warm pool. With several API replicas (the
+Modal FastAPI function scales out), each replica buffers what it sees in a
+`TrafficRecorder` and publishes the batches; the single controller applies
+them with `apply_traffic` and round-trips its state through `to_state` /
+`from_state` between ticks, so the history survives restarts.
+"""
+import math
+import os
+import time
+from collections import deque
+from typing import Callable, List, Optional
+
+PREWARM_INTERVAL_SECONDS = 30
+
+
+class RequestHistory:
+    """Sliding window of request arrival times"""
+
+    def __init__(self, window_seconds: float = 600.0, clock: Callable[[], float] = time.time):
+        self.window_seconds = window_seconds
+        self.clock = clock
+        self.arrivals = deque()
+
+    def record(self, timestamp: Optional[float] = None):
+        self.arrivals.append(self.clock() if timestamp is None else timestamp)
+
+    def extend(self, timestamps: List[float]):
+        """Merge arrivals recorded elsewhere, keeping the window ordered"""
+        if timestamps:
+            self.arrivals = deque(sorted([*self.arrivals, *timestamps]))
+
+    def rate(self) -> float:
+        """Requests per second over the window"""
+        cutoff = self.clock() - self.window_seconds
+        while self.arrivals and self.arrivals[0] < cutoff:
+            self.arrivals.popleft()
+        return len(self.arrivals) / self.window_seconds
+
+
+class Campaign:
+    """A scheduled burst of traffic that should find warm containers waiting"""
+
+    def __init__(self, name: str, start: float, duration_seconds: float, containers: int):
+        self.name = name
+        self.start = start
+        self.duration_seconds = duration_seconds
+        self.containers = containers
+        self.warmed = False
+
+    def to_dict(self) -> dict:
+        return {
+            "name": self.name,
+            "start": self.start,
+            "duration_seconds": self.duration_seconds,
+            "containers": self.containers,
+            "warmed": self.warmed,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "Campaign":
+        campaign = cls(data["name"], data["start"], data["duration_seconds"], data["containers"])
+        campaign.warmed = data.get("warmed", False)
+        return campaign
+
+
+class LatencySplit:
+    """Cold versus warm end-to-end latency samples"""
+
+    def __init__(self, window: int = 500):
+        self.samples = {"cold": deque(maxlen=window), "warm": deque(maxlen=window)}
+
+    def record(self, seconds: float, cold: bool):
+        self.samples["cold" if cold else "warm"].append(seconds)
+
+    def report(self) -> dict:
+        report = {}
+        for kind, samples in self.samples.items():
+            ordered = sorted(samples)
+            report[kind] = {
+                "count": len(ordered),
+                "p50": ordered[len(ordered) // 2] if ordered else None,
+                "p95": ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))] if ordered else None,
+            }
+        total = report["cold"]["count"] + report["warm"]["count"]
+        report["cold_fraction"] = round(report["cold"]["count"] / total, 4) if total else 0.0
+        return report
+
+
+class PrewarmController:
+    """Keeps N GPU containers warm based on traffic and upcoming campaigns"""
+
+    def __init__(self, backend, clock: Callable[[], float] = time.time, min_warm: int = 0,
+                 max_warm: int = 4, service_seconds: float = 20.0, target_utilization: float = 0.7,
+                 window_seconds: float = 600.0, lead_seconds: float = 600.0,
+                 scale_down_delay: float = 900.0):
+        self.backend = backend
+        self.clock = clock
+        self.min_warm = min_warm
+        self.max_warm = max_warm
+        self.service_seconds = service_seconds
+        self.target_utilization = target_utilization
+        self.lead_seconds = lead_seconds
+        self.scale_down_delay = scale_down_delay
+        self.history = RequestHistory(window_seconds, clock)
+        self.latency = LatencySplit()
+        self.campaigns: List[Campaign] = []
+        self.current_warm: Optional[int] = None
+        self.last_scale_up = float("-inf")
+        self.decisions = deque(maxlen=100)
+
+    def record_request(self):
+        self.history.record()
+
+    def record_latency(self, seconds: float, cold: bool):
+        self.latency.record(seconds, cold)
+
+    def schedule_campaign(self, name: str, start: float, duration_seconds: float, containers: int) -> Campaign:
+        campaign = Campaign(name, start, duration_seconds, containers)
+        self.campaigns.append(campaign)
+        return campaign
+
+    def traffic_target(self) -> int:
+        """Containers needed for the recent rate (Little's law with headroom)"""
+        busy = self.history.rate() * self.service_seconds
+        return math.ceil(busy / self.target_utilization) if busy > 0 else 0
+
+    def campaign_target(self) -> int:
+        now = self.clock()
+        target = 0
+        for campaign in self.campaigns:
+            if campaign.start - self.lead_seconds <= now <= campaign.start + campaign.duration_seconds:
+                target = max(target, campaign.containers)
+        return target
+
+    def desired_warm(self) -> int:
+        desired = max(self.min_warm, self.traffic_target(), self.campaign_target())
+        return min(self.max_warm, desired)
+
+    async def tick(self) -> int:
+        """Re-evaluate the warm pool; call periodically"""
+        now = self.clock()
+        desired = self.desired_warm()
+
+        # Scale up immediately, scale down only after traffic has stayed low
+        if self.current_warm is not None and desired < self.current_warm:
+            if now - self.last_scale_up < self.scale_down_delay:
+                desired = self.current_warm
+
+        if desired != self.current_warm:
+            if self.current_warm is None or desired > self.current_warm:
+                self.last_scale_up = now
+            await self.backend.set_warm(desired)
+            self.decisions.append({"time": now, "warm": desired, "rate": self.history.rate()})
+            print(f"🔥 Warm pool -> {desired} containers (rate {self.history.rate():.3f} req/s)")
+            self.current_warm = desired
+
+        for campaign in self.campaigns:
+            if not campaign.warmed and campaign.start - self.lead_seconds <= now < campaign.start:
+                campaign.warmed = True
+                print(f"🔥 Pre-warming {campaign.containers} containers for campaign '{campaign.name}'")
+                await self.backend.warmup(campaign.containers)
+
+        self.campaigns = [c for c in self.campaigns if now <= c.start + c.duration_seconds]
+        return self.current_warm
+
+    def get_status(self) -> dict:
+        return {
+            "current_warm": self.current_warm,
+            "desired_warm": self.desired_warm(),
+            "request_rate": round(self.history.rate(), 4),
+            "campaigns": [c.to_dict() for c in self.campaigns],
+            "latency": self.latency.report(),
+            "recent_decisions": list(self.decisions)[-10:],
+        }
+
+    def apply_traffic(self, batches: List[dict]):
+        """Merge batches published by `TrafficRecorder`s"""
+        for batch in batches:
+            self.history.extend(batch.get("requests", []))
+            for seconds, cold in batch.get("latency", []):
+                self.latency.record(seconds, cold)
+            for campaign in batch.get("campaigns", []):
+                self.campaigns.append(Campaign.from_dict(campaign))
+
+    def to_state(self) -> dict:
+        """Everything the next tick needs, as plain data"""
+        self.history.rate()  # drops arrivals that left the window
+        return {
+            "arrivals": list(self.history.arrivals),
+            "campaigns": [c.to_dict() for c in self.campaigns],
+            "current_warm": self.current_warm,
+            "last_scale_up": None if self.last_scale_up == float("-inf") else self.last_scale_up,
+            "latency": {kind: list(samples) for kind, samples in self.latency.samples.items()},
+            "decisions": list(self.decisions),
+        }
+
+    def load_state(self, state: Optional[dict]):
+        if not state:
+            return
+        self.history.arrivals = deque(state.get("arrivals", []))
+        self.campaigns = [Campaign.from_dict(c) for c in state.get("campaigns", [])]
+        self.current_warm = state.get("current_warm")
+        last_scale_up = state.get("last_scale_up")
+        self.last_scale_up = float("-inf") if last_scale_up is None else last_scale_up
+        for kind, samples in state.get("latency", {}).items():
+            self.latency.samples[kind].extend(samples)
+        self.decisions.extend(state.get("decisions", []))
+
+
+class TrafficRecorder:
+    """What one API replica saw since its last publish, for a controller running elsewhere.
+
+    Has the controller's recording methods, so the API calls either one the
+    same way.
+    """
+
+    def __init__(self, clock: Callable[[], float] = time.time):
+        self.clock = clock
+        self.requests: List[float] = []
+        self.latency: List[list] = []
+        self.campaigns: List[dict] = []
+
+    def record_request(self):
+        self.requests.append(self.clock())
+
+    def record_latency(self, seconds: float, cold: bool):
+        self.latency.append([seconds, cold])
+
+    def schedule_campaign(self, name: str, start: float, duration_seconds: float, containers: int) -> Campaign:
+        campaign = Campaign(name, start, duration_seconds, containers)
+        self.campaigns.append(campaign.to_dict())
+        return campaign
+
+    def drain(self) -> Optional[dict]:
+        """The buffered batch, or None when nothing happened"""
+        if not (self.requests or self.latency or self.campaigns):
+            return None
+        batch = {"requests": self.requests, "latency": self.latency, "campaigns": self.campaigns}
+        self.requests, self.latency, self.campaigns = [], [], []
+        return batch
+
+
+def controller_from_env(backend, state: Optional[dict] = None,
+                        clock: Callable[[], float] = time.time) -> PrewarmController:
+    """Controller bounded by PREWARM_MIN_CONTAINERS / PREWARM_MAX_CONTAINERS, resumed from `state`"""
+    controller = PrewarmController(
+        backend,
+        clock=clock,
+        min_warm=int(os.environ.get("PREWARM_MIN_CONTAINERS", "0")),
+        max_warm=int(os.environ.get("PREWARM_MAX_CONTAINERS", "4")),
+    )
+    controller.load_state(state)
+    return controller
@@ -0,0 +1,388 @@
+"""Offline similarity search over the prompts of past generations.
+
+Finding "that product shot we made last month" should not need the exact
+prompt or a new GPU call. Every stored image's prompt (plus its label, e.g.
+"instagram story") becomes a hashed n-gram TF-IDF vector, and a query is
+ranked against them by cosine similarity. It runs on CPU with NumPy and
+nothing leaves the machine.
+
+Features are lowercased words with a plural "s" stripped, weighted fully, and
+the character trigrams of each word, weighted lightly so misspellings still
+match. Word bigrams were left out: people remember the words of a prompt, not
+their order, and bigrams cost recall in `benchmarks/prompt_index_benchmark.py`.
+Each feature is hashed with
+CRC32 into a document-frequency table of 2**20 slots and, with a hash-derived
+sign, into one of `PROMPT_INDEX_DIM` dense dimensions (feature hashing), so
+there is no vocabulary to grow. IDF weights are fitted on the corpus and
+refitted, with every vector re-encoded, each time the corpus doubles.
+
+Below `PROMPT_INDEX_IVF_MIN` entries a query is scored against every vector
+(flat). Above it an inverted-file index groups the vectors into about sqrt(N)
+lists with spherical k-means, and a query scores only the
+`PROMPT_INDEX_NPROBE` lists whose centroids are nearest to it.
+
+The index follows the output store (`src/image_store.py`), picking up records
+other processes append, and is saved next to it as `prompt_index.npz`.
+
+    python -m src.prompt_index build
+    python -m src.prompt_index search "red sneakers on concrete" -k 5
+"""
+import argparse
+import json
+import math
+import os
+import re
+import threading
+import time
+import zlib
+from functools import lru_cache
+from itertools import islice
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from src.image_store import ImageStore, default_store
+
+DIM = int(os.environ.get("PROMPT_INDEX_DIM", "256"))
+IVF_MIN = int(os.environ.get("PROMPT_INDEX_IVF_MIN", "20000"))
+NPROBE = int(os.environ.get("PROMPT_INDEX_NPROBE", "16"))
+INDEX_NAME = "prompt_index.npz"
+DF_SLOTS = 1 << 20
+ENCODE_CHUNK = 4096
+KMEANS_SAMPLE = 32  # training vectors per list
+KMEANS_ITERATIONS = 10
+# Save after this many additions since the last save
+SAVE_EVERY = 1000
+
+WORD = re.compile(r"[a-z0-9]+")
+# Character trigrams are many and individually weak; in 256 dimensions heavier
+# trigrams crowd out the words
+GRAM_WEIGHTS = {"w": 1.0, "c": 0.1}
+
+
+def stem(word: str) -> str:
+    return word[:-1] if len(word) > 3 and word.endswith("s") and not word.endswith("ss") else word
+
+
+@lru_cache(maxsize=1 << 17)
+def word_features(word: str) -> Tuple[np.ndarray, np.ndarray]:
+    """CRC32 of a word and of its character trigrams, with their weights; cached, as vocabularies are small"""
+    padded = f"<{word}>"
+    grams = ["w " + word] + ["c " + padded[i:i + 3] for i in range(len(padded) - 2)]
+    weights = np.full(len(grams), GRAM_WEIGHTS["c"], dtype=np.float32)
+    weights[0] = GRAM_WEIGHTS["w"]
+    return np.array([zlib.crc32(gram.encode()) for gram in grams], dtype=np.uint32), weights
+
+
+def hash_features(text: str) -> Tuple[np.ndarray, np.ndarray]:
+    """Feature hashes and weights of a text; repeated features add up (raw term frequency)"""
+    parts = [word_features(stem(word)) for word in WORD.findall(text.lower())]
+    if not parts:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.float32)
+    return np.concatenate([hashes for hashes, _ in parts]), np.concatenate([weights for _, weights in parts])
+
+
+def record_text(record: dict) -> str:
+    return f"{record.get('prompt', '')} {record.get('label', '').replace('_', ' ')}".strip()
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.divide(vectors, norms, out=vectors, where=norms > 0)
+    return vectors
+
+
+def top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    """Positions of the k highest scores, highest first"""
+    if k < len(scores):
+        candidates = np.argpartition(-scores, k - 1)[:k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind="stable")]
+
+
+def spherical_kmeans(vectors: np.ndarray, lists: int, iterations: int = KMEANS_ITERATIONS,
+                     seed: int = 0) -> np.ndarray:
+    """Unit-length centroids trained on a sample of unit-length vectors"""
+    rng = np.random.default_rng(seed)
+    sample = vectors[rng.choice(len(vectors), min(len(vectors), lists * KMEANS_SAMPLE), replace=False)]
+    centroids = sample[rng.choice(len(sample), lists, replace=False)].copy()
+    for _ in range(iterations):
+        assignment = np.argmax(sample @ centroids.T, axis=1)
+        order = np.argsort(assignment, kind="stable")
+        used, starts = np.unique(assignment[order], return_index=True)
+        centroids[used] = np.add.reduceat(sample[order], starts, axis=0)
+        # An empty list restarts from a random training vector
+        empty = np.setdiff1d(np.arange(lists), used)
+        centroids[empty] = sample[rng.choice(len(sample), len(empty))]
+        normalize_rows(centroids)
+    return centroids
+
+
+class PromptIndex:
+    """Hashed n-gram TF-IDF vectors with flat or IVF cosine search"""
+
+    def __init__(self, dim: int = DIM, ivf_min: int = IVF_MIN, nprobe: int = NPROBE):
+        self.dim = dim
+        self.ivf_min = ivf_min
+        self.nprobe = nprobe
+        self.ids: List[str] = []
+        self.texts: List[str] = []
+        self._buffer = np.zeros((0, dim), dtype=np.float32)
+        self.df = np.zeros(DF_SLOTS, dtype=np.int32)
+        self.idf = np.ones(DF_SLOTS, dtype=np.float32)
+        self.fitted_size = 0
+        self.centroids: Optional[np.ndarray] = None
+        self.assignment = np.zeros(0, dtype=np.int32)
+        self.lists: List[List[int]] = []
+        self._list_arrays: Dict[int, np.ndarray] = {}
+        self.stats = {"refits": 0, "searches": 0}
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    @property
+    def vectors(self) -> np.ndarray:
+        return self._buffer[:len(self)]
+
+    @vectors.setter
+    def vectors(self, vectors: np.ndarray):
+        self._buffer = vectors
+
+    def _append(self, vectors: np.ndarray, start: int):
+        """Write rows from `start`, growing the buffer by doubling so adds stay amortized O(1)"""
+        end = start + len(vectors)
+        if end > len(self._buffer):
+            grown = np.zeros((max(end, 2 * len(self._buffer)), self.dim), dtype=np.float32)
+            grown[:start] = self._buffer[:start]
+            self._buffer = grown
+        self._buffer[start:end] = vectors
+
+    @property
+    def mode(self) -> str:
+        return "flat" if self.centroids is None else "ivf"
+
+    def _hash(self, texts: Sequence[str]) -> List[Tuple[np.ndarray, np.ndarray]]:
+        return [hash_features(text) for text in texts]
+
+    def _encode(self, hashed: List[Tuple[np.ndarray, np.ndarray]]) -> np.ndarray:
+        """Unit-length vectors for hashed documents under the current IDF"""
+        vectors = np.zeros((len(hashed), self.dim), dtype=np.float32)
+        for start in range(0, len(hashed), ENCODE_CHUNK):
+            chunk = hashed[start:start + ENCODE_CHUNK]
+            if not chunk:
+                continue
+            lengths = [len(hashes) for hashes, _ in chunk]
+            hashes = np.concatenate([hashes for hashes, _ in chunk])
+            weights = np.concatenate([weights for _, weights in chunk]) * self.idf[hashes & (DF_SLOTS - 1)]
+            # The bucket comes from the high bits and the sign from the lowest
+            cells = np.repeat(np.arange(len(chunk)), lengths) * self.dim + (hashes >> 20) % self.dim
+            signed = np.where(hashes & 1, weights, -weights)
+            vectors[start:start + len(chunk)] = np.bincount(
+                cells, weights=signed, minlength=len(chunk) * self.dim).reshape(len(chunk), self.dim)
+        return normalize_rows(vectors)
+
+    def _count(self, hashed: List[Tuple[np.ndarray, np.ndarray]]):
+        if hashed:
+            slots = np.concatenate([np.unique(hashes & (DF_SLOTS - 1)) for hashes, _ in hashed])
+            self.df += np.bincount(slots, minlength=DF_SLOTS).astype(np.int32)
+
+    def add(self, ids: Sequence[str], texts: Sequence[str]):
+        hashed = self._hash(texts)
+        self._count(hashed)
+        start = len(self)
+        self.ids.extend(ids)
+        self.texts.extend(texts)
+        if len(self) >= 2 * self.fitted_size or (self.centroids is None and len(self) >= self.ivf_min):
+            # Every row is re-encoded: those added since the last fit too
+            self.fit(self._hash(self.texts[:start]) + hashed)
+            return
+        self._append(self._encode(hashed), start)
+        if self.centroids is not None:
+            self._assign(start)
+
+    def fit(self, hashed: Optional[List[Tuple[np.ndarray, np.ndarray]]] = None):
+        """Refit IDF on the whole corpus, re-encode every vector and retrain the IVF lists"""
+        documents = len(self)
+        self.idf = (np.log((1.0 + documents) / (1.0 + self.df)) + 1.0).astype(np.float32)
+        self.vectors = self._encode(hashed if hashed is not None else self._hash(self.texts))
+        self.fitted_size = documents
+        self.stats["refits"] += 1
+        self.centroids = None
+        self.lists, self._list_arrays = [], {}
+        self.assignment = np.zeros(0, dtype=np.int32)
+        if documents >= self.ivf_min:
+            self.centroids = spherical_kmeans(self.vectors, max(1, int(math.sqrt(documents))))
+            self.lists = [[] for _ in range(len(self.centroids))]
+            self._assign(0)
+
+    def _assign(self, start: int):
+        assignments = [np.argmax(self.vectors[offset:offset + ENCODE_CHUNK] @ self.centroids.T, axis=1)
+                       for offset in range(start, len(self.vectors), ENCODE_CHUNK)]
+        assignment = np.concatenate(assignments).astype(np.int32) if assignments else np.zeros(0, dtype=np.int32)
+        self.assignment = np.concatenate([self.assignment, assignment])
+        for position, cell in enumerate(assignment.tolist(), start):
+            self.lists[cell].append(position)
+            self._list_arrays.pop(cell, None)
+
+    def _list(self, cell: int) -> np.ndarray:
+        if cell not in self._list_arrays:
+            self._list_arrays[cell] = np.array(self.lists[cell], dtype=np.int64)
+        return self._list_arrays[cell]
+
+    def search(self, query: str, k: int = 5, nprobe: Optional[int] = None,
+               exact: bool = False) -> List[Tuple[float, int]]:
+        """(cosine similarity, position) of the k nearest prompts, nearest first; exact scores every vector"""
+        self.stats["searches"] += 1
+        if not len(self) or k <= 0:
+            return []
+        vector = self._encode([hash_features(query)])[0]
+        if self.centroids is None or exact:
+            candidates = None
+            scores = self.vectors @ vector
+        else:
+            cells = top_k(self.centroids @ vector, nprobe or self.nprobe)
+            candidates = np.concatenate([self._list(int(cell)) for cell in cells])
+            scores = self.vectors[candidates] @ vector
+        best = top_k(scores, k)
+        positions = best if candidates is None else candidates[best]
+        return [(float(score), int(position)) for score, position in zip(scores[best], positions) if score > 0]
+
+    def save(self, path: str):
+        """Everything but the texts, which the output store already has"""
+        temporary = f"{path}.{os.getpid()}.tmp.npz"
+        np.savez(temporary, ids=np.frombuffer("\n".join(self.ids).encode(), dtype=np.uint8),
+                 vectors=self.vectors.astype(np.float16), df=self.df, idf=self.idf,
+                 fitted_size=self.fitted_size, dim=self.dim, assignment=self.assignment,
+                 centroids=self.centroids if self.centroids is not None else np.zeros((0, self.dim), np.float32))
+        os.replace(temporary, path)
+
+    @classmethod
+    def load(cls, path: str, texts: Dict[str, str], ivf_min: int = IVF_MIN, nprobe: int = NPROBE) -> "PromptIndex":
+        """Index saved by `save`; `texts` maps each saved id to its text"""
+        with np.load(path) as data:
+            index = cls(int(data["dim"]), ivf_min, nprobe)
+            encoded = data["ids"].tobytes().decode()
+            index.ids = encoded.split("\n") if encoded else []
+            index.texts = [texts[image_id] for image_id in index.ids]
+            index.vectors = data["vectors"].astype(np.float32)
+            index.df, index.idf = data["df"], data["idf"]
+            index.fitted_size = int(data["fitted_size"])
+            if len(data["centroids"]):
+                index.centroids = data["centroids"]
+                index.lists = [[] for _ in range(len(index.centroids))]
+                for position, cell in enumerate(data["assignment"].tolist()):
+                    index.lists[cell].append(position)
+                index.assignment = data["assignment"]
+        if len(index.vectors) != len(index.ids) or index.dim != DIM:
+            raise ValueError(f"Inconsistent prompt index at {path}")
+        return index
+
+    def get_stats(self) -> dict:
+        return {"entries": len(self), "mode": self.mode, "dim": self.dim,
+                "lists": len(self.lists), "nprobe": self.nprobe, **self.stats}
+
+
+class HistoryIndex:
+    """A `PromptIndex` over the output store, kept in step with it"""
+
+    def __init__(self, store: ImageStore, path: Optional[str] = None):
+        self.store = store
+        self.path = path or os.path.join(store.root, INDEX_NAME)
+        self.index: Optional[PromptIndex] = None
+        self.unsaved = 0
+        self._lock = threading.Lock()
+
+    def _load(self) -> PromptIndex:
+        records = self.store.records
+        if os.path.exists(self.path):
+            try:
+                index = PromptIndex.load(self.path, {image_id: record_text(record)
+                                                     for image_id, record in records.items()})
+                if index.ids == list(islice(records, len(index))):
+                    return index
+            except (KeyError, ValueError, OSError) as e:
+                print(f"⚠️  Rebuilding prompt index: {e}")
+        return PromptIndex()
+
+    def sync(self) -> int:
+        """Index records added to the store since the last call; returns how many"""
+        self.store.refresh()
+        records = self.store.records
+        if self.index is None:
+            self.index = self._load()
+        index = self.index
+        if len(records) == len(index) and (not records or next(reversed(records)) == index.ids[-1]):
+            return 0
+        if len(records) < len(index) or (len(index) and next(islice(records, len(index) - 1, None)) != index.ids[-1]):
+            # The store was rewritten (dedupe): start over
+            index = self.index = PromptIndex()
+        added = list(islice(records.values(), len(index), None))
+        index.add([record["id"] for record in added], [record_text(record) for record in added])
+        self.unsaved += len(added)
+        if self.unsaved >= SAVE_EVERY or index.fitted_size == len(index):
+            self.save()
+        return len(added)
+
+    def save(self):
+        if self.index is not None:
+            self.index.save(self.path)
+            self.unsaved = 0
+
+    def search(self, query: str, k: int = 5) -> dict:
+        """The k stored images whose prompts are most similar to `query`"""
+        with self._lock:
+            start_time = time.time()
+            self.sync()
+            sync_seconds = time.time() - start_time
+            start_time = time.time()
+            # Over-fetch: images deleted outside the store are skipped
+            hits = self.index.search(query, k * 2 + 5)
+            search_seconds = time.time() - start_time
+            results = []
+            for score, position in hits:
+                record = self.store.records.get(self.index.ids[position])
+                if record is None or not os.path.exists(self.store.path(record)):
+                    continue
+                results.append({"id": record["id"], "path": self.store.path(record), "score": round(score, 4),
+                                "prompt": record.get("prompt", ""), "label": record.get("label", ""),
+                                "width": record["width"], "height": record["height"],
+                                "created_at": record["created_at"]})
+                if len(results) >= k:
+                    break
+            return {"results": results, "search_ms": round(search_seconds * 1000, 3),
+                    "sync_ms": round(sync_seconds * 1000, 3), "index": self.index.get_stats()}
+
+
+_default_index: Optional[HistoryIndex] = None
+
+
+def default_history_index() -> HistoryIndex:
+    """Index over the default output store, loaded on first use"""
+    global _default_index
+    if _default_index is None:
+        _default_index = HistoryIndex(default_store())
+    return _default_index
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt similarity search over the output store")
+    parser.add_argument("command", choices=["build", "search"])
+    parser.add_argument("query", nargs="?", help="Text to search for")
+    parser.add_argument("-k", type=int, default=5)
+    parser.add_argument("--root", default=None, help="Output store directory")
+    args = parser.parse_args()
+
+    history = HistoryIndex(ImageStore(args.root) if args.root else default_store())
+    if args.command == "build":
+        start_time = time.time()
+        if os.path.exists(history.path):
+            os.remove(history.path)
+        history.sync()
+        history.save()
+        print(f"🔎 Indexed {len(history.index)} prompts in {time.time() - start_time:.2f}s "
+              f"({history.index.mode}) -> {history.path}")
+    else:
+        if not args.query:
+            parser.error("'search' needs a query")
+        print(json.dumps(history.search(args.query, args.k), indent=2))
@@ -0,0 +1,330 @@
+"""Prompt templates, style modifiers and variation strategies, and the
+compiler that composes them into a final Flux prompt.
+
+`PromptCompiler` precomputes every style x variation suffix once (clauses and
+dedup keys), so composing a prompt is a table lookup plus token counts that
+`src.tokens` memoizes. Clauses repeated between the prompt, the variation and
+the style are dropped, and the result is compacted to the encoder limits by
+priority: the user's own text is kept first, then the variation, then
+platform hints, and style filler is the first thing to go.
+
+Two texts come out: the full prompt for T5 (512 tokens) and a shorter one for
+CLIP (77 tokens), so neither encoder silently cuts off the tail.
+"""
+import random
+import string
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from src.tokens import CLIP_MAX_TOKENS, T5_MAX_TOKENS, clip_counter, t5_counter
+
+
+PROMPT_TEMPLATES = {
+    "product_hero": """A professional, cinematic product photography composition featuring {product} as the center subject against a {background} backdrop. The scene is illuminated with dramatic studio lighting creating golden highlights and deep shadows. The {product} appears to float with ethereal light emanating from beneath, surrounded by subtle glowing particles and atmospheric mist. The composition uses cinematic depth of field with the product razor-sharp in focus while the background fades into artistic bokeh. Luxurious materials and textures are emphasized with photorealistic detail, showcasing premium quality and craftsmanship.""",
+    
+    "social_announcement": """A high-energy, cinematic social media poster announcing {announcement}. The composition features bold, dramatic lighting with vibrant neon glows and electric energy crackling through the frame. Dynamic typography with the announcement text appears in luxurious, impactful metallic font that seems to emerge from the composition. The backdrop features a futuristic cityscape at night with towering skyscrapers surrounded by colorful LED light strips. Atmospheric elements include flowing energy streams, glowing particles, and lens flares that create a sense of excitement and urgency. The entire poster pulses with kinetic energy and modern sophistication.""",
+    
+    "blog_header": """An elegant, cinematic header image for a blog post about {topic}. The composition features ethereal lighting with soft golden hour illumination casting dramatic shadows across the scene. In the foreground, symbolic elements related to {topic} are artistically arranged with professional depth of field. The background dissolves into atmospheric mist with subtle bokeh and floating light particles. The color palette consists of warm golds, deep purples, and rich earth tones. The entire composition exudes intellectual sophistication and visual storytelling, with magazine-quality photography aesthetics.""",
+    
+    "team_photo": """A cinematic corporate team photograph showing {description} in a modern, luxurious office environment. The scene is lit with dramatic architectural lighting, featuring large floor-to-ceiling windows with natural light streaming in, creating beautiful rim lighting around the subjects. The team is positioned dynamically across multiple levels of the space, with some standing and others seated in premium furniture. The background showcases sleek modern architecture with glass, steel, and wood elements. Professional color grading gives the image a premium, magazine-worthy aesthetic with rich contrasts and warm undertones.""",
+    
+    "event_banner": """A spectacular, cinematic event banner for {event} with movie poster-level production value. The composition features epic scale with dramatic perspective and atmospheric depth. Bold, metallic event typography dominates the upper portion with luxurious, impactful font treatment that appears to be forged from light itself. The scene is filled with dynamic elements: swirling energy, floating particles, dramatic spotlights cutting through atmospheric haze, and architectural elements that frame the composition. The color palette uses deep blues, electric purples, and gold accents to create excitement and grandeur.""",
+    
+    "testimonial_bg": """An abstract, cinematic background for testimonial content featuring {mood} aesthetic. The composition uses flowing, organic shapes with ethereal lighting effects creating depth and movement. Subtle geometric patterns emerge from atmospheric mist while soft, diffused lighting creates beautiful gradients across the frame. The scene includes floating elements like delicate particles, soft bokeh, and gentle light rays that add visual interest without overwhelming the testimonial text. The color palette is sophisticated and calming, using gradient transitions between complementary colors to create emotional resonance.""",
+    
+    "poster_style": """A cinematic movie poster composition featuring {subject} with dramatic, high-impact visual storytelling. The scene is dominated by theatrical lighting with bold contrasts between light and shadow. The main subject is positioned using classical composition rules with supporting elements arranged to guide the eye. Atmospheric elements include swirling mist, dramatic sky, glowing magical effects, and rich environmental details. The composition features layered depth with foreground, midground, and background elements all contributing to the narrative. Typography space is reserved for impactful text placement with the overall mood being {mood}.""",
+    
+    "luxury_product": """An ultra-premium product showcase featuring {product} in a luxurious, museum-quality presentation. The item sits on pristine surfaces with perfect reflections, surrounded by architectural elements like marble, gold accents, and crystal. Dramatic lighting creates spectacular highlights and deep shadows, emphasizing every detail and texture. The background features elegant negative space with subtle gradient lighting and floating particles that suggest exclusivity. The entire composition exudes opulence and sophistication, with photorealistic detail that showcases premium craftsmanship and materials."""
+}
+
+
+STYLE_MODIFIERS = {
+    "professional": """professional studio lighting, cinematic composition, dramatic shadows and highlights, premium materials and textures, photorealistic detail, magazine-quality photography, sophisticated color grading, architectural precision, corporate elegance, high-end commercial aesthetics""",
+    
+    "playful": """vibrant neon colors, electric energy crackling through the frame, dynamic movement and flow, glowing particles and magical elements, whimsical floating objects, rainbow light effects, kinetic energy, joyful atmosphere, colorful light strips and LED effects, fun and energetic composition""",
+    
+    "minimalist": """clean geometric composition, pristine white negative space, single dramatic light source, subtle shadows and highlights, elegant simplicity, floating elements with perfect spacing, monochromatic or limited color palette, architectural precision, zen-like tranquility, museum-quality presentation""",
+    
+    "luxury": """opulent materials like gold, marble, and crystal, dramatic chiaroscuro lighting, rich textures and reflections, premium craftsmanship details, sophisticated color palette of deep jewel tones, elegant architectural elements, museum-quality presentation, exclusive atmosphere, metallic accents and flowing fabrics""",
+    
+    "tech": """futuristic neon lighting with electric blue and cyan glows, holographic interfaces and digital elements, sleek metallic surfaces with perfect reflections, floating geometric shapes, matrix-style digital rain effects, cyberpunk aesthetic, glowing circuit patterns, high-tech laboratory environment, innovative and cutting-edge atmosphere""",
+    
+    "cinematic": """movie poster lighting with dramatic spotlights, atmospheric haze and volumetric fog, epic scale and perspective, rich color grading with deep contrasts, cinematic depth of field, theatrical composition, dramatic sky and environmental elements, professional film-quality aesthetics, storytelling through visual elements""",
+    
+    "mystical": """ethereal lighting with soft, magical glows, floating particles and sparkles, misty atmospheric effects, enchanted forest or temple environment, glowing runes and magical symbols, otherworldly color palette of purples and golds, mysterious shadows and light rays, fantasy movie aesthetic, ancient and magical atmosphere""",
+    
+    "editorial": """magazine-quality photography lighting, sophisticated composition following rule of thirds, professional color grading, high fashion aesthetic, dramatic contrasts, premium materials and styling, architectural or natural backgrounds, artistic depth of field, editorial sophistication, contemporary visual storytelling"""
+}
+
+VARIATION_STRATEGIES = {
+    "color_schemes": [
+        "with warm colors (reds, oranges, yellows)",
+        "with cool colors (blues, greens, purples)", 
+        "with bold, high-contrast colors",
+        "with muted, pastel colors",
+        "monochromatic color scheme"
+    ],
+    "composition_styles": [
+        "centered composition with symmetrical balance",
+        "rule of thirds composition with dynamic flow",
+        "minimalist composition with lots of white space",
+        "busy, detailed composition with multiple elements",
+        "close-up, focused composition"
+    ],
+    "emotional_tones": [
+        "energetic and exciting mood",
+        "calm and peaceful atmosphere",
+        "professional and trustworthy feel",
+        "fun and playful vibe",
+        "luxurious and premium aesthetic"
+    ],
+    "visual_styles": [
+        "photorealistic style",
+        "illustrated/graphic design style",
+        "vintage/retro aesthetic",
+        "modern/contemporary look",
+        "artistic/creative approach"
+    ],
+    "lighting_moods": [
+        "bright, well-lit scene",
+        "dramatic lighting with shadows",
+        "soft, diffused lighting",
+        "golden hour warm lighting",
+        "studio lighting setup"
+    ]
+}
+
+
+CONTENT_CREATOR_VARIATIONS = {
+    "social_media": [
+        "Instagram-optimized with bold text overlay space",
+        "TikTok-style with vertical focus and trending elements",
+        "LinkedIn professional with corporate aesthetic",
+        "YouTube thumbnail with clickable visual hierarchy",
+        "Twitter-friendly with clear, readable elements"
+    ],
+    "engagement_hooks": [
+        "with eye-catching focal point in center",
+        "with contrasting element to grab attention",
+        "with human faces or eyes for connection",
+        "with bright colors that pop in feeds",
+        "with intriguing visual question or mystery"
+    ],
+    "brand_positioning": [
+        "premium/luxury brand positioning",
+        "affordable/accessible brand feel",
+        "innovative/cutting-edge brand image",
+        "trustworthy/established brand look",
+        "fun/approachable brand personality"
+    ]
+}
+
+
+DEFAULT_VARIATIONS = [
+    "with vibrant, attention-grabbing colors",
+    "with professional, clean aesthetic",
+    "with bold, dramatic composition"
+]
+
+# Compaction priorities, most important first
+USER, VARIATION, PLATFORM, STYLE = 0, 1, 2, 3
+
+
+def split_clauses(text: str) -> List[str]:
+    """Split on commas outside parentheses, keeping list items with their clause"""
+    clauses, depth, current = [], 0, []
+    for char in text:
+        if char in "([":
+            depth += 1
+        elif char in ")]" and depth:
+            depth -= 1
+        if char == "," and depth == 0:
+            clauses.append("".join(current))
+            current = []
+        else:
+            current.append(char)
+    clauses.append("".join(current))
+
+    merged = []
+    for clause in (" ".join(clause.split()) for clause in clauses if clause.strip()):
+        # List items ("gold, marble, and crystal") stay with the clause they belong to
+        if merged and (" " not in clause or clause.startswith(("and ", "or "))):
+            merged[-1] = f"{merged[-1]}, {clause}"
+        else:
+            merged.append(clause)
+    return merged
+
+
+def clause_key(clause: str) -> str:
+    return " ".join(clause.lower().split()).rstrip(".;:")
+
+
+class CompiledPrompt:
+    def __init__(self, text: str, tokens: int, clip_text: str, clip_tokens: int, style: str,
+                 dropped: List[str], clip_dropped: int, duplicates: int, user_truncated: bool):
+        self.text = text
+        self.tokens = tokens
+        self.clip_text = clip_text
+        self.clip_tokens = clip_tokens
+        self.style = style
+        self.dropped = dropped
+        self.clip_dropped = clip_dropped
+        self.duplicates = duplicates
+        self.user_truncated = user_truncated
+
+    @property
+    def truncated(self) -> bool:
+        return bool(self.dropped)
+
+    def to_dict(self) -> dict:
+        return {
+            "prompt": self.text,
+            "clip_prompt": self.clip_text,
+            "token_count": self.tokens,
+            "clip_token_count": self.clip_tokens,
+            "style": self.style,
+            "dropped_clauses": self.dropped,
+            "clip_clauses_dropped": self.clip_dropped,
+            "duplicates_removed": self.duplicates,
+            "user_truncated": self.user_truncated,
+        }
+
+
+class _Suffix:
+    """Precomputed variation and style clauses appended after the user's prompt"""
+
+    def __init__(self, variation_clauses: List[str], style_clauses: List[str]):
+        self.entries: List[Tuple[str, str, int]] = []
+        seen = set()
+        for priority, clauses in ((VARIATION, variation_clauses), (STYLE, style_clauses)):
+            for clause in clauses:
+                key = clause_key(clause)
+                if key not in seen:
+                    seen.add(key)
+                    self.entries.append((clause, key, priority))
+
+
+def _fit(clauses: List[str], counter: Callable[[str], int], max_tokens: int, special_tokens: int,
+         required: int) -> Tuple[List[str], int]:
+    """Clauses, in their order, greedily packed into `max_tokens`.
+
+    A clause that does not fit is skipped and later, shorter ones may still
+    fill the room, so the result is a subsequence, not necessarily a prefix:
+    the CLIP text can keep a short style clause after a longer platform hint
+    was dropped. Higher-priority clauses come first and so are never given up
+    for lower ones. The first `required` are only cut when they alone
+    overflow. A clause costs its own tokens minus the encoder's special tokens
+    plus one for the ", " separator.
+    """
+    kept = []
+    used = special_tokens - 1
+    for index, clause in enumerate(clauses):
+        cost = counter(clause) - special_tokens + 1
+        if used + cost > max_tokens and (index >= required or kept):
+            continue
+        kept.append(clause)
+        used += cost
+    # Per-clause sums are close but not exact; trim from the least important end
+    total = counter(", ".join(kept))
+    while total > max_tokens and len(kept) > 1:
+        kept.pop()
+        total = counter(", ".join(kept))
+    return kept, total
+
+
+class PromptCompiler:
+    def __init__(self, max_tokens: int = T5_MAX_TOKENS, clip_max_tokens: int = CLIP_MAX_TOKENS,
+                 counter: Callable[[str], int] = t5_counter, clip: Callable[[str], int] = clip_counter,
+                 style_modifiers: Optional[Dict[str, str]] = None,
+                 variation_strategies: Optional[Dict[str, List[str]]] = None,
+                 templates: Optional[Dict[str, str]] = None):
+        self.max_tokens = max_tokens
+        self.clip_max_tokens = clip_max_tokens
+        self.counter = counter
+        self.clip = clip
+        self.style_modifiers = style_modifiers if style_modifiers is not None else STYLE_MODIFIERS
+        self.variation_strategies = variation_strategies if variation_strategies is not None else {
+            **VARIATION_STRATEGIES, **CONTENT_CREATOR_VARIATIONS}
+        self.templates = templates if templates is not None else PROMPT_TEMPLATES
+
+        # style x variation lookup table, variation "" meaning none
+        variations = {""} | {v for options in self.variation_strategies.values() for v in options} | set(DEFAULT_VARIATIONS)
+        self.table: Dict[Tuple[str, str], _Suffix] = {}
+        for style in ["none", *self.style_modifiers]:
+            for variation in variations:
+                self.table[(style, variation)] = _Suffix(split_clauses(variation), self._style_clauses(style))
+
+        self._parsed_templates = {
+            name: [field for _, field, _, _ in string.Formatter().parse(template) if field]
+            for name, template in self.templates.items()
+        }
+
+    @property
+    def styles(self) -> List[str]:
+        return list(self.style_modifiers)
+
+    def _style_clauses(self, style: str) -> List[str]:
+        return split_clauses(self.style_modifiers[style]) if style != "none" else []
+
+    def _suffix(self, style: str, variation: str) -> _Suffix:
+        suffix = self.table.get((style, variation))
+        if suffix is None:
+            # Free-form variation text: compile on demand and keep it
+            suffix = self.table[(style, variation)] = _Suffix(split_clauses(variation), self._style_clauses(style))
+        return suffix
+
+    def compile(self, prompt: str, style: str = "none", variation: str = "", extra: Iterable[str] = ()) -> CompiledPrompt:
+        """Compose prompt + variation + extra clauses + style modifier within both encoder budgets"""
+        if style not in ("none", "") and style not in self.style_modifiers:
+            raise KeyError(f"Style '{style}' not found")
+        style = style or "none"
+        suffix = self._suffix(style, variation)
+
+        # Priority order: user clauses, variation, platform/extra hints, style filler
+        entries = [(clause, clause_key(clause), USER) for clause in split_clauses(prompt)]
+        entries += [entry for entry in suffix.entries if entry[2] == VARIATION]
+        entries += [(clause, clause_key(clause), PLATFORM) for clause in extra]
+        entries += [entry for entry in suffix.entries if entry[2] == STYLE]
+
+        seen = set()
+        clauses = []
+        duplicates = 0
+        for clause, key, priority in entries:
+            if key in seen:
+                duplicates += 1
+                continue
+            seen.add(key)
+            clauses.append((clause, priority))
+
+        ordered = [clause for clause, _ in clauses]
+        user_count = sum(1 for _, priority in clauses if priority == USER)
+        kept, tokens = _fit(ordered, self.counter, self.max_tokens, 1, user_count)
+        kept_set = set(kept)
+        dropped = [clause for clause in ordered if clause not in kept_set]
+
+        clip_kept, clip_tokens = _fit(kept, self.clip, self.clip_max_tokens, 2, 1)
+
+        return CompiledPrompt(", ".join(kept), tokens, ", ".join(clip_kept), clip_tokens, style, dropped,
+                              len(kept) - len(clip_kept), duplicates,
+                              any(clause not in kept_set for clause, priority in clauses if priority == USER))
+
+    def select_variations(self, variation_type: str, count: int, rng: Optional[random.Random] = None) -> List[str]:
+        """Variation clauses for an A/B batch"""
+        if variation_type == "mixed":
+            pool = [v for options in VARIATION_STRATEGIES.values() for v in options[:2]]
+            pool.extend(CONTENT_CREATOR_VARIATIONS["engagement_hooks"][:2])
+            return (rng or random).sample(pool, min(count, len(pool)))
+        if variation_type in self.variation_strategies:
+            return self.variation_strategies[variation_type][:count]
+        return DEFAULT_VARIATIONS[:count]
+
+    def template_fields(self, name: str) -> List[str]:
+        return self._parsed_templates[name]
+
+    def render_template(self, name: str, **fields) -> str:
+        missing = [field for field in self._parsed_templates[name] if field not in fields]
+        if missing:
+            raise KeyError(f"Template '{name}' needs {', '.join(missing)}")
+        return self.templates[name].format(**fields)
+
+
+prompt_compiler = PromptCompiler()
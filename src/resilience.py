@@ -0,0 +1,298 @@
+"""Resilient HTTP client for the Modal Flux API.
+
+Wraps calls to the Modal endpoint with:
+- exponential backoff with full jitter for retryable failures
+- optional hedged requests once a call runs past the p95 latency observed for
+  the same path and tier (a preview, a full render and an A/B set differ a lot)
+- a circuit breaker that fails fast while the endpoint is down and uses the
+  `/health` endpoint to decide when to let traffic through again
+
+A timed-out POST may still be running on the GPU. Only calls made with
+`idempotent=True` are retried after such an ambiguous failure or hedged: they
+carry one `Idempotency-Key` header across all their attempts, and the server
+answers every attempt from a single job.
+"""
+import asyncio
+import random
+import time
+import uuid
+from collections import deque
+from typing import Callable, Dict, Optional, Tuple
+
+import aiohttp
+
+
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+# The request may have reached the GPU before the failure
+AMBIGUOUS_STATUSES = {408, 504}
+
+
+class ModalAPIError(Exception):
+    """Raised when the Modal API call fails"""
+
+    def __init__(self, message: str, status: Optional[int] = None, retryable: bool = False,
+                 ambiguous: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.retryable = retryable
+        self.ambiguous = ambiguous
+
+
+class CircuitOpenError(ModalAPIError):
+    """Raised without contacting the endpoint while the circuit is open"""
+
+    def __init__(self, message: str):
+        super().__init__(message, status=None, retryable=False)
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, max_attempts: int = 3, base_delay: float = 1.0, max_delay: float = 20.0,
+                 retryable_statuses=RETRYABLE_STATUSES):
+        self.max_attempts = max(1, max_attempts)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.retryable_statuses = set(retryable_statuses)
+
+    def backoff(self, attempt: int) -> float:
+        """Delay before retry number `attempt` (0-based)"""
+        return random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+
+
+class LatencyTracker:
+    """Rolling window of successful call latencies"""
+
+    def __init__(self, window: int = 200):
+        self.samples = deque(maxlen=window)
+
+    def record(self, seconds: float):
+        self.samples.append(seconds)
+
+    def percentile(self, p: float) -> Optional[float]:
+        if not self.samples:
+            return None
+        ordered = sorted(self.samples)
+        index = min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+
+class CircuitBreaker:
+    """Closed -> open after consecutive failures; open -> half-open once a health probe passes"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.clock = clock
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.stats = {"opened": 0, "short_circuited": 0, "probes": 0}
+
+    def record_success(self):
+        if self.state != self.CLOSED:
+            print("🟢 Modal circuit closed")
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+
+    def record_failure(self):
+        self.consecutive_failures += 1
+        if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        if self.state != self.OPEN:
+            self.stats["opened"] += 1
+            print(f"🔴 Modal circuit opened after {self.consecutive_failures} failures")
+        self.state = self.OPEN
+        self.opened_at = self.clock()
+
+    async def allow(self, probe: Callable) -> bool:
+        """Whether a request may go out; runs `probe` (a health check) when the open period has elapsed"""
+        if self.state != self.OPEN:
+            return True
+        if self.clock() - self.opened_at < self.reset_timeout:
+            self.stats["short_circuited"] += 1
+            return False
+
+        self.stats["probes"] += 1
+        if await probe():
+            self.state = self.HALF_OPEN
+            print("🟡 Modal circuit half-open, health check passed")
+            return True
+
+        self.opened_at = self.clock()
+        self.stats["short_circuited"] += 1
+        return False
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["state"] = self.state
+        stats["consecutive_failures"] = self.consecutive_failures
+        return stats
+
+
+class ResilientModalClient:
+    """aiohttp client for the Modal API with retries, hedging and a circuit breaker"""
+
+    def __init__(self, base_url: str, retry_policy: Optional[RetryPolicy] = None,
+                 breaker: Optional[CircuitBreaker] = None, timeout: float = 120.0,
+                 hedge: bool = False, hedge_min_samples: int = 20, health_timeout: float = 10.0,
+                 sleep: Callable = asyncio.sleep):
+        self.base_url = base_url
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breaker = breaker or CircuitBreaker()
+        self.timeout = timeout
+        self.hedge = hedge
+        self.hedge_min_samples = hedge_min_samples
+        self.health_timeout = health_timeout
+        # Per (path, tier): one window would mix previews with full renders
+        self.latency: Dict[Tuple[str, str], LatencyTracker] = {}
+        self.sleep = sleep
+        self._session: Optional[aiohttp.ClientSession] = None
+        self.stats = {"calls": 0, "attempts": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "failures": 0}
+
+    async def session(self) -> aiohttp.ClientSession:
+        """Shared session so connections to Modal are pooled across calls"""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession()
+        return self._session
+
+    async def close(self):
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+
+    async def health(self) -> bool:
+        """Probe `/health`; the result also drives the circuit breaker"""
+        try:
+            session = await self.session()
+            async with session.get(
+                f"{self.base_url}/health",
+                timeout=aiohttp.ClientTimeout(total=self.health_timeout)
+            ) as response:
+                return response.status == 200
+        except Exception:
+            return False
+
+    def tracker(self, path: str, payload: dict) -> LatencyTracker:
+        key = (path, payload.get("tier", "full"))
+        if key not in self.latency:
+            self.latency[key] = LatencyTracker()
+        return self.latency[key]
+
+    async def post_json(self, path: str, payload: dict, headers: Optional[dict] = None,
+                        idempotent: bool = False) -> dict:
+        """POST `payload` to `path`, retrying retryable failures with backoff.
+
+        `idempotent` calls send one Idempotency-Key with every attempt and may
+        be hedged and retried after timeouts; other calls are only retried
+        when the request cannot have started a job.
+        """
+        self.stats["calls"] += 1
+        last_error = None
+        headers = dict(headers or {})
+        if idempotent:
+            headers.setdefault("Idempotency-Key", uuid.uuid4().hex)
+
+        for attempt in range(self.retry_policy.max_attempts):
+            if not await self.breaker.allow(self.health):
+                self.stats["failures"] += 1
+                raise CircuitOpenError("Modal API circuit is open (endpoint unhealthy), failing fast")
+
+            try:
+                result = await self._call(path, payload, headers, idempotent)
+                self.breaker.record_success()
+                return result
+            except ModalAPIError as e:
+                last_error = e
+                if e.retryable:
+                    self.breaker.record_failure()
+                if not e.retryable or (e.ambiguous and not idempotent):
+                    self.stats["failures"] += 1
+                    raise
+
+            if attempt + 1 < self.retry_policy.max_attempts:
+                delay = self.retry_policy.backoff(attempt)
+                self.stats["retries"] += 1
+                print(f"🔁 Retrying Modal call in {delay:.2f}s ({last_error})")
+                await self.sleep(delay)
+
+        self.stats["failures"] += 1
+        raise last_error
+
+    async def _call(self, path: str, payload: dict, headers: dict, idempotent: bool) -> dict:
+        tracker = self.tracker(path, payload)
+        threshold = tracker.percentile(95)
+        if (not self.hedge or not idempotent or threshold is None
+                or len(tracker.samples) < self.hedge_min_samples):
+            return await self._attempt(path, payload, headers)
+        return await self._hedged(path, payload, headers, threshold)
+
+    async def _hedged(self, path: str, payload: dict, headers: Optional[dict], threshold: float) -> dict:
+        """Send a backup request if the primary is still running after the p95 latency"""
+        primary = asyncio.ensure_future(self._attempt(path, payload, headers))
+        done, _ = await asyncio.wait({primary}, timeout=threshold)
+        if done:
+            return primary.result()
+
+        self.stats["hedges"] += 1
+        print(f"🪁 Hedging Modal call after {threshold:.2f}s (p95)")
+        backup = asyncio.ensure_future(self._attempt(path, payload, headers))
+        pending = {primary, backup}
+        last_error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is backup:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    last_error = task.exception()
+            raise last_error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def _attempt(self, path: str, payload: dict, headers: Optional[dict]) -> dict:
+        self.stats["attempts"] += 1
+        start_time = time.monotonic()
+        try:
+            session = await self.session()
+            async with session.post(
+                f"{self.base_url}{path}",
+                json=payload,
+                headers=headers,
+                timeout=aiohttp.ClientTimeout(total=self.timeout)
+            ) as response:
+                if response.status != 200:
+                    error_text = await response.text()
+                    raise ModalAPIError(
+                        f"Modal API error ({response.status}): {error_text}",
+                        status=response.status,
+                        retryable=response.status in self.retry_policy.retryable_statuses,
+                        ambiguous=response.status in AMBIGUOUS_STATUSES
+                    )
+                result = await response.json(content_type=None)
+        except asyncio.TimeoutError:
+            raise ModalAPIError(f"Modal API timed out after {self.timeout}s", retryable=True, ambiguous=True)
+        except aiohttp.ClientConnectorError as e:
+            # Never connected: nothing can be running
+            raise ModalAPIError(f"Modal API connection error: {str(e)}", retryable=True)
+        except aiohttp.ClientError as e:
+            raise ModalAPIError(f"Modal API connection error: {str(e)}", retryable=True, ambiguous=True)
+
+        self.tracker(path, payload).record(time.monotonic() - start_time)
+        return result
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["p95_latency"] = {f"{path} {tier}": tracker.percentile(95)
+                                for (path, tier), tracker in self.latency.items()}
+        stats["circuit"] = self.breaker.get_stats()
+        return stats
@@ -0,0 +1,83 @@
+"""Per-tool routing between the full Flux model and the preview tier.
+
+The preview tier runs FLUX.1-schnell, a distilled model that needs only 1-4
+steps, at reduced resolution, so a draft is back in a couple of seconds. The
+full tier is FLUX.1-dev at the requested steps and size.
+
+Every MCP tool that generates images looks up its route by tool name. The
+default sends `generate_preview_image` to the preview tier and everything
+else to the full tier; override with a JSON object in MCP_TOOL_ROUTES, where
+a value is a tier name or a dict of route fields:
+
+    MCP_TOOL_ROUTES='{"batch_generate_smart_variations": "preview",
+                      "generate_social_media_set": {"tier": "preview", "steps": 2, "max_side": 768}}'
+"""
+import json
+import os
+from typing import Dict, Optional, Tuple
+
+TIERS = ("full", "preview")
+
+PREVIEW_STEPS = 4
+PREVIEW_MAX_STEPS = 4
+PREVIEW_MAX_SIDE = 512
+
+
+def preview_size(width: int, height: int, max_side: int = PREVIEW_MAX_SIDE) -> Tuple[int, int]:
+    """Scale down so the long side is at most `max_side`, keeping the aspect ratio and multiples of 16"""
+    scale = min(1.0, max_side / max(width, height))
+    return max(256, int(width * scale) // 16 * 16), max(256, int(height * scale) // 16 * 16)
+
+
+class Route:
+    def __init__(self, tier: str = "full", steps: Optional[int] = None, max_side: Optional[int] = None):
+        if tier not in TIERS:
+            raise ValueError(f"Unknown tier '{tier}', expected one of {list(TIERS)}")
+        self.tier = tier
+        self.steps = steps
+        self.max_side = max_side
+
+    @classmethod
+    def parse(cls, value) -> "Route":
+        if isinstance(value, str):
+            return cls(value)
+        return cls(value.get("tier", "full"), value.get("steps"), value.get("max_side"))
+
+    def apply(self, num_inference_steps: int, width: int, height: int) -> Tuple[int, int, int]:
+        """Steps and size to request on this route"""
+        if self.tier == "preview":
+            steps = min(self.steps or PREVIEW_STEPS, PREVIEW_MAX_STEPS)
+            width, height = preview_size(width, height, self.max_side or PREVIEW_MAX_SIDE)
+            return steps, width, height
+        if self.max_side:
+            width, height = preview_size(width, height, self.max_side)
+        return self.steps or num_inference_steps, width, height
+
+    def to_dict(self) -> dict:
+        return {"tier": self.tier, "steps": self.steps, "max_side": self.max_side}
+
+
+DEFAULT_ROUTES = {
+    "generate_preview_image": Route("preview"),
+}
+
+
+class ToolRouter:
+    def __init__(self, routes: Optional[Dict[str, Route]] = None, default: Optional[Route] = None):
+        self.routes = dict(DEFAULT_ROUTES if routes is None else routes)
+        self.default = default or Route("full")
+
+    @classmethod
+    def from_env(cls) -> "ToolRouter":
+        router = cls()
+        overrides = os.environ.get("MCP_TOOL_ROUTES", "").strip()
+        if overrides:
+            for tool, value in json.loads(overrides).items():
+                router.routes[tool] = Route.parse(value)
+        return router
+
+    def route(self, tool: str) -> Route:
+        return self.routes.get(tool, self.default)
+
+    def to_dict(self) -> dict:
+        return {tool: route.to_dict() for tool, route in self.routes.items()}
@@ -0,0 +1,204 @@
+"""Priority scheduling of generation jobs in front of the GPU.
+
+Jobs carry a priority class (interactive, standard, bulk) and an estimated
+cost. A fixed number of slots (GPU containers) run at once; when a slot frees
+up, the waiting job with the best effective class runs next, and within a
+class the cheapest job goes first (shortest job first). Waiting promotes a
+job by one class every `aging_seconds`, without limit, so bulk work that has
+waited long enough eventually outranks fresh interactive requests and
+cannot starve.
+
+Preemption is cooperative: when a job arrives that outranks a running
+preemptible job and no slot is free, the running job is asked to stop
+(`job.preempt_requested`). Its runner checks the flag between denoising
+steps and returns `Preempted(state, remaining_cost)`; the scheduler requeues
+it with its original arrival time and hands `state` back on the next run.
+
+A caller that stops waiting (its `submit` is cancelled) takes its job out of
+the queue; a job already running finishes, but is not requeued if preempted.
+
+The clock is injectable so policies can be exercised with simulated costs
+(see `benchmarks/scheduler_simulation.py` and `tests/test_scheduler.py`).
+"""
+import asyncio
+import itertools
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+PRIORITY_CLASSES = {"interactive": 0, "standard": 1, "bulk": 2}
+DEFAULT_PRIORITY = "standard"
+
+
+def estimate_cost(num_inference_steps: int, width: int, height: int) -> float:
+    """Relative GPU cost: denoising steps x megapixels (1024x1024 at 1 step = 1.0)"""
+    return num_inference_steps * (width * height) / (1024 * 1024)
+
+
+class Preempted:
+    """Returned by a runner that stopped early at the scheduler's request"""
+
+    def __init__(self, state: Any, remaining_cost: float):
+        self.state = state
+        self.remaining_cost = remaining_cost
+
+
+class Job:
+    def __init__(self, job_id: int, runner: Callable[["Job"], Awaitable[Any]], priority: str, cost: float,
+                 enqueued_at: float, preemptible: bool):
+        self.job_id = job_id
+        self.runner = runner
+        self.priority = priority
+        self.rank = PRIORITY_CLASSES[priority]
+        self.cost = cost
+        self.enqueued_at = enqueued_at
+        self.preemptible = preemptible
+        self.preempt_requested = False
+        self.resume_state = None
+        self.preemptions = 0
+        self.started_at = None
+        self.future: Optional[asyncio.Future] = None
+
+
+class PriorityScheduler:
+    def __init__(self, slots: int = 1, aging_seconds: float = 300.0, preemption: bool = False,
+                 clock: Callable[[], float] = time.time,
+                 on_preempt: Optional[Callable[[Job], Any]] = None):
+        self.slots = slots
+        self.aging_seconds = aging_seconds
+        self.preemption = preemption
+        self.clock = clock
+        self.on_preempt = on_preempt
+        self.waiting: List[Job] = []
+        self.running: Dict[int, Job] = {}
+        self._ids = itertools.count(1)
+        self.stats = {
+            "submitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "cancelled": 0,
+            "preemptions": 0,
+        }
+        # Queue wait of recent jobs per class
+        self.wait_seconds: Dict[str, deque] = {name: deque(maxlen=1000) for name in PRIORITY_CLASSES}
+
+    def effective_rank(self, job: Job, now: Optional[float] = None) -> int:
+        """Class rank after aging: one class better per `aging_seconds` waited"""
+        if not self.aging_seconds:
+            return job.rank
+        waited = (self.clock() if now is None else now) - job.enqueued_at
+        return job.rank - int(waited // self.aging_seconds)
+
+    def sort_key(self, job: Job, now: float) -> tuple:
+        # Equal effective class and cost: the originally higher class goes first
+        return (self.effective_rank(job, now), job.cost, job.rank, job.enqueued_at, job.job_id)
+
+    def next_job(self) -> Optional[Job]:
+        """The waiting job that should get the next free slot"""
+        if not self.waiting:
+            return None
+        now = self.clock()
+        return min(self.waiting, key=lambda job: self.sort_key(job, now))
+
+    def preemption_victim(self, incoming: Job) -> Optional[Job]:
+        """Running preemptible job that `incoming` should displace, if any"""
+        if not self.preemption or len(self.running) < self.slots:
+            return None
+        now = self.clock()
+        incoming_rank = self.effective_rank(incoming, now)
+        candidates = [
+            job for job in self.running.values()
+            if job.preemptible and not job.preempt_requested and job.rank > incoming_rank
+        ]
+        # Displace the lowest-class job, and among those the one with most work left
+        return max(candidates, key=lambda job: (job.rank, job.cost), default=None)
+
+    async def submit(self, runner: Callable[[Job], Awaitable[Any]], priority: str = DEFAULT_PRIORITY,
+                     cost: float = 1.0, preemptible: bool = False) -> Any:
+        """Queue `runner(job)` and return its result once it has run to completion"""
+        if priority not in PRIORITY_CLASSES:
+            raise ValueError(f"Unknown priority '{priority}', expected one of {list(PRIORITY_CLASSES)}")
+        job = Job(next(self._ids), runner, priority, cost, self.clock(), preemptible)
+        job.future = asyncio.get_running_loop().create_future()
+        self.stats["submitted"] += 1
+        self._enqueue(job)
+        try:
+            return await job.future
+        except asyncio.CancelledError:
+            self.cancel(job)
+            raise
+
+    def cancel(self, job: Job):
+        """Drop a job nobody waits for any more; a running job is left to finish"""
+        if not job.future.done():
+            job.future.cancel()
+        if job in self.waiting:
+            self.waiting.remove(job)
+            self.stats["cancelled"] += 1
+
+    def _enqueue(self, job: Job):
+        self.waiting.append(job)
+        victim = self.preemption_victim(job)
+        if victim is not None:
+            victim.preempt_requested = True
+            self.stats["preemptions"] += 1
+            if self.on_preempt is not None:
+                self.on_preempt(victim)
+        self._dispatch()
+
+    def _dispatch(self):
+        while len(self.running) < self.slots:
+            job = self.next_job()
+            if job is None:
+                return
+            self.waiting.remove(job)
+            self.running[job.job_id] = job
+            if job.started_at is None:
+                job.started_at = self.clock()
+                self.wait_seconds[job.priority].append(job.started_at - job.enqueued_at)
+            asyncio.ensure_future(self._run(job))
+
+    async def _run(self, job: Job):
+        try:
+            result = await job.runner(job)
+        except Exception as e:
+            self.running.pop(job.job_id, None)
+            self.stats["failed"] += 1
+            if not job.future.done():
+                job.future.set_exception(e)
+            self._dispatch()
+            return
+
+        self.running.pop(job.job_id, None)
+        if isinstance(result, Preempted) and job.future.cancelled():
+            self.stats["cancelled"] += 1
+        elif isinstance(result, Preempted):
+            # Back in line with its original arrival time, so aging still counts
+            job.resume_state = result.state
+            job.cost = result.remaining_cost
+            job.preempt_requested = False
+            job.preemptions += 1
+            self.waiting.append(job)
+        else:
+            self.stats["completed"] += 1
+            if not job.future.done():
+                job.future.set_result(result)
+        self._dispatch()
+
+    def get_stats(self) -> dict:
+        def percentile(values, p: float) -> Optional[float]:
+            if not values:
+                return None
+            ordered = sorted(values)
+            return round(ordered[min(len(ordered) - 1, int(round(p / 100 * (len(ordered) - 1))))], 3)
+
+        return {
+            **self.stats,
+            "slots": self.slots,
+            "running": len(self.running),
+            "waiting": {name: sum(1 for job in self.waiting if job.priority == name) for name in PRIORITY_CLASSES},
+            "wait_seconds": {
+                name: {"p50": percentile(values, 50), "p95": percentile(values, 95), "count": len(values)}
+                for name, values in self.wait_seconds.items()
+            },
+        }
@@ -0,0 +1,105 @@
+"""Run the Flux API without Modal: a `FluxEngine` in-process behind plain uvicorn.
+
+The endpoints, scheduler, coalescing, metrics and engine are the ones the Modal
+deployment runs, so every server-side feature can be measured on a laptop:
+
+    python -m src.serve --backend fake --port 8000    # no GPU, torch or diffusers
+    python -m src.serve --backend tiny                # real diffusers code path, tiny random weights
+    python -m src.serve --backend flux                # FLUX.1-dev on a local CUDA GPU (needs huggingface_token)
+
+The backend has no default, so a bare `python -m src.serve` cannot end up
+serving blank test images. With the uvicorn CLI, it comes from ENGINE_BACKEND:
+
+    ENGINE_BACKEND=fake uvicorn --factory src.serve:create_app --port 8000
+
+Point MODAL_API_URL at it (e.g. http://127.0.0.1:8000) to drive it from the
+MCP server, the app or the benchmarks. The preview tier runs on the same
+engine, with its reduced steps and size; only `--backend schnell` previews
+unguided as on Modal, while the other backends keep FLUX.1-dev's guidance, so
+`--backend flux` drafts are slower but not degraded.
+"""
+import argparse
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import uvicorn
+from fastapi import FastAPI
+
+from src.api import serve
+from src.engine import BACKENDS, FluxEngine, clear_preempt_flag
+
+
+class LocalEngineClient:
+    """Engine client that runs one engine on a worker thread, like a single GPU container"""
+
+    def __init__(self, engine: FluxEngine):
+        self.engine = engine
+        # One pipeline call at a time: calls do not share the device
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="engine")
+        self.in_flight = 0
+
+    async def _run(self, method, *args):
+        self.in_flight += 1
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self.executor, functools.partial(method, *args))
+        finally:
+            self.in_flight -= 1
+
+    async def inference(self, *args):
+        return await self._run(self.engine.inference, *args)
+
+    async def preview(self, *args):
+        return await self._run(self.engine.preview, *args)
+
+    async def edit(self, *args):
+        return await self._run(self.engine.edit, *args)
+
+    async def variations(self, *args):
+        return await self._run(self.engine.variations, *args)
+
+    def request_preemption(self, key: str):
+        self.engine.preempt_flags[key] = True
+
+    async def clear_preemption(self, key: str):
+        clear_preempt_flag(self.engine.preempt_flags, key)
+
+    async def queue_stats(self):
+        return max(0, self.in_flight - 1), 1
+
+    async def set_warm(self, count: int):
+        # The engine is loaded for as long as the process runs
+        pass
+
+    async def warmup(self, count: int):
+        await self._run(self.engine.warmup)
+
+
+def create_app(backend: str = "", compile: bool = False) -> FastAPI:
+    """Load an engine (ENGINE_BACKEND by default) and bind the API to it"""
+    backend = backend or os.environ.get("ENGINE_BACKEND", "")
+    if not backend:
+        raise ValueError(f"Choose an engine backend with ENGINE_BACKEND, one of {list(BACKENDS)}")
+    engine = FluxEngine.from_backend(backend, compile=compile)
+    # The scheduler orders requests for the one engine thread
+    return serve(LocalEngineClient(engine), slots=1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the Flux API locally with a pluggable pipeline")
+    backend = os.environ.get("ENGINE_BACKEND")
+    parser.add_argument("--backend", choices=BACKENDS, default=backend, required=not backend,
+                        help="Pipeline to serve (default: ENGINE_BACKEND); fake renders placeholder images")
+    parser.add_argument("--compile", action="store_true", help="torch.compile the flux backend")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    args = parser.parse_args()
+
+    app = create_app(args.backend, args.compile)
+    print(f"🚀 Flux API ({args.backend} backend) on http://{args.host}:{args.port}")
+    uvicorn.run(app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""Single-flight coalescing for identical in-flight requests.
+
+Used by the MCP server and the FastAPI layer so that two identical generations
+arriving while the first one is still running share a single GPU job.
+`IdempotentResponses` does the same by Idempotency-Key, and also for a while
+after the response was sent, so a client retry after a timeout gets it again.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+def normalize_generation_key(prompt: str, num_inference_steps: int, width: int, height: int, *extra) -> tuple:
+    """Build the coalescing key for a generation request.
+
+    Whitespace differences in the prompt are not meaningful to the model, so
+    they are collapsed before comparing requests.
+    """
+    return (" ".join(prompt.split()), int(num_inference_steps), int(width), int(height)) + tuple(extra)
+
+
+class SingleFlight:
+    """Share one in-flight task between every caller asking for the same key"""
+
+    def __init__(self, name: str = "singleflight"):
+        self.name = name
+        self._inflight: Dict[Hashable, asyncio.Future] = {}
+        self.stats = {
+            "requests": 0,
+            "executed": 0,
+            "coalesced": 0,
+            "errors": 0,
+        }
+
+    @property
+    def in_flight(self) -> int:
+        return len(self._inflight)
+
+    def is_in_flight(self, key: Hashable) -> bool:
+        """Whether a call for `key` would join an existing task"""
+        return key in self._inflight
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """Run `fn` once per key; concurrent callers with the same key await the same result"""
+        self.stats["requests"] += 1
+        task = self._inflight.get(key)
+        if task is None:
+            self.stats["executed"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t, k=key: self._finish(k, t))
+        else:
+            self.stats["coalesced"] += 1
+            print(f"🔗 [{self.name}] Coalesced duplicate request ({self.stats['coalesced']} total)")
+
+        # Shield the shared task so one waiter disconnecting does not cancel
+        # the job for everybody else
+        return await asyncio.shield(task)
+
+    def _finish(self, key: Hashable, task: asyncio.Future):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def get_stats(self) -> dict:
+        stats = dict(self.stats)
+        stats["in_flight"] = self.in_flight
+        stats["coalesce_rate"] = round(stats["coalesced"] / stats["requests"], 4) if stats["requests"] else 0.0
+        return stats
+
+
+class IdempotentResponses:
+    """One response per Idempotency-Key: shared while in flight, replayed for `ttl_seconds` after"""
+
+    def __init__(self, ttl_seconds: float = 300.0, max_entries: int = 64, clock: Callable[[], float] = time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.clock = clock
+        self.flight = SingleFlight("idempotency")
+        # Responses hold images, so only a few are kept
+        self._done: "OrderedDict[str, tuple]" = OrderedDict()
+        self.stats = {"replayed": 0}
+
+    def _expire(self, now: float):
+        while self._done:
+            key, (finished_at, _) = next(iter(self._done.items()))
+            if now - finished_at < self.ttl_seconds and len(self._done) <= self.max_entries:
+                return
+            del self._done[key]
+
+    def seen(self, key: str) -> bool:
+        return key in self._done or self.flight.is_in_flight(key)
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """`fn()` once per key; failures are not kept, so they can be retried"""
+        self._expire(self.clock())
+        if key in self._done:
+            self.stats["replayed"] += 1
+            return self._done[key][1]
+        result = await self.flight.do(key, fn)
+        if key not in self._done:
+            self._done[key] = (self.clock(), result)
+            self._expire(self.clock())
+        return result
+
+    def get_stats(self) -> dict:
+        return {**self.stats, **self.flight.get_stats(), "kept": len(self._done)}
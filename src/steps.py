@@ -0,0 +1,142 @@
+"""Automatic choice of denoising steps from size, platform and quality target.
+
+Image quality stops improving well before 50 steps, and how early depends on
+resolution. The calibration table (`src/step_calibration.json`, rebuilt with
+`python -m benchmarks.step_calibration` on a GPU) records, per resolution
+bucket, how close a render at N steps gets to the 50-step reference of the
+same prompt and seed:
+
+    lpips        perceptual distance to the reference (lower is closer)
+    clip_ratio   CLIP prompt-image score relative to the reference
+
+A quality target is a bound on both. The planner picks the smallest
+calibrated step count that meets the target in the nearest resolution
+bucket. The target comes from the platform (a thumbnail needs less than a
+hero image) unless one is given.
+
+Pass `num_inference_steps=0` (AUTO_STEPS) to the MCP generation tools to use
+it. Only a measured table (`"measured": true`, as the calibration benchmark
+writes) is trusted: with the shipped provisional one, auto steps run the full
+UNCALIBRATED_STEPS schedule.
+
+    python -m src.steps                      # steps and GPU time per preset
+"""
+import argparse
+import json
+import math
+import os
+from typing import Optional
+
+AUTO_STEPS = 0
+# Auto steps until a measured calibration table replaces the provisional one
+UNCALIBRATED_STEPS = int(os.environ.get("UNCALIBRATED_STEPS", "50"))
+CALIBRATION_FILE = os.environ.get(
+    "STEP_CALIBRATION_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "step_calibration.json"))
+
+QUALITY_TARGETS = {
+    "draft": {"max_lpips": 0.30, "min_clip_ratio": 0.97},
+    "standard": {"max_lpips": 0.18, "min_clip_ratio": 0.99},
+    "hero": {"max_lpips": 0.10, "min_clip_ratio": 0.995},
+}
+DEFAULT_QUALITY = "standard"
+
+# Size presets and the AI tab's platform names
+PLATFORM_QUALITY = {
+    "youtube_thumbnail": "draft",
+    "twitter_post": "standard",
+    "twitter": "standard",
+    "facebook_cover": "standard",
+    "facebook": "standard",
+    "instagram_post": "standard",
+    "instagram_story": "standard",
+    "instagram": "standard",
+    "linkedin_post": "standard",
+    "linkedin": "standard",
+    "website": "hero",
+    "hero": "hero",
+}
+
+
+class StepPlanner:
+    def __init__(self, table: dict):
+        self.table = table
+        self.reference_steps = table.get("reference_steps", 50)
+        self.measured = table.get("measured", False)
+        self.buckets = sorted(table["buckets"], key=lambda bucket: bucket["megapixels"])
+
+    @classmethod
+    def load(cls, path: Optional[str] = None) -> "StepPlanner":
+        with open(path or CALIBRATION_FILE, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    @staticmethod
+    def quality_for(platform: str = "", quality: str = "") -> str:
+        if quality:
+            if quality not in QUALITY_TARGETS:
+                raise ValueError(f"Unknown quality '{quality}', expected one of {list(QUALITY_TARGETS)}")
+            return quality
+        return PLATFORM_QUALITY.get(platform, DEFAULT_QUALITY)
+
+    def bucket_for(self, width: int, height: int) -> dict:
+        """Calibrated bucket nearest in megapixels (log scale)"""
+        megapixels = width * height / 1e6
+        return min(self.buckets, key=lambda bucket: abs(math.log(bucket["megapixels"] / megapixels)))
+
+    def plan(self, width: int, height: int, platform: str = "", quality: str = "") -> dict:
+        quality = self.quality_for(platform, quality)
+        target = QUALITY_TARGETS[quality]
+        bucket = self.bucket_for(width, height)
+        candidates = zip(bucket["steps"], bucket["lpips"], bucket["clip_ratio"])
+        for steps, lpips, clip_ratio in candidates:
+            if lpips <= target["max_lpips"] and clip_ratio >= target["min_clip_ratio"]:
+                break
+        else:
+            steps, lpips, clip_ratio = self.reference_steps, 0.0, 1.0
+        if not self.measured:
+            # Provisional numbers are not evidence that fewer steps are enough
+            steps, lpips, clip_ratio = UNCALIBRATED_STEPS, 0.0, 1.0
+        return {
+            "steps": steps,
+            "quality": quality,
+            "calibrated": self.measured,
+            "bucket_megapixels": bucket["megapixels"],
+            "expected_lpips": lpips,
+            "expected_clip_ratio": clip_ratio,
+        }
+
+    def choose(self, width: int, height: int, platform: str = "", quality: str = "") -> int:
+        return self.plan(width, height, platform, quality)["steps"]
+
+
+step_planner = StepPlanner.load()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Show auto-step decisions for the size presets")
+    parser.add_argument("--table", default=None, help="Calibration table (default: src/step_calibration.json)")
+    parser.add_argument("--quality", default="", choices=[""] + list(QUALITY_TARGETS))
+    args = parser.parse_args()
+
+    presets = {
+        "default": (1024, 1024),
+        "instagram_post": (1080, 1080),
+        "instagram_story": (1080, 1920),
+        "twitter_post": (1200, 672),
+        "linkedin_post": (1200, 1200),
+        "facebook_cover": (1200, 632),
+        "youtube_thumbnail": (1280, 720),
+        "website": (1344, 768),
+    }
+    planner = StepPlanner.load(args.table) if args.table else step_planner
+    print(f"Calibration: {planner.table.get('source', 'unknown')}")
+    if not planner.measured:
+        print(f"⚠️ Not a measured table: auto steps use {UNCALIBRATED_STEPS} steps")
+    total = 0
+    for platform, (width, height) in presets.items():
+        plan = planner.plan(width, height, platform, args.quality)
+        total += plan["steps"]
+        print(f"{platform:>18} {width}x{height}  {plan['quality']:<8} {plan['steps']:>3} steps  "
+              f"(lpips {plan['expected_lpips']:.3f}, clip {plan['expected_clip_ratio']:.3f})")
+    average = total / len(presets)
+    print(f"Average {average:.1f} steps vs {planner.reference_steps}: "
+          f"{1 - average / planner.reference_steps:.0%} fewer GPU-seconds in the denoising loop")
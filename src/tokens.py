@@ -0,0 +1,153 @@
+"""Token counting for the two Flux text encoders.
+
+Flux feeds the prompt to CLIP (77 tokens, pooled embedding) and to T5
+(`max_sequence_length`, up to 512). `TokenCounter` loads the matching Hugging
+Face tokenizer on first use (CPU only, cached for the life of the process) and
+memoizes counts. Where `transformers` or the tokenizer files are missing, it
+falls back to a conservative estimate.
+
+By default tokenizers are only read from the local Hugging Face cache, so a
+request never waits on a download; fetch them once with
+    python -m src.tokens download
+
+Configuration:
+    TOKENIZER_MODE=auto|download|estimate         (default: auto = local cache only)
+    T5_TOKENIZER=google/t5-v1_1-xxl
+    CLIP_TOKENIZER=openai/clip-vit-large-patch14
+"""
+import argparse
+import os
+import re
+import threading
+from collections import OrderedDict
+from typing import Callable, Optional, Sequence
+
+T5_MAX_TOKENS = 512
+CLIP_MAX_TOKENS = 77
+
+# T5 encoder lengths worth padding to; shorter sequences encode and attend faster
+T5_SEQUENCE_BUCKETS = (128, 256, 512)
+
+_PIECE_PATTERN = re.compile(r"[A-Za-z]+|\d|[^\sA-Za-z\d]")
+
+
+def estimate_t5_tokens(text: str) -> int:
+    """Approximate T5 SentencePiece token count (plus the end-of-sequence token).
+
+    Short words are usually one piece and long ones split every ~6
+    characters; digits and punctuation are a piece each. Errs on the high side.
+    """
+    count = 1
+    for piece in _PIECE_PATTERN.findall(text):
+        count += 1 + len(piece) // 6 if piece.isalpha() else 1
+    return count
+
+
+def estimate_clip_tokens(text: str) -> int:
+    """Approximate CLIP BPE token count including start and end tokens"""
+    count = 2
+    for piece in _PIECE_PATTERN.findall(text):
+        count += 1 + len(piece) // 7 if piece.isalpha() else 1
+    return count
+
+
+class TokenCounter:
+    def __init__(self, name: str, source: str, estimate: Callable[[str], int], special_tokens: int,
+                 cache_size: int = 8192):
+        self.name = name
+        self.source = source
+        self.estimate = estimate
+        self.special_tokens = special_tokens
+        self.cache_size = cache_size
+        self._tokenizer = None
+        self._loaded = False
+        self._lock = threading.Lock()
+        self._cache: "OrderedDict[str, int]" = OrderedDict()
+
+    def use(self, tokenizer):
+        """Count with an already loaded tokenizer (e.g. the pipeline's own)"""
+        with self._lock:
+            self._tokenizer = tokenizer
+            self._loaded = True
+            self._cache.clear()
+
+    def _load(self):
+        with self._lock:
+            if self._loaded:
+                return
+            self._loaded = True
+            mode = os.environ.get("TOKENIZER_MODE", "auto")
+            if mode == "estimate":
+                return
+            try:
+                from transformers import AutoTokenizer
+                self._tokenizer = AutoTokenizer.from_pretrained(self.source, local_files_only=mode != "download")
+                print(f"🔤 Loaded {self.name} tokenizer from {self.source}")
+            except Exception as e:
+                print(f"⚠️ {self.name} tokenizer unavailable ({type(e).__name__}), using estimates")
+
+    @property
+    def exact(self) -> bool:
+        if not self._loaded:
+            self._load()
+        return self._tokenizer is not None
+
+    def count(self, text: str) -> int:
+        """Tokens `text` occupies in the encoder, special tokens included"""
+        cached = self._cache.get(text)
+        if cached is not None:
+            self._cache.move_to_end(text)
+            return cached
+        if not self._loaded:
+            self._load()
+        if self._tokenizer is not None:
+            count = len(self._tokenizer(text, add_special_tokens=True, truncation=False)["input_ids"])
+        else:
+            count = self.estimate(text)
+        self._cache[text] = count
+        if len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return count
+
+    __call__ = count
+
+
+t5_counter = TokenCounter("T5", os.environ.get("T5_TOKENIZER", "google/t5-v1_1-xxl"), estimate_t5_tokens, 1)
+clip_counter = TokenCounter("CLIP", os.environ.get("CLIP_TOKENIZER", "openai/clip-vit-large-patch14"),
+                            estimate_clip_tokens, 2)
+
+
+def sequence_length_for(tokens: int, buckets: Sequence[int] = T5_SEQUENCE_BUCKETS) -> int:
+    """Smallest T5 `max_sequence_length` bucket that holds `tokens`"""
+    for bucket in buckets:
+        if tokens <= bucket:
+            return bucket
+    return buckets[-1]
+
+
+def token_stats(prompt: str, clip_prompt: Optional[str] = None) -> dict:
+    """Per-request token statistics for both encoders"""
+    t5_tokens = t5_counter.count(prompt)
+    clip_tokens = clip_counter.count(clip_prompt if clip_prompt is not None else prompt)
+    return {
+        "t5_tokens": t5_tokens,
+        "clip_tokens": clip_tokens,
+        "t5_truncated": t5_tokens > T5_MAX_TOKENS,
+        "clip_truncated": clip_tokens > CLIP_MAX_TOKENS,
+        "max_sequence_length": sequence_length_for(t5_tokens),
+        "exact": t5_counter.exact,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Prompt tokenizer tools")
+    parser.add_argument("command", choices=["download", "count"])
+    parser.add_argument("text", nargs="?", default="")
+    args = parser.parse_args()
+
+    if args.command == "download":
+        os.environ["TOKENIZER_MODE"] = "download"
+        for counter in (t5_counter, clip_counter):
+            print(f"{counter.name}: {'ready' if counter.exact else 'unavailable'}")
+    else:
+        print(token_stats(args.text))
@@ -0,0 +1,371 @@
+"""Request-scoped latency tracing for the Gradio -> MCP -> Modal path.
+
+A trace ID is created by the Gradio handler, handed to the MCP tools as a
+`trace_id` argument (a W3C `traceparent` string), forwarded to the Modal API in
+the `traceparent` HTTP header and finally into `Model.inference`, which returns
+its own stage timings. Every process appends its spans to the same exporter.
+
+Spans are written as OTLP/JSON (`ExportTraceServiceRequest`), one object per
+line, so the file can be fed to an OpenTelemetry collector's `otlpjsonfile`
+receiver; alternatively they are POSTed to an OTLP/HTTP collector. Finished
+spans are queued and exported in batches from a background thread, so a slow
+collector or disk never blocks the event loop of the handler that recorded
+them; when the queue is full, new spans are dropped.
+
+Configuration:
+    TRACE_EXPORT=none|file|otlp   (default: none)
+    TRACE_FILE=traces/spans.jsonl
+    TRACE_FILE_MAX_BYTES=52428800 (rotated to spans.jsonl.1, .2, ... past this size)
+    TRACE_FILE_BACKUPS=3
+    OTEL_EXPORTER_OTLP_ENDPOINT=http://localhost:4318
+
+Summarize a trace file:
+    python -m src.tracing summarize traces/spans.jsonl
+"""
+import argparse
+import atexit
+import contextvars
+import json
+import os
+import queue
+import secrets
+import threading
+import time
+import urllib.request
+from contextlib import contextmanager
+from typing import Dict, List, Optional, Tuple
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+
+def new_trace_id() -> str:
+    return secrets.token_hex(16)
+
+
+def new_span_id() -> str:
+    return secrets.token_hex(8)
+
+
+def format_traceparent(trace_id: str, span_id: str) -> str:
+    return f"00-{trace_id}-{span_id}-01"
+
+
+def parse_traceparent(value: Optional[str]) -> Tuple[Optional[str], Optional[str]]:
+    """Return (trace_id, parent_span_id) from a traceparent header or a bare trace ID"""
+    if not value:
+        return None, None
+    parts = value.strip().split("-")
+    if len(parts) == 4 and len(parts[1]) == 32 and len(parts[2]) == 16:
+        return parts[1], parts[2]
+    if len(value.strip()) == 32:
+        return value.strip(), None
+    return None, None
+
+
+class Span:
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str] = None,
+                 start: Optional[float] = None, attributes: Optional[dict] = None):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = new_span_id()
+        self.parent_span_id = parent_span_id
+        self.start = time.time() if start is None else start
+        self.end = None
+        self.attributes = dict(attributes or {})
+        self.error = None
+
+    def set_attribute(self, key: str, value):
+        self.attributes[key] = value
+
+    def traceparent(self) -> str:
+        return format_traceparent(self.trace_id, self.span_id)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": 1,
+            "startTimeUnixNano": str(int(self.start * 1e9)),
+            "endTimeUnixNano": str(int((self.end or self.start) * 1e9)),
+            "attributes": [_otlp_attribute(k, v) for k, v in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 1},
+        }
+        if self.parent_span_id:
+            span["parentSpanId"] = self.parent_span_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+def _otlp_request(service_name: str, spans: List[Span]) -> dict:
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [_otlp_attribute("service.name", service_name)]},
+            "scopeSpans": [{
+                "scope": {"name": "ai-marketing-content-creator"},
+                "spans": [span.to_otlp() for span in spans],
+            }],
+        }]
+    }
+
+
+class FileSpanExporter:
+    """Append OTLP/JSON lines to a local file, rotating it past `max_bytes`"""
+
+    def __init__(self, path: str, max_bytes: int = 50 * 1024 * 1024, backups: int = 3):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.backups = backups
+        self._lock = threading.Lock()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def _rotate(self):
+        """spans.jsonl -> spans.jsonl.1 -> ... -> spans.jsonl.<backups>, dropping the oldest"""
+        for index in range(self.backups - 1, 0, -1):
+            source = f"{self.path}.{index}"
+            if os.path.exists(source):
+                os.replace(source, f"{self.path}.{index + 1}")
+        if self.backups > 0:
+            os.replace(self.path, f"{self.path}.1")
+        else:
+            os.remove(self.path)
+
+    def export(self, service_name: str, spans: List[Span]):
+        line = json.dumps(_otlp_request(service_name, spans)) + "\n"
+        with self._lock:
+            try:
+                if self.max_bytes and os.path.getsize(self.path) >= self.max_bytes:
+                    self._rotate()
+            except FileNotFoundError:
+                # Not written yet, or another process rotated it first
+                pass
+            # One write per line keeps appends from several processes intact
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(line)
+
+
+class OTLPHttpSpanExporter:
+    """POST spans to an OTLP/HTTP collector (`/v1/traces`, JSON encoding)"""
+
+    def __init__(self, endpoint: str, timeout: float = 2.0):
+        self.url = endpoint.rstrip("/") + "/v1/traces"
+        self.timeout = timeout
+
+    def export(self, service_name: str, spans: List[Span]):
+        body = json.dumps(_otlp_request(service_name, spans)).encode("utf-8")
+        request = urllib.request.Request(self.url, data=body, headers={"Content-Type": "application/json"})
+        try:
+            urllib.request.urlopen(request, timeout=self.timeout).close()
+        except Exception as e:
+            print(f"Trace export to {self.url} failed: {str(e)}")
+
+
+class BatchSpanExporter:
+    """Queue spans and hand them to `exporter` in batches from a daemon thread.
+
+    `export` only enqueues, so it is safe to call from async handlers. A batch
+    goes out when it reaches `max_batch` spans or `interval` seconds after its
+    first span, and whatever is queued is flushed at interpreter exit.
+    """
+
+    def __init__(self, exporter, max_queue: int = 2048, max_batch: int = 256, interval: float = 1.0):
+        self.exporter = exporter
+        self.max_batch = max_batch
+        self.interval = interval
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._worker, name="span-exporter", daemon=True)
+        self._thread.start()
+        atexit.register(self.shutdown)
+
+    def export(self, service_name: str, spans: List[Span]):
+        for span in spans:
+            try:
+                self._queue.put_nowait((service_name, span))
+            except queue.Full:
+                self.dropped += 1
+
+    def _worker(self):
+        while True:
+            item = self._queue.get()
+            if item is None:
+                return
+            batch = [item]
+            deadline = time.monotonic() + self.interval
+            stop = False
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    item = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                batch.append(item)
+            self._send(batch)
+            if stop:
+                return
+
+    def _send(self, batch: List[Tuple[str, Span]]):
+        by_service: Dict[str, List[Span]] = {}
+        for service_name, span in batch:
+            by_service.setdefault(service_name, []).append(span)
+        for service_name, spans in by_service.items():
+            try:
+                self.exporter.export(service_name, spans)
+            except Exception as e:
+                print(f"Trace export failed: {str(e)}")
+
+    def shutdown(self, timeout: float = 5.0):
+        """Flush the queue and stop the worker"""
+        if not self._thread.is_alive():
+            return
+        try:
+            self._queue.put(None, timeout=timeout)
+        except queue.Full:
+            return
+        self._thread.join(timeout)
+
+
+class Tracer:
+    def __init__(self, service_name: str, exporter=None):
+        self.service_name = service_name
+        self.exporter = exporter
+
+    @property
+    def enabled(self) -> bool:
+        return self.exporter is not None
+
+    @contextmanager
+    def span(self, name: str, parent: Optional[str] = None, **attributes):
+        """Time a block as a span.
+
+        `parent` is a traceparent string (or bare trace ID); without it the span
+        joins the current span's trace, or starts a new trace.
+        """
+        trace_id, parent_span_id = parse_traceparent(parent)
+        current = _current_span.get()
+        if trace_id is None and current is not None:
+            trace_id, parent_span_id = current.trace_id, current.span_id
+        span = Span(name, trace_id or new_trace_id(), parent_span_id, attributes=attributes)
+        token = _current_span.set(span)
+        try:
+            yield span
+        except BaseException as e:
+            span.error = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            _current_span.reset(token)
+            span.end = time.time()
+            self.export([span])
+
+    def record_span(self, name: str, parent: Optional[str], start: float, end: float, **attributes) -> Optional[Span]:
+        """Record a span whose timing was measured elsewhere (e.g. returned by the model server)"""
+        trace_id, parent_span_id = parse_traceparent(parent)
+        if trace_id is None:
+            return None
+        span = Span(name, trace_id, parent_span_id, start=start, attributes=attributes)
+        span.end = end
+        self.export([span])
+        return span
+
+    def export(self, spans: List[Span]):
+        if self.exporter is None:
+            return
+        try:
+            self.exporter.export(self.service_name, spans)
+        except Exception as e:
+            print(f"Trace export failed: {str(e)}")
+
+
+def get_tracer(service_name: str) -> Tracer:
+    """Tracer configured from the TRACE_EXPORT environment variables (off unless set)"""
+    mode = os.environ.get("TRACE_EXPORT", "none").lower()
+    if mode == "otlp":
+        endpoint = os.environ.get("OTEL_EXPORTER_OTLP_ENDPOINT", "http://localhost:4318")
+        exporter = OTLPHttpSpanExporter(endpoint)
+    elif mode == "file":
+        exporter = FileSpanExporter(
+            os.environ.get("TRACE_FILE", "traces/spans.jsonl"),
+            max_bytes=int(os.environ.get("TRACE_FILE_MAX_BYTES", str(50 * 1024 * 1024))),
+            backups=int(os.environ.get("TRACE_FILE_BACKUPS", "3")),
+        )
+    else:
+        return Tracer(service_name)
+    return Tracer(service_name, BatchSpanExporter(exporter))
+
+
+# Summary CLI
+
+def load_spans(path: str) -> List[dict]:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            for resource_spans in json.loads(line).get("resourceSpans", []):
+                for scope_spans in resource_spans.get("scopeSpans", []):
+                    spans.extend(scope_spans.get("spans", []))
+    return spans
+
+
+def percentile(ordered: List[float], p: float) -> float:
+    index = min(len(ordered) - 1, max(0, int(round(p / 100 * (len(ordered) - 1)))))
+    return ordered[index]
+
+
+def summarize(spans: List[dict]) -> Dict[str, dict]:
+    """p50/p95/p99 duration in milliseconds per span name"""
+    durations: Dict[str, List[float]] = {}
+    for span in spans:
+        duration = (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6
+        durations.setdefault(span["name"], []).append(duration)
+
+    summary = {}
+    for name, values in durations.items():
+        values.sort()
+        summary[name] = {
+            "count": len(values),
+            "p50_ms": round(percentile(values, 50), 2),
+            "p95_ms": round(percentile(values, 95), 2),
+            "p99_ms": round(percentile(values, 99), 2),
+            "max_ms": round(values[-1], 2),
+        }
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Latency tracing tools")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    summarize_parser = subparsers.add_parser("summarize", help="p50/p95/p99 per stage")
+    summarize_parser.add_argument("path", nargs="?", default=os.environ.get("TRACE_FILE", "traces/spans.jsonl"))
+    summarize_parser.add_argument("--json", action="store_true", help="Print JSON instead of a table")
+    args = parser.parse_args()
+
+    summary = summarize(load_spans(args.path))
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    print(f"{'stage':<28}{'count':>8}{'p50 ms':>12}{'p95 ms':>12}{'p99 ms':>12}{'max ms':>12}")
+    for name, row in sorted(summary.items(), key=lambda item: -item[1]["p50_ms"]):
+        print(f"{name:<28}{row['count']:>8}{row['p50_ms']:>12.1f}{row['p95_ms']:>12.1f}{row['p99_ms']:>12.1f}{row['max_ms']:>12.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,230 @@
+"""Pluggable transports between the Gradio app and the MCP tool server.
+
+    stdio      spawn `mcp_server.py` child processes and speak JSON-RPC over
+               their pipes; MCP_WORKERS (default 1) processes run as a
+               supervised pool (see `src/mcp_pool.py`) that restarts crashed
+               workers
+    inprocess  import `mcp_server` and call the FastMCP tools directly: no
+               child process, no serialization, images are passed by reference
+    http       connect to a running `python mcp_server.py --transport streamable-http`
+               over MCP streamable HTTP, with a pool of sessions; each call
+               goes to the session with the fewest calls in flight
+
+Select with MCP_TRANSPORT=stdio|inprocess|http. The http transport reads
+MCP_SERVER_URL (default http://127.0.0.1:8765/mcp) and MCP_HTTP_POOL_SIZE
+(default 4).
+
+`stats` counts calls and the payload bytes each transport serializes (tool
+arguments out, tool results back); in-process calls serialize nothing.
+"""
+import asyncio
+import importlib
+import json
+import os
+from contextlib import AsyncExitStack
+from typing import List, Optional
+
+DEFAULT_SERVER_URL = "http://127.0.0.1:8765/mcp"
+
+
+def _tool_dicts(tools) -> List[dict]:
+    return [{
+        "name": tool.name,
+        "description": tool.description,
+        "input_schema": tool.inputSchema
+    } for tool in tools]
+
+
+def _first_text(content) -> Optional[str]:
+    return content[0].text if content else None
+
+
+class MCPTransport:
+    name = ""
+
+    def __init__(self):
+        self.stats = {"calls": 0, "errors": 0, "bytes_sent": 0, "bytes_received": 0}
+        self._connected = False
+
+    @property
+    def connected(self) -> bool:
+        return self._connected
+
+    async def start(self) -> List[dict]:
+        """Connect and return the server's tools"""
+        raise NotImplementedError
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Optional[str]:
+        raise NotImplementedError
+
+    async def ping(self):
+        """Raise if the server no longer answers"""
+
+    async def close(self):
+        self._connected = False
+
+    def _record(self, arguments: dict, result: Optional[str], serialized: bool = True):
+        self.stats["calls"] += 1
+        if serialized:
+            self.stats["bytes_sent"] += len(json.dumps(arguments))
+            self.stats["bytes_received"] += len(result or "")
+
+    def get_stats(self) -> dict:
+        return {"transport": self.name, **self.stats}
+
+
+class _SessionTransport(MCPTransport):
+    """Shared plumbing for transports that talk to the server through a ClientSession"""
+
+    def __init__(self):
+        super().__init__()
+        self._stack: Optional[AsyncExitStack] = None
+
+    async def _open_session(self, read, write):
+        from mcp import ClientSession
+
+        session = await self._stack.enter_async_context(ClientSession(read, write))
+        await session.initialize()
+        return session
+
+    async def _call(self, session, tool_name: str, arguments: dict) -> Optional[str]:
+        try:
+            result = await session.call_tool(tool_name, arguments=arguments)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        text = _first_text(result.content) if hasattr(result, "content") else None
+        self._record(arguments, text)
+        return text
+
+    async def close(self):
+        self._connected = False
+        if self._stack is not None:
+            stack, self._stack = self._stack, None
+            await stack.aclose()
+
+
+class StdioTransport(_SessionTransport):
+    name = "stdio"
+
+    def __init__(self, script: str = "mcp_server.py", env: Optional[dict] = None):
+        super().__init__()
+        self.script = script
+        self.env = env
+        self.session = None
+
+    async def start(self) -> List[dict]:
+        from mcp import StdioServerParameters
+        from mcp.client.stdio import stdio_client
+
+        params = StdioServerParameters(command="python", args=[self.script], env=self.env)
+        self._stack = AsyncExitStack()
+        read, write = await self._stack.enter_async_context(stdio_client(params))
+        self.session = await self._open_session(read, write)
+        tools = _tool_dicts((await self.session.list_tools()).tools)
+        self._connected = True
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Optional[str]:
+        return await self._call(self.session, tool_name, arguments)
+
+    async def ping(self):
+        await self.session.send_ping()
+
+
+class InProcessTransport(MCPTransport):
+    name = "inprocess"
+
+    def __init__(self, module: str = "mcp_server"):
+        super().__init__()
+        self.module = module
+        self.server = None
+
+    async def start(self) -> List[dict]:
+        self.server = importlib.import_module(self.module).mcp
+        tools = _tool_dicts(await self.server.list_tools())
+        self._connected = True
+        return tools
+
+    async def close(self):
+        self._connected = False
+        # The server's HTTP session lives on this event loop
+        client = getattr(importlib.import_module(self.module), "modal_client", None)
+        if client is not None:
+            await client.close()
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Optional[str]:
+        try:
+            content = await self.server.call_tool(tool_name, arguments)
+        except Exception:
+            self.stats["errors"] += 1
+            raise
+        text = _first_text(content)
+        self._record(arguments, text, serialized=False)
+        return text
+
+
+class StreamableHTTPTransport(_SessionTransport):
+    name = "http"
+
+    def __init__(self, url: str = DEFAULT_SERVER_URL, pool_size: int = 4, headers: Optional[dict] = None):
+        super().__init__()
+        self.url = url
+        self.pool_size = max(1, pool_size)
+        self.headers = headers
+        self.sessions = []
+        self.in_flight = []
+
+    async def start(self) -> List[dict]:
+        from mcp.client.streamable_http import streamablehttp_client
+
+        self._stack = AsyncExitStack()
+        for _ in range(self.pool_size):
+            read, write, _ = await self._stack.enter_async_context(streamablehttp_client(self.url, headers=self.headers))
+            self.sessions.append(await self._open_session(read, write))
+            self.in_flight.append(0)
+        tools = _tool_dicts((await self.sessions[0].list_tools()).tools)
+        self._connected = True
+        return tools
+
+    async def call_tool(self, tool_name: str, arguments: dict) -> Optional[str]:
+        index = min(range(len(self.sessions)), key=self.in_flight.__getitem__)
+        self.in_flight[index] += 1
+        try:
+            return await self._call(self.sessions[index], tool_name, arguments)
+        finally:
+            self.in_flight[index] -= 1
+
+    async def ping(self):
+        await asyncio.gather(*(session.send_ping() for session in self.sessions))
+
+    async def close(self):
+        self.sessions, self.in_flight = [], []
+        await super().close()
+
+
+def server_env() -> dict:
+    """Environment handed to a spawned MCP server"""
+    return {
+        "MODAL_API_URL": os.environ.get("MODAL_API_URL"),
+        "MISTRAL_API_KEY": os.environ.get("MISTRAL_API_KEY"),
+        # Client tuning and tracing settings for the server process
+        **{key: value for key, value in os.environ.items()
+           if key.startswith(("MODAL_", "MISTRAL_", "TRACE_", "OTEL_", "MCP_", "STEP_", "TOKENIZER_"))},
+    }
+
+
+def make_transport(kind: Optional[str] = None) -> MCPTransport:
+    kind = kind or os.environ.get("MCP_TRANSPORT", "stdio")
+    if kind == "stdio":
+        from src.mcp_pool import MCPWorkerPool
+
+        env = server_env()
+        return MCPWorkerPool(int(os.environ.get("MCP_WORKERS", "1")), lambda: StdioTransport(env=env),
+                             health_interval=float(os.environ.get("MCP_HEALTH_INTERVAL", "5")))
+    if kind == "inprocess":
+        return InProcessTransport()
+    if kind == "http":
+        return StreamableHTTPTransport(os.environ.get("MCP_SERVER_URL", DEFAULT_SERVER_URL),
+                                       int(os.environ.get("MCP_HTTP_POOL_SIZE", "4")))
+    raise ValueError(f"Unknown MCP_TRANSPORT '{kind}', expected stdio, inprocess or http")
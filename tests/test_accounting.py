@@ -0,0 +1,49 @@
+import pytest
+
+from src.accounting import Ledger, QuotaExceeded
+
+
+@pytest.fixture
+def ledger(tmp_path):
+    return Ledger(str(tmp_path / "accounting.sqlite3"))
+
+
+def test_calls_in_flight_count_against_the_quota(ledger):
+    ledger.set_quota("user", "ana", "day", gpu_seconds=10)
+    reservation = ledger.admit(user="ana", gpu_seconds=6)
+    with pytest.raises(QuotaExceeded) as error:
+        ledger.admit(user="ana", gpu_seconds=6)
+    assert error.value.limit == "gpu_seconds"
+    ledger.release(reservation)
+    ledger.release(ledger.admit(user="ana", gpu_seconds=6))
+    assert ledger.get_stats()["in_flight"] == {}
+
+
+def test_recorded_usage_replaces_the_reservation(ledger):
+    ledger.set_quota("campaign", "launch", "month", gpu_seconds=10, images=2)
+    with ledger.admission(campaign="launch", gpu_seconds=6, images=1):
+        ledger.record("generate_and_save_image", campaign="launch", tier="full", width=1024, height=1024,
+                      steps=30, gpu_seconds=8)
+    assert ledger.usage("campaign", "launch", "month") == {"gpu_seconds": 8, "images": 1, "mistral_tokens": 0}
+    with pytest.raises(QuotaExceeded):
+        ledger.admit(campaign="launch", gpu_seconds=6)
+    # A coalesced duplicate charges nothing and is admitted
+    ledger.release(ledger.admit(campaign="launch", gpu_seconds=0, images=0))
+
+
+def test_admission_releases_when_the_call_fails(ledger):
+    ledger.set_quota("user", "ana", "total", images=1)
+    with pytest.raises(RuntimeError):
+        with ledger.admission(user="ana", images=1):
+            raise RuntimeError("Modal timeout")
+    ledger.release(ledger.admit(user="ana", images=1))
+
+
+def test_every_tenant_of_a_call_is_checked(ledger):
+    ledger.set_quota("campaign", "launch", "day", images=1)
+    ledger.record("generate_and_save_image", user="ana", campaign="launch", tier="full", width=1024,
+                  height=1024, steps=30, gpu_seconds=5)
+    with pytest.raises(QuotaExceeded) as error:
+        ledger.admit(user="ana", campaign="launch", images=1)
+    assert (error.value.kind, error.value.tenant) == ("campaign", "launch")
+    assert ledger.stats["rejected"] == 1
@@ -0,0 +1,64 @@
+import asyncio
+import base64
+import json
+import os
+
+from src.bulk import RESULTS_FILE, BulkJob, BulkRunner, load_checkpoint
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\nnot really an image").decode()
+
+
+def make_jobs():
+    return [BulkJob(f"poster {n}", f"poster {n}", "none", "default", 1024, 1024, 30, n) for n in range(4)]
+
+
+def run(output_dir, jobs, fail=()):
+    calls = []
+
+    async def generate(prompt, steps, width, height):
+        calls.append(prompt)
+        if prompt in fail:
+            raise RuntimeError("Modal timeout")
+        return PNG
+
+    summary = asyncio.run(BulkRunner(generate, str(output_dir), concurrency=2).run(jobs))
+    return summary, calls
+
+
+def test_rerun_skips_finished_jobs_and_retries_failed_ones(tmp_path):
+    jobs = make_jobs()
+    summary, calls = run(tmp_path, jobs, fail={"poster 1"})
+    assert (summary["completed"], summary["failed"], summary["skipped"]) == (3, 1, 0)
+    assert sorted(calls) == ["poster 0", "poster 1", "poster 2", "poster 3"]
+
+    summary, calls = run(tmp_path, jobs)
+    assert calls == ["poster 1"]
+    assert (summary["completed"], summary["failed"], summary["skipped"]) == (1, 0, 3)
+    assert set(load_checkpoint(str(tmp_path))) == {job.job_id for job in jobs}
+
+
+def test_a_missing_image_is_generated_again(tmp_path):
+    jobs = make_jobs()
+    run(tmp_path, jobs)
+    record = load_checkpoint(str(tmp_path))[jobs[2].job_id]
+    os.remove(os.path.join(tmp_path, record["file"]))
+
+    summary, calls = run(tmp_path, jobs)
+    assert calls == ["poster 2"]
+    assert summary["skipped"] == 3
+
+
+def test_a_torn_last_line_is_ignored(tmp_path):
+    jobs = make_jobs()
+    run(tmp_path, jobs[:2])
+    with open(os.path.join(tmp_path, RESULTS_FILE), "a", encoding="utf-8") as f:
+        f.write(json.dumps({"job_id": jobs[2].job_id, "status": "ok"})[:20])
+
+    done = load_checkpoint(str(tmp_path))
+    assert set(done) == {jobs[0].job_id, jobs[1].job_id}
+
+
+def test_the_results_file_is_only_opened_by_run(tmp_path):
+    output_dir = tmp_path / "launch"
+    BulkRunner(lambda *args: None, str(output_dir))
+    assert not output_dir.exists()
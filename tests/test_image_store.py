@@ -0,0 +1,37 @@
+import random
+
+from src.image_store import HashIndex
+
+
+def brute_force(hashes, key, radius):
+    distances = [(bin(value ^ key).count("1"), index) for index, value in enumerate(hashes)]
+    return sorted((distance, index) for distance, index in distances if distance <= radius)
+
+
+def flip_bits(value, count, rng):
+    for bit in rng.sample(range(64), count):
+        value ^= 1 << bit
+    return value
+
+
+def test_hash_index_matches_brute_force():
+    rng = random.Random(3)
+    index = HashIndex(radius=8)
+    hashes = []
+    for _ in range(300):
+        base = rng.getrandbits(64)
+        # Near-duplicates at every distance around each random hash
+        for value in (base, flip_bits(base, rng.randint(1, 8), rng), flip_bits(base, rng.randint(9, 16), rng)):
+            index.add(value, len(hashes))
+            hashes.append(value)
+
+    for _ in range(100):
+        key = flip_bits(rng.choice(hashes), rng.randint(0, 10), rng)
+        for radius in (0, 4, 8, 12):
+            found = index.query(key, radius)
+            assert sorted(found) == brute_force(hashes, key, radius)
+            assert [distance for distance, _ in found] == sorted(distance for distance, _ in found)
+
+
+def test_empty_index_finds_nothing():
+    assert HashIndex().query(0, 8) == []
@@ -0,0 +1,52 @@
+import pickle
+
+import pytest
+
+from src.memory import GB, MemoryBusy, plan_memory, plan_resume
+
+
+def test_square_render_runs_without_tiling_or_slicing():
+    plan = plan_memory(1024, 1024, 512)
+    assert plan.action == "run"
+    assert (plan.render_width, plan.render_height) == (1024, 1024)
+    assert not plan.vae_tiling
+    assert not plan.attention_slicing
+
+
+def test_tall_story_size_decodes_tiled():
+    plan = plan_memory(1080, 1920, 512)
+    assert plan.action == "run"
+    assert plan.vae_tiling
+
+
+def test_queue_when_it_fits_an_idle_gpu_but_not_the_free_memory():
+    plan = plan_memory(1024, 1024, 512, capacity_bytes=80 * GB, free_bytes=1 * GB)
+    assert plan.action == "queue"
+
+
+def test_split_renders_smaller_in_multiples_of_16():
+    plan = plan_memory(4096, 4096, 512, capacity_bytes=2 * GB)
+    assert plan.action == "split"
+    assert plan.vae_tiling and plan.attention_slicing
+    assert plan.render_width < 4096 and plan.render_height < 4096
+    assert plan.render_width % 16 == 0 and plan.render_height % 16 == 0
+    assert plan.activation_bytes <= 2 * GB
+
+
+def test_no_capacity_left_after_the_weights_is_an_error():
+    with pytest.raises(ValueError):
+        plan_memory(1024, 1024, 512, capacity_bytes=0)
+
+
+def test_resume_keeps_the_render_size_of_the_latents():
+    plan = plan_resume(4096, 4096, 1024, 1024, 512, capacity_bytes=1)
+    assert (plan.width, plan.height) == (4096, 4096)
+    assert (plan.render_width, plan.render_height) == (1024, 1024)
+    assert plan.action == "run"
+    assert plan.vae_tiling and plan.attention_slicing
+
+
+def test_memory_busy_survives_pickling():
+    error = pickle.loads(pickle.dumps(MemoryBusy("needs 9.0 GB, 2.0 GB free")))
+    assert error.reason == "needs 9.0 GB, 2.0 GB free"
+    assert str(error) == "GPU memory busy: needs 9.0 GB, 2.0 GB free"
@@ -0,0 +1,56 @@
+import base64
+import os
+import zipfile
+
+import pytest
+
+from src.packaging import default_package_path, member_name, within_roots, write_package
+
+PNG = base64.b64encode(b"\x89PNG\r\n\x1a\nnot really an image").decode()
+
+
+def test_member_names_are_sanitized_relative_paths():
+    assert member_name("images/1080x1920/a b.png") == "images/1080x1920/a_b.png"
+    assert member_name("images\\story.png") == "images/story.png"
+    assert member_name("./launch//hero.png") == "launch/hero.png"
+
+
+@pytest.mark.parametrize("name", ["../evil.png", "images/../../evil.png", "/etc/passwd", "C:\\evil.png", "", "./"])
+def test_unsafe_member_names_are_rejected(name):
+    with pytest.raises(ValueError):
+        member_name(name)
+
+
+def test_package_members_never_escape_or_shadow_the_manifest(tmp_path):
+    output = tmp_path / "pkg.zip"
+    entries = [
+        {"image_base64": PNG, "filename": "hero shot.png"},
+        {"image_base64": PNG, "filename": "manifest.json"},
+        {"image_base64": PNG, "filename": "hero shot.png"},
+    ]
+    manifest = write_package(entries, str(output), "launch")
+    with zipfile.ZipFile(output) as archive:
+        names = archive.namelist()
+    assert names == ["hero_shot.png", "manifest_2.json", "hero_shot_3.png", "manifest.json"]
+    assert manifest["total_images"] == 3
+
+
+def test_sources_outside_the_roots_are_refused(tmp_path):
+    root = tmp_path / "store"
+    root.mkdir()
+    inside = root / "a.png"
+    inside.write_bytes(b"png")
+    outside = tmp_path / "secret.png"
+    outside.write_bytes(b"secret")
+    assert within_roots(str(inside), [str(root)])
+    assert not within_roots(str(root / ".." / "secret.png"), [str(root)])
+
+    output = tmp_path / "pkg.zip"
+    with pytest.raises(ValueError):
+        write_package([{"path": str(inside)}, {"path": str(outside)}], str(output), "launch", roots=[str(root)])
+    assert not output.exists()
+    assert [name for name in os.listdir(tmp_path) if name.endswith(".part")] == []
+
+
+def test_default_package_paths_do_not_collide():
+    assert default_package_path("launch") != default_package_path("launch")
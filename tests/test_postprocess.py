@@ -0,0 +1,64 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+from src.postprocess import LUMA, ColorGrade, Pipeline, PostProcessor, _process_chunk, hex_color
+
+STEPS = {
+    "color_grade": [{"op": "color_grade", "brightness": 0.05, "contrast": 1.1, "saturation": 1.2,
+                     "temperature": 0.05, "shadows": "#1b2a49", "highlights": "#ffd6a5", "split_strength": 0.2}],
+    "safe_zone_scrim": [{"op": "safe_zone", "mode": "scrim", "opacity": 0.5}],
+    "safe_zone_guide": [{"op": "safe_zone", "mode": "guide"}],
+    "watermark": [{"op": "watermark", "text": "ACME", "position": "top-left"}],
+    "resize_cover": [{"op": "resize", "width": 48, "height": 30, "fit": "cover"}],
+    "resize_contain": [{"op": "resize", "preset": "instagram_story", "fit": "contain"}],
+}
+
+
+def images(count, seed=0):
+    rng = np.random.default_rng(seed)
+    shapes = [(64, 64, 3), (40, 72, 3)]
+    return [rng.integers(0, 256, shapes[n % 2], dtype=np.uint8) for n in range(count)]
+
+
+@pytest.mark.parametrize("name", sorted(STEPS))
+def test_a_stack_matches_images_one_at_a_time(name):
+    pipeline = Pipeline(STEPS[name])
+    inputs = images(6)
+    platforms = ["instagram_story", "instagram_story", "", "youtube_thumbnail", "instagram_story", ""]
+    stacked = pipeline.run(inputs, platforms)
+    for image, platform, result in zip(inputs, platforms, stacked):
+        alone = Pipeline(STEPS[name]).run([image], [platform])[0]
+        assert result.shape == alone.shape
+        assert np.array_equal(result, alone)
+
+
+def test_fused_color_grade_matches_the_unfused_formula():
+    grade = ColorGrade(brightness=0.05, contrast=1.1, saturation=1.2, temperature=0.05,
+                       shadows="#1b2a49", highlights="#ffd6a5", split_strength=0.2)
+    batch = np.stack(images(4)[::2]).astype(np.float32) / 255.0
+    x = batch * 1.1 * np.array([1.05, 1.0, 0.95], dtype=np.float32) + (0.05 - 0.5) * 1.1 + 0.5
+    luma = (x @ LUMA)[..., None]
+    shadows, highlights = hex_color("#1b2a49"), hex_color("#ffd6a5")
+    expected = 0.8 * (1.2 * x + (1 - 1.2) * luma) + 0.2 * (shadows + luma * (highlights - shadows))
+    assert np.allclose(grade.apply(batch.copy(), ""), expected, atol=1e-5)
+
+
+def test_the_pool_returns_images_in_input_order(tmp_path):
+    paths, platforms = [], []
+    for n, image in enumerate(images(9, seed=1)):
+        path = str(tmp_path / f"{n}.png")
+        Image.fromarray(image).save(path)
+        paths.append(path)
+        platforms.append(["instagram_story", ""][n % 3 == 0])
+    pipeline = Pipeline(STEPS["color_grade"] + STEPS["watermark"], "brand")
+
+    processor = PostProcessor(workers=3)
+    try:
+        chunks, order = processor.chunks(paths, platforms)
+        assert len(chunks) > 1 and order != sorted(order)
+        pooled = processor.process_files(paths, pipeline, platforms)
+    finally:
+        processor.close()
+    assert pooled == [_process_chunk([path], [platform], pipeline.to_config())[0]
+                      for path, platform in zip(paths, platforms)]
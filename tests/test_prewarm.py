@@ -0,0 +1,129 @@
+import asyncio
+
+from src.prewarm import PrewarmController, TrafficRecorder
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+class FakeWarmPool:
+    def __init__(self):
+        self.warm_counts = []
+        self.warmups = []
+
+    async def set_warm(self, count: int):
+        self.warm_counts.append(count)
+
+    async def warmup(self, count: int):
+        self.warmups.append(count)
+
+
+def make_controller(**kwargs):
+    clock = FakeClock()
+    backend = FakeWarmPool()
+    options = dict(min_warm=0, max_warm=4, service_seconds=20.0, target_utilization=0.5,
+                   window_seconds=100.0, lead_seconds=60.0, scale_down_delay=300.0)
+    options.update(kwargs)
+    return PrewarmController(backend, clock=clock, **options), clock, backend
+
+
+def record(controller, clock, count: int, spacing: float = 1.0):
+    for _ in range(count):
+        controller.record_request()
+        clock.now += spacing
+
+
+def test_traffic_target_follows_littles_law():
+    controller, clock, _ = make_controller()
+    assert controller.traffic_target() == 0
+    # 10 requests in a 100 s window: 0.1 req/s x 20 s = 2 busy, / 0.5 utilization
+    record(controller, clock, 10)
+    assert controller.traffic_target() == 4
+    record(controller, clock, 30)
+    assert controller.desired_warm() == 4  # capped at max_warm
+
+
+def test_scales_up_at_once_and_down_only_after_the_delay():
+    controller, clock, backend = make_controller()
+    assert asyncio.run(controller.tick()) == 0
+    record(controller, clock, 5)
+    assert asyncio.run(controller.tick()) == 2
+    assert backend.warm_counts == [0, 2]
+
+    # Traffic stops: arrivals leave the window but the pool is held
+    clock.now += 150
+    assert controller.desired_warm() == 0
+    assert asyncio.run(controller.tick()) == 2
+    clock.now += 200
+    assert asyncio.run(controller.tick()) == 0
+    assert backend.warm_counts == [0, 2, 0]
+
+
+def test_min_warm_is_kept_without_traffic():
+    controller, _, backend = make_controller(min_warm=1)
+    assert asyncio.run(controller.tick()) == 1
+    assert backend.warm_counts == [1]
+
+
+def test_campaign_is_warmed_once_within_the_lead_time():
+    controller, clock, backend = make_controller()
+    controller.schedule_campaign("launch", start=1000.0, duration_seconds=100.0, containers=3)
+
+    clock.now = 900.0
+    assert asyncio.run(controller.tick()) == 0
+    assert backend.warmups == []
+
+    clock.now = 950.0
+    assert asyncio.run(controller.tick()) == 3
+    clock.now = 960.0
+    asyncio.run(controller.tick())
+    assert backend.warmups == [3]
+
+    # The campaign is dropped once over; the scale-down delay still applies
+    clock.now = 1101.0
+    assert asyncio.run(controller.tick()) == 3
+    assert controller.campaigns == []
+
+
+def test_state_round_trip_keeps_the_decisions():
+    controller, clock, _ = make_controller()
+    record(controller, clock, 5)
+    asyncio.run(controller.tick())
+    controller.schedule_campaign("launch", start=5000.0, duration_seconds=60.0, containers=2)
+    controller.record_latency(95.0, cold=True)
+
+    resumed, _, backend = make_controller()
+    resumed.clock = clock
+    resumed.history.clock = clock
+    resumed.load_state(controller.to_state())
+    assert resumed.current_warm == 2
+    assert resumed.traffic_target() == controller.traffic_target()
+    assert [c.name for c in resumed.campaigns] == ["launch"]
+    assert resumed.latency.report()["cold"]["count"] == 1
+
+    # Same count as before the restart: no call to the backend
+    asyncio.run(resumed.tick())
+    assert backend.warm_counts == []
+
+
+def test_traffic_from_several_replicas_is_merged():
+    controller, clock, _ = make_controller()
+    replicas = [TrafficRecorder(clock), TrafficRecorder(clock)]
+    for _ in range(5):
+        for replica in replicas:
+            replica.record_request()
+        clock.now += 1.0
+    replicas[1].record_latency(21.0, cold=False)
+    replicas[1].schedule_campaign("launch", start=500.0, duration_seconds=60.0, containers=1)
+
+    controller.apply_traffic([replica.drain() for replica in replicas])
+    # 10 requests in the window, as if one controller had seen them all
+    assert controller.traffic_target() == 4
+    assert controller.latency.report()["warm"]["count"] == 1
+    assert [c.name for c in controller.campaigns] == ["launch"]
+    assert replicas[0].drain() is None
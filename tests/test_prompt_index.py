@@ -0,0 +1,102 @@
+from io import BytesIO
+
+import numpy as np
+from PIL import Image
+
+from src.image_store import ImageStore
+from src.prompt_index import HistoryIndex, PromptIndex
+
+PRODUCTS = ["red sneakers", "leather handbag", "steel watch", "wool scarf", "glass bottle", "denim jacket",
+            "ceramic mug", "bamboo desk", "silk tie", "canvas tote", "running shorts", "copper lamp"]
+
+
+def prompts(count):
+    return [f"{PRODUCTS[n % len(PRODUCTS)]} on concrete, studio shot {n}" for n in range(count)]
+
+
+def png(seed, touch=False):
+    pixels = np.random.default_rng(seed).integers(0, 256, (64, 64, 3), dtype=np.uint8)
+    if touch:
+        pixels[0, 0] ^= 1
+    buffer = BytesIO()
+    Image.fromarray(pixels).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def assert_consistent(index):
+    assert len(index.vectors) == len(index.ids) == len(index.texts)
+    for position, text in enumerate(index.texts):
+        assert index.search(text, k=1, exact=True)[0][1] == position
+
+
+def test_one_at_a_time_adds_survive_every_refit():
+    index = PromptIndex()
+    for n, text in enumerate(prompts(40)):
+        index.add([f"id{n}"], [text])
+        assert len(index.vectors) == len(index.ids)
+    assert index.stats["refits"] > 3
+    assert_consistent(index)
+
+
+def test_small_batches_match_a_single_fit():
+    texts = prompts(30)
+    incremental = PromptIndex()
+    for offset in range(0, len(texts), 3):
+        incremental.add([f"id{n}" for n in range(offset, offset + 3)], texts[offset:offset + 3])
+    incremental.fit()
+    whole = PromptIndex()
+    whole.add([f"id{n}" for n in range(len(texts))], texts)
+    assert np.allclose(incremental.vectors, whole.vectors, atol=1e-6)
+
+
+def test_save_and_load_after_incremental_adds(tmp_path):
+    texts = prompts(13)
+    index = PromptIndex()
+    for n, text in enumerate(texts):
+        index.add([f"id{n}"], [text])
+    path = str(tmp_path / "prompt_index.npz")
+    index.save(path)
+
+    loaded = PromptIndex.load(path, {f"id{n}": text for n, text in enumerate(texts)})
+    assert loaded.ids == index.ids
+    assert loaded.fitted_size == index.fitted_size
+    loaded.add(["id13"], ["copper lamp on a marble table"])
+    assert_consistent(loaded)
+
+
+def test_index_switches_to_ivf_at_ivf_min():
+    texts = prompts(60)
+    index = PromptIndex(ivf_min=50, nprobe=64)
+    for n, text in enumerate(texts):
+        index.add([f"id{n}"], [text])
+        assert index.mode == ("ivf" if n + 1 >= 50 else "flat")
+    assert len(index.assignment) == len(index) == sum(len(cells) for cells in index.lists)
+    # Probing every list is exact
+    for position, text in enumerate(texts):
+        hits, exact = index.search(text, k=3), index.search(text, k=3, exact=True)
+        assert hits[0][1] == position
+        assert [score for score, _ in hits] == [score for score, _ in exact]
+
+
+def test_sync_starts_over_after_a_dedupe_rewrite(tmp_path):
+    store = ImageStore(str(tmp_path))
+    history = HistoryIndex(store)
+    texts = prompts(6)
+    for seed, text in enumerate(texts[:5]):
+        store.save(png(seed), prompt=text)
+        assert history.sync() == 1
+    store.save(png(2, touch=True), prompt=texts[5])
+    assert history.sync() == 1
+
+    assert store.dedupe(apply=True)["redundant_images"] == 1
+    assert history.sync() == 5
+    assert history.index.ids == list(store.records)
+    assert_consistent(history.index)
+    store.save(png(9), prompt="wool scarf on a park bench")
+    assert history.sync() == 1
+    assert history.search("wool scarf park bench", k=1)["results"][0]["prompt"] == "wool scarf on a park bench"
+
+    reloaded = HistoryIndex(ImageStore(str(tmp_path)))
+    history.save()
+    assert reloaded.sync() == 0
+    assert reloaded.index.ids == history.index.ids
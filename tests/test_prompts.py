@@ -0,0 +1,57 @@
+from src.prompts import PromptCompiler, clause_key, split_clauses
+
+
+def words(special_tokens):
+    """Token counter stand-in: one token per word plus the encoder's special tokens"""
+    return lambda text: len(text.split()) + special_tokens
+
+
+def make_compiler(max_tokens=512, clip_max_tokens=77):
+    return PromptCompiler(
+        max_tokens=max_tokens, clip_max_tokens=clip_max_tokens, counter=words(1), clip=words(2),
+        style_modifiers={"cinematic": "dramatic lighting, shallow depth of field, film grain texture"},
+        variation_strategies={"mood": ["Dramatic Lighting., moody blue tones"]},
+        templates={},
+    )
+
+
+def test_split_clauses_keeps_list_items_and_parentheses_together():
+    assert split_clauses("a bowl of fruit, apples, pears, and figs, soft light (warm, golden)") == [
+        "a bowl of fruit, apples, pears, and figs",
+        "soft light (warm, golden)",
+    ]
+
+
+def test_clause_key_ignores_case_spacing_and_trailing_punctuation():
+    assert clause_key("  Dramatic   Lighting. ") == clause_key("dramatic lighting")
+
+
+def test_clauses_repeated_across_prompt_variation_and_style_are_dropped():
+    compiled = make_compiler().compile("a red sports car, dramatic lighting", "cinematic",
+                                       "Dramatic Lighting., moody blue tones")
+    assert compiled.text == ("a red sports car, dramatic lighting, moody blue tones, "
+                             "shallow depth of field, film grain texture")
+    # The style's copy is removed when the suffix is precompiled, the variation's here
+    assert compiled.duplicates == 1
+    assert not compiled.truncated
+
+
+def test_style_filler_goes_before_the_users_clauses():
+    compiled = make_compiler(max_tokens=16).compile("a red sports car, on a mountain road", "cinematic",
+                                                    extra=["optimized for instagram post"])
+    assert compiled.text.startswith("a red sports car, on a mountain road")
+    assert "optimized for instagram post" not in compiled.dropped
+    assert compiled.dropped
+    assert all(clause in ("dramatic lighting", "shallow depth of field", "film grain texture")
+               for clause in compiled.dropped)
+    assert compiled.tokens <= 16
+    assert not compiled.user_truncated
+
+
+def test_clip_text_is_a_subset_of_the_t5_text_within_its_budget():
+    compiled = make_compiler(clip_max_tokens=10).compile("a red sports car, on a mountain road", "cinematic")
+    t5_clauses = split_clauses(compiled.text)
+    clip_clauses = split_clauses(compiled.clip_text)
+    assert all(clause in t5_clauses for clause in clip_clauses)
+    assert compiled.clip_tokens <= 10
+    assert compiled.clip_dropped == len(t5_clauses) - len(clip_clauses)
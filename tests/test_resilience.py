@@ -0,0 +1,145 @@
+import asyncio
+
+import pytest
+
+from src.resilience import CircuitBreaker, CircuitOpenError, ModalAPIError, ResilientModalClient, RetryPolicy
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class StubClient(ResilientModalClient):
+    """Answers attempts from a script instead of HTTP: a dict, an error, or (seconds, dict)"""
+
+    def __init__(self, script, healthy=True, **kwargs):
+        self.clock = kwargs.pop("clock", FakeClock())
+        self.delays = []
+
+        async def sleep(seconds):
+            self.delays.append(seconds)
+            self.clock.now += seconds
+
+        super().__init__("http://modal.test", breaker=kwargs.pop("breaker", CircuitBreaker(clock=self.clock)),
+                         sleep=sleep, **kwargs)
+        self.script = list(script)
+        self.healthy = healthy
+        self.sent = []
+
+    async def health(self):
+        return self.healthy
+
+    async def _attempt(self, path, payload, headers):
+        self.stats["attempts"] += 1
+        self.sent.append(dict(headers or {}))
+        outcome = self.script.pop(0)
+        if isinstance(outcome, tuple):
+            seconds, outcome = outcome
+            await asyncio.sleep(seconds)
+        if isinstance(outcome, Exception):
+            raise outcome
+        return outcome
+
+
+def timeout():
+    return ModalAPIError("Modal API timed out", retryable=True, ambiguous=True)
+
+
+def unavailable():
+    return ModalAPIError("Modal API error (503)", status=503, retryable=True)
+
+
+def test_retries_stop_at_the_attempt_budget():
+    client = StubClient([unavailable()] * 5, retry_policy=RetryPolicy(max_attempts=3, base_delay=1.0, max_delay=2.0))
+    with pytest.raises(ModalAPIError):
+        asyncio.run(client.post_json("/generate", {}))
+    assert client.stats["attempts"] == 3
+    assert client.stats["retries"] == 2
+    assert len(client.delays) == 2 and all(0 <= delay <= 2.0 for delay in client.delays)
+
+
+def test_a_retryable_failure_is_retried_until_it_succeeds():
+    client = StubClient([unavailable(), {"ok": True}])
+    assert asyncio.run(client.post_json("/generate", {})) == {"ok": True}
+    assert client.stats["retries"] == 1
+
+
+def test_non_retryable_errors_are_raised_at_once():
+    client = StubClient([ModalAPIError("Modal API error (400)", status=400), {"ok": True}])
+    with pytest.raises(ModalAPIError):
+        asyncio.run(client.post_json("/generate", {}, idempotent=True))
+    assert client.stats["attempts"] == 1
+
+
+def test_ambiguous_failures_are_only_retried_for_idempotent_calls():
+    client = StubClient([timeout(), {"ok": True}])
+    with pytest.raises(ModalAPIError):
+        asyncio.run(client.post_json("/generate", {}))
+    assert client.stats["attempts"] == 1
+    assert "Idempotency-Key" not in client.sent[0]
+
+    client = StubClient([timeout(), timeout(), {"ok": True}])
+    assert asyncio.run(client.post_json("/generate", {}, idempotent=True)) == {"ok": True}
+    keys = {headers["Idempotency-Key"] for headers in client.sent}
+    assert len(client.sent) == 3 and len(keys) == 1
+
+
+def test_a_call_past_the_p95_is_hedged_and_the_backup_wins():
+    client = StubClient([(1.0, {"from": "primary"}), (0.0, {"from": "backup"})], hedge=True, hedge_min_samples=5)
+    for _ in range(20):
+        client.tracker("/generate", {}).record(0.01)
+    client.tracker("/generate", {"tier": "preview"}).record(5.0)
+
+    assert asyncio.run(client.post_json("/generate", {}, idempotent=True)) == {"from": "backup"}
+    assert (client.stats["hedges"], client.stats["hedge_wins"]) == (1, 1)
+    assert client.sent[0]["Idempotency-Key"] == client.sent[1]["Idempotency-Key"]
+
+
+def test_calls_are_not_hedged_without_enough_samples_or_idempotency():
+    client = StubClient([(0.05, {"ok": True})] * 2, hedge=True, hedge_min_samples=5)
+    for _ in range(20):
+        client.tracker("/generate", {}).record(0.01)
+    asyncio.run(client.post_json("/generate", {}))
+    asyncio.run(client.post_json("/generate", {"tier": "preview"}, idempotent=True))
+    assert client.stats["hedges"] == 0
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=30.0, clock=clock)
+    client = StubClient([unavailable(), unavailable(), {"ok": True}, {"ok": True}], clock=clock, breaker=breaker,
+                        retry_policy=RetryPolicy(max_attempts=2, base_delay=0.0))
+    with pytest.raises(ModalAPIError):
+        asyncio.run(client.post_json("/generate", {}))
+    assert breaker.state == CircuitBreaker.OPEN
+
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.post_json("/generate", {}))
+    assert client.stats["attempts"] == 2
+
+    clock.now += 31
+    client.healthy = False
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(client.post_json("/generate", {}))
+    assert breaker.state == CircuitBreaker.OPEN and breaker.stats["probes"] == 1
+
+    clock.now += 31
+    client.healthy = True
+    assert asyncio.run(breaker.allow(client.health))
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    assert asyncio.run(client.post_json("/generate", {})) == {"ok": True}
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_a_failure_while_half_open_opens_the_breaker_again():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=5, reset_timeout=30.0, clock=clock)
+    breaker.trip()
+    clock.now += 31
+    assert asyncio.run(breaker.allow(lambda: asyncio.sleep(0, True)))
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN and breaker.opened_at == clock.now
@@ -0,0 +1,163 @@
+import asyncio
+
+from src.scheduler import Job, PriorityScheduler, Preempted
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def make_job(job_id, priority, cost=1.0, enqueued_at=0.0, preemptible=False):
+    return Job(job_id, None, priority, cost, enqueued_at, preemptible)
+
+
+async def settle():
+    for _ in range(5):
+        await asyncio.sleep(0)
+
+
+def test_shortest_job_first_within_a_class():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1, aging_seconds=0, clock=FakeClock())
+        gate = asyncio.Event()
+        order = []
+
+        async def blocker(job):
+            await gate.wait()
+
+        def runner(name):
+            async def run(job):
+                order.append(name)
+            return run
+
+        first = asyncio.ensure_future(scheduler.submit(blocker, "standard", 1.0))
+        await settle()
+        others = [
+            asyncio.ensure_future(scheduler.submit(runner("bulk-cheap"), "bulk", 0.5)),
+            asyncio.ensure_future(scheduler.submit(runner("standard-5"), "standard", 5.0)),
+            asyncio.ensure_future(scheduler.submit(runner("standard-2"), "standard", 2.0)),
+        ]
+        await settle()
+        gate.set()
+        await asyncio.gather(first, *others)
+        return order
+
+    assert asyncio.run(scenario()) == ["standard-2", "standard-5", "bulk-cheap"]
+
+
+def test_aging_promotes_one_class_per_period():
+    clock = FakeClock()
+    scheduler = PriorityScheduler(slots=1, aging_seconds=10, clock=clock)
+    bulk = make_job(1, "bulk", cost=50.0, enqueued_at=0.0)
+    clock.now = 9.9
+    assert scheduler.effective_rank(bulk) == 2
+    clock.now = 25.0
+    assert scheduler.effective_rank(bulk) == 0
+
+    fresh = make_job(2, "interactive", cost=1.0, enqueued_at=25.0)
+    scheduler.waiting = [fresh, bulk]
+    # Same effective class: the cheaper job still wins
+    assert scheduler.next_job() is fresh
+    clock.now = 34.9
+    # Bulk has now waited long enough to outrank fresh interactive work
+    assert scheduler.effective_rank(bulk) == -1
+    assert scheduler.next_job() is bulk
+
+
+def test_preemption_victim_is_lowest_class_with_most_work():
+    scheduler = PriorityScheduler(slots=3, aging_seconds=0, preemption=True, clock=FakeClock())
+    standard = make_job(1, "standard", cost=40.0, preemptible=True)
+    small_bulk = make_job(2, "bulk", cost=10.0, preemptible=True)
+    big_bulk = make_job(3, "bulk", cost=30.0, preemptible=True)
+    scheduler.running = {job.job_id: job for job in (standard, small_bulk, big_bulk)}
+
+    incoming = make_job(4, "interactive")
+    assert scheduler.preemption_victim(incoming) is big_bulk
+
+    big_bulk.preempt_requested = True
+    assert scheduler.preemption_victim(incoming) is small_bulk
+
+    # Only strictly lower classes are displaced
+    assert scheduler.preemption_victim(make_job(5, "bulk")) is None
+
+
+def test_no_preemption_with_a_free_slot_or_when_disabled():
+    scheduler = PriorityScheduler(slots=2, aging_seconds=0, preemption=True, clock=FakeClock())
+    bulk = make_job(1, "bulk", preemptible=True)
+    scheduler.running = {1: bulk}
+    assert scheduler.preemption_victim(make_job(2, "interactive")) is None
+
+    scheduler.running[3] = make_job(3, "bulk", preemptible=False)
+    assert scheduler.preemption_victim(make_job(2, "interactive")) is bulk
+    scheduler.preemption = False
+    assert scheduler.preemption_victim(make_job(2, "interactive")) is None
+
+
+def test_cancelled_waiter_is_removed_and_never_runs():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1, aging_seconds=0, clock=FakeClock())
+        gate = asyncio.Event()
+        ran = []
+
+        async def blocker(job):
+            await gate.wait()
+
+        async def waiter(job):
+            ran.append(job.job_id)
+
+        first = asyncio.ensure_future(scheduler.submit(blocker))
+        await settle()
+        second = asyncio.ensure_future(scheduler.submit(waiter))
+        await settle()
+        assert len(scheduler.waiting) == 1
+
+        second.cancel()
+        await settle()
+        assert scheduler.waiting == []
+
+        gate.set()
+        await first
+        await settle()
+        return ran, scheduler.stats
+
+    ran, stats = asyncio.run(scenario())
+    assert ran == []
+    assert stats["cancelled"] == 1
+    assert stats["completed"] == 1
+
+
+def test_preempted_job_resumes_with_its_state():
+    async def scenario():
+        scheduler = PriorityScheduler(slots=1, aging_seconds=0, preemption=True, clock=FakeClock())
+        preempted = []
+        scheduler.on_preempt = preempted.append
+        bulk_started = asyncio.Event()
+        resumed_from = []
+
+        async def bulk(job):
+            if job.resume_state is None:
+                bulk_started.set()
+                while not job.preempt_requested:
+                    await asyncio.sleep(0)
+                return Preempted(state=20, remaining_cost=3.0)
+            resumed_from.append(job.resume_state)
+            return "bulk done"
+
+        async def interactive(job):
+            return "interactive done"
+
+        bulk_task = asyncio.ensure_future(scheduler.submit(bulk, "bulk", 5.0, preemptible=True))
+        await bulk_started.wait()
+        interactive_result = await scheduler.submit(interactive, "interactive", 1.0)
+        return interactive_result, await bulk_task, resumed_from, preempted, scheduler.stats
+
+    interactive_result, bulk_result, resumed_from, preempted, stats = asyncio.run(scenario())
+    assert interactive_result == "interactive done"
+    assert bulk_result == "bulk done"
+    assert resumed_from == [20]
+    assert len(preempted) == 1 and preempted[0].preemptions == 1
+    assert stats["preemptions"] == 1
@@ -0,0 +1,117 @@
+import asyncio
+
+import pytest
+
+from src.singleflight import IdempotentResponses, SingleFlight, normalize_generation_key
+
+
+class FakeClock:
+    def __init__(self, now: float = 0.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_generation_key_ignores_prompt_whitespace():
+    assert normalize_generation_key(" a  red\ncar ", 30, 1024, 1024, "full") == \
+        normalize_generation_key("a red car", "30", 1024, 1024, "full")
+
+
+def test_concurrent_callers_share_one_call():
+    async def scenario():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+        calls = []
+
+        async def work():
+            calls.append(1)
+            await gate.wait()
+            return "image"
+
+        waiters = [asyncio.ensure_future(flight.do("key", work)) for _ in range(3)]
+        await asyncio.sleep(0)
+        assert flight.is_in_flight("key")
+        gate.set()
+        results = await asyncio.gather(*waiters)
+        return results, calls, flight
+
+    results, calls, flight = asyncio.run(scenario())
+    assert results == ["image"] * 3
+    assert len(calls) == 1
+    assert flight.get_stats()["coalesced"] == 2
+    assert flight.in_flight == 0
+
+
+def test_a_failure_reaches_every_waiter_and_is_not_cached():
+    async def scenario():
+        flight = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise RuntimeError("GPU lost")
+
+        results = await asyncio.gather(flight.do("key", fail), flight.do("key", fail), return_exceptions=True)
+        retried = await flight.do("key", lambda: asyncio.sleep(0, result="image"))
+        return results, retried, flight
+
+    results, retried, flight = asyncio.run(scenario())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert retried == "image"
+    assert flight.stats["errors"] == 1
+
+
+def test_a_cancelled_waiter_does_not_cancel_the_shared_call():
+    async def scenario():
+        flight = SingleFlight()
+        gate = asyncio.Event()
+
+        async def work():
+            await gate.wait()
+            return "image"
+
+        first = asyncio.ensure_future(flight.do("key", work))
+        second = asyncio.ensure_future(flight.do("key", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        gate.set()
+        return await second, first.cancelled()
+
+    assert asyncio.run(scenario()) == ("image", True)
+
+
+def test_idempotent_responses_replay_until_the_ttl():
+    async def scenario():
+        clock = FakeClock()
+        responses = IdempotentResponses(ttl_seconds=60, clock=clock)
+        calls = []
+
+        async def work():
+            calls.append(1)
+            return f"image {len(calls)}"
+
+        first = await responses.do("retry-key", work)
+        clock.now = 59
+        replayed = await responses.do("retry-key", work)
+        clock.now = 120
+        fresh = await responses.do("retry-key", work)
+        return first, replayed, fresh, responses
+
+    first, replayed, fresh, responses = asyncio.run(scenario())
+    assert (first, replayed, fresh) == ("image 1", "image 1", "image 2")
+    assert responses.stats["replayed"] == 1
+
+
+def test_idempotent_failures_can_be_retried():
+    async def scenario():
+        responses = IdempotentResponses(clock=FakeClock())
+
+        async def fail():
+            raise RuntimeError("timeout")
+
+        with pytest.raises(RuntimeError):
+            await responses.do("retry-key", fail)
+        assert not responses.seen("retry-key")
+        return await responses.do("retry-key", lambda: asyncio.sleep(0, result="image"))
+
+    assert asyncio.run(scenario()) == "image"
@@ -0,0 +1,53 @@
+import pytest
+
+from src.steps import UNCALIBRATED_STEPS, StepPlanner
+
+
+def make_table(measured=True):
+    return {
+        "measured": measured,
+        "reference_steps": 50,
+        "buckets": [
+            {"megapixels": 0.59, "steps": [8, 16, 24, 36], "lpips": [0.31, 0.17, 0.10, 0.05],
+             "clip_ratio": [0.975, 0.99, 0.995, 0.998]},
+            {"megapixels": 2.07, "steps": [8, 16, 24, 36], "lpips": [0.40, 0.25, 0.16, 0.09],
+             "clip_ratio": [0.96, 0.985, 0.992, 0.996]},
+        ],
+    }
+
+
+def test_smallest_step_count_that_meets_the_target():
+    planner = StepPlanner(make_table())
+    assert planner.choose(768, 768, quality="draft") == 16
+    assert planner.choose(768, 768, quality="standard") == 16
+    assert planner.choose(768, 768, quality="hero") == 24
+
+
+def test_nearest_bucket_and_platform_target():
+    planner = StepPlanner(make_table())
+    plan = planner.plan(1080, 1920, platform="instagram_story")
+    assert plan["bucket_megapixels"] == 2.07
+    assert plan["quality"] == "standard"
+    assert plan["steps"] == 24
+    assert plan["calibrated"]
+
+
+def test_reference_steps_when_no_calibrated_count_is_good_enough():
+    table = make_table()
+    table["buckets"][1]["lpips"][-1] = 0.11
+    assert StepPlanner(table).choose(1080, 1920, quality="hero") == 50
+
+
+def test_unmeasured_table_runs_the_full_schedule():
+    plan = StepPlanner(make_table(measured=False)).plan(768, 768, quality="draft")
+    assert plan["steps"] == UNCALIBRATED_STEPS
+    assert not plan["calibrated"]
+
+
+def test_shipped_table_is_not_trusted():
+    assert not StepPlanner.load().measured
+
+
+def test_unknown_quality_is_rejected():
+    with pytest.raises(ValueError):
+        StepPlanner(make_table()).choose(1024, 1024, quality="ultra")
@@ -0,0 +1,48 @@
+import random
+
+from src.prompts import _fit
+from src.tokens import estimate_clip_tokens, estimate_t5_tokens, sequence_length_for
+
+
+def words(special_tokens):
+    return lambda text: len(text.split()) + special_tokens
+
+
+def test_sequence_length_picks_the_smallest_bucket_that_holds_the_prompt():
+    assert sequence_length_for(1) == 128
+    assert sequence_length_for(128) == 128
+    assert sequence_length_for(129) == 256
+    assert sequence_length_for(600) == 512
+
+
+def test_estimates_count_special_tokens_and_grow_with_the_text():
+    assert estimate_t5_tokens("") == 1
+    assert estimate_clip_tokens("") == 2
+    assert estimate_t5_tokens("a cat") < estimate_t5_tokens("a cat, on a photorealistic windowsill")
+
+
+def test_fit_skips_a_clause_that_does_not_fit_and_keeps_later_ones():
+    kept, total = _fit(["a b c", "d e f g h", "i"], words(1), max_tokens=6, special_tokens=1, required=0)
+    # A subsequence, not a prefix: the long middle clause is skipped
+    assert kept == ["a b c", "i"]
+    assert total == 5
+
+
+def test_fit_keeps_a_lone_required_clause_that_overflows():
+    kept, total = _fit(["a b c d e f g", "h"], words(1), max_tokens=5, special_tokens=1, required=1)
+    assert kept == ["a b c d e f g"]
+    assert total == 8
+
+
+def test_fit_stays_within_budget_whenever_more_than_one_clause_is_kept():
+    rng = random.Random(7)
+    for _ in range(200):
+        clauses = [" ".join([f"c{n}"] + ["w"] * rng.randint(0, 7)) for n in range(rng.randint(1, 10))]
+        budget = rng.randint(3, 30)
+        kept, total = _fit(clauses, words(2), budget, special_tokens=2, required=1)
+        assert total == len(", ".join(kept).split()) + 2
+        if len(kept) > 1:
+            assert total <= budget
+        # Order is preserved
+        positions = [clauses.index(clause) for clause in kept]
+        assert positions == sorted(positions)